@@ -37,6 +37,52 @@ class Config(object):
     # Logging
     LOG_TO_STDOUT = os.getenv('LOG_TO_STDOUT', default=False)
 
+    # Cache of the identity of the logged in users (per process)
+    USER_CACHE_SIZE = 4096
+    USER_CACHE_TTL = 60  # seconds
+
+    # Folder for the memory-mapped cache files of the daily closing prices
+    PRICE_CACHE_FOLDER = os.path.join(BASEDIR, 'instance', 'price_cache')
+
+    # Portfolio analytics
+    ANALYTICS_BENCHMARK_SYMBOL = 'SPY'
+    ANALYTICS_RISK_FREE_RATE = 0.0  # annualized
+
+    # Maximum number of points in the price chart of a stock (longer histories are downsampled)
+    CHART_MAX_POINTS = 250
+
+    # Background jobs (projections and efficient frontiers), with their status and results shared by every process
+    JOB_FOLDER = os.path.join(BASEDIR, 'instance', 'jobs')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', default=2))  # threads per process
+    JOB_TTL = 3600  # seconds
+    JOB_TIMEOUT = 600  # seconds
+
+    # Monte Carlo projections (PROJECTION_WORKERS of 0 simulates the paths in the background thread)
+    PROJECTION_WORKERS = int(os.getenv('PROJECTION_WORKERS', default=2))
+    PROJECTION_BATCH_SIZE = 5000
+
+    # Nightly batch of the time-weighted and money-weighted returns (RETURN_METRICS_WORKERS of 0 runs in the CLI process)
+    RETURN_METRICS_WORKERS = int(os.getenv('RETURN_METRICS_WORKERS', default=2))
+    RETURN_METRICS_BATCH_SIZE = 500  # users
+
+    # Number of transactions in the ledger between each snapshot of a position
+    LEDGER_SNAPSHOT_INTERVAL = 20
+
+    # Exchange rates ('alpha_vantage', or 'replay' to read recorded responses from FX_RATES_REPLAY_FILE)
+    FX_RATES_PROVIDER = os.getenv('FX_RATES_PROVIDER', default='alpha_vantage')
+    FX_RATES_REPLAY_FILE = os.path.join(BASEDIR, 'instance', 'fx_rates.json')
+
+    # Interval between re-loading the index of the price alerts (to include the alerts changed in other processes)
+    PRICE_ALERT_RELOAD_INTERVAL = 60  # seconds
+
+    # Interval between re-loading the ranking of the leaderboard (to include the scores updated in other processes)
+    LEADERBOARD_RELOAD_INTERVAL = 60  # seconds
+    LEADERBOARD_SIZE = 25
+
+    # Fingerprinted static files (served with an immutable Cache-Control header) and their precompressed copies
+    STATIC_BUILD_FOLDER = os.path.join(BASEDIR, 'instance', 'static_build')
+    STATIC_MAX_AGE = 31536000  # one year, in seconds
+
 
 class ProductionConfig(Config):
     FLASK_ENV = 'production'
@@ -61,4 +107,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI',
                                         default=f"sqlite:///{os.path.join(BASEDIR, 'instance', 'test.db')}")
+    PRICE_CACHE_FOLDER = os.path.join(BASEDIR, 'instance', 'test_price_cache')
+    JOB_FOLDER = os.path.join(BASEDIR, 'instance', 'test_jobs')
+    PROJECTION_WORKERS = 0
+    RETURN_METRICS_WORKERS = 0
+    FX_RATES_PROVIDER = 'replay'
     WTF_CSRF_ENABLED = False
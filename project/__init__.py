@@ -9,6 +9,8 @@ from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
 from flask_mail import Mail
 from sqlalchemy import MetaData
+from project.cache import TTLCache
+from project.assets import StaticAssets
 
 
 # -------------
@@ -34,6 +36,11 @@ csrf_protection = CSRFProtect()
 login = LoginManager()
 login.login_view = "users.login"
 mail = Mail()
+static_assets = StaticAssets()
+
+# Per-process cache of the identity of the logged in users, which is configured
+# when the Flask application is created
+user_cache = TTLCache()
 
 
 # ----------------------------
@@ -68,13 +75,16 @@ def initialize_extensions(app):
     csrf_protection.init_app(app)
     login.init_app(app)
     mail.init_app(app)
+    static_assets.init_app(app)
 
     # Flask-Login configuration
-    from project.models import User
+    from project.models import load_cached_user
+
+    user_cache.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
 
     @login.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
 
 
 def register_blueprints(app):
@@ -83,6 +93,7 @@ def register_blueprints(app):
     from project.users import users_blueprint
     from project.admin import admin_blueprint
     from project.watchlist import watchlist_blueprint
+    from project.api import api_blueprint
 
     # Since the application instance is now created, register each Blueprint
     # with the Flask application instance (app)
@@ -90,6 +101,10 @@ def register_blueprints(app):
     app.register_blueprint(users_blueprint, url_prefix='/users')
     app.register_blueprint(admin_blueprint, url_prefix='/admin')
     app.register_blueprint(watchlist_blueprint)
+    app.register_blueprint(api_blueprint, url_prefix='/api/v1')
+
+    # Unauthenticated requests to the API receive a 401 (Unauthorized) response instead of a redirect to the login page
+    login.blueprint_login_views['api'] = None
 
 
 def configure_logging(app):
@@ -1,8 +1,10 @@
 import click
 from . import admin_blueprint
 from project import database
-from project.models import User, Stock, WatchStock
-from flask import render_template, current_app, abort, flash, redirect, url_for, request
+from project.models import User, Stock, WatchStock, delete_user
+from sqlalchemy import func, select
+from project.exports import generate_csv, cents_to_dollars
+from flask import render_template, current_app, abort, flash, redirect, url_for, request, Response, stream_with_context
 from flask_login import login_required, current_user
 from .forms import PasswordForm, EmailForm
 
@@ -41,13 +43,49 @@ def admin_before_request():
 
 @admin_blueprint.route('/users')
 def admin_list_users():
-    users = User.query.order_by(User.id).all()
-    for user in users:
-        user.number_of_stocks_in_portfolio = len(Stock.query.filter_by(user_id=user.id).all())
-        user.number_of_stocks_in_watchlist = len(WatchStock.query.filter_by(user_id=user.id).all())
+    # Count the stocks of each user in the same query (instead of loading every stock of every
+    # user) and only select the columns displayed, so the password hashes are never loaded
+    number_of_stocks_in_portfolio = select(func.count(Stock.id)).where(Stock.user_id == User.id).scalar_subquery()
+    number_of_stocks_in_watchlist = select(func.count(WatchStock.id)).where(WatchStock.user_id == User.id).scalar_subquery()
+    users = database.session.query(User.id,
+                                   User.email,
+                                   User.registered_on,
+                                   User.email_confirmed,
+                                   User.user_type,
+                                   number_of_stocks_in_portfolio.label('number_of_stocks_in_portfolio'),
+                                   number_of_stocks_in_watchlist.label('number_of_stocks_in_watchlist')).order_by(User.id).all()
     return render_template('admin/users.html', users=users)
 
 
+@admin_blueprint.route('/stocks/export.csv')
+def admin_export_stocks():
+    query = database.session.query(Stock.user_id,
+                                   User.email,
+                                   Stock.stock_symbol,
+                                   Stock.number_of_shares,
+                                   Stock.purchase_price,
+                                   Stock.purchase_date,
+                                   Stock.current_price,
+                                   Stock.position_value).join(User, Stock.user_id == User.id).order_by(Stock.id)
+    header = ['user_id', 'email', 'stock_symbol', 'number_of_shares', 'purchase_price',
+              'purchase_date', 'current_price', 'position_value']
+
+    def convert_row(row):
+        return (row.user_id,
+                row.email,
+                row.stock_symbol,
+                row.number_of_shares,
+                cents_to_dollars(row.purchase_price),
+                row.purchase_date,
+                cents_to_dollars(row.current_price),
+                cents_to_dollars(row.position_value))
+
+    current_app.logger.info(f'Exporting the portfolios of all users by admin user: {current_user.id}')
+    return Response(stream_with_context(generate_csv(query, header, convert_row)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=all_portfolios.csv'})
+
+
 @admin_blueprint.route('/users/<id>/delete')
 def admin_delete_user(id):
     user = User.query.filter_by(id=id).first_or_404()
@@ -55,7 +93,7 @@ def admin_delete_user(id):
     if user.user_type == 'Admin':
         flash(f'Error! Admin user ({id}) cannot be deleted!', 'error')
     else:
-        database.session.delete(user)
+        delete_user(user.id)
         database.session.commit()
         flash(f'User ({user.id}: {user.email}) was deleted!', 'success')
         current_app.logger.info(
@@ -95,7 +133,7 @@ def admin_change_password(id):
 
     if form.validate_on_submit():
         user.set_password(form.password.data)
-        database.session.add(current_user)
+        database.session.add(user)
         database.session.commit()
         flash(f"User's password ({user.id}: {user.email}) was updated!", 'success')
         current_app.logger.info(
@@ -112,7 +150,7 @@ def admin_change_email(id):
 
     if form.validate_on_submit():
         user.email = form.email.data
-        database.session.add(current_user)
+        database.session.add(user)
         database.session.commit()
         flash(f"User's email ({user.id}: {user.email}) was updated!", 'success')
         current_app.logger.info(
@@ -0,0 +1,349 @@
+"""
+Price alerts evaluated against an in-memory index of the alert thresholds.
+
+The active alerts of every user are indexed per symbol in two sorted threshold
+arrays: one for the alerts that trigger when the price rises to (or above) the
+threshold, and one for the alerts that trigger when the price falls to (or below)
+the threshold. A price move from `old_price` to `new_price` can only trigger the
+alerts with a threshold between the two prices, which are a contiguous slice of
+one of the arrays found with two binary searches. Evaluating a price update
+therefore never scans the alerts that are not triggered, so it takes a few
+microseconds even with 100k alerts.
+
+A new current price retrieved when a user views their portfolio or watchlist is
+evaluated from the last price of the symbol evaluated (by this process) on the
+same day or, for the first update of the day, from the latest stored daily
+close. The price stored in the row of the user is not used, as it can be days
+old, and would trigger the alerts of other users for a move that happened
+before they were created.
+
+Triggered alerts are removed from the index and marked as triggered in the
+database (only once, even if several processes see the same price move). The
+notifications are queued and delivered by email in a background thread, so the
+price updates never wait for the mail server.
+
+The index is loaded from the `price_alerts` table in each process, and is
+re-loaded every `PRICE_ALERT_RELOAD_INTERVAL` seconds to include the alerts
+created (or deleted) in other processes.
+
+Note: As for the `Stock` model, all prices are integers (cents).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+import math
+import queue
+from threading import Lock, Thread
+import time
+from flask import current_app, render_template
+from flask_mail import Message
+from project import database, mail
+from project.models import Stock, WatchStock, User, PriceAlert
+from project.prices import price_history_cache
+
+
+ALERT_TYPES = ('ABOVE', 'BELOW', 'PERCENT')
+
+# Largest value of an integer column (in PostgreSQL), which limits the thresholds (in cents) and percent changes
+MAXIMUM_STORED_VALUE = 2_147_483_647
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class SymbolAlertIndex(object):
+    """Class that stores the thresholds of the active alerts of a single symbol in sorted arrays."""
+
+    __slots__ = ('above_thresholds', 'above_ids', 'below_thresholds', 'below_ids')
+
+    def __init__(self):
+        self.above_thresholds = []
+        self.above_ids = []
+        self.below_thresholds = []
+        self.below_ids = []
+
+    def __len__(self):
+        return len(self.above_ids) + len(self.below_ids)
+
+    def _arrays(self, direction: str):
+        if direction == 'above':
+            return self.above_thresholds, self.above_ids
+        return self.below_thresholds, self.below_ids
+
+    def add(self, alert_id: int, direction: str, threshold: int):
+        thresholds, ids = self._arrays(direction)
+        if alert_id in ids[bisect_left(thresholds, threshold):bisect_right(thresholds, threshold)]:
+            return
+        index = bisect_right(thresholds, threshold)
+        thresholds.insert(index, threshold)
+        ids.insert(index, alert_id)
+
+    def remove(self, alert_id: int, direction: str, threshold: int) -> bool:
+        thresholds, ids = self._arrays(direction)
+        for index in range(bisect_left(thresholds, threshold), bisect_right(thresholds, threshold)):
+            if ids[index] == alert_id:
+                del thresholds[index]
+                del ids[index]
+                return True
+        return False
+
+    def pop_crossed(self, old_price: int, new_price: int):
+        """Remove and return the ids of the alerts triggered by a price move from `old_price` to `new_price`."""
+        if new_price > old_price:
+            # Alerts above: old_price < threshold <= new_price
+            thresholds, ids = self.above_thresholds, self.above_ids
+            start = bisect_right(thresholds, old_price)
+            end = bisect_right(thresholds, new_price, start)
+        elif new_price < old_price:
+            # Alerts below: new_price <= threshold < old_price
+            thresholds, ids = self.below_thresholds, self.below_ids
+            start = bisect_left(thresholds, new_price)
+            end = bisect_left(thresholds, old_price, start)
+        else:
+            return []
+
+        triggered = ids[start:end]
+        if triggered:
+            del thresholds[start:end]
+            del ids[start:end]
+        return triggered
+
+
+class PriceAlertEngine(object):
+    """Class that indexes the active price alerts of every symbol and evaluates the price updates."""
+
+    def __init__(self):
+        self._symbols = {}
+        self._last_prices = {}
+        self._lock = Lock()
+        self.loaded_at = None
+
+    def __len__(self):
+        return sum(len(alerts) for alerts in self._symbols.values())
+
+    def load(self, alerts):
+        """Replace the index with the alerts, given as (id, stock symbol, direction, threshold) tuples."""
+        symbols = {}
+        for alert_id, stock_symbol, direction, threshold in alerts:
+            thresholds, ids = symbols.setdefault(stock_symbol, SymbolAlertIndex())._arrays(direction)
+            thresholds.append(threshold)
+            ids.append(alert_id)
+
+        # Sort each array once, instead of inserting each alert in order
+        for alerts_of_symbol in symbols.values():
+            for direction in ('above', 'below'):
+                thresholds, ids = alerts_of_symbol._arrays(direction)
+                order = sorted(range(len(thresholds)), key=thresholds.__getitem__)
+                thresholds[:] = [thresholds[index] for index in order]
+                ids[:] = [ids[index] for index in order]
+
+        with self._lock:
+            self._symbols = symbols
+            self.loaded_at = time.monotonic()
+
+    def add(self, alert_id: int, stock_symbol: str, direction: str, threshold: int):
+        with self._lock:
+            self._symbols.setdefault(stock_symbol, SymbolAlertIndex()).add(alert_id, direction, threshold)
+
+    def remove(self, alert_id: int, stock_symbol: str, direction: str, threshold: int) -> bool:
+        with self._lock:
+            alerts = self._symbols.get(stock_symbol)
+            return alerts is not None and alerts.remove(alert_id, direction, threshold)
+
+    def evaluate(self, stock_symbol: str, old_price: int, new_price: int):
+        """Return the ids of the alerts triggered by a price move, which are removed from the index."""
+        with self._lock:
+            alerts = self._symbols.get(stock_symbol)
+            if alerts is None:
+                return []
+            return alerts.pop_crossed(old_price, new_price)
+
+    def swap_last_price(self, stock_symbol: str, price: int):
+        """Record the latest price evaluated for the symbol, and return the previous price evaluated today (or None)."""
+        today = date.today()
+        with self._lock:
+            last_price = self._last_prices.get(stock_symbol)
+            self._last_prices[stock_symbol] = (today, price)
+        if last_price is None or last_price[0] != today:
+            return None
+        return last_price[1]
+
+    def is_stale(self, reload_interval: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > reload_interval
+
+
+class AlertNotificationQueue(object):
+    """Queue of the notifications of triggered alerts, which are delivered by email in a background thread."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def put(self, message: Message):
+        # Each notification is delivered with the configuration of the application that queued it
+        self._queue.put((current_app._get_current_object(), message))
+        self._start_delivery()
+
+    def join(self):
+        """Wait until every queued notification has been delivered."""
+        self._queue.join()
+
+    def _start_delivery(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._deliver, daemon=True)
+                self._thread.start()
+
+    def _deliver(self):
+        while True:
+            app, message = self._queue.get()
+            with app.app_context():
+                try:
+                    mail.send(message)
+                except Exception as error:
+                    app.logger.error(f'Error! Could not deliver the price alert ({message.subject}): {error}')
+            self._queue.task_done()
+
+
+price_alert_engine = PriceAlertEngine()
+alert_notification_queue = AlertNotificationQueue()
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def load_price_alerts():
+    """Load the index of the price alert engine with every active alert."""
+    alerts = database.session.query(PriceAlert.id, PriceAlert.stock_symbol, PriceAlert.alert_type,
+                                    PriceAlert.threshold, PriceAlert.percent_change) \
+        .filter(PriceAlert.triggered_on.is_(None))
+    price_alert_engine.load(
+        (alert.id, alert.stock_symbol, PriceAlert.get_direction(alert.alert_type, alert.percent_change), alert.threshold)
+        for alert in alerts)
+
+
+def _ensure_loaded():
+    if price_alert_engine.is_stale(current_app.config['PRICE_ALERT_RELOAD_INTERVAL']):
+        load_price_alerts()
+
+
+def get_purchase_price(user_id: int, stock_symbol: str) -> int:
+    """Return the average purchase price (in cents) of a stock in a user's portfolio (0 if not held)."""
+    row = database.session.query(database.func.sum(Stock.purchase_price * Stock.number_of_shares),
+                                 database.func.sum(Stock.number_of_shares)) \
+        .filter_by(user_id=user_id, stock_symbol=stock_symbol).one()
+    if not row[1]:
+        return 0
+    return int(round(row[0] / row[1]))
+
+
+def create_price_alert(user_id: int, stock_symbol: str, alert_type: str, value: float) -> PriceAlert:
+    """Create a price alert on a symbol in a user's portfolio or watchlist and add it to the index.
+
+    `value` is the threshold price (in dollars) of an 'ABOVE' or 'BELOW' alert, or
+    the percent change from the purchase price of a 'PERCENT' alert. Raises a
+    ValueError if the alert is not valid.
+
+    Note: The changes are not committed to the database.
+    """
+    if alert_type not in ALERT_TYPES:
+        raise ValueError(f'Invalid alert type ({alert_type})! Must be one of: {", ".join(ALERT_TYPES)}')
+    if not math.isfinite(value):
+        raise ValueError(f'Invalid value ({value})! Must be a finite number.')
+
+    is_tracked = Stock.query.filter_by(user_id=user_id, stock_symbol=stock_symbol).first() is not None or \
+        WatchStock.query.filter_by(user_id=user_id, stock_symbol=stock_symbol).first() is not None
+    if not is_tracked:
+        raise ValueError(f'Stock ({stock_symbol}) is not in the portfolio or the watchlist!')
+
+    if alert_type == 'PERCENT':
+        purchase_price = get_purchase_price(user_id, stock_symbol)
+        if purchase_price == 0:
+            raise ValueError(f'Percent alerts require a purchase price, but {stock_symbol} is not in the portfolio!')
+        if value == 0.0 or value <= -100.0:
+            raise ValueError(f'Invalid percent change ({value})!')
+        alert = PriceAlert(user_id, stock_symbol, alert_type, int(round(purchase_price * (1.0 + value / 100))),
+                           int(round(value * 100)))
+    else:
+        if value <= 0.0:
+            raise ValueError(f'Invalid threshold price ({value})!')
+        alert = PriceAlert(user_id, stock_symbol, alert_type, int(round(value * 100)))
+    if alert.threshold > MAXIMUM_STORED_VALUE or abs(alert.percent_change or 0) > MAXIMUM_STORED_VALUE:
+        raise ValueError(f'Invalid value ({value})! The threshold price is too large.')
+
+    # The index is (re-)loaded before the alert is stored, so the new alert is only added once
+    _ensure_loaded()
+    database.session.add(alert)
+    database.session.flush()
+    price_alert_engine.add(alert.id, alert.stock_symbol, alert.direction, alert.threshold)
+    return alert
+
+
+def delete_price_alert(alert: PriceAlert):
+    """Delete a price alert and remove it from the index.
+
+    Note: The changes are not committed to the database.
+    """
+    price_alert_engine.remove(alert.id, alert.stock_symbol, alert.direction, alert.threshold)
+    database.session.delete(alert)
+
+
+def generate_price_alert_email(alert: PriceAlert, email: str):
+    return Message(subject=f'Flask Stock Portfolio App - Price Alert ({alert.stock_symbol})',
+                   html=render_template('stocks/email_price_alert.html', alert=alert),
+                   recipients=[email])
+
+
+def check_price_alerts(stock_symbol: str, old_price: int, new_price: int):
+    """Evaluate a price update of a symbol and notify the owners of the alerts that it triggers.
+
+    The price update is only evaluated against the index, so the database is only
+    used if an alert is triggered. Returns the list of alerts triggered.
+
+    Note: The changes are not committed to the database.
+    """
+    if not old_price or not new_price:
+        return []
+
+    _ensure_loaded()
+    alert_ids = price_alert_engine.evaluate(stock_symbol, old_price, new_price)
+    if not alert_ids:
+        return []
+
+    # Only the process that marks an alert as triggered sends the notification
+    triggered_on = datetime.now()
+    triggered_ids = [alert_id for alert_id in alert_ids
+                     if PriceAlert.query.filter_by(id=alert_id, triggered_on=None).update(
+                         {PriceAlert.triggered_on: triggered_on, PriceAlert.triggered_price: new_price},
+                         synchronize_session=False) == 1]
+    database.session.flush()
+
+    alerts = database.session.query(PriceAlert, User.email).join(User, User.id == PriceAlert.user_id) \
+        .filter(PriceAlert.id.in_(triggered_ids)).all()
+    for alert, email in alerts:
+        alert_notification_queue.put(generate_price_alert_email(alert, email))
+        current_app.logger.info(f'Triggered price alert {alert.id} ({alert}) for user: {alert.user_id}')
+    return [alert for alert, _ in alerts]
+
+
+def check_current_price(stock_symbol: str, current_price: int):
+    """Evaluate a new current price of a symbol, retrieved when a user views their portfolio or watchlist.
+
+    The move is evaluated from the last price of the symbol evaluated today or,
+    for the first update of the day, from the latest stored daily close. Returns
+    the list of alerts triggered.
+
+    Note: The changes are not committed to the database.
+    """
+    if not current_price:
+        return []
+
+    previous_price = price_alert_engine.swap_last_price(stock_symbol, current_price)
+    if previous_price is None:
+        _, closes = price_history_cache.get_series(stock_symbol)
+        if len(closes) == 0:
+            return []
+        previous_price = int(round(closes[-1] * 100))
+    return check_price_alerts(stock_symbol, previous_price, current_price)
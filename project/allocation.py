@@ -0,0 +1,98 @@
+"""
+Allocation of a portfolio by asset type, sector, and industry.
+
+The holdings of a user (the lots in the `stocks` table) are joined with the
+symbol-level classification in the `stock_fundamentals` table and summed with
+a single GROUP BY over (asset type, sector, industry, currency). The grouped
+values are converted into the base currency of the user, and then rolled up into
+the allocation by each dimension, so the work done in Python only depends on the
+number of distinct groups (not on the number of lots). Holdings without any
+stored fundamentals are allocated to 'Unknown', and holdings in a currency
+without an exchange rate are excluded (with their currencies listed in
+`missing_rates`, as for the portfolio totals in fx.py).
+
+The allocation is cached per user, along with the version of the user's data
+(`users.data_version`, which is incremented by every process when a stock changes),
+the base currency, and the exchange rates, so an allocation is never served after
+the holdings change in another process. Every entry is removed when the
+fundamentals of any symbol are refreshed in this process.
+"""
+from sqlalchemy import event
+import numpy as np
+from project import database
+from project.models import Stock, StockFundamentals, get_data_version
+from project.cache import TTLCache
+from project.fx import get_fx_rates, convert_values
+
+
+ALLOCATION_DIMENSIONS = ('asset_type', 'sector', 'industry')
+UNKNOWN_CLASSIFICATION = 'Unknown'
+
+# Per-process cache of the (version, allocation) of each user
+allocation_cache = TTLCache(maxsize=4096, ttl=3600)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def _rollup(groups, values, dimension: str, total: float):
+    # Sum the values of the groups by a single dimension, sorted from the largest allocation
+    allocation = {}
+    for group, value in zip(groups, values):
+        allocation[group[dimension]] = allocation.get(group[dimension], 0.0) + value
+    return [dict(name=name, value=round(value / 100, 2), weight=round(value / total, 4) if total else 0.0)
+            for name, value in sorted(allocation.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def get_allocation(user_id: int, base_currency: str = 'USD'):
+    """Return the allocation of a user's portfolio by asset type, sector, and industry (suitable for JSON).
+
+    The values are the current position values in the base currency, and the
+    weights are the fractions of the total value. Holdings in a currency without
+    an exchange rate are excluded, and their currencies are listed in `missing_rates`.
+    """
+    fx_rates = get_fx_rates()
+    version = (get_data_version(user_id), base_currency, tuple(sorted(fx_rates.items())))
+    cached = allocation_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    columns = [database.func.coalesce(getattr(StockFundamentals, dimension), UNKNOWN_CLASSIFICATION).label(dimension)
+               for dimension in ALLOCATION_DIMENSIONS]
+    rows = database.session.query(*columns, Stock.currency,
+                                  database.func.sum(Stock.position_value).label('position_value')) \
+        .outerjoin(StockFundamentals, StockFundamentals.stock_symbol == Stock.stock_symbol) \
+        .filter(Stock.user_id == user_id) \
+        .group_by(*columns, Stock.currency).all()
+
+    currencies = [row.currency for row in rows]
+    values = convert_values([row.position_value or 0 for row in rows], currencies, base_currency, fx_rates)
+    converted = ~np.isnan(values)
+    groups = [row._asdict() for row, included in zip(rows, converted) if included]
+    values = values[converted]
+    total = float(values.sum())
+    allocation = {
+        'base_currency': base_currency,
+        'total_value': round(total / 100, 2),
+        **{dimension: _rollup(groups, values.tolist(), dimension, total) for dimension in ALLOCATION_DIMENSIONS},
+        'missing_rates': sorted(set(currencies + [base_currency]) - set(fx_rates)),
+    }
+    allocation_cache.set(user_id, (version, allocation))
+    return allocation
+
+
+@event.listens_for(Stock, 'after_insert')
+@event.listens_for(Stock, 'after_update')
+@event.listens_for(Stock, 'after_delete')
+def _invalidate_allocation(mapper, connection, target):
+    # Any change to the holdings of a user (shares, prices, or lots) changes their allocation (the changes
+    # in other processes are detected by the version of the user's data)
+    allocation_cache.invalidate(target.user_id)
+
+
+@event.listens_for(StockFundamentals, 'after_insert')
+@event.listens_for(StockFundamentals, 'after_update')
+def _clear_allocations(mapper, connection, target):
+    # The classification of a symbol is shared by every user holding it
+    allocation_cache.clear()
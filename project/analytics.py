@@ -0,0 +1,336 @@
+"""
+Portfolio analytics computed from the stored daily closing prices.
+
+All the calculations are vectorized with NumPy over a matrix of closing prices
+(one row per trading day, one column per symbol), so the analytics for every
+holding in a portfolio are computed at once instead of per `Stock` object.
+
+The value of a portfolio is in the base currency of the user: the shares of each
+holding are weighted by the latest exchange rate of its currency (see fx.py), so
+the holdings in different currencies are never summed as raw prices. A holding in
+a currency without an exchange rate is excluded from the value of the portfolio,
+and listed in the results.
+"""
+import numpy as np
+from flask import current_app
+from project import database
+from project.models import Stock, WatchStock
+from project.prices import price_history_cache, day_number_to_date, date_to_day_number
+from project.cache import TTLCache
+from project.fx import get_fx_rates, convert_values
+
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Windows (in trading days) available for the correlation and covariance matrices
+CORRELATION_WINDOWS = (63, 126, 252, 504)
+
+# Per-process cache of the daily portfolio value series of each user
+portfolio_value_cache = TTLCache(maxsize=1024)
+
+# Per-process cache of the correlation and covariance matrices, keyed by (symbols, window, as-of date)
+correlation_cache = TTLCache(maxsize=256)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def forward_fill(prices):
+    """Replace each NaN in the price matrix with the last valid price above it (in the same column)."""
+    valid = ~np.isnan(prices)
+    row_indices = np.where(valid, np.arange(prices.shape[0])[:, None], 0)
+    np.maximum.accumulate(row_indices, axis=0, out=row_indices)
+    return prices[row_indices, np.arange(prices.shape[1])]
+
+
+def load_price_matrix(symbols, start_date=None, end_date=None, common_history=True):
+    """Return the (day numbers, price matrix) of the symbols over their common history.
+
+    The closing prices of each symbol are aligned on the union of their trading
+    days, with any missing day filled with the previous closing price, and the
+    matrix starts on the first day where every symbol has a closing price.
+
+    If `common_history` is False, the matrix starts on the first day where any
+    symbol has a closing price (with NaN before the history of each symbol).
+    """
+    series = []
+    for symbol in symbols:
+        days, closes = price_history_cache.get_series(symbol, start_date, end_date)
+        if len(days) == 0 and price_history_cache.refresh(symbol) > 0:
+            days, closes = price_history_cache.get_series(symbol, start_date, end_date)
+        series.append((days, closes))
+
+    if not series or (common_history and any(len(days) == 0 for days, _ in series)):
+        return np.empty(0, dtype=np.int32), np.empty((0, len(symbols)))
+
+    all_days = np.unique(np.concatenate([days for days, _ in series]))
+    prices = np.full((len(all_days), len(symbols)), np.nan)
+    for column, (days, closes) in enumerate(series):
+        prices[np.searchsorted(all_days, days), column] = closes
+
+    prices = forward_fill(prices)
+    if not common_history:
+        return all_days, prices
+
+    first_row = int(np.max(np.argmax(~np.isnan(prices), axis=0)))
+    return all_days[first_row:], prices[first_row:]
+
+
+def compute_returns(prices):
+    """Return the daily returns of each column of the price (or value) matrix."""
+    return prices[1:] / prices[:-1] - 1.0
+
+
+def compute_max_drawdown(values):
+    """Return the maximum drawdown (as a negative fraction) of each column of the value matrix."""
+    # Accumulating down the columns is much faster when each column is contiguous in memory
+    values = np.asfortranarray(values)
+    drawdowns = np.maximum.accumulate(values, axis=0)
+    np.divide(values, drawdowns, out=drawdowns)
+    return drawdowns.min(axis=0) - 1.0
+
+
+def compute_analytics(prices, shares, benchmark_prices=None, risk_free_rate=0.0):
+    """Compute the analytics for each holding and for the total portfolio.
+
+    `prices` is a (days x holdings) matrix of closing prices, `shares` is the number
+    of shares of each holding, and `benchmark_prices` is the optional series of
+    closing prices of the benchmark on the same days.
+
+    Returns a dictionary of arrays (one element per holding) and of the values for
+    the total portfolio.
+    """
+    shares = np.asarray(shares, dtype=np.float64)
+
+    # Treat the portfolio as an extra column, so every metric is computed in a single pass
+    # (the matrix is stored column-major, as every calculation is down the columns)
+    values = np.empty((prices.shape[0], prices.shape[1] + 1), order='F')
+    values[:, :-1] = prices
+    values[:, -1] = prices @ shares
+    returns = compute_returns(values)
+
+    mean_returns = returns.mean(axis=0)
+    volatility = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    annualized_returns = mean_returns * TRADING_DAYS_PER_YEAR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratio = np.where(volatility > 0.0, (annualized_returns - risk_free_rate) / volatility, np.nan)
+    max_drawdown = compute_max_drawdown(values)
+
+    beta = np.full(values.shape[1], np.nan)
+    if benchmark_prices is not None:
+        benchmark_returns = compute_returns(np.asarray(benchmark_prices, dtype=np.float64))
+        benchmark_variance = benchmark_returns.var(ddof=1)
+        if benchmark_variance > 0.0:
+            covariance = (benchmark_returns - benchmark_returns.mean()) @ returns / (len(benchmark_returns) - 1)
+            beta = covariance / benchmark_variance
+
+    return {
+        'returns': returns,
+        'annualized_return': annualized_returns,
+        'volatility': volatility,
+        'sharpe_ratio': sharpe_ratio,
+        'max_drawdown': max_drawdown,
+        'beta': beta,
+    }
+
+
+def _to_json_value(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def get_holdings(user_id: int, base_currency: str = 'USD'):
+    """Return the (symbols, shares, exchange rates) of a user's portfolio, with the lots of each symbol combined.
+
+    The exchange rate of each holding converts its prices into the base currency,
+    and is NaN if the rate of its currency is not available.
+    """
+    rows = database.session.query(Stock.stock_symbol, database.func.sum(Stock.number_of_shares),
+                                  database.func.max(Stock.currency)) \
+        .filter_by(user_id=user_id).group_by(Stock.stock_symbol).order_by(Stock.stock_symbol).all()
+    fx_rates = convert_values(np.ones(len(rows)), [row[2] for row in rows], base_currency, get_fx_rates())
+    return [row[0] for row in rows], np.array([row[1] for row in rows], dtype=np.float64), fx_rates
+
+
+def get_portfolio_analytics(user_id: int, start_date=None, end_date=None, base_currency: str = 'USD'):
+    """Return the analytics of a user's portfolio as a dictionary (suitable for JSON).
+
+    The analytics of the total portfolio are based on its value in the base currency,
+    which excludes the holdings without an exchange rate (`excluded_symbols`).
+    Returns None if the portfolio is empty (or has no holding with an exchange rate)
+    or there is not enough price history.
+    """
+    symbols, shares, fx_rates = get_holdings(user_id, base_currency)
+    converted = ~np.isnan(fx_rates)
+    if not converted.any():
+        return None
+
+    benchmark_symbol = current_app.config['ANALYTICS_BENCHMARK_SYMBOL']
+    days, prices = load_price_matrix(symbols + [benchmark_symbol], start_date, end_date)
+    benchmark_prices = prices[:, -1]
+    if len(days) == 0:
+        # Without any history for the benchmark, the analytics are computed without beta
+        days, prices = load_price_matrix(symbols, start_date, end_date)
+        benchmark_prices = None
+    else:
+        prices = prices[:, :-1]
+
+    if len(days) < 3:
+        return None
+
+    # Weighting the shares by the exchange rates values the portfolio in the base currency
+    analytics = compute_analytics(prices, np.where(converted, shares * fx_rates, 0.0), benchmark_prices,
+                                  current_app.config['ANALYTICS_RISK_FREE_RATE'])
+    metrics = ('annualized_return', 'volatility', 'sharpe_ratio', 'max_drawdown', 'beta')
+    return {
+        'start_date': day_number_to_date(days[0]).isoformat(),
+        'end_date': day_number_to_date(days[-1]).isoformat(),
+        'benchmark': benchmark_symbol if benchmark_prices is not None else None,
+        'base_currency': base_currency,
+        'excluded_symbols': [symbol for symbol, included in zip(symbols, converted) if not included],
+        'holdings': [
+            dict(symbol=symbol, shares=int(shares[index]),
+                 **{metric: _to_json_value(analytics[metric][index]) for metric in metrics})
+            for index, symbol in enumerate(symbols)
+        ],
+        'portfolio': {metric: _to_json_value(analytics[metric][-1]) for metric in metrics},
+    }
+
+
+def compute_portfolio_values(days, prices, lot_columns, lot_shares, lot_purchase_days):
+    """Return the value of the portfolio on each day of the price matrix.
+
+    Each lot (i.e. each purchase of a stock) is defined by the column of its symbol in
+    the price matrix, its number of shares, and its purchase date (as a day number).
+    The shares held of each symbol on each day are computed as one matrix (the lots
+    are added on their purchase day and then accumulated down the days), so the
+    value on every day is a single element-wise product with the price matrix.
+    Prices of NaN (before the price history of a symbol) are valued as zero.
+    """
+    shares_held = np.zeros(prices.shape)
+    rows = np.searchsorted(days, lot_purchase_days, side='left')
+    purchased = rows < len(days)
+    np.add.at(shares_held, (rows[purchased], lot_columns[purchased]), lot_shares[purchased])
+    np.cumsum(shares_held, axis=0, out=shares_held)
+    return np.nansum(shares_held * prices, axis=1)
+
+
+def get_portfolio_value_history(user_id: int, base_currency: str = 'USD'):
+    """Return the (day numbers, values) of the daily value of a user's portfolio in the base currency.
+
+    The prices on every day are converted at the latest exchange rates, and the lots
+    in a currency without an exchange rate are excluded. The series is cached for
+    each user and, as long as the user's stocks (and the exchange rates) do not
+    change, it is only extended with the days added to the price history since it
+    was last computed. Returns None if there is no price history for the portfolio.
+    """
+    query = database.session.query(Stock.id,
+                                   Stock.stock_symbol,
+                                   Stock.number_of_shares,
+                                   Stock.purchase_date,
+                                   Stock.currency).filter_by(user_id=user_id).order_by(Stock.id)
+    lots = [tuple(row) for row in query]
+    fx_rates = convert_values(np.ones(len(lots)), [lot[4] for lot in lots], base_currency, get_fx_rates())
+    if np.isnan(fx_rates).all():
+        return None
+
+    symbols = sorted({lot[1] for lot in lots})
+    column_of_symbol = {symbol: column for column, symbol in enumerate(symbols)}
+    lot_columns = np.array([column_of_symbol[lot[1]] for lot in lots], dtype=np.intp)
+    lot_fx_rates = np.nan_to_num(fx_rates, nan=0.0)
+    lot_shares = np.array([lot[2] for lot in lots], dtype=np.float64) * lot_fx_rates
+    lot_purchase_days = np.array([date_to_day_number(lot[3].date()) if lot[3] is not None else 0 for lot in lots],
+                                 dtype=np.int64)
+
+    # The series needs to be re-computed when the lots or the exchange rates change
+    version = (lots, base_currency, tuple(lot_fx_rates.tolist()))
+    cached = portfolio_value_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        _, cached_days, cached_values = cached
+
+        # Start from the last cached day, so that any missing prices on the new days are filled in
+        days, prices = load_price_matrix(symbols, start_date=day_number_to_date(cached_days[-1]), common_history=False)
+        if len(days) <= 1:
+            return cached_days, cached_values
+
+        new_values = compute_portfolio_values(days[1:], prices[1:], lot_columns, lot_shares, lot_purchase_days)
+        days = np.concatenate([cached_days, days[1:]])
+        values = np.concatenate([cached_values, new_values])
+    else:
+        start_date = day_number_to_date(lot_purchase_days.min())
+        days, prices = load_price_matrix(symbols, start_date=start_date, common_history=False)
+        if len(days) == 0:
+            return None
+        values = compute_portfolio_values(days, prices, lot_columns, lot_shares, lot_purchase_days)
+
+    portfolio_value_cache.set(user_id, (version, days, values))
+    return days, values
+
+
+def compute_covariance_correlation(prices):
+    """Return the (annualized covariance, correlation) matrices of the daily returns of each column.
+
+    The correlation of a column without any variance (e.g. a constant price) is NaN.
+    """
+    returns = compute_returns(prices)
+    centered = returns - returns.mean(axis=0)
+    covariance = centered.T @ centered / (returns.shape[0] - 1)
+
+    standard_deviations = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(standard_deviations, standard_deviations)
+    correlation[np.outer(standard_deviations, standard_deviations) == 0.0] = np.nan
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    return covariance * TRADING_DAYS_PER_YEAR, correlation
+
+
+def get_user_symbols(user_id: int):
+    """Return the sorted list of the stock symbols in a user's portfolio or watchlist."""
+    query = database.session.query(Stock.stock_symbol).filter_by(user_id=user_id).union(
+        database.session.query(WatchStock.stock_symbol).filter_by(user_id=user_id))
+    return sorted(row[0] for row in query)
+
+
+def get_correlation_matrix(user_id: int, window: int = TRADING_DAYS_PER_YEAR):
+    """Return the correlation and covariance of the stocks in a user's portfolio and watchlist (suitable for JSON).
+
+    The matrices are computed from the daily returns over the last `window` trading
+    days, using only the symbols with a closing price on every day of the window.
+    They are cached for each (symbols, window, as-of date), so the matrices are only
+    re-computed when the symbols change or new daily prices are added.
+
+    Returns None if fewer than two symbols have enough price history.
+    """
+    symbols = get_user_symbols(user_id)
+    if len(symbols) < 2:
+        return None
+
+    latest_dates = [price_history_cache.get_latest_date(symbol) for symbol in symbols]
+    as_of_date = max((latest_date for latest_date in latest_dates if latest_date is not None), default=None)
+    key = (tuple(symbols), window, as_of_date)
+    result = correlation_cache.get(key)
+    if result is not None:
+        return result
+
+    days, prices = load_price_matrix(symbols, common_history=False)
+    days, prices = days[-(window + 1):], prices[-(window + 1):]
+    if len(days) > 0:
+        # Loading the matrix may have cached the history of new symbols, so use the actual as-of date
+        key = (tuple(symbols), window, day_number_to_date(days[-1]))
+    complete = ~np.isnan(prices).any(axis=0)
+    if len(days) < 3 or np.count_nonzero(complete) < 2:
+        return None
+
+    covariance, correlation = compute_covariance_correlation(prices[:, complete])
+    result = {
+        'start_date': day_number_to_date(days[0]).isoformat(),
+        'end_date': day_number_to_date(days[-1]).isoformat(),
+        'window': window,
+        'symbols': [symbol for symbol, included in zip(symbols, complete) if included],
+        'excluded_symbols': [symbol for symbol, included in zip(symbols, complete) if not included],
+        'correlation': [[_to_json_value(value) for value in row] for row in correlation],
+        'covariance': [[_to_json_value(value) for value in row] for row in covariance],
+    }
+    correlation_cache.set(key, result)
+    return result
@@ -0,0 +1,8 @@
+"""
+The api blueprint provides a versioned JSON API of the stocks, watchlist, and quotes of users.
+"""
+from flask import Blueprint
+
+api_blueprint = Blueprint('api', __name__)
+
+from . import routes
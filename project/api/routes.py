@@ -0,0 +1,199 @@
+"""
+Versioned JSON API of the stocks, watchlist, and quotes of the logged in user.
+
+The rows are serialized in a compact, columnar form ({"columns": [...], "rows": [[...], ...]}),
+so the names of the fields are only sent once per response.
+
+Every response has an ETag and a Last-Modified header, and a conditional request
+(If-None-Match or If-Modified-Since) for unchanged data receives a 304 (Not Modified)
+response:
+    * the stocks and the watchlist are versioned by the `data_version` of the user,
+      which is incremented whenever any of their stocks or watchstocks change, so
+      checking a conditional request only reads a single row of the `users` table
+    * the quotes are versioned by the latest date and closing price of each symbol
+      in the price history cache
+"""
+from . import api_blueprint
+from datetime import datetime, timezone
+import hashlib
+import re
+from flask import request, jsonify, current_app
+from flask_login import login_required, current_user
+from werkzeug.http import is_resource_modified
+from project import database
+from project.models import Stock, WatchStock, User
+from project.exports import cents_to_dollars
+from project.prices import price_history_cache, day_number_to_date
+
+
+MAXIMUM_QUOTE_SYMBOLS = 100
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9.\-]{0,9}$')
+
+STOCK_COLUMNS = ('id', 'symbol', 'number_of_shares', 'purchase_price', 'purchase_date', 'current_price',
+                 'current_price_date', 'position_value', 'currency')
+WATCHLIST_COLUMNS = ('id', 'symbol', 'company_name', 'current_share_price', 'current_share_price_date',
+                     'fiftytwo_week_low', 'fiftytwo_week_high', 'market_cap', 'dividend_per_share', 'pe_ratio',
+                     'peg_ratio', 'profit_margin', 'beta', 'price_to_book_ratio', 'sector', 'industry')
+QUOTE_COLUMNS = ('symbol', 'date', 'close', 'previous_close', 'change_percent')
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def make_etag(*parts) -> str:
+    """Return an opaque ETag for the parts that identify the version of a response."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def to_http_datetime(value):
+    """Return a datetime (stored in local time) as a timezone-aware UTC datetime for the Last-Modified header."""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc)
+
+
+def to_isoformat(value):
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+def get_user_data_version(user_id: int):
+    """Return the (version, last updated datetime) of the stocks and watchlist of the user."""
+    row = database.session.query(User.data_version, User.data_updated_on).filter(User.id == user_id).one()
+    return row.data_version, row.data_updated_on
+
+
+def conditional_json(etag: str, last_modified, build_payload):
+    """Return a JSON response with the ETag and Last-Modified headers, or a 304 response if the data is unchanged.
+
+    `build_payload` is only called if the response is not a 304 (Not Modified).
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = jsonify(build_payload())
+    else:
+        response = current_app.response_class(status=304)
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    # Clients may store the (user-specific) responses, but need to revalidate them on every request
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_quote_symbols(user_id: int):
+    """Return the symbols from the `symbols` query parameter, or the symbols of the user's stocks and watchlist.
+
+    Raises a ValueError if a symbol is invalid or too many symbols are requested.
+    """
+    text = request.args.get('symbols')
+    if text is None:
+        query = database.session.query(Stock.stock_symbol).filter(Stock.user_id == user_id) \
+            .union(database.session.query(WatchStock.stock_symbol).filter(WatchStock.user_id == user_id))
+        return sorted(row[0] for row in query)
+
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in text.split(',') if symbol.strip()))
+    for symbol in symbols:
+        if SYMBOL_PATTERN.match(symbol) is None:
+            raise ValueError(f'Invalid symbol ({symbol})!')
+    if len(symbols) > MAXIMUM_QUOTE_SYMBOLS:
+        raise ValueError(f'Too many symbols! Request at most {MAXIMUM_QUOTE_SYMBOLS} symbols.')
+    return symbols
+
+
+def get_quote(symbol: str):
+    """Return the latest (symbol, date, close, previous close, change percent) of the symbol from the price history."""
+    days, closes = price_history_cache.get_series(symbol)
+    if len(days) == 0:
+        return [symbol, None, None, None, None]
+
+    close = round(float(closes[-1]), 2)
+    previous_close = round(float(closes[-2]), 2) if len(closes) > 1 else None
+    change_percent = round((close / previous_close - 1.0) * 100, 2) if previous_close else None
+    return [symbol, day_number_to_date(days[-1]).isoformat(), close, previous_close, change_percent]
+
+
+# --------------
+# Error Handlers
+# --------------
+
+@api_blueprint.errorhandler(400)
+@api_blueprint.errorhandler(401)
+@api_blueprint.errorhandler(404)
+def api_error(e):
+    return jsonify({'error': e.description}), e.code
+
+
+# ------
+# Routes
+# ------
+
+@api_blueprint.route('/stocks')
+@login_required
+def api_stocks():
+    version, updated_on = get_user_data_version(current_user.id)
+
+    def build_payload():
+        rows = database.session.query(Stock.id, Stock.stock_symbol, Stock.number_of_shares, Stock.purchase_price,
+                                      Stock.purchase_date, Stock.current_price, Stock.current_price_date,
+                                      Stock.position_value, Stock.currency) \
+            .filter(Stock.user_id == current_user.id).order_by(Stock.id)
+        return {
+            'version': version,
+            'columns': STOCK_COLUMNS,
+            'rows': [[row.id, row.stock_symbol, row.number_of_shares, cents_to_dollars(row.purchase_price),
+                      to_isoformat(row.purchase_date), cents_to_dollars(row.current_price),
+                      to_isoformat(row.current_price_date), cents_to_dollars(row.position_value), row.currency]
+                     for row in rows],
+        }
+
+    return conditional_json(make_etag('stocks', current_user.id, version), to_http_datetime(updated_on), build_payload)
+
+
+@api_blueprint.route('/watchlist')
+@login_required
+def api_watchlist():
+    version, updated_on = get_user_data_version(current_user.id)
+
+    def build_payload():
+        rows = database.session.query(WatchStock.id, WatchStock.stock_symbol, WatchStock.company_name,
+                                      WatchStock.current_share_price, WatchStock.current_share_price_date,
+                                      WatchStock.fiftytwo_week_low, WatchStock.fiftytwo_week_high, WatchStock.market_cap,
+                                      WatchStock.dividend_per_share, WatchStock.pe_ratio, WatchStock.peg_ratio,
+                                      WatchStock.profit_margin, WatchStock.beta, WatchStock.price_to_book_ratio,
+                                      WatchStock.sector, WatchStock.industry) \
+            .filter(WatchStock.user_id == current_user.id).order_by(WatchStock.id)
+        return {
+            'version': version,
+            'columns': WATCHLIST_COLUMNS,
+            'rows': [[row.id, row.stock_symbol, row.company_name, cents_to_dollars(row.current_share_price),
+                      to_isoformat(row.current_share_price_date), cents_to_dollars(row.fiftytwo_week_low),
+                      cents_to_dollars(row.fiftytwo_week_high), row.market_cap, cents_to_dollars(row.dividend_per_share),
+                      cents_to_dollars(row.pe_ratio), cents_to_dollars(row.peg_ratio),
+                      cents_to_dollars(row.profit_margin), cents_to_dollars(row.beta),
+                      cents_to_dollars(row.price_to_book_ratio), row.sector, row.industry]
+                     for row in rows],
+        }
+
+    return conditional_json(make_etag('watchlist', current_user.id, version), to_http_datetime(updated_on), build_payload)
+
+
+@api_blueprint.route('/quotes')
+@login_required
+def api_quotes():
+    try:
+        symbols = get_quote_symbols(current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Reading the latest prices from the memory-mapped price history is cheap, so the
+    # quotes themselves are the version of the response
+    quotes = [get_quote(symbol) for symbol in symbols]
+    latest_date = max((quote[1] for quote in quotes if quote[1] is not None), default=None)
+    last_modified = datetime.fromisoformat(latest_date).replace(tzinfo=timezone.utc) if latest_date is not None else None
+    return conditional_json(make_etag('quotes', quotes), last_modified,
+                            lambda: {'columns': QUOTE_COLUMNS, 'rows': quotes})
@@ -0,0 +1,142 @@
+"""
+Fingerprinted and precompressed static files.
+
+When the application is created, every file in the static folder is hashed, and
+`url_for('static', filename=...)` returns a fingerprinted URL that includes the
+hash of the content (e.g. 'css/base_style.css' -> 'css/base_style.1a2b3c4d5e.css').
+Since the content of a fingerprinted URL never changes, it is served with an
+immutable Cache-Control header that lasts for a year, so browsers do not
+revalidate the static files on every page view.
+
+The text files (CSS, JavaScript, etc.) are also compressed with Brotli and gzip
+into the `STATIC_BUILD_FOLDER`, and the preferred encoding accepted by the browser
+is served. Brotli is listed in requirements.txt; if the `brotli` module is not
+installed (e.g. in a development environment), only the gzip files are built. The compressed files
+are named after the hash of their content, so they are only built once and can
+be shared by every process.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import current_app, request, send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.map')
+MINIMUM_COMPRESSION_SIZE = 1024  # bytes
+
+# File extension of each encoding, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def fingerprint_filename(filename: str, content: bytes) -> str:
+    """Return the filename with the hash of the content inserted before the extension."""
+    root, extension = os.path.splitext(filename)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}'
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(content, quality=11)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def write_file_atomically(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class StaticAssets(object):
+    """Manifest of the fingerprinted static files, which also serves them from the 'static' endpoint."""
+
+    def __init__(self, app=None):
+        self.fingerprints = {}   # filename -> fingerprinted filename
+        self.sources = {}        # fingerprinted filename -> filename
+        self.encodings = {}      # fingerprinted filename -> available encodings
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.build(app.static_folder, app.config['STATIC_BUILD_FOLDER'])
+        app.url_defaults(self.inject_fingerprint)
+        app.view_functions['static'] = self.send_static_file
+        app.extensions['static_assets'] = self
+
+    def build(self, static_folder: str, build_folder: str):
+        """Hash every static file, and compress the text files that have not already been compressed."""
+        available_encodings = [(encoding, extension) for encoding, extension in ENCODINGS
+                               if encoding != 'br' or brotli is not None]
+        for directory, _, files in os.walk(static_folder):
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as file:
+                    content = file.read()
+
+                fingerprinted_filename = fingerprint_filename(filename, content)
+                self.fingerprints[filename] = fingerprinted_filename
+                self.sources[fingerprinted_filename] = filename
+                self.encodings[fingerprinted_filename] = []
+                if not name.endswith(COMPRESSIBLE_EXTENSIONS) or len(content) < MINIMUM_COMPRESSION_SIZE:
+                    continue
+
+                for encoding, extension in available_encodings:
+                    compressed_path = os.path.join(build_folder, *f'{fingerprinted_filename}{extension}'.split('/'))
+                    if not os.path.exists(compressed_path):
+                        compressed = compress(content, encoding)
+                        if len(compressed) >= len(content):
+                            continue
+                        write_file_atomically(compressed_path, compressed)
+                    self.encodings[fingerprinted_filename].append((encoding, compressed_path))
+
+    def inject_fingerprint(self, endpoint, values):
+        # Called by `url_for()`, so `url_for('static', filename=...)` returns the fingerprinted URL
+        if endpoint == 'static' and values.get('filename') in self.fingerprints:
+            values['filename'] = self.fingerprints[values['filename']]
+
+    def send_static_file(self, filename):
+        """View function of the 'static' endpoint.
+
+        Fingerprinted files are served with an immutable Cache-Control header (and
+        compressed, if the browser accepts one of the encodings), while any other
+        URL is served as a regular static file.
+        """
+        source = self.sources.get(filename)
+        if source is None:
+            return current_app.send_static_file(filename)
+
+        max_age = current_app.config['STATIC_MAX_AGE']
+        encodings = self.encodings[filename]
+        for encoding, compressed_path in encodings:
+            if request.accept_encodings[encoding]:
+                mimetype = mimetypes.guess_type(source)[0] or 'application/octet-stream'
+                response = send_file(compressed_path, mimetype=mimetype, max_age=max_age)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(current_app.static_folder, source, max_age=max_age)
+
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
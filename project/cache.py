@@ -0,0 +1,71 @@
+"""
+Simple in-process cache with least-recently-used (LRU) eviction and an
+optional time-to-live (TTL) for each entry.
+
+Each process (e.g. each gunicorn worker) has its own copy of a cache, so
+the cached values should be small and safe to be briefly out-of-date in
+other processes.
+"""
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class TTLCache(object):
+    """Thread-safe LRU cache where each entry expires `ttl` seconds after being set.
+
+    A `ttl` of None means that the entries never expire and are only removed
+    when they are evicted or invalidated.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def configure(self, maxsize, ttl=None):
+        """Update the size and TTL of the cache, which also removes all the entries."""
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._entries.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
@@ -0,0 +1,133 @@
+"""
+Chart data for the price history of a stock, downsampled on the server.
+
+The chart covers a selectable range (e.g. the last year) at a daily, weekly, or
+monthly resolution, and is read from the price history cache with a single
+range lookup. The weekly and monthly series (the last closing price of each
+week or month) are aggregated with vectorized NumPy operations.
+
+Long price histories (e.g. several years of daily prices) are reduced to a target
+number of points with the Largest-Triangle-Three-Buckets (LTTB) algorithm, which
+keeps the visual shape of the series (peaks and troughs) while the page only
+contains a few hundred points. The chart data is cached per
+(symbol, range, resolution, number of points, as-of date).
+"""
+from datetime import timedelta
+import numpy as np
+from flask import current_app
+from project.cache import TTLCache
+from project.prices import price_history_cache, day_number_to_date
+
+
+# Ranges of the chart, as the number of days before the latest daily price (None for the full history)
+CHART_RANGES = {
+    '1M': timedelta(days=31),
+    '6M': timedelta(days=183),
+    '1Y': timedelta(days=366),
+    '5Y': timedelta(days=5 * 366),
+    'MAX': None,
+}
+CHART_RESOLUTIONS = ('daily', 'weekly', 'monthly')
+
+# Per-process cache of the downsampled chart data
+chart_cache = TTLCache(maxsize=512)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def lttb(x, y, threshold: int):
+    """Return the indices of the points selected by the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always selected. The other points are divided
+    into `threshold - 2` buckets, and the point selected from each bucket is the
+    one forming the largest triangle with the point selected from the previous
+    bucket and the average of the next bucket.
+    """
+    number_of_points = len(x)
+    if threshold >= number_of_points or threshold < 3:
+        return np.arange(number_of_points)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries for the points between the first and the last point
+    edges = np.linspace(1, number_of_points - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = number_of_points - 1
+
+    # The average of each bucket only depends on the data, so compute them all at once
+    bucket_sizes = np.diff(edges)
+    average_x = np.add.reduceat(x[:-1], edges[:-1]) / bucket_sizes
+    average_y = np.add.reduceat(y[:-1], edges[:-1]) / bucket_sizes
+    average_x = np.append(average_x[1:], x[-1])
+    average_y = np.append(average_y[1:], y[-1])
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the area of the triangle (previous point, candidate point, average of the next bucket)
+        first_term = (x[previous] - average_x[bucket]) * (y[start:end] - y[previous])
+        second_term = (x[previous] - x[start:end]) * (average_y[bucket] - y[previous])
+        areas = np.abs(first_term - second_term)
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def aggregate_closes(days, closes, resolution: str):
+    """Return the (day numbers, closing prices) of the last trading day of each period.
+
+    The `resolution` is either 'daily' (no aggregation), 'weekly' (weeks starting
+    on Monday), or 'monthly' (calendar months).
+    """
+    if resolution == 'daily' or len(days) == 0:
+        return days, closes
+
+    if resolution == 'weekly':
+        # Day 0 (1970-01-01) is a Thursday, so shift by 3 days for the weeks to start on Monday
+        periods = (np.asarray(days, dtype=np.int64) + 3) // 7
+    elif resolution == 'monthly':
+        periods = np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]')
+    else:
+        raise ValueError(f'Invalid chart resolution ({resolution})! Must be one of: {", ".join(CHART_RESOLUTIONS)}')
+
+    last_day_of_period = np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(days) - 1)
+    return days[last_day_of_period], closes[last_day_of_period]
+
+
+def get_range_start_date(latest_date, range_key: str):
+    """Return the first date of the chart range ending on `latest_date` (None for the full history)."""
+    if latest_date is None or CHART_RANGES[range_key] is None:
+        return None
+    return latest_date - CHART_RANGES[range_key]
+
+
+def get_chart_data(symbol: str, range_key: str = '6M', resolution: str = 'daily'):
+    """Return the (day numbers, labels, values) of the closing prices of a stock over a range at a resolution.
+
+    The range ends on the latest daily price stored for the stock. The series is
+    downsampled to at most `CHART_MAX_POINTS` points and cached for each
+    (symbol, range, resolution, number of points, as-of date). Returns empty labels
+    and values if there is no price history for the stock.
+    """
+    max_points = current_app.config['CHART_MAX_POINTS']
+    latest_date = price_history_cache.get_latest_date(symbol)
+    if latest_date is None and price_history_cache.refresh(symbol) > 0:
+        latest_date = price_history_cache.get_latest_date(symbol)
+
+    key = (symbol, range_key, resolution, max_points, latest_date)
+    chart_data = chart_cache.get(key)
+    if chart_data is not None:
+        return chart_data
+
+    start_date = get_range_start_date(latest_date, range_key)
+    days, closes = aggregate_closes(*price_history_cache.get_series(symbol, start_date), resolution)
+    selected = lttb(days, closes, max_points)
+    chart_data = (days[selected],
+                  [day_number_to_date(day).strftime('%m/%d/%Y') for day in days[selected]],
+                  [round(float(close), 2) for close in closes[selected]])
+    chart_cache.set(key, chart_data)
+    return chart_data
@@ -0,0 +1,114 @@
+"""
+Projected dividend income of a portfolio from the symbol-level fundamentals.
+
+The holdings of a user (the lots in the `stocks` table) are joined with the
+dividend per share in the `stock_fundamentals` table, and the annual income of
+each symbol is summed by the database with a single aggregate query, so the
+number of lots never affects the work done in Python. The monthly income is the
+annual income spread evenly over the year, as the payment dates are not stored.
+
+The income of each holding is in the currency of the stock, and the totals are
+converted into the base currency of the user. The holdings in a currency without
+an exchange rate are excluded from the totals, and their currencies are listed
+in `missing_rates` (as for the portfolio totals in fx.py).
+
+The projection is cached per user, along with the version of the user's data
+(`users.data_version`, which is incremented by every process when a stock changes),
+the base currency, and the exchange rates, so a projection is never served after
+the holdings change in another process. Every entry is removed when the
+fundamentals (and so the dividends) of any symbol are refreshed in this process.
+
+Note: As for the `Stock` model, all prices and values are integers (cents).
+"""
+from sqlalchemy import event
+import numpy as np
+from project import database
+from project.models import Stock, StockFundamentals, get_data_version
+from project.cache import TTLCache
+from project.fx import get_fx_rates, convert_values
+
+
+# Per-process cache of the (version, projected dividend income) of each user
+dividend_cache = TTLCache(maxsize=4096, ttl=3600)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def _cents_to_dollars(value) -> float:
+    return round(value / 100, 2) if value is not None else None
+
+
+def get_dividend_projection(user_id: int, base_currency: str = 'USD'):
+    """Return the projected annual and monthly dividend income of a user's portfolio (suitable for JSON).
+
+    Each symbol in the portfolio is included once (with its lots combined), with
+    its income in the currency of the stock. Symbols without any stored
+    fundamentals have a dividend per share of None, and are excluded from the
+    totals (in the base currency), as are the symbols in a currency without an
+    exchange rate.
+    """
+    fx_rates = get_fx_rates()
+    version = (get_data_version(user_id), base_currency, tuple(sorted(fx_rates.items())))
+    cached = dividend_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    number_of_shares = database.func.sum(Stock.number_of_shares)
+    rows = database.session.query(Stock.stock_symbol,
+                                  database.func.max(Stock.currency).label('currency'),
+                                  number_of_shares.label('number_of_shares'),
+                                  database.func.sum(Stock.number_of_shares * Stock.purchase_price).label('cost_basis'),
+                                  database.func.sum(Stock.position_value).label('position_value'),
+                                  StockFundamentals.dividend_per_share,
+                                  (number_of_shares * StockFundamentals.dividend_per_share).label('annual_income')) \
+        .outerjoin(StockFundamentals, StockFundamentals.stock_symbol == Stock.stock_symbol) \
+        .filter(Stock.user_id == user_id) \
+        .group_by(Stock.stock_symbol, StockFundamentals.dividend_per_share) \
+        .order_by(Stock.stock_symbol).all()
+
+    currencies = [row.currency for row in rows]
+    incomes = convert_values([row.annual_income if row.annual_income is not None else np.nan for row in rows],
+                             currencies, base_currency, fx_rates)
+    costs = convert_values([row.cost_basis or 0 for row in rows], currencies, base_currency, fx_rates)
+    included = ~np.isnan(incomes)
+    annual_income = float(np.sum(incomes[included]))
+    cost_basis = float(np.sum(costs[included]))
+    projection = {
+        'base_currency': base_currency,
+        'annual_income': _cents_to_dollars(annual_income),
+        'monthly_income': _cents_to_dollars(annual_income / 12),
+        'yield_on_cost': round(annual_income / cost_basis, 4) if cost_basis else None,
+        'holdings': [
+            dict(symbol=row.stock_symbol,
+                 currency=row.currency,
+                 shares=int(row.number_of_shares),
+                 dividend_per_share=_cents_to_dollars(row.dividend_per_share),
+                 annual_income=_cents_to_dollars(row.annual_income),
+                 monthly_income=_cents_to_dollars(row.annual_income / 12 if row.annual_income is not None else None),
+                 converted_annual_income=_cents_to_dollars(float(incomes[index])) if included[index] else None,
+                 yield_on_cost=round(row.annual_income / row.cost_basis, 4) if row.annual_income is not None and row.cost_basis else None,
+                 current_yield=round(row.annual_income / row.position_value, 4) if row.annual_income is not None and row.position_value else None)
+            for index, row in enumerate(rows)
+        ],
+        'missing_rates': sorted(set(currencies + [base_currency]) - set(fx_rates)),
+    }
+    dividend_cache.set(user_id, (version, projection))
+    return projection
+
+
+@event.listens_for(Stock, 'after_insert')
+@event.listens_for(Stock, 'after_update')
+@event.listens_for(Stock, 'after_delete')
+def _invalidate_dividend_projection(mapper, connection, target):
+    # Any change to the holdings of a user (shares, prices, or lots) changes their projected income (the changes
+    # in other processes are detected by the version of the user's data)
+    dividend_cache.invalidate(target.user_id)
+
+
+@event.listens_for(StockFundamentals, 'after_insert')
+@event.listens_for(StockFundamentals, 'after_update')
+def _clear_dividend_projections(mapper, connection, target):
+    # The dividend of a symbol is shared by every user holding it
+    dividend_cache.clear()
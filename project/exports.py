@@ -0,0 +1,62 @@
+"""
+Helper functions for streaming exports of the stock data (CSV and NDJSON).
+
+The exports are generated row-by-row from a server-side cursor, so the full
+result set is never loaded into memory and the first bytes of the response
+are sent as soon as the first batch of rows is read from the database.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+
+# Number of rows fetched from the database cursor per batch
+EXPORT_BATCH_SIZE = 1000
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def generate_csv(query, header, convert_row):
+    """Generator that yields the rows of `query` as lines of CSV text.
+
+    `header` is the list of column names written as the first line and
+    `convert_row` converts each row returned by the query into a sequence
+    of values matching the header.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(header)
+    yield buffer.getvalue()
+
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow([_format_value(value) for value in convert_row(row)])
+        yield buffer.getvalue()
+
+
+def generate_ndjson(query, keys, convert_row):
+    """Generator that yields the rows of `query` as newline-delimited JSON objects.
+
+    `keys` is the list of keys for each JSON object and `convert_row` converts
+    each row returned by the query into a sequence of values matching the keys.
+    """
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        values = [_format_value(value) for value in convert_row(row)]
+        yield json.dumps(dict(zip(keys, values)), separators=(',', ':')) + '\n'
+
+
+def cents_to_dollars(value):
+    if value is None:
+        return None
+    return value / 100
@@ -0,0 +1,160 @@
+"""
+Efficient frontier of a set of stocks from a watchlist.
+
+The expected returns and the covariance matrix of the stocks are estimated from
+the daily returns over a window of the stored daily prices. The portfolios on the
+efficient frontier (fully invested, with short positions allowed) have a closed
+form, so the minimum-variance portfolio, the maximum Sharpe ratio (tangency)
+portfolio, and every sampled point of the frontier are computed with a couple of
+linear solves against the covariance matrix, with the weights of all the points
+as a single outer-product sum.
+
+The optimization is run as a background job (see jobs.py, like the Monte Carlo
+projections), and the results are stored per (symbol set, window, as-of date) in a
+job store that is shared by every process, so the request thread only starts the
+job and then reads the stored results.
+"""
+import numpy as np
+from flask import current_app
+from project.jobs import JobStore
+from project.analytics import CORRELATION_WINDOWS, TRADING_DAYS_PER_YEAR, load_price_matrix, compute_returns, \
+    compute_covariance_correlation
+from project.prices import price_history_cache, day_number_to_date
+
+
+FRONTIER_WINDOWS = CORRELATION_WINDOWS
+FRONTIER_POINTS = 25
+MAXIMUM_FRONTIER_SYMBOLS = 50
+
+# Status and results of the optimizations (shared by every process), keyed by (symbols, window, as-of date)
+frontier_jobs = JobStore('frontiers')
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def _portfolio(weights, expected_returns, covariance, risk_free_rate: float):
+    expected_return = float(weights @ expected_returns)
+    volatility = float(np.sqrt(max(weights @ covariance @ weights, 0.0)))
+    return {
+        'weights': np.round(weights, 4).tolist(),
+        'expected_return': round(expected_return, 4),
+        'volatility': round(volatility, 4),
+        'sharpe_ratio': round((expected_return - risk_free_rate) / volatility, 4) if volatility > 0.0 else None,
+    }
+
+
+def compute_efficient_frontier(expected_returns, covariance, risk_free_rate: float = 0.0, number_of_points: int = FRONTIER_POINTS):
+    """Compute the minimum-variance and maximum Sharpe ratio portfolios, and a sample of the efficient frontier.
+
+    `expected_returns` and `covariance` are the annualized expected returns and
+    covariance matrix of the stocks. The frontier is sampled from the return of the
+    minimum-variance portfolio up to the highest expected return of any stock (or
+    the return of the tangency portfolio, if higher).
+
+    Raises a ValueError if the covariance matrix is singular.
+    """
+    expected_returns = np.asarray(expected_returns, dtype=np.float64)
+    covariance = np.asarray(covariance, dtype=np.float64)
+    ones = np.ones(len(expected_returns))
+    try:
+        # Both solves against the covariance matrix are done with a single factorization
+        solved = np.linalg.solve(covariance, np.column_stack([ones, expected_returns]))
+    except np.linalg.LinAlgError:
+        raise ValueError('The covariance matrix of the stocks is singular!')
+    inverse_ones, inverse_returns = solved[:, 0], solved[:, 1]
+
+    a = ones @ inverse_ones
+    b = ones @ inverse_returns
+    c = expected_returns @ inverse_returns
+    d = a * c - b * b
+
+    minimum_variance = inverse_ones / a
+    excess = inverse_returns - risk_free_rate * inverse_ones
+    max_sharpe = excess / excess.sum() if b - risk_free_rate * a > 0.0 else None
+
+    # Each frontier portfolio is a combination of the two solved vectors:
+    #     w(m) = (c - m b) / d * inverse_ones + (m a - b) / d * inverse_returns
+    minimum_return = b / a
+    maximum_return = max(float(expected_returns.max()),
+                         float(max_sharpe @ expected_returns) if max_sharpe is not None else minimum_return)
+    target_returns = np.linspace(minimum_return, max(maximum_return, minimum_return), number_of_points)
+    if d > 0.0:
+        weights = np.outer((c - target_returns * b) / d, inverse_ones) + np.outer((target_returns * a - b) / d, inverse_returns)
+    else:
+        # All the stocks have the same expected return, so the frontier is the minimum-variance portfolio
+        weights = np.tile(minimum_variance, (number_of_points, 1))
+
+    return {
+        'minimum_variance': _portfolio(minimum_variance, expected_returns, covariance, risk_free_rate),
+        'max_sharpe': _portfolio(max_sharpe, expected_returns, covariance, risk_free_rate) if max_sharpe is not None else None,
+        'frontier': [_portfolio(point, expected_returns, covariance, risk_free_rate) for point in weights],
+    }
+
+
+def run_optimization(symbols, window: int, risk_free_rate: float):
+    """Estimate the returns and covariance of the stocks over the window and compute their efficient frontier."""
+    days, prices = load_price_matrix(symbols, common_history=False)
+    days, prices = days[-(window + 1):], prices[-(window + 1):]
+    complete = ~np.isnan(prices).any(axis=0)
+    if len(days) < 3 or np.count_nonzero(complete) < 2:
+        raise ValueError('Not enough price history to compute the efficient frontier!')
+
+    prices = prices[:, complete]
+    expected_returns = compute_returns(prices).mean(axis=0) * TRADING_DAYS_PER_YEAR
+    covariance, _ = compute_covariance_correlation(prices)
+    return {
+        'start_date': day_number_to_date(days[0]).isoformat(),
+        'end_date': day_number_to_date(days[-1]).isoformat(),
+        'window': window,
+        'symbols': [symbol for symbol, included in zip(symbols, complete) if included],
+        'excluded_symbols': [symbol for symbol, included in zip(symbols, complete) if not included],
+        'expected_returns': np.round(expected_returns, 4).tolist(),
+        'volatilities': np.round(np.sqrt(np.diag(covariance)), 4).tolist(),
+        'risk_free_rate': risk_free_rate,
+        **compute_efficient_frontier(expected_returns, covariance, risk_free_rate),
+    }
+
+
+def get_frontier_key(symbols, window: int):
+    """Return the job key of the optimization of the symbols, which changes when new daily prices are added."""
+    latest_dates = [price_history_cache.get_latest_date(symbol) for symbol in symbols]
+    as_of_date = max((latest_date for latest_date in latest_dates if latest_date is not None), default=None)
+    return tuple(sorted(symbols)), window, as_of_date
+
+
+def get_frontier(symbols, window: int):
+    """Return the status of an optimization ('running', 'complete', or 'error') and its results.
+
+    Returns None if the optimization has not been started (or has expired).
+    """
+    return frontier_jobs.get(get_frontier_key(symbols, window))
+
+
+def start_frontier(symbols, window: int):
+    """Start the optimization of the symbols as a background job (unless it is already running or complete).
+
+    Returns the status of the optimization.
+    """
+    if window not in FRONTIER_WINDOWS:
+        raise ValueError(f'Invalid window ({window})! Must be one of: {", ".join(str(window) for window in FRONTIER_WINDOWS)}')
+    if not 2 <= len(set(symbols)) <= MAXIMUM_FRONTIER_SYMBOLS:
+        raise ValueError(f'Select between 2 and {MAXIMUM_FRONTIER_SYMBOLS} stocks!')
+
+    key = get_frontier_key(symbols, window)
+
+    def run_job():
+        try:
+            result = run_optimization(list(key[0]), window, current_app.config['ANALYTICS_RISK_FREE_RATE'])
+            frontier = {'status': 'complete', 'result': result, 'error': None}
+            frontier_jobs.set(key, frontier)
+
+            # Loading the prices may have cached the history of new symbols, so also store the actual as-of date
+            frontier_jobs.set(get_frontier_key(key[0], window), frontier)
+            current_app.logger.info(f'Completed the efficient frontier of {", ".join(key[0])} ({window} days)')
+        except Exception as error:
+            frontier_jobs.set(key, {'status': 'error', 'result': None, 'error': str(error)})
+            current_app.logger.error(f'Error! Efficient frontier failed for {", ".join(key[0])}: {error}')
+
+    return frontier_jobs.start(key, {'status': 'running', 'result': None, 'error': None}, run_job)
@@ -0,0 +1,167 @@
+"""
+Exchange rates for converting the values of holdings in other currencies.
+
+The daily exchange rate of each currency into USD is retrieved from Alpha Vantage
+(FX_DAILY) and stored in the `fx_rates` table. For development and testing
+without network access, the `FX_RATES_PROVIDER` configuration variable can be
+set to 'replay', which reads recorded FX_DAILY responses from the JSON file
+specified by `FX_RATES_REPLAY_FILE` (an object of responses keyed by currency).
+
+The latest rates of every currency are read with a single query and cached per
+day, so the number of currencies held does not change the number of queries (or
+upstream calls) made by a page. The values of the holdings are converted into
+the base currency of a user with vectorized NumPy operations.
+"""
+from datetime import date
+import json
+import numpy as np
+import requests
+from flask import current_app
+from project import database
+from project.models import Stock, FxRate
+from project.cache import TTLCache
+
+
+SUPPORTED_CURRENCIES = ('USD', 'EUR', 'GBP', 'JPY', 'CAD', 'CHF', 'AUD', 'HKD')
+
+# Per-process cache of the latest rate of every currency, keyed by date (rates retrieved
+# by another process are seen within the TTL)
+fx_rate_cache = TTLCache(maxsize=32, ttl=3600)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def create_alpha_vantage_url_fx_daily(currency: str) -> str:
+    return 'https://www.alphavantage.co/query?function={}&from_symbol={}&to_symbol={}&apikey={}'.format(
+        'FX_DAILY',
+        currency,
+        'USD',
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def _request_fx_daily(currency: str) -> dict:
+    # Return the FX_DAILY data of the currency from the configured provider ({} if unavailable)
+    if current_app.config['FX_RATES_PROVIDER'] == 'replay':
+        try:
+            with open(current_app.config['FX_RATES_REPLAY_FILE']) as file:
+                return json.load(file).get(currency, {})
+        except FileNotFoundError:
+            current_app.logger.warning(f'Could not find the replay file of the exchange rates '
+                                       f'({current_app.config["FX_RATES_REPLAY_FILE"]})!')
+            return {}
+
+    # Attempt the GET call to Alpha Vantage and check that a ConnectionError does
+    # not occur, which happens when the GET call fails due to a network issue
+    try:
+        r = requests.get(create_alpha_vantage_url_fx_daily(currency))
+    except requests.exceptions.ConnectionError:
+        current_app.logger.error(
+            f'Error! Network problem preventing retrieving the exchange rates ({currency})!')
+        return {}
+
+    # Status code returned from Alpha Vantage needs to be 200 (OK) to process the exchange rates
+    if r.status_code != 200:
+        current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
+                                   f'when retrieving the exchange rates ({currency})!')
+        return {}
+    return r.json()
+
+
+def retrieve_fx_rates(currency: str) -> int:
+    """Retrieve the daily exchange rates of a currency into USD and store the new days.
+
+    Returns the number of days that were added to the `fx_rates` table.
+    """
+    if currency not in SUPPORTED_CURRENCIES or currency == 'USD':
+        raise ValueError(f'Invalid currency ({currency})! Must be one of: {", ".join(SUPPORTED_CURRENCIES[1:])}')
+
+    fx_data = _request_fx_daily(currency)
+
+    # The key of 'Time Series FX (Daily)' needs to be present in order to process the exchange rates
+    # Typically, this key will not be present if the API rate limit has been exceeded.
+    if 'Time Series FX (Daily)' not in fx_data:
+        current_app.logger.warning(f'Could not find the Time Series FX (Daily) key when retrieving '
+                                   f'the exchange rates ({currency})!')
+        return 0
+
+    # Only add the days after the latest day already stored for this currency
+    latest_date = database.session.query(database.func.max(FxRate.date)).filter_by(currency=currency).scalar()
+    number_of_days_added = 0
+    for element, values in fx_data['Time Series FX (Daily)'].items():
+        rate_date = date.fromisoformat(element)
+        if latest_date is None or rate_date > latest_date:
+            database.session.add(FxRate(currency, rate_date, values['4. close']))
+            number_of_days_added += 1
+
+    database.session.commit()
+    fx_rate_cache.clear()
+    current_app.logger.info(f'Added {number_of_days_added} exchange rates for {currency}.')
+    return number_of_days_added
+
+
+def get_fx_rates(as_of: date = None) -> dict:
+    """Return the latest rate (USD per unit) of every stored currency on the date (default: today)."""
+    as_of = as_of or date.today()
+    rates = fx_rate_cache.get(as_of)
+    if rates is not None:
+        return rates
+
+    latest_dates = database.session.query(FxRate.currency, database.func.max(FxRate.date).label('date')) \
+        .filter(FxRate.date <= as_of).group_by(FxRate.currency).subquery()
+    rows = database.session.query(FxRate.currency, FxRate.rate) \
+        .join(latest_dates, (FxRate.currency == latest_dates.c.currency) & (FxRate.date == latest_dates.c.date))
+    rates = {'USD': 1.0}
+    rates.update((row.currency, row.rate) for row in rows)
+    fx_rate_cache.set(as_of, rates)
+    return rates
+
+
+def convert_values(values, currencies, base_currency: str, rates: dict):
+    """Return the values converted from their currencies into the base currency (as a NumPy array).
+
+    The conversion factor is looked up once per distinct currency, and applied to
+    every value with a single vectorized multiplication. The converted value is NaN
+    if the rate of its currency (or of the base currency) is not available.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values
+
+    unique_currencies, inverse = np.unique(np.asarray(currencies, dtype='U3'), return_inverse=True)
+    factors = np.array([rates.get(currency, np.nan) for currency in unique_currencies]) / rates.get(base_currency, np.nan)
+    return values * factors[inverse]
+
+
+def get_portfolio_totals(user_id: int, base_currency: str, as_of: date = None):
+    """Return the value and cost of a user's portfolio in each currency and in the base currency (suitable for JSON).
+
+    The holdings are summed per currency by the database, and the currencies
+    without an exchange rate are listed in `missing_rates` and excluded from
+    the totals (in which case `is_complete` is False).
+    """
+    rows = database.session.query(Stock.currency,
+                                  database.func.sum(Stock.position_value).label('position_value'),
+                                  database.func.sum(Stock.number_of_shares * Stock.purchase_price).label('cost_basis')) \
+        .filter_by(user_id=user_id).group_by(Stock.currency).order_by(Stock.currency).all()
+    currencies = [row.currency for row in rows]
+    rates = get_fx_rates(as_of)
+    values = convert_values([row.position_value or 0 for row in rows], currencies, base_currency, rates)
+    costs = convert_values([row.cost_basis or 0 for row in rows], currencies, base_currency, rates)
+    converted = ~np.isnan(values)
+    return {
+        'base_currency': base_currency,
+        'total_value': round(float(np.sum(values[converted])) / 100, 2),
+        'total_cost': round(float(np.sum(costs[converted])) / 100, 2),
+        'is_complete': bool(converted.all()),
+        'currencies': [
+            dict(currency=row.currency,
+                 value=round((row.position_value or 0) / 100, 2),
+                 cost=round((row.cost_basis or 0) / 100, 2),
+                 converted_value=None if np.isnan(values[index]) else round(float(values[index]) / 100, 2))
+            for index, row in enumerate(rows)
+        ],
+        'missing_rates': sorted(set(currencies + [base_currency]) - set(rates)),
+    }
@@ -0,0 +1,211 @@
+"""
+Technical indicators computed from the daily closing prices of a stock.
+
+The following indicators are available (with their default parameters):
+    SMA - simple moving average (window=20)
+    EMA - exponential moving average (span=20)
+    RSI - relative strength index with Wilder's smoothing (period=14)
+    BBANDS - Bollinger bands (window=20, num_std=2)
+    MACD - moving average convergence/divergence (fast=12, slow=26, signal=9)
+
+Each indicator is computed with vectorized NumPy over the full close series of
+the price history cache, and is cached per (symbol, indicator, parameters). When
+new daily prices are added, the cached indicator is extended with only the new
+days: the moving windows are recomputed over the last window of days, and the
+exponential averages continue from their last value.
+
+The values before an indicator has enough history are NaN.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from project.cache import TTLCache
+from project.prices import price_history_cache
+
+
+INDICATORS = {
+    'SMA': {'window': 20},
+    'EMA': {'span': 20},
+    'RSI': {'period': 14},
+    'BBANDS': {'window': 20, 'num_std': 2},
+    'MACD': {'fast': 12, 'slow': 26, 'signal': 9},
+}
+
+# Number of values combined in each matrix product when computing an exponential moving average
+EMA_BLOCK_SIZE = 128
+
+# Per-process cache of the indicators of each symbol, keyed by (symbol, indicator, parameters)
+indicator_cache = TTLCache(maxsize=1024)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def sma(values, window: int):
+    """Return the simple moving average of the values over `window` values."""
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        cumulative = np.cumsum(np.insert(np.asarray(values, dtype=np.float64), 0, 0.0))
+        result[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return result
+
+
+def ema(values, alpha: float, initial=None):
+    """Return the exponential moving average of the values with the smoothing factor `alpha`.
+
+    The average continues from `initial` (the average before the first value) if
+    it is specified, otherwise it starts from the first value. The recursion is
+    evaluated in blocks, where each block is a single matrix product with the
+    decay weights, so the calculation is vectorized while the weights stay
+    numerically stable.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(len(values))
+    if len(values) == 0:
+        return result
+
+    if initial is None:
+        initial = values[0]
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(EMA_BLOCK_SIZE + 1)
+    exponents = np.arange(EMA_BLOCK_SIZE)[:, None] - np.arange(EMA_BLOCK_SIZE)[None, :]
+    weights = np.tril(alpha * powers[np.maximum(exponents, 0)])
+
+    previous = initial
+    for start in range(0, len(values), EMA_BLOCK_SIZE):
+        block = values[start:start + EMA_BLOCK_SIZE]
+        size = len(block)
+        result[start:start + size] = weights[:size, :size] @ block + powers[1:size + 1] * previous
+        previous = result[start + size - 1]
+    return result
+
+
+def _moving_window_tail(closes, number_of_new_values: int, window: int):
+    # The closes needed to compute a moving window indicator for the last `number_of_new_values` days
+    return closes[max(len(closes) - number_of_new_values - window + 1, 0):]
+
+
+def _compute_sma(closes, number_of_new_values, state, window):
+    values = sma(_moving_window_tail(closes, number_of_new_values, window), window)
+    return {'sma': values[-number_of_new_values:]}, state
+
+
+def _compute_bollinger_bands(closes, number_of_new_values, state, window, num_std):
+    tail = _moving_window_tail(closes, number_of_new_values, window)
+    middle = sma(tail, window)
+    deviation = np.full(len(tail), np.nan)
+    if len(tail) >= window:
+        deviation[window - 1:] = sliding_window_view(tail, window).std(axis=1)
+    return {
+        'middle': middle[-number_of_new_values:],
+        'upper': (middle + num_std * deviation)[-number_of_new_values:],
+        'lower': (middle - num_std * deviation)[-number_of_new_values:],
+    }, state
+
+
+def _compute_ema(closes, number_of_new_values, state, span):
+    values = ema(closes[-number_of_new_values:], 2.0 / (span + 1), state.get('ema'))
+    return {'ema': values}, {'ema': values[-1]}
+
+
+def _compute_macd(closes, number_of_new_values, state, fast, slow, signal):
+    new_closes = closes[-number_of_new_values:]
+    fast_ema = ema(new_closes, 2.0 / (fast + 1), state.get('fast_ema'))
+    slow_ema = ema(new_closes, 2.0 / (slow + 1), state.get('slow_ema'))
+    macd = fast_ema - slow_ema
+    signal_line = ema(macd, 2.0 / (signal + 1), state.get('signal_ema'))
+    return {
+        'macd': macd,
+        'signal': signal_line,
+        'histogram': macd - signal_line,
+    }, {'fast_ema': fast_ema[-1], 'slow_ema': slow_ema[-1], 'signal_ema': signal_line[-1]}
+
+
+def _compute_rsi(closes, number_of_new_values, state, period):
+    if 'average_gain' in state:
+        # Include the previous close, so the change on the first new day is known
+        changes = np.diff(closes[-number_of_new_values - 1:])
+        average_gains = ema(np.clip(changes, 0.0, None), 1.0 / period, state['average_gain'])
+        average_losses = ema(np.clip(-changes, 0.0, None), 1.0 / period, state['average_loss'])
+    else:
+        # Without a previous average, Wilder's smoothing starts from the simple average of the first `period` changes
+        changes = np.diff(closes)
+        gains = np.clip(changes, 0.0, None)
+        losses = np.clip(-changes, 0.0, None)
+        average_gains = np.full(len(closes), np.nan)
+        average_losses = np.full(len(closes), np.nan)
+        if len(changes) >= period:
+            average_gains[period] = gains[:period].mean()
+            average_losses[period] = losses[:period].mean()
+            average_gains[period + 1:] = ema(gains[period:], 1.0 / period, average_gains[period])
+            average_losses[period + 1:] = ema(losses[period:], 1.0 / period, average_losses[period])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + average_gains / average_losses)
+    rsi[average_losses == 0.0] = 100.0
+
+    if not np.isnan(average_gains[-1]):
+        state = {'average_gain': average_gains[-1], 'average_loss': average_losses[-1]}
+    return {'rsi': rsi[-number_of_new_values:]}, state
+
+
+_INDICATOR_FUNCTIONS = {
+    'SMA': _compute_sma,
+    'EMA': _compute_ema,
+    'RSI': _compute_rsi,
+    'BBANDS': _compute_bollinger_bands,
+    'MACD': _compute_macd,
+}
+
+
+def get_indicator_params(name: str, **params):
+    """Return the parameters of the indicator, using the default for each parameter not specified."""
+    if name not in INDICATORS:
+        raise ValueError(f'Invalid indicator ({name})! Must be one of: {", ".join(INDICATORS)}')
+    params = {key: int(params.get(key) or default) for key, default in INDICATORS[name].items()}
+    if any(value < 1 for value in params.values()):
+        raise ValueError(f'Invalid parameters ({params}) for the {name} indicator!')
+    return params
+
+
+def get_indicator(symbol: str, name: str, **params):
+    """Return the (day numbers, outputs) of an indicator over the full price history of a stock.
+
+    `outputs` is a dictionary of arrays (e.g. 'upper', 'middle', and 'lower' for the
+    Bollinger bands) aligned with the day numbers. If the history has only been
+    extended since the indicator was cached, only the new days are computed.
+    """
+    params = get_indicator_params(name, **params)
+    days, closes = price_history_cache.get_series(symbol)
+    if len(days) == 0 and price_history_cache.refresh(symbol) > 0:
+        days, closes = price_history_cache.get_series(symbol)
+    if len(days) == 0:
+        return days, {}
+
+    key = (symbol, name, tuple(sorted(params.items())))
+    cached = indicator_cache.get(key)
+    if cached is not None:
+        number_of_days, last_day, outputs, state = cached
+        if number_of_days == len(days):
+            return days, outputs
+
+        if number_of_days < len(days) and days[number_of_days - 1] == last_day:
+            new_outputs, state = _INDICATOR_FUNCTIONS[name](closes, len(days) - number_of_days, state, **params)
+            outputs = {output: np.concatenate([outputs[output], new_outputs[output]]) for output in outputs}
+            indicator_cache.set(key, (len(days), days[-1], outputs, state))
+            return days, outputs
+
+    outputs, state = _INDICATOR_FUNCTIONS[name](closes, len(days), {}, **params)
+    indicator_cache.set(key, (len(days), days[-1], outputs, state))
+    return days, outputs
+
+
+def get_indicator_overlay(symbol: str, name: str, chart_days, **params):
+    """Return the outputs of an indicator on each day of a chart (as lists suitable for JSON)."""
+    days, outputs = get_indicator(symbol, name, **params)
+    if len(days) == 0:
+        return {}
+
+    rows = np.clip(np.searchsorted(days, chart_days, side='right') - 1, 0, len(days) - 1)
+    return {output: [None if np.isnan(value) else round(float(value), 2) for value in values[rows]]
+            for output, values in outputs.items()}
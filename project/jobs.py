@@ -0,0 +1,124 @@
+"""
+Background jobs with a status and results that are shared by every process.
+
+The Monte Carlo projections and the efficient frontier optimizations are run as
+background jobs in a bounded pool of threads (`JOB_WORKERS` per process), so a
+burst of requests queues the jobs instead of starting a new thread per request.
+
+The status and results of each job are stored as a JSON file in the `JOB_FOLDER`
+(named after a hash of the job key), so a job started by one web server process
+can be polled from any other process. A job expires `JOB_TTL` seconds after its
+status is written, and a job that is still running after `JOB_TIMEOUT` seconds
+(e.g. the process running it was restarted) is reported as an error, so that it
+can be started again.
+
+Note: Two processes may start the same job at the same time, in which case the
+      job is run twice and the results written last are kept.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import tempfile
+import time
+from threading import Lock
+from flask import current_app
+
+
+# Pool of the threads that run the background jobs in this process (created after the process is forked)
+_executor = None
+_executor_pid = None
+_executor_lock = Lock()
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class JobStore(object):
+    """Class that stores the status and results of the jobs of one type (e.g. 'projections') in the `JOB_FOLDER`."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = Lock()
+
+    @property
+    def folder(self) -> str:
+        return os.path.join(current_app.config['JOB_FOLDER'], self.name)
+
+    def get_path(self, key) -> str:
+        return os.path.join(self.folder, f'{hashlib.sha1(repr(key).encode("utf-8")).hexdigest()}.json')
+
+    def get(self, key):
+        """Return the status and results of a job, or None if the job has not been started (or has expired)."""
+        path = self.get_path(key)
+        try:
+            with open(path, 'r') as file:
+                job = json.load(file)
+            age = time.time() - os.stat(path).st_mtime
+        except (OSError, ValueError):
+            return None
+
+        if age > current_app.config['JOB_TTL']:
+            return None
+        if job['status'] == 'running' and age > current_app.config['JOB_TIMEOUT']:
+            return dict(job, status='error', error='The job did not complete!')
+        return job
+
+    def set(self, key, job: dict):
+        # Write to a temporary file and then replace the job file, so that other
+        # processes never read a partially written file
+        os.makedirs(self.folder, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'w') as file:
+                json.dump(job, file)
+            os.replace(temporary_path, self.get_path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def clear(self):
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            os.remove(os.path.join(self.folder, name))
+
+    def start(self, key, job: dict, run_job):
+        """Store the (running) status of a job and submit `run_job` to the background threads.
+
+        If the job is already running or complete, its status is returned instead of starting it again.
+        """
+        with self._lock:
+            current_job = self.get(key)
+            if current_job is not None and current_job['status'] != 'error':
+                return current_job
+            self.set(key, job)
+
+        submit_job(run_job)
+        return job
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def get_job_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the long-lived pool of the threads that run the background jobs in this process."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def submit_job(run_job):
+    """Run a job (with an application context) in the pool of background threads of this process."""
+    app = current_app._get_current_object()
+
+    def run_job_in_app_context():
+        with app.app_context():
+            run_job()
+
+    return get_job_executor(app.config['JOB_WORKERS']).submit(run_job_in_app_context)
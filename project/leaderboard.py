@@ -0,0 +1,264 @@
+"""
+Leaderboard of the portfolio returns of the users that opted in.
+
+The return of a portfolio is the value of its holdings (at the latest price of
+each symbol, either the current price retrieved for any portfolio or the latest
+stored daily close, whichever is newer) relative to its cost basis, with
+both converted into USD so that portfolios in different currencies are ranked
+on the same scale. The scores are stored in the `leaderboard_scores` table and
+are only re-computed for the users affected by a change:
+
+    * the holdings of a user are added, changed, or deleted
+    * the prices of a user's holdings are updated when they view their portfolio
+    * the daily prices of symbols are updated (by the `flask stocks update_prices`
+      command), which re-computes the scores of every user holding those symbols
+    * a user opts in to (or out of) the leaderboard
+
+Each re-computation is a single grouped query over the holdings of the affected
+users, followed by vectorized NumPy operations, so even a full rebuild of 100k
+users does not load any entities.
+
+The ranking is kept in memory as an array of (-score, user id) keys in sorted
+order, so the rank of a user is found with a binary search (O(log n)) and the
+top N users are the first N keys (O(N)). Updating a score moves a single key in
+the array, instead of re-sorting every user. The ranking is loaded from the
+`leaderboard_scores` table in each process, and is re-loaded every
+`LEADERBOARD_RELOAD_INTERVAL` seconds to include the scores updated in other
+processes.
+"""
+from bisect import bisect_left, insort
+from datetime import datetime
+from threading import Lock
+import time
+import numpy as np
+from flask import current_app
+from project import database
+from project.models import Stock, User, LeaderboardScore, DailyPrice
+from project.fx import get_fx_rates, convert_values
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class Leaderboard(object):
+    """Class that stores the scores of the users in sorted order, for ranking queries in O(log n)."""
+
+    def __init__(self):
+        self._keys = []
+        self._scores = {}
+        self._lock = Lock()
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._scores
+
+    def load(self, scores):
+        """Replace the ranking with the scores, given as (user id, score) tuples."""
+        scores = dict(scores)
+        keys = sorted((-score, user_id) for user_id, score in scores.items())
+        with self._lock:
+            self._keys = keys
+            self._scores = scores
+            self.loaded_at = time.monotonic()
+
+    def update(self, user_id: int, score: float):
+        with self._lock:
+            self._remove(user_id)
+            insort(self._keys, (-score, user_id))
+            self._scores[user_id] = score
+
+    def remove(self, user_id: int) -> bool:
+        with self._lock:
+            return self._remove(user_id)
+
+    def _remove(self, user_id: int) -> bool:
+        score = self._scores.pop(user_id, None)
+        if score is None:
+            return False
+        del self._keys[bisect_left(self._keys, (-score, user_id))]
+        return True
+
+    def get_score(self, user_id: int):
+        return self._scores.get(user_id)
+
+    def rank(self, user_id: int):
+        """Return the rank of a user (starting at 1), or None if the user is not on the leaderboard."""
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return bisect_left(self._keys, (-score, user_id)) + 1
+
+    def top(self, number_of_users: int):
+        """Return the (user id, score) tuples of the users with the highest scores."""
+        with self._lock:
+            return [(user_id, -negative_score) for negative_score, user_id in self._keys[:number_of_users]]
+
+    def is_stale(self, reload_interval: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > reload_interval
+
+
+leaderboard = Leaderboard()
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def load_leaderboard():
+    """Load the ranking of the leaderboard with every stored score."""
+    leaderboard.load(database.session.query(LeaderboardScore.user_id, LeaderboardScore.score))
+
+
+def _ensure_loaded():
+    if leaderboard.is_stale(current_app.config['LEADERBOARD_RELOAD_INTERVAL']):
+        load_leaderboard()
+
+
+def get_latest_prices(stock_symbols=None) -> dict:
+    """Return the latest price (in cents) of each symbol held in any portfolio (default: every symbol).
+
+    The latest price is the latest current price retrieved for any portfolio, unless
+    a daily close has been stored for a later day (e.g. by the `update_prices` command).
+    """
+    latest_dates = database.session.query(Stock.stock_symbol,
+                                          database.func.max(Stock.current_price_date).label('current_price_date')) \
+        .filter(Stock.current_price_date.isnot(None))
+    if stock_symbols is not None:
+        latest_dates = latest_dates.filter(Stock.stock_symbol.in_(stock_symbols))
+    latest_dates = latest_dates.group_by(Stock.stock_symbol).subquery()
+    is_latest = database.and_(Stock.stock_symbol == latest_dates.c.stock_symbol,
+                              Stock.current_price_date == latest_dates.c.current_price_date)
+    rows = database.session.query(Stock.stock_symbol, Stock.current_price, Stock.current_price_date) \
+        .join(latest_dates, is_latest)
+    prices = {row.stock_symbol: (row.current_price_date.date(), row.current_price) for row in rows}
+
+    held_symbols = database.session.query(Stock.stock_symbol)
+    if stock_symbols is not None:
+        held_symbols = held_symbols.filter(Stock.stock_symbol.in_(stock_symbols))
+    latest_closes = database.session.query(DailyPrice.stock_symbol, database.func.max(DailyPrice.date).label('date')) \
+        .filter(DailyPrice.stock_symbol.in_(held_symbols.scalar_subquery())) \
+        .group_by(DailyPrice.stock_symbol).subquery()
+    rows = database.session.query(DailyPrice.stock_symbol, DailyPrice.date, DailyPrice.close_price) \
+        .join(latest_closes, database.and_(DailyPrice.stock_symbol == latest_closes.c.stock_symbol,
+                                           DailyPrice.date == latest_closes.c.date))
+    for row in rows:
+        if row.stock_symbol not in prices or row.date > prices[row.stock_symbol][0]:
+            prices[row.stock_symbol] = (row.date, row.close_price)
+    return {symbol: price for symbol, (_, price) in prices.items()}
+
+
+def compute_scores(user_filter=None):
+    """Return the scores of the users that opted in to the leaderboard (and match the filter, if specified).
+
+    Returns a dictionary of {user id: (score, portfolio value, cost basis)}, with
+    the value and cost basis in USD (cents). Holdings without a current price are
+    valued at their purchase price, and holdings in a currency without an exchange
+    rate are excluded.
+    """
+    query = database.session.query(Stock.user_id, Stock.stock_symbol, Stock.currency,
+                                   database.func.sum(Stock.number_of_shares).label('number_of_shares'),
+                                   database.func.sum(Stock.number_of_shares * Stock.purchase_price).label('cost_basis')) \
+        .join(User, User.id == Stock.user_id) \
+        .filter(User.leaderboard_opt_in.is_(True))
+    if user_filter is not None:
+        query = query.filter(user_filter)
+    rows = query.group_by(Stock.user_id, Stock.stock_symbol, Stock.currency).all()
+    if not rows:
+        return {}
+
+    symbols = sorted({row.stock_symbol for row in rows})
+    prices = get_latest_prices(symbols if user_filter is not None else None)
+    shares = np.array([row.number_of_shares for row in rows], dtype=np.float64)
+    costs = np.array([row.cost_basis for row in rows], dtype=np.float64)
+    current_prices = np.array([prices.get(row.stock_symbol) or np.nan for row in rows], dtype=np.float64)
+    values = np.where(np.isnan(current_prices), costs, shares * current_prices)
+
+    # Convert into USD, and sum the holdings of each user
+    currencies = [row.currency for row in rows]
+    rates = get_fx_rates()
+    values = np.nan_to_num(convert_values(values, currencies, 'USD', rates), nan=0.0)
+    costs = np.nan_to_num(convert_values(costs, currencies, 'USD', rates), nan=0.0)
+    user_ids, inverse = np.unique(np.array([row.user_id for row in rows]), return_inverse=True)
+    total_values = np.bincount(inverse, weights=values, minlength=len(user_ids))
+    total_costs = np.bincount(inverse, weights=costs, minlength=len(user_ids))
+
+    return {
+        int(user_id): (round(float(total_value / total_cost - 1.0), 6), int(round(total_value)), int(round(total_cost)))
+        for user_id, total_value, total_cost in zip(user_ids, total_values, total_costs) if total_cost > 0
+    }
+
+
+def update_leaderboard_scores(user_ids=None, stock_symbols=None) -> int:
+    """Re-compute and store the scores of the users affected by a change, and update the ranking.
+
+    The scores are re-computed for the specified users, or for every user holding
+    one of the specified symbols, or for every user if neither is specified. The
+    users in the scope without a score (opted out, or without any holdings) are
+    removed from the leaderboard. Returns the number of scores stored.
+
+    Note: The changes are committed to the database.
+    """
+    if user_ids is None and stock_symbols is not None:
+        # The holders are read once, so the holders without a score are also removed from the ranking
+        user_ids = [row.user_id for row in database.session.query(Stock.user_id)
+                    .filter(Stock.stock_symbol.in_(stock_symbols), Stock.user_id.isnot(None)).distinct()]
+
+    if user_ids is not None:
+        user_filter = Stock.user_id.in_(user_ids)
+        score_filter = LeaderboardScore.user_id.in_(user_ids)
+    else:
+        user_filter = None
+        score_filter = None
+
+    scores = compute_scores(user_filter)
+
+    # Replace the stored scores of the users in the scope
+    delete_query = LeaderboardScore.query
+    if score_filter is not None:
+        delete_query = delete_query.filter(score_filter)
+    delete_query.delete(synchronize_session=False)
+    updated_on = datetime.now()
+    database.session.bulk_insert_mappings(LeaderboardScore, [
+        dict(user_id=user_id, score=score, portfolio_value=value, cost_basis=cost, updated_on=updated_on)
+        for user_id, (score, value, cost) in scores.items()
+    ])
+    database.session.commit()
+
+    if user_filter is None or leaderboard.loaded_at is None:
+        load_leaderboard()
+    else:
+        for user_id in (user_ids or ()):
+            if user_id not in scores:
+                leaderboard.remove(user_id)
+        for user_id, (score, _, _) in scores.items():
+            leaderboard.update(user_id, score)
+    return len(scores)
+
+
+def mask_email(email: str) -> str:
+    """Return the name of a user shown on the leaderboard, which does not reveal their email address."""
+    name, _, domain = email.partition('@')
+    return f'{name[:3]}***@{domain}'
+
+
+def get_leaderboard(number_of_users: int = 25, user_id: int = None):
+    """Return the top users on the leaderboard, and the rank of a user (suitable for JSON)."""
+    _ensure_loaded()
+    leaders = leaderboard.top(number_of_users)
+    emails = dict(database.session.query(User.id, User.email).filter(User.id.in_([leader[0] for leader in leaders])))
+
+    rank = leaderboard.rank(user_id) if user_id is not None else None
+    return {
+        'number_of_users': len(leaderboard),
+        'leaders': [
+            dict(rank=index + 1, name=mask_email(emails.get(leader_id, '')), score=round(score, 4),
+                 is_current_user=leader_id == user_id)
+            for index, (leader_id, score) in enumerate(leaders)
+        ],
+        'user': dict(rank=rank, score=round(leaderboard.get_score(user_id), 4)) if rank is not None else None,
+    }
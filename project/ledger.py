@@ -0,0 +1,252 @@
+"""
+Positions derived from the append-only transaction ledger.
+
+Every buy, sell, split, and dividend is appended to the `transactions` table and
+never changed. The state of each position (shares, cost basis, realized gain, and
+dividend income) is periodically saved to the `position_snapshots` table, so the
+current state is computed as the latest snapshot plus the transactions recorded
+after it. Reading a position therefore only applies the recent transactions
+(at most `LEDGER_SNAPSHOT_INTERVAL` per symbol) instead of the full history.
+
+The cost basis uses the average cost method: a sale removes the average cost of
+the shares sold from the cost basis, and the difference from the sale proceeds is
+the realized gain. A split changes the number of shares but not the cost basis.
+
+The lots in a portfolio (the `Stock` model) are kept consistent with the ledger:
+adding a lot records a purchase, deleting a lot records a sale, and editing a lot
+records an adjustment that replaces the shares and cost of the original lot with
+the corrected values (without changing the realized gain). The lots added before
+the ledger existed are recorded as purchases the first time the ledger of a user
+is used (see `backfill_transactions`).
+
+Note: As for the `Stock` model, all prices and values are stored as integers (cents).
+"""
+from flask import current_app
+from project import database
+from project.models import Stock, Transaction, PositionSnapshot
+
+
+TRANSACTION_TYPES = ('BUY', 'SELL', 'SPLIT', 'DIVIDEND')
+
+# Adjustments are recorded when a lot in a portfolio is edited, so they are not entered by the user
+ADJUSTMENT = 'ADJUSTMENT'
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class LedgerPosition(object):
+    """Class that represents the state of a position after applying the transactions in the ledger."""
+
+    __slots__ = ('stock_symbol', 'number_of_shares', 'cost_basis', 'realized_gain', 'dividend_income',
+                 'transaction_id', 'transactions_since_snapshot', 'current_price')
+
+    def __init__(self, stock_symbol: str, number_of_shares=0, cost_basis=0, realized_gain=0,
+                 dividend_income=0, transaction_id=0):
+        self.stock_symbol = stock_symbol
+        self.number_of_shares = number_of_shares
+        self.cost_basis = cost_basis
+        self.realized_gain = realized_gain
+        self.dividend_income = dividend_income
+        self.transaction_id = transaction_id
+        self.transactions_since_snapshot = 0
+        self.current_price = 0
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.number_of_shares} shares with a cost basis of ${self.cost_basis / 100}'
+
+    @classmethod
+    def from_snapshot(cls, snapshot: PositionSnapshot):
+        return cls(snapshot.stock_symbol, snapshot.number_of_shares, snapshot.cost_basis,
+                   snapshot.realized_gain, snapshot.dividend_income, snapshot.transaction_id)
+
+    def apply(self, transaction: Transaction):
+        """Update the position with the next transaction in the ledger."""
+        if transaction.transaction_type == 'BUY':
+            self.number_of_shares += transaction.number_of_shares
+            self.cost_basis += transaction.number_of_shares * transaction.price
+        elif transaction.transaction_type == 'SELL':
+            cost_of_shares_sold = 0
+            if self.number_of_shares > 0:
+                cost_of_shares_sold = round(self.cost_basis * transaction.number_of_shares / self.number_of_shares)
+            self.realized_gain += transaction.number_of_shares * transaction.price - cost_of_shares_sold
+            self.cost_basis -= cost_of_shares_sold
+            self.number_of_shares -= transaction.number_of_shares
+        elif transaction.transaction_type == 'SPLIT':
+            self.number_of_shares = int(round(self.number_of_shares * transaction.split_ratio))
+        elif transaction.transaction_type == 'DIVIDEND':
+            self.dividend_income += self.number_of_shares * transaction.price
+        elif transaction.transaction_type == ADJUSTMENT:
+            # The number of shares is negative when the shares and cost of a lot are removed
+            self.number_of_shares += transaction.number_of_shares
+            self.cost_basis += transaction.number_of_shares * transaction.price
+
+        self.transaction_id = transaction.id
+        self.transactions_since_snapshot += 1
+
+    def create_snapshot(self, user_id: int) -> PositionSnapshot:
+        return PositionSnapshot(user_id, self.stock_symbol, self.transaction_id, self.number_of_shares,
+                                self.cost_basis, self.realized_gain, self.dividend_income)
+
+    @property
+    def average_cost(self) -> float:
+        """Average cost per share (in cents)."""
+        if self.number_of_shares == 0:
+            return 0.0
+        return self.cost_basis / self.number_of_shares
+
+    @property
+    def position_value(self) -> int:
+        return self.number_of_shares * self.current_price
+
+    @property
+    def unrealized_gain(self) -> int:
+        return self.position_value - self.cost_basis
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def get_ledger_positions(user_id: int, stock_symbol: str = None):
+    """Return the current positions of a user, keyed by stock symbol.
+
+    Only the latest snapshot of each position and the transactions recorded after
+    it are read from the database. If `stock_symbol` is specified, only the
+    position of that stock is read.
+    """
+    latest_snapshots = database.session.query(database.func.max(PositionSnapshot.id)) \
+        .filter_by(user_id=user_id).group_by(PositionSnapshot.stock_symbol)
+    snapshots = PositionSnapshot.query.filter(PositionSnapshot.id.in_(latest_snapshots.scalar_subquery()))
+    if stock_symbol is not None:
+        snapshots = snapshots.filter_by(stock_symbol=stock_symbol)
+    positions = {snapshot.stock_symbol: LedgerPosition.from_snapshot(snapshot) for snapshot in snapshots}
+
+    # Only read the transactions after the latest snapshot of each stock
+    snapshot_transaction_ids = database.session.query(PositionSnapshot.stock_symbol.label('stock_symbol'),
+                                                      PositionSnapshot.transaction_id.label('transaction_id')) \
+        .filter(PositionSnapshot.id.in_(latest_snapshots.scalar_subquery())).subquery()
+    transactions = Transaction.query \
+        .outerjoin(snapshot_transaction_ids, snapshot_transaction_ids.c.stock_symbol == Transaction.stock_symbol) \
+        .filter(Transaction.user_id == user_id,
+                Transaction.id > database.func.coalesce(snapshot_transaction_ids.c.transaction_id, 0))
+    if stock_symbol is not None:
+        transactions = transactions.filter(Transaction.stock_symbol == stock_symbol)
+
+    for transaction in transactions.order_by(Transaction.id):
+        position = positions.setdefault(transaction.stock_symbol, LedgerPosition(transaction.stock_symbol))
+        position.apply(transaction)
+    return positions
+
+
+def get_current_prices(symbols):
+    """Return the latest current price (in cents) of each symbol, as retrieved for any stock in a portfolio."""
+    if not symbols:
+        return {}
+    rows = database.session.query(Stock.stock_symbol, Stock.current_price) \
+        .filter(Stock.stock_symbol.in_(symbols), Stock.current_price_date.isnot(None)) \
+        .order_by(Stock.current_price_date)
+    return {row.stock_symbol: row.current_price for row in rows}
+
+
+def get_ledger_summary(user_id: int):
+    """Return the list of positions in a user's ledger (sorted by stock symbol), valued at the current prices."""
+    positions = get_ledger_positions(user_id)
+    current_prices = get_current_prices(list(positions))
+    for symbol, position in positions.items():
+        position.current_price = current_prices.get(symbol, 0)
+    return [positions[symbol] for symbol in sorted(positions)]
+
+
+def record_transaction(transaction: Transaction) -> LedgerPosition:
+    """Append a transaction to the ledger and return the updated position.
+
+    A snapshot of the position is added once `LEDGER_SNAPSHOT_INTERVAL` transactions
+    have been recorded since the previous snapshot. Raises a ValueError if the
+    transaction is not valid for the current position (e.g. selling more shares
+    than are held).
+
+    Note: The changes are not committed to the database.
+    """
+    if transaction.transaction_type not in TRANSACTION_TYPES + (ADJUSTMENT,):
+        raise ValueError(f'Invalid transaction type ({transaction.transaction_type})! '
+                         f'Must be one of: {", ".join(TRANSACTION_TYPES)}')
+
+    position = get_ledger_positions(transaction.user_id, transaction.stock_symbol).get(
+        transaction.stock_symbol, LedgerPosition(transaction.stock_symbol))
+
+    if transaction.transaction_type in ('BUY', 'SELL') and transaction.number_of_shares <= 0:
+        raise ValueError(f'Invalid number of shares ({transaction.number_of_shares})!')
+    if transaction.transaction_type == 'SELL' and transaction.number_of_shares > position.number_of_shares:
+        raise ValueError(f'Cannot sell {transaction.number_of_shares} shares of {transaction.stock_symbol} '
+                         f'when only {position.number_of_shares} shares are held!')
+    if transaction.transaction_type == ADJUSTMENT and \
+            (transaction.number_of_shares == 0 or position.number_of_shares + transaction.number_of_shares < 0):
+        raise ValueError(f'Cannot adjust {transaction.stock_symbol} by {transaction.number_of_shares} shares '
+                         f'when {position.number_of_shares} shares are held!')
+    if transaction.transaction_type == 'SPLIT' and (transaction.split_ratio is None or transaction.split_ratio <= 0.0):
+        raise ValueError(f'Invalid split ratio ({transaction.split_ratio})!')
+
+    database.session.add(transaction)
+    database.session.flush()
+    position.apply(transaction)
+
+    if position.transactions_since_snapshot >= current_app.config['LEDGER_SNAPSHOT_INTERVAL']:
+        database.session.add(position.create_snapshot(transaction.user_id))
+        position.transactions_since_snapshot = 0
+    return position
+
+
+def record_lot_adjustment(stock: Stock, original_number_of_shares: int, original_purchase_price: int):
+    """Record the adjustment of the ledger after a lot is edited (from its original shares and purchase price).
+
+    The shares and cost of the original lot are removed from the position, and the
+    shares and cost of the lot (as edited) are added. Nothing is recorded if the
+    shares and purchase price of the lot are unchanged.
+
+    Note: The changes are not committed to the database.
+    """
+    if (stock.number_of_shares, stock.purchase_price) == (original_number_of_shares, original_purchase_price):
+        return
+    if original_number_of_shares > 0:
+        record_transaction(Transaction(stock.user_id, stock.stock_symbol, ADJUSTMENT, stock.purchase_date,
+                                       -original_number_of_shares, original_purchase_price / 100))
+    if stock.number_of_shares > 0:
+        record_transaction(Transaction(stock.user_id, stock.stock_symbol, ADJUSTMENT, stock.purchase_date,
+                                       stock.number_of_shares, stock.purchase_price / 100))
+
+
+def record_lot_sale(stock: Stock, transaction_date=None):
+    """Record the sale of every share of a lot (at its current price) when it is deleted from a portfolio.
+
+    If the current price of the stock has not been retrieved, the lot is sold at its purchase price.
+
+    Note: The changes are not committed to the database.
+    """
+    price = stock.current_price or stock.purchase_price
+    return record_transaction(Transaction(stock.user_id, stock.stock_symbol, 'SELL', transaction_date,
+                                          stock.number_of_shares, price / 100))
+
+
+def backfill_transactions(user_id: int = None) -> int:
+    """Record a purchase in the ledger for each lot of the stocks that have no transactions.
+
+    The lots that were added to a portfolio before the ledger existed are only stored
+    in the `stocks` table, so they are added to the ledger of each user before it is
+    first read or changed (or for every user by the `backfill_ledger` command). Any
+    stock that already has a transaction in the ledger is skipped, so running it
+    again does not record the lots twice. Returns the number of lots recorded.
+
+    Note: The changes are not committed to the database.
+    """
+    recorded = database.session.query(Transaction.id).filter(Transaction.user_id == Stock.user_id,
+                                                             Transaction.stock_symbol == Stock.stock_symbol)
+    lots = Stock.query.filter(Stock.user_id.isnot(None), Stock.number_of_shares > 0, ~recorded.exists())
+    if user_id is not None:
+        lots = lots.filter(Stock.user_id == user_id)
+    lots = lots.order_by(Stock.user_id, Stock.stock_symbol, Stock.purchase_date, Stock.id).all()
+    for stock in lots:
+        record_transaction(Transaction(stock.user_id, stock.stock_symbol, 'BUY', stock.purchase_date,
+                                       stock.number_of_shares, stock.purchase_price / 100))
+    return len(lots)
@@ -0,0 +1,174 @@
+"""
+Lot-level cost basis of the stocks in a portfolio.
+
+Each `Stock` in a portfolio is a separate lot (i.e. a single purchase of a stock).
+The lots of each symbol are consolidated into a position with a single GROUP BY
+query, and the lots sold by a future sale are selected with sorted arrays using
+either the FIFO, LIFO, or specific-lot accounting method.
+
+The lots are kept consistent with the transaction ledger (see ledger.py), so the
+purchases, sales, and splits recorded in the ledger are also applied to the lots.
+
+Note: As for the `Stock` model, all prices and values are stored as integers (cents).
+"""
+import numpy as np
+from project import database
+from project.models import Stock
+
+
+ACCOUNTING_METHODS = ('FIFO', 'LIFO', 'SPECIFIC')
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class Position(object):
+    """Class that represents the consolidated position of all the lots of a stock."""
+
+    __slots__ = ('stock_symbol', 'number_of_lots', 'number_of_shares', 'cost_basis',
+                 'current_price', 'position_value')
+
+    def __init__(self, stock_symbol: str, number_of_lots: int, number_of_shares: int, cost_basis: int,
+                 current_price: int, position_value: int):
+        self.stock_symbol = stock_symbol
+        self.number_of_lots = number_of_lots
+        self.number_of_shares = number_of_shares
+        self.cost_basis = cost_basis
+        self.current_price = current_price or 0
+        self.position_value = position_value or 0
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.number_of_shares} shares in {self.number_of_lots} lots'
+
+    @property
+    def average_cost(self) -> float:
+        """Average purchase price per share (in cents)."""
+        if self.number_of_shares == 0:
+            return 0.0
+        return self.cost_basis / self.number_of_shares
+
+    @property
+    def unrealized_gain(self) -> int:
+        return self.position_value - self.cost_basis
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def get_positions(user_id: int):
+    """Return the list of positions (one per stock symbol) in a user's portfolio."""
+    rows = database.session.query(
+        Stock.stock_symbol,
+        database.func.count(Stock.id),
+        database.func.sum(Stock.number_of_shares),
+        database.func.sum(Stock.number_of_shares * Stock.purchase_price),
+        database.func.max(Stock.current_price),
+        database.func.sum(Stock.position_value)
+    ).filter_by(user_id=user_id).group_by(Stock.stock_symbol).order_by(Stock.stock_symbol)
+    return [Position(*row) for row in rows]
+
+
+def allocate_sale(lot_ids, lot_shares, lot_purchase_days, number_of_shares: int, method='FIFO', specific_lot_ids=None):
+    """Select the shares sold from each lot for a sale of `number_of_shares` shares.
+
+    The lots are defined by the arrays of their IDs, number of shares, and purchase
+    dates (as day numbers). The lots are sold in order of:
+        FIFO - oldest purchase date first
+        LIFO - newest purchase date first
+        SPECIFIC - the order of the lot IDs in `specific_lot_ids` (other lots are not sold)
+
+    Returns a list of (lot ID, shares sold) tuples, in the order that the lots are sold.
+    Raises a ValueError if the lots do not contain enough shares for the sale, or if a
+    specific lot is not valid or is specified more than once.
+    """
+    lot_ids = np.asarray(lot_ids)
+    lot_shares = np.asarray(lot_shares, dtype=np.int64)
+    lot_purchase_days = np.asarray(lot_purchase_days)
+
+    if method == 'FIFO':
+        order = np.argsort(lot_purchase_days, kind='stable')
+    elif method == 'LIFO':
+        order = np.argsort(lot_purchase_days, kind='stable')[::-1]
+    elif method == 'SPECIFIC':
+        index_of_lot = {lot_id: index for index, lot_id in enumerate(lot_ids.tolist())}
+        specified_lot_ids = set()
+        for lot_id in (specific_lot_ids or []):
+            if lot_id in specified_lot_ids:
+                raise ValueError(f'Lot ({lot_id}) is specified more than once for the sale!')
+            specified_lot_ids.add(lot_id)
+        try:
+            order = np.array([index_of_lot[lot_id] for lot_id in (specific_lot_ids or [])], dtype=np.intp)
+        except KeyError as error:
+            raise ValueError(f'Invalid lot ({error.args[0]}) specified for the sale!')
+    else:
+        raise ValueError(f'Invalid accounting method ({method})! Must be one of: {", ".join(ACCOUNTING_METHODS)}')
+
+    ordered_shares = lot_shares[order]
+    if number_of_shares <= 0 or ordered_shares.sum() < number_of_shares:
+        raise ValueError(f'Invalid number of shares ({number_of_shares}) for the sale!')
+
+    # Shares still to be sold when each lot is reached, capped at the size of the lot
+    shares_before_lot = np.cumsum(ordered_shares) - ordered_shares
+    shares_sold = np.clip(number_of_shares - shares_before_lot, 0, ordered_shares)
+    sold = np.nonzero(shares_sold)[0]
+    return [(lot_ids[order[index]].item(), int(shares_sold[index])) for index in sold]
+
+
+def sell_lots(user_id: int, stock_symbol: str, number_of_shares: int, method='FIFO', specific_lot_ids=None):
+    """Remove the shares of a sale from the lots of a stock, which are selected using the accounting method.
+
+    A lot that is completely sold is deleted. Returns the list of (lot ID, shares sold)
+    tuples (see `allocate_sale()`), and raises a ValueError if the sale is not valid.
+
+    Note: The changes are not committed to the database.
+    """
+    lots = Stock.query.filter_by(user_id=user_id, stock_symbol=stock_symbol).order_by(Stock.id).all()
+    sales = allocate_sale([lot.id for lot in lots],
+                          [lot.number_of_shares for lot in lots],
+                          [lot.purchase_date.toordinal() if lot.purchase_date is not None else 0 for lot in lots],
+                          number_of_shares, method, specific_lot_ids)
+
+    lots_by_id = {lot.id: lot for lot in lots}
+    for lot_id, shares_sold in sales:
+        lot = lots_by_id[lot_id]
+        if shares_sold == lot.number_of_shares:
+            database.session.delete(lot)
+        else:
+            lot.update(lot.number_of_shares - shares_sold)
+    return sales
+
+
+def get_lot_currency(user_id: int, stock_symbol: str) -> str:
+    """Return the currency of the existing lots of a stock in a user's portfolio (USD if there are none)."""
+    currency = database.session.query(Stock.currency).filter_by(user_id=user_id, stock_symbol=stock_symbol) \
+        .order_by(Stock.id).limit(1).scalar()
+    return currency or 'USD'
+
+
+def split_lots(user_id: int, stock_symbol: str, split_ratio: float):
+    """Apply a stock split to the lots of a stock, without changing the cost basis of each lot.
+
+    The number of shares of each lot is multiplied by the split ratio (and the
+    prices divided by it). As the ledger rounds the total number of shares of the
+    position, any rounding difference is assigned to the newest lot. A lot left
+    with no shares is deleted.
+
+    Note: The changes are not committed to the database.
+    """
+    lots = Stock.query.filter_by(user_id=user_id, stock_symbol=stock_symbol) \
+        .order_by(Stock.purchase_date, Stock.id).all()
+    if not lots:
+        return
+
+    split_shares = [int(round(lot.number_of_shares * split_ratio)) for lot in lots]
+    split_shares[-1] += int(round(sum(lot.number_of_shares for lot in lots) * split_ratio)) - sum(split_shares)
+    for lot, number_of_shares in zip(lots, split_shares):
+        if number_of_shares <= 0:
+            database.session.delete(lot)
+            continue
+        lot.purchase_price = int(round(lot.purchase_price * lot.number_of_shares / number_of_shares))
+        lot.number_of_shares = number_of_shares
+        lot.current_price = int(round((lot.current_price or 0) / split_ratio))
+        lot.position_value = lot.current_price * number_of_shares
@@ -1,7 +1,8 @@
-from project import database
+from project import database, user_cache
 from flask import current_app
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, false
 import requests
 
 
@@ -52,6 +53,11 @@ def get_current_stock_price(symbol: str) -> float:
     return current_price
 
 
+def get_start_of_today() -> datetime:
+    """Return the datetime of midnight today, as prices retrieved before this time are stale."""
+    return datetime.combine(datetime.now().date(), time.min)
+
+
 # ---------------
 # Database Models
 # ---------------
@@ -69,9 +75,11 @@ class Stock(database.Model):
         current price (type: integer)
         date when current price was retrieved from the Alpha Vantage API (type: datetime)
         position value = current price * number of shares (type: integer)
+        currency of the prices and the position value (type: string)
 
     Note: Due to a limitation in the data types supported by SQLite, the
-          purchase price, current price, and position value are stored as integers:
+          purchase price, current price, and position value are stored as integers
+          (in the minor unit of the currency):
               $24.10 -> 2410
               $100.00 -> 10000
               $87.65 -> 8765
@@ -80,17 +88,18 @@ class Stock(database.Model):
     __tablename__ = 'stocks'
 
     id = database.Column(database.Integer, primary_key=True)
-    stock_symbol = database.Column(database.String, nullable=False)
+    stock_symbol = database.Column(database.String, nullable=False, index=True)
     number_of_shares = database.Column(database.Integer, nullable=False)
     purchase_price = database.Column(database.Integer, nullable=False)
-    user_id = database.Column(database.Integer, database.ForeignKey('users.id'))
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), index=True)
     purchase_date = database.Column(database.DateTime)
     current_price = database.Column(database.Integer)
     current_price_date = database.Column(database.DateTime)
     position_value = database.Column(database.Integer)
+    currency = database.Column(database.String(3), nullable=False, default='USD', server_default='USD')
 
     def __init__(self, stock_symbol: str, number_of_shares: str, purchase_price: str,
-                 user_id: int, purchase_date=None):
+                 user_id: int, purchase_date=None, currency='USD'):
         self.stock_symbol = stock_symbol
         self.number_of_shares = int(number_of_shares)
         self.purchase_price = int(float(purchase_price) * 100)
@@ -99,6 +108,7 @@ class Stock(database.Model):
         self.current_price = 0
         self.current_price_date = None
         self.position_value = 0
+        self.currency = currency
 
     def __repr__(self):
         return f'{self.stock_symbol} - {self.number_of_shares} shares purchased at ${self.purchase_price / 100}'
@@ -194,6 +204,10 @@ class User(database.Model):
         * email_confirmation_sent_on - date & time that the confirmation email was sent
         * email_confirmed - flag indicating if the user's email address has been confirmed
         * email_confirmed_on - date & time that the user's email address was confirmed
+        * base_currency - currency that the totals of the portfolio are converted into
+        * leaderboard_opt_in - flag indicating if the user's portfolio return is ranked on the leaderboard
+        * data_version - counter that is incremented whenever the user's stocks or watchlist change
+        * data_updated_on - date & time that the user's stocks or watchlist last changed
 
     REMEMBER: Never store the plaintext password in a database!
     """
@@ -209,6 +223,10 @@ class User(database.Model):
     stocks = database.relationship('Stock', backref='user', lazy='dynamic')
     user_type = database.Column(database.String(10), default='User')
     watchstocks = database.relationship('WatchStock', backref='user', lazy='dynamic')
+    base_currency = database.Column(database.String(3), nullable=False, default='USD', server_default='USD')
+    leaderboard_opt_in = database.Column(database.Boolean, nullable=False, default=False, server_default=false())
+    data_version = database.Column(database.Integer, nullable=False, default=0, server_default='0')
+    data_updated_on = database.Column(database.DateTime)
 
     def __init__(self, email: str, password_plaintext: str, user_type='User'):
         """Create a new User object
@@ -223,6 +241,10 @@ class User(database.Model):
         self.email_confirmed = False
         self.email_confirmed_on = None
         self.user_type = user_type
+        self.base_currency = 'USD'
+        self.leaderboard_opt_in = False
+        self.data_version = 0
+        self.data_updated_on = self.registered_on
 
     def is_password_correct(self, password_plaintext: str):
         return check_password_hash(self.password_hashed, password_plaintext)
@@ -268,7 +290,134 @@ class User(database.Model):
         self.email_confirmed_on = None
 
 
-class WatchStock(database.Model):
+class CachedUser(object):
+    """
+    Class that represents the identity of a logged in user, as stored in `user_cache`.
+
+    Only the attributes needed on every request (id, email, user type, email
+    confirmed flag, and base currency) are stored in the cache, so most authenticated requests
+    do not need to query the `users` table. Accessing any other attribute (or
+    method) of the `User` model loads the full `User` object from the database
+    the first time it is needed during the request.
+    """
+
+    def __init__(self, id: int, email: str, user_type: str, email_confirmed: bool, base_currency: str = 'USD'):
+        self.id = id
+        self.email = email
+        self.user_type = user_type
+        self.email_confirmed = email_confirmed
+        self.base_currency = base_currency
+        self._user = None
+
+    def __repr__(self):
+        return f'<User: {self.email}>'
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not part of the cached identity
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def get_user(self) -> User:
+        """Return the full `User` object, which is loaded from the database when first needed."""
+        if self._user is None:
+            self._user = User.query.get(self.id)
+        return self._user
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def is_admin(self):
+        return self.user_type == 'Admin'
+
+
+def load_cached_user(user_id: int):
+    """Return the identity of the specified user, only querying the database on a cache miss."""
+    identity = user_cache.get(user_id)
+    if identity is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        identity = (user.id, user.email, user.user_type, user.email_confirmed, user.base_currency)
+        user_cache.set(user_id, identity)
+    return CachedUser(*identity)
+
+
+def invalidate_cached_user(user_id: int):
+    user_cache.invalidate(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    # Any change to a user (password, email, confirmation, deletion) removes their cached identity
+    invalidate_cached_user(target.id)
+
+
+class WatchStockDisplayMixin(object):
+    """
+    Mixin class that provides the formatted values of a stock in a watch list.
+
+    The methods only depend on the columns of the `watchstocks` table, so they
+    can be shared by the `WatchStock` model and the lightweight `WatchStockRow`
+    objects used by the listing pages.
+    """
+
+    __slots__ = ()
+
+    def get_current_share_price(self) -> float:
+        return self.current_share_price / 100
+
+    def get_fiftytwo_week_low(self) -> float:
+        return self.fiftytwo_week_low / 100
+
+    def get_fiftytwo_week_high(self) -> float:
+        return self.fiftytwo_week_high / 100
+
+    def get_market_cap(self) -> str:
+        if self.market_cap is None:
+            return '-'
+
+        market_cap_integer = int(self.market_cap)
+        market_cap_integer_billions = market_cap_integer / 1_000_000_000
+        return str(round(market_cap_integer_billions, 1)) + 'B'
+
+    def get_dividend_per_share(self) -> float:
+        return self.dividend_per_share / 100
+
+    def get_pe_ratio(self) -> float:
+        return self.pe_ratio / 100
+
+    def get_peg_ratio(self) -> float:
+        if self.pe_ratio < 0.1:
+            return 0.0
+        return self.peg_ratio / 100
+
+    def get_profit_margin(self) -> float:
+        return self.profit_margin / 100
+
+    def get_beta(self) -> float:
+        return self.beta / 100
+
+    def get_price_to_book_ratio(self) -> float:
+        if self.price_to_book_ratio is None:
+            return 0.0
+        return self.price_to_book_ratio / 100
+
+
+class WatchStock(WatchStockDisplayMixin, database.Model):
     """
     Class that represents a stock in a watch list.
 
@@ -288,6 +437,7 @@ class WatchStock(database.Model):
         price-to-book ratio (type: integer)
         date when stock data was retrieved from the Alpha Vantage API (type: datetime)
         primary key of User that owns the watchstock (type: integer)
+        asset type, sector, and industry (type: string)
 
     Note: Due to a limitation in the data types supported by SQLite, the
           attributes displayed as floating point values are stored as integers:
@@ -314,7 +464,10 @@ class WatchStock(database.Model):
     beta = database.Column(database.Integer)
     price_to_book_ratio = database.Column(database.Integer)
     stock_data_date = database.Column(database.DateTime)
-    user_id = database.Column(database.Integer, database.ForeignKey('users.id'))
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), index=True)
+    asset_type = database.Column(database.String)
+    sector = database.Column(database.String)
+    industry = database.Column(database.String)
 
     def __init__(self, stock_symbol: str, user_id: str):
         self.stock_symbol = stock_symbol
@@ -332,6 +485,9 @@ class WatchStock(database.Model):
         self.price_to_book_ratio = 0
         self.stock_data_date = None
         self.user_id = user_id
+        self.asset_type = None
+        self.sector = None
+        self.industry = None
 
     def __repr__(self):
         return f'{self.stock_symbol}'
@@ -394,6 +550,9 @@ class WatchStock(database.Model):
         self.profit_margin = self.parse_input_string_percentage(data['ProfitMargin'])
         self.beta = self.parse_input_string_integer(data['Beta'])
         self.price_to_book_ratio = self.parse_input_string_integer(data['PriceToBookRatio'])
+        self.asset_type = self.parse_input_string(data.get('AssetType', ''))
+        self.sector = self.parse_input_string(data.get('Sector', ''))
+        self.industry = self.parse_input_string(data.get('Industry', ''))
         self.stock_data_date = datetime.now()
         current_app.logger.info(f'Retrieved valid stock analysis data for {self.stock_symbol} '
                                 f'at time {self.stock_data_date}.')
@@ -405,6 +564,13 @@ class WatchStock(database.Model):
 
         return int(float(input_field) * 100)
 
+    @staticmethod
+    def parse_input_string(input_field: str):
+        if input_field == 'None' or input_field == '' or input_field == '-':
+            return None
+
+        return input_field.title() if input_field.isupper() else input_field
+
     @staticmethod
     def parse_input_string_percentage(input_field: str) -> int:
         if input_field == 'None' or input_field == '':
@@ -412,41 +578,476 @@ class WatchStock(database.Model):
 
         return int(float(input_field) * 10000)
 
-    def get_current_share_price(self) -> float:
-        return self.current_share_price / 100
 
-    def get_fiftytwo_week_low(self) -> float:
-        return self.fiftytwo_week_low / 100
+@event.listens_for(Stock, 'after_insert')
+@event.listens_for(Stock, 'after_update')
+@event.listens_for(Stock, 'after_delete')
+@event.listens_for(WatchStock, 'after_insert')
+@event.listens_for(WatchStock, 'after_update')
+@event.listens_for(WatchStock, 'after_delete')
+def _increment_user_data_version(mapper, connection, target):
+    # Any change to a user's stocks or watchlist (including new prices) changes the version of their data,
+    # which is used by the API to respond to conditional requests without querying the stocks
+    if target.user_id is not None:
+        users = User.__table__
+        connection.execute(users.update()
+                           .where(users.c.id == target.user_id)
+                           .values(data_version=users.c.data_version + 1, data_updated_on=datetime.now()))
 
-    def get_fiftytwo_week_high(self) -> float:
-        return self.fiftytwo_week_high / 100
 
-    def get_market_cap(self) -> str:
-        if self.market_cap is None:
-            return '-'
+class WatchStockRow(WatchStockDisplayMixin):
+    """
+    Class that represents a read-only row from the `watchstocks` table.
 
-        market_cap_integer = int(self.market_cap)
-        market_cap_integer_billions = market_cap_integer / 1_000_000_000
-        return str(round(market_cap_integer_billions, 1)) + 'B'
+    Objects of this class are created from a query that only selects the
+    columns listed in `columns`, which avoids loading full `WatchStock`
+    entities (and tracking them in the session) on the listing pages.
+    """
 
-    def get_dividend_per_share(self) -> float:
-        return self.dividend_per_share / 100
+    columns = ('id', 'stock_symbol', 'company_name', 'current_share_price', 'fiftytwo_week_low',
+               'fiftytwo_week_high', 'market_cap', 'dividend_per_share', 'pe_ratio', 'peg_ratio',
+               'profit_margin', 'beta', 'price_to_book_ratio')
+    __slots__ = columns
 
-    def get_pe_ratio(self) -> float:
-        return self.pe_ratio / 100
+    def __init__(self, row):
+        for column in self.columns:
+            setattr(self, column, getattr(row, column))
 
-    def get_peg_ratio(self) -> float:
-        if self.pe_ratio < 0.1:
-            return 0.0
-        return self.peg_ratio / 100
+    def __repr__(self):
+        return f'{self.stock_symbol}'
 
-    def get_profit_margin(self) -> float:
-        return self.profit_margin / 100
+    @classmethod
+    def query_columns(cls):
+        return [getattr(WatchStock, column) for column in cls.columns]
 
-    def get_beta(self) -> float:
-        return self.beta / 100
 
-    def get_price_to_book_ratio(self) -> float:
-        if self.price_to_book_ratio is None:
-            return 0.0
-        return self.price_to_book_ratio / 100
+class DailyPrice(database.Model):
+    """
+    Class that represents the closing price of a stock on a single trading day.
+
+    The following attributes of a daily price are stored in this table:
+        stock symbol (type: string)
+        date of the trading day (type: date)
+        closing price (type: integer)
+
+    The rows are indexed by (stock symbol, date), so the price history of a stock
+    over a range of dates is read with a single indexed range query.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          closing price is stored as an integer:
+              $24.10 -> 2410
+    """
+
+    __tablename__ = 'daily_prices'
+    __table_args__ = (
+        database.Index('ix_daily_prices_stock_symbol_date', 'stock_symbol', 'date', unique=True),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    stock_symbol = database.Column(database.String, nullable=False)
+    date = database.Column(database.Date, nullable=False)
+    close_price = database.Column(database.Integer, nullable=False)
+
+    def __init__(self, stock_symbol: str, date, close_price: str):
+        self.stock_symbol = stock_symbol
+        self.date = date
+        self.close_price = int(round(float(close_price) * 100))
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.date}: ${self.close_price / 100}'
+
+
+class StockFundamentals(database.Model):
+    """
+    Class that represents the latest fundamentals of a stock symbol (shared by every user).
+
+    The following attributes of a stock are stored in this table:
+        stock symbol (type: string)
+        company name (type: string)
+        current share price (type: integer)
+        52-week low (type: integer)
+        52-week high (type: integer)
+        52-week position - where the current price is between the 52-week low and high (type: integer)
+        dividend per share (type: integer)
+        p/e ratio (type: integer)
+        peg ratio (type: integer)
+        profit margin (type: integer)
+        beta (type: integer)
+        price-to-book ratio (type: integer)
+        asset type, sector, and industry (type: string)
+        date when the fundamentals were updated (type: datetime)
+
+    Each screenable column is indexed, so the screener filters and sorts the stocks
+    with indexed range queries instead of reading the watchlist of every user.
+
+    Note: The values are stored as integers with the same scaling as in the
+          `WatchStock` model, and the 52-week position is stored as a percentage:
+              42.35% -> 4235
+    """
+
+    __tablename__ = 'stock_fundamentals'
+
+    id = database.Column(database.Integer, primary_key=True)
+    stock_symbol = database.Column(database.String, nullable=False, unique=True)
+    company_name = database.Column(database.String)
+    current_share_price = database.Column(database.Integer)
+    fiftytwo_week_low = database.Column(database.Integer)
+    fiftytwo_week_high = database.Column(database.Integer)
+    fiftytwo_week_position = database.Column(database.Integer, index=True)
+    dividend_per_share = database.Column(database.Integer, index=True)
+    pe_ratio = database.Column(database.Integer, index=True)
+    peg_ratio = database.Column(database.Integer, index=True)
+    profit_margin = database.Column(database.Integer, index=True)
+    beta = database.Column(database.Integer, index=True)
+    price_to_book_ratio = database.Column(database.Integer, index=True)
+    asset_type = database.Column(database.String)
+    sector = database.Column(database.String)
+    industry = database.Column(database.String)
+    updated_on = database.Column(database.DateTime)
+
+    def __init__(self, stock_symbol: str):
+        self.stock_symbol = stock_symbol
+
+    def __repr__(self):
+        return f'{self.stock_symbol} (fundamentals updated on {self.updated_on})'
+
+    def update(self, watchstock: WatchStock):
+        """Copy the fundamentals retrieved for a stock in a watchlist."""
+        for column in ('company_name', 'current_share_price', 'fiftytwo_week_low', 'fiftytwo_week_high',
+                       'dividend_per_share', 'pe_ratio', 'peg_ratio', 'profit_margin', 'beta', 'price_to_book_ratio',
+                       'asset_type', 'sector', 'industry'):
+            setattr(self, column, getattr(watchstock, column))
+
+        self.fiftytwo_week_position = None
+        if self.fiftytwo_week_high and self.fiftytwo_week_high > self.fiftytwo_week_low:
+            position = (self.current_share_price - self.fiftytwo_week_low) / (self.fiftytwo_week_high - self.fiftytwo_week_low)
+            self.fiftytwo_week_position = int(round(position * 10000))
+        self.updated_on = datetime.now()
+
+
+class FxRate(database.Model):
+    """
+    Class that represents the exchange rate of a currency into USD on a single day.
+
+    The following attributes of an exchange rate are stored in this table:
+        currency - ISO 4217 code (type: string)
+        date of the rate (type: date)
+        rate - USD per unit of the currency (type: float)
+
+    The rows are indexed by (currency, date), so the latest rate of every currency
+    on a date is read with a single indexed query.
+    """
+
+    __tablename__ = 'fx_rates'
+    __table_args__ = (
+        database.Index('ix_fx_rates_currency_date', 'currency', 'date', unique=True),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    currency = database.Column(database.String(3), nullable=False)
+    date = database.Column(database.Date, nullable=False)
+    rate = database.Column(database.Float, nullable=False)
+
+    def __init__(self, currency: str, date, rate: str):
+        self.currency = currency
+        self.date = date
+        self.rate = float(rate)
+
+    def __repr__(self):
+        return f'{self.currency}/USD - {self.date}: {self.rate}'
+
+
+class Transaction(database.Model):
+    """
+    Class that represents a single event in the append-only transaction ledger of a user.
+
+    The following attributes of a transaction are stored in this table:
+        primary key of User that owns the transaction (type: integer)
+        stock symbol (type: string)
+        transaction type - 'BUY', 'SELL', 'SPLIT', 'DIVIDEND', or 'ADJUSTMENT' (type: string)
+        transaction date (type: datetime)
+        number of shares bought, sold, or adjusted (type: integer)
+        price per share - purchase/sale price or dividend per share (type: integer)
+        split ratio - new shares per existing share (type: float)
+
+    Transactions are never updated or deleted (except when the user is deleted),
+    so the positions derived from the ledger always have a full history.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          price per share is stored as an integer:
+              $24.10 -> 2410
+    """
+
+    __tablename__ = 'transactions'
+    __table_args__ = (
+        database.Index('ix_transactions_user_id_stock_symbol', 'user_id', 'stock_symbol'),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), nullable=False)
+    stock_symbol = database.Column(database.String, nullable=False)
+    transaction_type = database.Column(database.String(10), nullable=False)
+    transaction_date = database.Column(database.DateTime)
+    number_of_shares = database.Column(database.Integer, nullable=False, default=0)
+    price = database.Column(database.Integer, nullable=False, default=0)
+    split_ratio = database.Column(database.Float)
+
+    def __init__(self, user_id: int, stock_symbol: str, transaction_type: str, transaction_date=None,
+                 number_of_shares='0', price='0', split_ratio=None):
+        self.user_id = user_id
+        self.stock_symbol = stock_symbol
+        self.transaction_type = transaction_type
+        self.transaction_date = transaction_date
+        self.number_of_shares = int(number_of_shares)
+        self.price = int(round(float(price) * 100))
+        self.split_ratio = float(split_ratio) if split_ratio is not None else None
+
+    def __repr__(self):
+        if self.transaction_type == 'SPLIT':
+            return f'{self.transaction_type} {self.stock_symbol} - {self.split_ratio}:1'
+        return f'{self.transaction_type} {self.stock_symbol} - {self.number_of_shares} shares at ${self.price / 100}'
+
+
+class PositionSnapshot(database.Model):
+    """
+    Class that represents the state of a position after a specific transaction in the ledger.
+
+    The following attributes of a position snapshot are stored in this table:
+        primary key of User that owns the position (type: integer)
+        stock symbol (type: string)
+        primary key of the last Transaction included in the snapshot (type: integer)
+        number of shares (type: integer)
+        cost basis (type: integer)
+        realized gain (type: integer)
+        dividend income (type: integer)
+
+    The current state of a position is the latest snapshot plus the transactions
+    recorded after it, so the full ledger never needs to be replayed.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          cost basis, realized gain, and dividend income are stored as integers:
+              $24.10 -> 2410
+    """
+
+    __tablename__ = 'position_snapshots'
+    __table_args__ = (
+        database.Index('ix_position_snapshots_user_id_stock_symbol', 'user_id', 'stock_symbol'),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), nullable=False)
+    stock_symbol = database.Column(database.String, nullable=False)
+    transaction_id = database.Column(database.Integer, database.ForeignKey('transactions.id'), nullable=False)
+    number_of_shares = database.Column(database.Integer, nullable=False)
+    cost_basis = database.Column(database.Integer, nullable=False)
+    realized_gain = database.Column(database.Integer, nullable=False)
+    dividend_income = database.Column(database.Integer, nullable=False)
+
+    def __init__(self, user_id: int, stock_symbol: str, transaction_id: int, number_of_shares: int,
+                 cost_basis: int, realized_gain: int, dividend_income: int):
+        self.user_id = user_id
+        self.stock_symbol = stock_symbol
+        self.transaction_id = transaction_id
+        self.number_of_shares = number_of_shares
+        self.cost_basis = cost_basis
+        self.realized_gain = realized_gain
+        self.dividend_income = dividend_income
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.number_of_shares} shares (as of transaction {self.transaction_id})'
+
+
+class PriceAlert(database.Model):
+    """
+    Class that represents a price alert of a user on a stock symbol.
+
+    The following attributes of a price alert are stored in this table:
+        primary key of User that owns the alert (type: integer)
+        stock symbol (type: string)
+        alert type - 'ABOVE', 'BELOW', or 'PERCENT' (move from the purchase price) (type: string)
+        threshold price (type: integer)
+        percent change from the purchase price - only for 'PERCENT' alerts (type: integer)
+        date when the alert was created (type: datetime)
+        date when the alert was triggered (type: datetime)
+        price that triggered the alert (type: integer)
+
+    An alert triggers once, when the price crosses the threshold price. For a
+    'PERCENT' alert, the threshold price is calculated from the purchase price
+    when the alert is created.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          prices and the percent change are stored as integers:
+              $24.10 -> 2410
+              -12.5% -> -1250
+    """
+
+    __tablename__ = 'price_alerts'
+    __table_args__ = (
+        database.Index('ix_price_alerts_stock_symbol_triggered_on', 'stock_symbol', 'triggered_on'),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), nullable=False, index=True)
+    stock_symbol = database.Column(database.String, nullable=False)
+    alert_type = database.Column(database.String(10), nullable=False)
+    threshold = database.Column(database.Integer, nullable=False)
+    percent_change = database.Column(database.Integer)
+    created_on = database.Column(database.DateTime)
+    triggered_on = database.Column(database.DateTime)
+    triggered_price = database.Column(database.Integer)
+
+    def __init__(self, user_id: int, stock_symbol: str, alert_type: str, threshold: int, percent_change=None):
+        self.user_id = user_id
+        self.stock_symbol = stock_symbol
+        self.alert_type = alert_type
+        self.threshold = threshold
+        self.percent_change = percent_change
+        self.created_on = datetime.now()
+        self.triggered_on = None
+        self.triggered_price = None
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.direction} ${self.threshold / 100}'
+
+    @property
+    def direction(self) -> str:
+        return self.get_direction(self.alert_type, self.percent_change)
+
+    @staticmethod
+    def get_direction(alert_type: str, percent_change=None) -> str:
+        """Return the direction of the price move that triggers an alert ('above' or 'below')."""
+        if alert_type == 'ABOVE' or (alert_type == 'PERCENT' and percent_change > 0):
+            return 'above'
+        return 'below'
+
+
+class LeaderboardScore(database.Model):
+    """
+    Class that represents the score of a user on the leaderboard of portfolio returns.
+
+    The following attributes of a score are stored in this table:
+        primary key of User that the score is for (type: integer)
+        score - total return of the portfolio (type: float)
+        portfolio value in USD (type: integer)
+        cost basis in USD (type: integer)
+        date when the score was updated (type: datetime)
+
+    Only the users that opted in to the leaderboard have a score. The scores are
+    indexed, so every process re-builds its in-memory ranking with a single
+    ordered query.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          portfolio value and cost basis are stored as integers:
+              $24.10 -> 2410
+    """
+
+    __tablename__ = 'leaderboard_scores'
+
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), primary_key=True)
+    score = database.Column(database.Float, nullable=False, index=True)
+    portfolio_value = database.Column(database.Integer, nullable=False)
+    cost_basis = database.Column(database.Integer, nullable=False)
+    updated_on = database.Column(database.DateTime)
+
+    def __init__(self, user_id: int, score: float, portfolio_value: int, cost_basis: int):
+        self.user_id = user_id
+        self.score = score
+        self.portfolio_value = portfolio_value
+        self.cost_basis = cost_basis
+        self.updated_on = datetime.now()
+
+    def __repr__(self):
+        return f'User {self.user_id} - {self.score:.2%}'
+
+
+class ReturnMetrics(database.Model):
+    """
+    Class that represents the time-weighted and money-weighted returns of a user's portfolio.
+
+    The following attributes of the returns are stored in this table:
+        primary key of User that the returns are for (type: integer)
+        start date - purchase date of the first lot in the portfolio (type: date)
+        as-of date - date of the closing prices used to value the portfolio (type: date)
+        time-weighted return - cumulative return since the start date (type: float)
+        annualized time-weighted return - only for portfolios held for at least a year (type: float)
+        money-weighted return - internal rate of return of the purchases (XIRR, per year) (type: float)
+        date when the returns were calculated (type: datetime)
+
+    The returns of every user are calculated in a nightly batch, so the profile
+    page only reads a single row (instead of calculating the returns in the request).
+    """
+
+    __tablename__ = 'return_metrics'
+
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), primary_key=True)
+    start_date = database.Column(database.Date)
+    as_of_date = database.Column(database.Date)
+    time_weighted_return = database.Column(database.Float)
+    annualized_time_weighted_return = database.Column(database.Float)
+    money_weighted_return = database.Column(database.Float)
+    updated_on = database.Column(database.DateTime)
+
+    def __init__(self, user_id: int, start_date, as_of_date, time_weighted_return: float = None,
+                 annualized_time_weighted_return: float = None, money_weighted_return: float = None):
+        self.user_id = user_id
+        self.start_date = start_date
+        self.as_of_date = as_of_date
+        self.time_weighted_return = time_weighted_return
+        self.annualized_time_weighted_return = annualized_time_weighted_return
+        self.money_weighted_return = money_weighted_return
+        self.updated_on = datetime.now()
+
+    def __repr__(self):
+        return f'User {self.user_id} - TWR: {self.time_weighted_return}, IRR: {self.money_weighted_return}'
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def get_tracked_symbols():
+    """Return the sorted list of every stock symbol in a portfolio or a watchlist of any user."""
+    query = database.session.query(Stock.stock_symbol).union(database.session.query(WatchStock.stock_symbol))
+    return sorted(row[0] for row in query)
+
+
+def get_data_version(user_id: int) -> int:
+    """Return the version of the stocks and watchlist of a user (incremented by every process on any change)."""
+    return database.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+
+def save_stock_fundamentals(watchstock: WatchStock):
+    """Update the symbol-level fundamentals with the data retrieved for a stock in a watchlist.
+
+    Note: The changes are not committed to the database.
+    """
+    if watchstock.stock_data_date is None:
+        return
+
+    fundamentals = StockFundamentals.query.filter_by(stock_symbol=watchstock.stock_symbol).first()
+    if fundamentals is None:
+        fundamentals = StockFundamentals(watchstock.stock_symbol)
+    fundamentals.update(watchstock)
+    database.session.add(fundamentals)
+
+
+def delete_user(user_id: int):
+    """Delete the specified user and all of their stocks, watchstocks, transactions, price alerts, and scores.
+
+    Each table is cleared with a single set-based DELETE statement, so the
+    stocks, watchstocks, and transactions are never loaded into the session (or left
+    orphaned), regardless of how large the user's portfolio is.
+
+    Note: The changes are not committed to the database.
+    """
+    Stock.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    WatchStock.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    PositionSnapshot.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    Transaction.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    PriceAlert.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    LeaderboardScore.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    ReturnMetrics.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    User.query.filter_by(id=user_id).delete(synchronize_session='evaluate')
+
+    # Bulk deletes do not trigger the ORM events, so remove the cached identity explicitly
+    invalidate_cached_user(user_id)
@@ -0,0 +1,235 @@
+"""
+Storage and caching of the daily closing prices of stocks.
+
+The daily closing prices are retrieved from Alpha Vantage and stored in the
+`daily_prices` table. For analytics over many symbols, the closing prices of
+each symbol are also stored in a compact columnar file:
+
+    header (16 bytes): magic number (4 bytes), unused (4 bytes), number of days (8 bytes)
+    day numbers: int32 array of the days since 1970-01-01 (padded to 8 bytes)
+    closing prices: float64 array of the closing prices in dollars
+
+The files are memory-mapped (read-only), so loading a symbol does not copy the
+data and the OS page cache is shared by every process (e.g. gunicorn workers).
+A file is only ever replaced atomically, so a process that has the previous
+version mapped continues to see a consistent (but older) series.
+"""
+from datetime import date, timedelta
+import os
+import tempfile
+from threading import Lock
+import numpy as np
+import requests
+from flask import current_app
+from project import database
+from project.models import DailyPrice
+
+
+FILE_MAGIC = b'PXC1'
+HEADER_SIZE = 16
+EPOCH = date(1970, 1, 1)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def date_to_day_number(value: date) -> int:
+    return (value - EPOCH).days
+
+
+def day_number_to_date(day_number: int) -> date:
+    return EPOCH + timedelta(days=int(day_number))
+
+
+def _days_block_size(number_of_days: int) -> int:
+    # Pad the day numbers so that the closing prices are aligned to 8 bytes
+    return (number_of_days * 4 + 7) // 8 * 8
+
+
+def create_alpha_vantage_url_daily_full(symbol: str) -> str:
+    return 'https://www.alphavantage.co/query?function={}&symbol={}&outputsize={}&apikey={}'.format(
+        'TIME_SERIES_DAILY',
+        symbol,
+        'full',
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def retrieve_daily_prices(symbol: str) -> int:
+    """Retrieve the daily closing prices of a stock from Alpha Vantage and store the new days.
+
+    Returns the number of days that were added to the `daily_prices` table.
+    """
+    # Attempt the GET call to Alpha Vantage and check that a ConnectionError does
+    # not occur, which happens when the GET call fails due to a network issue
+    try:
+        r = requests.get(create_alpha_vantage_url_daily_full(symbol))
+    except requests.exceptions.ConnectionError:
+        current_app.logger.error(
+            f'Error! Network problem preventing retrieving the daily prices ({symbol})!')
+        return 0
+
+    # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
+    if r.status_code != 200:
+        current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
+                                   f'when retrieving the daily prices ({symbol})!')
+        return 0
+
+    daily_data = r.json()
+
+    # The key of 'Time Series (Daily)' needs to be present in order to process the stock data
+    # Typically, this key will not be present if the API rate limit has been exceeded.
+    if 'Time Series (Daily)' not in daily_data:
+        current_app.logger.warning(f'Could not find the Time Series (Daily) key when retrieving '
+                                   f'the daily prices ({symbol})!')
+        return 0
+
+    # Only add the days after the latest day already stored for this symbol
+    latest_date = database.session.query(database.func.max(DailyPrice.date)).filter_by(stock_symbol=symbol).scalar()
+    number_of_days_added = 0
+    for element, values in daily_data['Time Series (Daily)'].items():
+        price_date = date.fromisoformat(element)
+        if latest_date is None or price_date > latest_date:
+            database.session.add(DailyPrice(symbol, price_date, values['4. close']))
+            number_of_days_added += 1
+
+    database.session.commit()
+    current_app.logger.info(f'Added {number_of_days_added} daily prices for {symbol}.')
+    return number_of_days_added
+
+
+# --------------
+# Helper Classes
+# --------------
+
+class PriceHistoryCache(object):
+    """Columnar, memory-mapped cache of the daily closing prices of each symbol.
+
+    The cache files are stored in the folder specified by the `PRICE_CACHE_FOLDER`
+    configuration variable. The memory maps opened by this process are re-used
+    until the file for the symbol is replaced (by this or any other process).
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._lock = Lock()
+
+    @property
+    def folder(self) -> str:
+        return current_app.config['PRICE_CACHE_FOLDER']
+
+    def get_path(self, symbol: str) -> str:
+        return os.path.join(self.folder, f'{symbol.upper()}.prices')
+
+    def get_series(self, symbol: str, start_date: date = None, end_date: date = None):
+        """Return the (day numbers, closing prices) arrays for the symbol between the dates (inclusive).
+
+        The arrays returned are read-only views of the memory-mapped file, so no
+        data is copied. Empty arrays are returned if the symbol is not cached.
+        """
+        days, closes = self._open(symbol)
+        start_index = 0
+        end_index = len(days)
+        if start_date is not None:
+            start_index = int(np.searchsorted(days, date_to_day_number(start_date), side='left'))
+        if end_date is not None:
+            end_index = int(np.searchsorted(days, date_to_day_number(end_date), side='right'))
+        return days[start_index:end_index], closes[start_index:end_index]
+
+    def get_latest_date(self, symbol: str):
+        days, _ = self._open(symbol)
+        if len(days) == 0:
+            return None
+        return day_number_to_date(days[-1])
+
+    def refresh(self, symbol: str) -> int:
+        """Extend the cache of the symbol with the days stored after the latest cached day.
+
+        Returns the number of days added to the cache.
+        """
+        days, closes = self._open(symbol)
+        query = database.session.query(DailyPrice.date, DailyPrice.close_price).filter_by(stock_symbol=symbol)
+        if len(days) > 0:
+            query = query.filter(DailyPrice.date > day_number_to_date(days[-1]))
+        rows = query.order_by(DailyPrice.date).all()
+        if not rows:
+            return 0
+
+        new_days = np.fromiter((date_to_day_number(row.date) for row in rows), dtype=np.int32, count=len(rows))
+        new_closes = np.fromiter((row.close_price for row in rows), dtype=np.float64, count=len(rows)) / 100
+        self._write(symbol, np.concatenate([days, new_days]), np.concatenate([closes, new_closes]))
+        return len(rows)
+
+    def rebuild(self, symbol: str) -> int:
+        """Re-create the cache of the symbol from all the days stored in the database."""
+        self.invalidate(symbol)
+        return self.refresh(symbol)
+
+    def invalidate(self, symbol: str):
+        path = self.get_path(symbol)
+        with self._lock:
+            self._series.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _open(self, symbol: str):
+        path = self.get_path(symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        # Re-use the existing memory map unless the file has been replaced
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._series.get(path)
+            if entry is not None and entry[0] == file_id:
+                return entry[1], entry[2]
+
+        days, closes = self._map_file(path)
+        with self._lock:
+            self._series[path] = (file_id, days, closes)
+        return days, closes
+
+    @staticmethod
+    def _map_file(path: str):
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE or header[:4] != FILE_MAGIC:
+            raise ValueError(f'Invalid price history cache file ({path})!')
+
+        number_of_days = int(np.frombuffer(header, dtype='<i8', count=1, offset=8)[0])
+        if number_of_days == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        days = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_SIZE, shape=(number_of_days,))
+        closes = np.memmap(path, dtype='<f8', mode='r',
+                           offset=HEADER_SIZE + _days_block_size(number_of_days),
+                           shape=(number_of_days,))
+        return days, closes
+
+    def _write(self, symbol: str, days, closes):
+        number_of_days = len(days)
+        header = FILE_MAGIC + bytes(4) + np.array([number_of_days], dtype='<i8').tobytes()
+        padding = bytes(_days_block_size(number_of_days) - number_of_days * 4)
+
+        # Write to a temporary file and then replace the cache file, so that other
+        # processes never read a partially written file
+        os.makedirs(self.folder, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                file.write(header)
+                file.write(np.ascontiguousarray(days, dtype='<i4').tobytes())
+                file.write(padding)
+                file.write(np.ascontiguousarray(closes, dtype='<f8').tobytes())
+            os.replace(temporary_path, self.get_path(symbol))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+
+price_history_cache = PriceHistoryCache()
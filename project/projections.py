@@ -0,0 +1,191 @@
+"""
+Monte Carlo projection of the value of a portfolio.
+
+The daily returns of a portfolio (from the stored daily prices of its holdings)
+are simulated over a horizon with either:
+    bootstrap - resampling the historical daily returns (with replacement)
+    gbm - geometric Brownian motion with the mean and volatility of the historical log returns
+
+Each batch of paths is simulated as a single (paths x days) matrix, and the
+batches are distributed across a `ProcessPoolExecutor`. Only the value of each
+path at a few checkpoints is returned by a batch, so the memory used does not
+depend on the total number of paths.
+
+The process pool is created once per web server process (instead of for each
+projection), so the worker processes are only spawned once.
+
+A projection is run as a background job (see jobs.py), and the results are stored
+per (user, holdings, as-of date, parameters) in a job store that is shared by every
+process, so the request thread only starts the job and then reads the stored results.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+from threading import Lock
+import numpy as np
+from flask import current_app
+from project.jobs import JobStore
+from project.analytics import get_holdings, load_price_matrix, compute_returns
+from project.prices import day_number_to_date
+
+
+PROJECTION_METHODS = ('bootstrap', 'gbm')
+PROJECTION_HORIZONS = (21, 63, 126, 252, 756)  # trading days
+PROJECTION_PATHS = (1_000, 10_000, 100_000)
+PROJECTION_PERCENTILES = (5, 25, 50, 75, 95)
+NUMBER_OF_CHECKPOINTS = 12
+
+# Status and results of the projections (shared by every process), keyed by the job key
+projection_jobs = JobStore('projections')
+
+# Pool of the worker processes that simulate the paths in this process
+_process_pool = None
+_process_pool_pid = None
+_process_pool_workers = 0
+_process_pool_lock = Lock()
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def get_checkpoints(horizon: int):
+    """Return the days (1 to `horizon`) at which the value of each path is recorded."""
+    return np.unique(np.linspace(1, horizon, min(NUMBER_OF_CHECKPOINTS, horizon)).round().astype(np.intp))
+
+
+def get_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the long-lived pool of worker processes of this process, which is created on first use."""
+    global _process_pool, _process_pool_pid, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_pid != os.getpid() or _process_pool_workers != max_workers:
+            if _process_pool is not None and _process_pool_pid == os.getpid():
+                _process_pool.shutdown(wait=False)
+            # Start the worker processes with 'spawn', as forking a multi-threaded web server process is unsafe
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _process_pool_pid = os.getpid()
+            _process_pool_workers = max_workers
+        return _process_pool
+
+
+def reset_process_pool():
+    """Discard the pool of worker processes (e.g. after a worker process was terminated), so a new pool is created."""
+    global _process_pool
+    with _process_pool_lock:
+        _process_pool = None
+
+
+def simulate_batch(returns, method: str, horizon: int, number_of_paths: int, seed: int):
+    """Return the growth of each simulated path at each checkpoint, as a (paths x checkpoints) matrix.
+
+    This function is run in a worker process, so it only uses its arguments.
+    """
+    rng = np.random.default_rng(seed)
+    log_returns = np.log1p(returns)
+    if method == 'bootstrap':
+        simulated = log_returns[rng.integers(0, len(log_returns), size=(number_of_paths, horizon))]
+    elif method == 'gbm':
+        simulated = rng.normal(log_returns.mean(), log_returns.std(ddof=1), size=(number_of_paths, horizon))
+    else:
+        raise ValueError(f'Invalid projection method ({method})! Must be one of: {", ".join(PROJECTION_METHODS)}')
+
+    np.cumsum(simulated, axis=1, out=simulated)
+    return np.exp(simulated[:, get_checkpoints(horizon) - 1])
+
+
+def run_projection(returns, start_value: float, method: str, horizon: int, number_of_paths: int,
+                   batch_size: int = 10_000, max_workers: int = 0, seed: int = None):
+    """Simulate the value of a portfolio and return the percentiles of the value at each checkpoint.
+
+    The paths are simulated in batches of `batch_size` paths, which are distributed
+    across the process pool of `max_workers` processes (or simulated in this process
+    if `max_workers` is 0).
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    batch_sizes = [min(batch_size, number_of_paths - start) for start in range(0, number_of_paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).generate_state(len(batch_sizes))
+    arguments = ([returns] * len(batch_sizes), [method] * len(batch_sizes), [horizon] * len(batch_sizes),
+                 batch_sizes, seeds.tolist())
+
+    if max_workers > 0:
+        try:
+            batches = list(get_process_pool(max_workers).map(simulate_batch, *arguments))
+        except BrokenProcessPool:
+            reset_process_pool()
+            raise
+    else:
+        batches = list(map(simulate_batch, *arguments))
+
+    values = start_value * np.concatenate(batches)
+    percentiles = np.percentile(values, PROJECTION_PERCENTILES, axis=0)
+    return {
+        'start_value': round(float(start_value), 2),
+        'method': method,
+        'horizon': horizon,
+        'number_of_paths': number_of_paths,
+        'checkpoints': get_checkpoints(horizon).tolist(),
+        'percentiles': {str(percentile): np.round(percentiles[index], 2).tolist()
+                        for index, percentile in enumerate(PROJECTION_PERCENTILES)},
+        'probability_of_loss': round(float(np.mean(values[:, -1] < start_value)), 4),
+    }
+
+
+def get_projection_inputs(user_id: int, base_currency: str = 'USD'):
+    """Return the (job key, daily returns, current value) of a user's portfolio in the base currency.
+
+    The holdings without an exchange rate into the base currency are excluded.
+    Returns None if the portfolio is empty or there is not enough price history.
+    """
+    symbols, shares, fx_rates = get_holdings(user_id, base_currency)
+    converted = ~np.isnan(fx_rates)
+    if not converted.any():
+        return None
+
+    symbols = [symbol for symbol, included in zip(symbols, converted) if included]
+    weights = shares[converted] * fx_rates[converted]
+    days, prices = load_price_matrix(symbols)
+    if len(days) < 3:
+        return None
+
+    values = prices @ weights
+    returns = compute_returns(values)
+    key = (user_id, tuple(symbols), tuple(weights.tolist()), base_currency, day_number_to_date(days[-1]))
+    return key, returns, float(values[-1])
+
+
+def get_projection(user_id: int, method: str, horizon: int, number_of_paths: int, base_currency: str = 'USD'):
+    """Return the status of a projection ('running', 'complete', or 'error') and its results.
+
+    Returns None if the projection has not been started (or has expired).
+    """
+    inputs = get_projection_inputs(user_id, base_currency)
+    if inputs is None:
+        return None
+    return projection_jobs.get(inputs[0] + (method, horizon, number_of_paths))
+
+
+def start_projection(user_id: int, method: str, horizon: int, number_of_paths: int, base_currency: str = 'USD'):
+    """Start a projection of a user's portfolio as a background job (unless it is already running or complete).
+
+    Returns the status of the projection, or None if there is not enough price history.
+    """
+    inputs = get_projection_inputs(user_id, base_currency)
+    if inputs is None:
+        return None
+
+    key, returns, start_value = inputs
+    key = key + (method, horizon, number_of_paths)
+
+    def run_job():
+        try:
+            result = run_projection(returns, start_value, method, horizon, number_of_paths,
+                                    batch_size=current_app.config['PROJECTION_BATCH_SIZE'],
+                                    max_workers=current_app.config['PROJECTION_WORKERS'])
+            projection_jobs.set(key, {'status': 'complete', 'result': result})
+            current_app.logger.info(f'Completed the projection ({number_of_paths} paths) for user: {user_id}')
+        except Exception as error:
+            projection_jobs.set(key, {'status': 'error', 'result': None})
+            current_app.logger.error(f'Error! Projection failed for user {user_id}: {error}')
+
+    return projection_jobs.start(key, {'status': 'running', 'result': None}, run_job)
@@ -0,0 +1,241 @@
+"""
+Time-weighted and money-weighted returns of every portfolio, calculated in a nightly batch.
+
+The time-weighted return (TWR) chains the daily returns of the value of a
+portfolio, excluding the purchases, so it measures the performance of the
+holdings regardless of when money was added. The money-weighted return is the
+internal rate of return (XIRR) of the purchases of each lot and the current value
+of the portfolio, so it also reflects the timing of the purchases.
+
+The batch loads the lots of every user with a single query, and splits the users
+into batches that are distributed across a `ProcessPoolExecutor`. Within a batch,
+the returns of every user are computed at once:
+    * the daily value of each lot is a column of a (days x lots) matrix, and the
+      lots of each user are summed with `np.add.reduceat()`
+    * the XIRR of every user is solved simultaneously with a vectorized Newton's
+      method, with a vectorized bisection for the users where Newton's method
+      does not converge
+
+The results are stored in the `return_metrics` table, which the profile page
+reads directly.
+
+Note: The values of the lots in other currencies are converted into USD at the
+      latest exchange rates, so the returns do not include any currency effects.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import numpy as np
+from flask import current_app
+from project import database
+from project.models import Stock, ReturnMetrics
+from project.analytics import load_price_matrix
+from project.prices import date_to_day_number, day_number_to_date
+from project.fx import get_fx_rates
+
+
+DAYS_PER_YEAR = 365.0
+XIRR_TOLERANCE = 1e-9
+XIRR_MAX_ITERATIONS = 50
+XIRR_BISECTION_ITERATIONS = 100
+XIRR_BRACKET = (-0.9999, 100.0)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def _net_present_values(rates, amounts, times):
+    # Return the net present value (and its derivative) of each row of cash flows at its rate
+    discount = (1.0 + rates[:, None]) ** -times
+    values = (amounts * discount).sum(axis=1)
+    derivatives = -(times * amounts * discount).sum(axis=1) / (1.0 + rates)
+    return values, derivatives
+
+
+def solve_xirr(amounts, times, guess: float = 0.1):
+    """Return the internal rate of return (per year) of each row of cash flows.
+
+    `amounts` and `times` are (rows x cash flows) matrices of the amount of each
+    cash flow and its time (in years from the first cash flow). Rows with fewer cash
+    flows are padded with amounts of zero. The rate of a row without a solution
+    (e.g. only purchases) is NaN.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    scale = np.abs(amounts).sum(axis=1)
+    lower, upper = XIRR_BRACKET
+
+    # Newton's method for every row at once (only the rows that have not converged are updated)
+    rates = np.full(amounts.shape[0], guess)
+    converged = scale == 0.0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(XIRR_MAX_ITERATIONS):
+            active = ~converged
+            if not active.any():
+                break
+            values, derivatives = _net_present_values(rates[active], amounts[active], times[active])
+            steps = values / derivatives
+            rates[active] = np.clip(rates[active] - steps, lower, upper)
+            converged[active] = np.abs(values) <= XIRR_TOLERANCE * scale[active]
+
+        # Bisection for the remaining rows with a root in the bracket
+        remaining = ~converged | ~np.isfinite(rates)
+        if remaining.any():
+            low = np.full(np.count_nonzero(remaining), lower)
+            high = np.full(len(low), upper)
+            low_values, _ = _net_present_values(low, amounts[remaining], times[remaining])
+            high_values, _ = _net_present_values(high, amounts[remaining], times[remaining])
+            bracketed = np.sign(low_values) != np.sign(high_values)
+            for _ in range(XIRR_BISECTION_ITERATIONS):
+                middle = (low + high) / 2
+                middle_values, _ = _net_present_values(middle, amounts[remaining], times[remaining])
+                same_sign = np.sign(middle_values) == np.sign(low_values)
+                low = np.where(same_sign, middle, low)
+                low_values = np.where(same_sign, middle_values, low_values)
+                high = np.where(same_sign, high, middle)
+            rates[remaining] = np.where(bracketed, (low + high) / 2, np.nan)
+
+    rates[scale == 0.0] = np.nan
+    return rates
+
+
+def compute_time_weighted_returns(values, flows):
+    """Return the time-weighted return of each column of the (days x portfolios) value matrix.
+
+    `flows` is the matrix of the value of the purchases on each day, which is
+    excluded from the daily return. Days without any value are skipped.
+    """
+    previous_values = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_growth = np.where(previous_values > 0.0, (values[1:] - flows[1:]) / previous_values, 1.0)
+    return daily_growth.prod(axis=0) - 1.0
+
+
+def compute_return_metrics(days, prices, lot_users, lot_columns, lot_shares, lot_costs, lot_days):
+    """Compute the time-weighted and money-weighted returns of every user in a batch.
+
+    `days` and `prices` are the price matrix of the symbols held in the batch (with
+    NaN before the history of a symbol), and each lot is defined by its user, the
+    column of its symbol, its number of shares, its cost (in dollars), and its
+    purchase date (as a day number). The lots must be sorted by user.
+
+    Returns the arrays (user ids, start days, time-weighted returns, annualized
+    time-weighted returns, money-weighted returns), with one element per user.
+
+    This function is run in a worker process, so it only uses its arguments.
+    """
+    user_ids, user_starts = np.unique(lot_users, return_index=True)
+    if len(user_ids) == 0:
+        empty = np.empty(0)
+        return user_ids, np.empty(0, dtype=np.int64), empty, empty, empty
+    as_of_day = days[-1]
+
+    # Lots purchased before the history of their symbol are added on its first day
+    first_rows = np.argmax(~np.isnan(prices), axis=0)
+    rows = np.maximum(np.searchsorted(days, lot_days, side='left'), first_rows[lot_columns])
+
+    # Daily value of each lot (zero before its purchase), summed into the value of each user's portfolio
+    lot_prices = np.nan_to_num(prices[:, lot_columns])
+    lot_values = lot_prices * lot_shares
+    lot_values[np.arange(len(days))[:, None] < rows] = 0.0
+    values = np.add.reduceat(lot_values, user_starts, axis=1)
+
+    # The purchases are valued at the closing price on their first day in the portfolio
+    held = rows < len(days)
+    flows = np.zeros(values.shape)
+    lot_user_columns = np.searchsorted(user_ids, lot_users)
+    np.add.at(flows, (rows[held], lot_user_columns[held]), lot_values[rows[held], np.flatnonzero(held)])
+    time_weighted_returns = compute_time_weighted_returns(values, flows)
+
+    start_days = np.minimum.reduceat(lot_days, user_starts)
+    years = (as_of_day - start_days) / DAYS_PER_YEAR
+    with np.errstate(invalid='ignore'):
+        annualized = np.where(years >= 1.0, (1.0 + time_weighted_returns) ** (1.0 / np.maximum(years, 1.0)) - 1.0, np.nan)
+
+    # Cash flows of each user: the cost of each lot on its purchase date, and the current value
+    # of the portfolio on the as-of date (lots without a price are valued at their cost)
+    lot_current_values = np.where(np.isnan(prices[-1, lot_columns]), lot_costs, prices[-1, lot_columns] * lot_shares)
+    lot_positions = np.arange(len(lot_users)) - user_starts[lot_user_columns]
+    number_of_flows = np.diff(np.append(user_starts, len(lot_users))).max() + 1
+    amounts = np.zeros((len(user_ids), number_of_flows))
+    times = np.zeros(amounts.shape)
+    amounts[lot_user_columns, lot_positions] = -lot_costs
+    times[lot_user_columns, lot_positions] = (lot_days - start_days[lot_user_columns]) / DAYS_PER_YEAR
+    amounts[:, -1] = np.add.reduceat(lot_current_values, user_starts)
+    times[:, -1] = years
+    money_weighted_returns = solve_xirr(amounts, times)
+
+    return user_ids, start_days, time_weighted_returns, annualized, money_weighted_returns
+
+
+def _to_metric(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 6)
+
+
+def calculate_return_metrics(max_workers: int = 0, batch_size: int = 500) -> int:
+    """Calculate the returns of every user's portfolio and store them in the `return_metrics` table.
+
+    The users are split into batches of `batch_size` users, which are distributed
+    across a process pool of `max_workers` processes (or calculated in this process
+    if `max_workers` is 0). Returns the number of users with returns.
+
+    Note: The changes are committed to the database.
+    """
+    lots = database.session.query(Stock.user_id, Stock.stock_symbol, Stock.number_of_shares, Stock.purchase_price,
+                                  Stock.purchase_date, Stock.currency) \
+        .filter(Stock.purchase_date.isnot(None)).order_by(Stock.user_id, Stock.id).all()
+    if not lots:
+        return 0
+
+    symbols = sorted({lot.stock_symbol for lot in lots})
+    days, prices = load_price_matrix(symbols, common_history=False)
+    if len(days) == 0:
+        current_app.logger.warning('Could not calculate the returns, as there is no price history!')
+        return 0
+
+    rates = get_fx_rates()
+    factors = np.array([rates.get(lot.currency, np.nan) for lot in lots])
+    column_of_symbol = {symbol: column for column, symbol in enumerate(symbols)}
+    lot_users = np.array([lot.user_id for lot in lots], dtype=np.int64)
+    lot_columns = np.array([column_of_symbol[lot.stock_symbol] for lot in lots], dtype=np.intp)
+    lot_shares = np.array([lot.number_of_shares for lot in lots], dtype=np.float64) * factors
+    lot_costs = np.array([lot.number_of_shares * lot.purchase_price / 100 for lot in lots], dtype=np.float64) * factors
+    lot_days = np.array([date_to_day_number(lot.purchase_date.date()) for lot in lots], dtype=np.int64)
+
+    # Lots in a currency without an exchange rate are excluded
+    included = ~np.isnan(factors)
+    if not included.any():
+        current_app.logger.warning('Could not calculate the returns, as there are no exchange rates for the lots!')
+        return 0
+    lot_users, lot_columns, lot_shares, lot_costs, lot_days = (array[included] for array in (
+        lot_users, lot_columns, lot_shares, lot_costs, lot_days))
+
+    # Each batch only receives the columns of the price matrix for the symbols its users hold
+    user_starts = np.flatnonzero(np.r_[True, lot_users[1:] != lot_users[:-1]])
+    batch_bounds = np.append(user_starts[::batch_size], len(lot_users))
+    arguments = []
+    for start, end in zip(batch_bounds[:-1], batch_bounds[1:]):
+        batch_columns, columns = np.unique(lot_columns[start:end], return_inverse=True)
+        arguments.append((days, prices[:, batch_columns], lot_users[start:end], columns,
+                          lot_shares[start:end], lot_costs[start:end], lot_days[start:end]))
+
+    if max_workers > 0:
+        # Start the worker processes with 'spawn', as forking a multi-threaded web server process is unsafe
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            batches = list(executor.map(compute_return_metrics, *zip(*arguments)))
+    else:
+        batches = [compute_return_metrics(*batch_arguments) for batch_arguments in arguments]
+
+    as_of_date = day_number_to_date(days[-1])
+    updated_on = datetime.now()
+    ReturnMetrics.query.delete(synchronize_session=False)
+    database.session.bulk_insert_mappings(ReturnMetrics, [
+        dict(user_id=int(user_id), start_date=day_number_to_date(start_day), as_of_date=as_of_date,
+             time_weighted_return=_to_metric(twr), annualized_time_weighted_return=_to_metric(annualized),
+             money_weighted_return=_to_metric(irr), updated_on=updated_on)
+        for batch in batches for user_id, start_day, twr, annualized, irr in zip(*batch)
+    ])
+    database.session.commit()
+    return sum(len(batch[0]) for batch in batches)
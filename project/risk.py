@@ -0,0 +1,251 @@
+"""
+Historical Value-at-Risk and stress scenarios of a portfolio.
+
+The Value-at-Risk (VaR) is estimated by historical simulation: the daily returns
+of every holding over a window (a days x holdings matrix, from the stored daily
+prices) are applied to the current value of the holdings, which gives the profit
+or loss of the portfolio on each historical day with a single matrix-vector
+product. The losses are sorted once, so the VaR and the Conditional VaR (the
+average loss beyond the VaR, also called the Expected Shortfall) at every
+confidence level are read from the same sorted array.
+
+A stress scenario is a list of shocks, such as 'Technology -20%, market -5%'.
+The target of a shock is a stock symbol, a sector, an industry, an asset type, or
+'market' (which is scaled by the beta of each holding, or 1.0 without a beta).
+A sector, industry, or asset type can also be shortened to a prefix (e.g. 'tech')
+or given by a common alias (e.g. 'financials'), and a target that does not match
+any holding is rejected instead of being ignored. The shocks of every scenario
+are combined into a (scenarios x holdings) matrix, where the shocks matching the
+same holding are added, so the profit or loss of every scenario is again a single
+matrix-vector product.
+
+The values of the holdings are converted into the base currency of the user, and
+the holdings in a currency without an exchange rate are excluded (with their
+currencies listed in `missing_rates`).
+
+The results are cached per (user, holdings, as-of date, parameters).
+"""
+import re
+import numpy as np
+from project import database
+from project.models import Stock, StockFundamentals
+from project.cache import TTLCache
+from project.analytics import CORRELATION_WINDOWS, load_price_matrix, compute_returns
+from project.prices import price_history_cache, day_number_to_date
+from project.fx import get_fx_rates, convert_values
+
+
+RISK_WINDOWS = CORRELATION_WINDOWS
+DEFAULT_CONFIDENCE_LEVELS = (0.95, 0.99)
+MAXIMUM_SCENARIOS = 10
+MARKET_SHOCK_TARGET = 'market'
+
+# A shock is a target followed by a signed percent change (e.g. 'Technology -20%')
+SHOCK_PATTERN = re.compile(r'^\s*(?P<target>[^,]+?)\s+(?P<change>[+-]?\d+(?:\.\d+)?)\s*%\s*$')
+
+# Common names of the sectors that are not a prefix of the sector names of the fundamentals
+SHOCK_TARGET_ALIASES = {
+    'financials': 'finance',
+    'financial services': 'finance',
+    'healthcare': 'life sciences',
+    'health care': 'life sciences',
+    'industrials': 'manufacturing',
+}
+
+# Per-process cache of the risk of each portfolio, keyed by (user, holdings, as-of date, parameters)
+risk_cache = TTLCache(maxsize=1024)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def parse_confidence_levels(text: str):
+    """Return the confidence levels (as fractions) from a comma-separated list of percentages (e.g. '95, 99')."""
+    try:
+        levels = sorted({round(float(level) / 100, 4) for level in text.split(',') if level.strip()})
+    except ValueError:
+        raise ValueError(f'Invalid confidence levels ({text})!')
+    if not levels or any(not 0.5 < level < 1.0 for level in levels):
+        raise ValueError(f'Invalid confidence levels ({text})! Must be between 50 and 100.')
+    return tuple(levels)
+
+
+def parse_scenario(text: str):
+    """Return the shocks of a scenario as a tuple of (target, change) tuples, with the change as a fraction.
+
+    Raises a ValueError if a shock is not a target followed by a percent change.
+    """
+    shocks = []
+    for shock in text.split(','):
+        match = SHOCK_PATTERN.match(shock)
+        if match is None:
+            raise ValueError(f'Invalid shock ({shock.strip()})! Must be a target and a percent change (e.g. "Technology -20%").')
+        shocks.append((match.group('target').strip().lower(), float(match.group('change')) / 100))
+    return tuple(shocks)
+
+
+def compute_var_cvar(profits, confidence_levels):
+    """Return the (VaR, CVaR) arrays of the historical profits at each confidence level (as positive losses).
+
+    The VaR at a confidence level c is the smallest loss of the worst (1 - c) of the
+    days, and the CVaR is the average loss over those days.
+    """
+    profits = np.sort(np.asarray(profits, dtype=np.float64))
+    tail_sizes = np.maximum(np.ceil((1.0 - np.asarray(confidence_levels)) * len(profits) - 1e-9).astype(np.intp), 1)
+    var = -profits[tail_sizes - 1]
+    cvar = -np.cumsum(profits)[tail_sizes - 1] / tail_sizes
+    return var, cvar
+
+
+def build_shock_matrix(scenarios, symbols, classifications, betas):
+    """Return the (scenarios x holdings) matrix of the change in the value of each holding in each scenario.
+
+    `classifications` is the list of the (sector, industry, asset type) of each holding,
+    and `betas` is the array of the beta of each holding (NaN if not available).
+    A target matches the holdings with the same symbol or classification or, if there
+    are none, the holdings with a classification that starts with the target. Raises
+    a ValueError if a target does not match any holding.
+    """
+    holding_targets = [{symbol.lower(), *(value.lower() for value in classification if value)}
+                       for symbol, classification in zip(symbols, classifications)]
+    holding_classifications = [[value.lower() for value in classification if value] for classification in classifications]
+    market_exposure = np.where(np.isnan(betas), 1.0, betas)
+
+    # Each target is matched against the holdings once, even if it is used in several scenarios
+    target_masks = {}
+    shocks = np.zeros((len(scenarios), len(symbols)))
+    for row, scenario in enumerate(scenarios):
+        for target, change in scenario:
+            if target == MARKET_SHOCK_TARGET:
+                shocks[row] += change * market_exposure
+                continue
+
+            if target not in target_masks:
+                name = SHOCK_TARGET_ALIASES.get(target, target)
+                mask = np.fromiter((name in targets for targets in holding_targets), dtype=bool, count=len(symbols))
+                if not mask.any():
+                    mask = np.fromiter((any(value.startswith(name) for value in values)
+                                        for values in holding_classifications), dtype=bool, count=len(symbols))
+                if not mask.any():
+                    raise ValueError(f'Invalid shock target ({target})! It does not match the symbol, sector, '
+                                     f'industry, or asset type of any holding (or "{MARKET_SHOCK_TARGET}").')
+                target_masks[target] = mask
+            shocks[row] += change * target_masks[target]
+    return shocks
+
+
+def compute_risk(prices, values, confidence_levels, shocks):
+    """Compute the historical VaR and CVaR of the holdings, and the profit or loss of each stress scenario.
+
+    `prices` is a (days x holdings) matrix of closing prices (NaN where a holding does
+    not have a price, which is then excluded from the historical simulation),
+    `values` is the current value of each holding, and `shocks` is the
+    (scenarios x holdings) matrix of the change in the value of each holding.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    complete = ~np.isnan(prices).any(axis=0)
+    profits = compute_returns(prices[:, complete]) @ values[complete]
+    var, cvar = compute_var_cvar(profits, confidence_levels) if len(profits) > 0 else (None, None)
+    return {
+        'complete': complete,
+        'profits': profits,
+        'var': var,
+        'cvar': cvar,
+        'scenario_profits': shocks @ values,
+    }
+
+
+def _round(value):
+    return round(float(value), 2)
+
+
+def get_holdings_risk_inputs(user_id: int, base_currency: str):
+    """Return the (symbols, classifications, betas, values, missing rates) of a user's portfolio.
+
+    The values are in the base currency, and the holdings in a currency without an
+    exchange rate are excluded (with the currencies returned as the missing rates).
+    """
+    rows = database.session.query(Stock.stock_symbol, Stock.currency,
+                                  database.func.sum(Stock.position_value).label('position_value'),
+                                  StockFundamentals.sector, StockFundamentals.industry, StockFundamentals.asset_type,
+                                  StockFundamentals.beta) \
+        .outerjoin(StockFundamentals, StockFundamentals.stock_symbol == Stock.stock_symbol) \
+        .filter(Stock.user_id == user_id) \
+        .group_by(Stock.stock_symbol, Stock.currency, StockFundamentals.sector, StockFundamentals.industry,
+                  StockFundamentals.asset_type, StockFundamentals.beta) \
+        .order_by(Stock.stock_symbol, Stock.currency).all()
+    fx_rates = get_fx_rates()
+    values = convert_values([row.position_value or 0 for row in rows], [row.currency for row in rows],
+                            base_currency, fx_rates) / 100
+    missing_rates = sorted({row.currency for row in rows} - set(fx_rates))
+    converted = ~np.isnan(values)
+    rows = [row for row, included in zip(rows, converted) if included]
+    symbols = [row.stock_symbol for row in rows]
+    classifications = [(row.sector, row.industry, row.asset_type) for row in rows]
+    betas = np.array([row.beta / 100 if row.beta is not None else np.nan for row in rows])
+    return symbols, classifications, betas, values[converted], missing_rates
+
+
+def get_portfolio_risk(user_id: int, base_currency: str = 'USD', confidence_levels=DEFAULT_CONFIDENCE_LEVELS,
+                       window: int = 252, scenarios=()):
+    """Return the historical VaR and CVaR (over 1 day) and the stress scenarios of a user's portfolio (suitable for JSON).
+
+    `scenarios` is a tuple of (name, shocks) tuples, with the shocks as returned
+    by `parse_scenario()`. Returns None if the portfolio is empty (or has no holding
+    with an exchange rate). Raises a ValueError if a shock target does not match any holding.
+    """
+    if window not in RISK_WINDOWS:
+        raise ValueError(f'Invalid window ({window})! Must be one of: {", ".join(str(window) for window in RISK_WINDOWS)}')
+
+    symbols, classifications, betas, values, missing_rates = get_holdings_risk_inputs(user_id, base_currency)
+    if not symbols:
+        return None
+
+    unique_symbols = sorted(set(symbols))
+    latest_dates = [price_history_cache.get_latest_date(symbol) for symbol in unique_symbols]
+    as_of_date = max((latest_date for latest_date in latest_dates if latest_date is not None), default=None)
+    key = (user_id, tuple(symbols), tuple(values.tolist()), as_of_date, base_currency, tuple(confidence_levels),
+           window, tuple(scenarios))
+    risk = risk_cache.get(key)
+    if risk is not None:
+        return risk
+
+    days, prices = load_price_matrix(unique_symbols, common_history=False)
+    days, prices = days[-(window + 1):], prices[-(window + 1):]
+    if len(days) == 0:
+        prices = np.full((0, len(unique_symbols)), np.nan)
+    else:
+        # Loading the matrix may have cached the history of new symbols, so use the actual as-of date
+        key = key[:3] + (day_number_to_date(days[-1]),) + key[4:]
+    column_of_symbol = {symbol: column for column, symbol in enumerate(unique_symbols)}
+    prices = prices[:, [column_of_symbol[symbol] for symbol in symbols]]
+
+    shocks = build_shock_matrix([shocks for _, shocks in scenarios], symbols, classifications, betas)
+    result = compute_risk(prices, values, confidence_levels, shocks)
+    total_value = float(values.sum())
+    risk = {
+        'base_currency': base_currency,
+        'total_value': _round(total_value),
+        'window': window,
+        'start_date': day_number_to_date(days[0]).isoformat() if len(days) > 0 else None,
+        'end_date': day_number_to_date(days[-1]).isoformat() if len(days) > 0 else None,
+        'number_of_days': len(result['profits']),
+        'excluded_symbols': sorted({symbol for symbol, included in zip(symbols, result['complete']) if not included}),
+        'missing_rates': missing_rates,
+        'value_at_risk': [
+            dict(confidence_level=level,
+                 var=_round(result['var'][index]) if result['var'] is not None else None,
+                 cvar=_round(result['cvar'][index]) if result['cvar'] is not None else None,
+                 var_percent=round(float(result['var'][index]) / total_value, 4) if result['var'] is not None and total_value else None)
+            for index, level in enumerate(confidence_levels)
+        ],
+        'scenarios': [
+            dict(name=name,
+                 profit=_round(result['scenario_profits'][index]),
+                 percent=round(float(result['scenario_profits'][index]) / total_value, 4) if total_value else None)
+            for index, (name, _) in enumerate(scenarios)
+        ],
+    }
+    risk_cache.set(key, risk)
+    return risk
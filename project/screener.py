@@ -0,0 +1,117 @@
+"""
+Fundamentals screener across every stock tracked by any user.
+
+The screener filters and sorts the `stock_fundamentals` table (one row per
+symbol, with an index on each screenable column), restricted to the symbols in
+any portfolio or watchlist. The pages of results are cached, as the
+fundamentals only change when they are retrieved again (at most once per day).
+"""
+import math
+from sqlalchemy import union
+from project import database
+from project.models import Stock, WatchStock, StockFundamentals
+from project.cache import TTLCache
+
+
+# Screenable fields: (column, scale from the displayed value to the stored integer)
+SCREENER_FIELDS = {
+    'pe_ratio': (StockFundamentals.pe_ratio, 100),
+    'peg_ratio': (StockFundamentals.peg_ratio, 100),
+    'profit_margin': (StockFundamentals.profit_margin, 100),  # percent
+    'beta': (StockFundamentals.beta, 100),
+    'price_to_book_ratio': (StockFundamentals.price_to_book_ratio, 100),
+    'dividend_per_share': (StockFundamentals.dividend_per_share, 100),  # dollars
+    'fiftytwo_week_position': (StockFundamentals.fiftytwo_week_position, 100),  # percent
+}
+SCREENER_RESULT_COLUMNS = ('stock_symbol', 'company_name', 'current_share_price') + tuple(SCREENER_FIELDS)
+
+# Range of the limits (in the stored units) that fit in the integer columns, and the number of pages of results
+MAXIMUM_LIMIT = 2 ** 31 - 1
+MAXIMUM_PAGE = 10_000
+
+# Per-process cache of the pages of screener results, which is cleared when the fundamentals are
+# updated in this process (the entries expire, so updates in other processes are seen within the TTL)
+SCREENER_CACHE_TTL = 300  # seconds
+screener_cache = TTLCache(maxsize=512, ttl=SCREENER_CACHE_TTL)
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def parse_criteria(args):
+    """Return the criteria of a screen from the request arguments (e.g. `pe_ratio_min=5&pe_ratio_max=20`).
+
+    Returns a tuple of (field, minimum, maximum) tuples, where the limits are in the
+    stored units and are None if not specified. Raises a ValueError if a limit is not a finite
+    number or is outside the range of the integer columns.
+    """
+    criteria = []
+    for field, (_, scale) in SCREENER_FIELDS.items():
+        limits = []
+        for suffix in ('min', 'max'):
+            value = args.get(f'{field}_{suffix}', '')
+            if value == '':
+                limits.append(None)
+                continue
+            limit = float(value)
+            if not math.isfinite(limit) or abs(limit * scale) > MAXIMUM_LIMIT:
+                raise ValueError(f'Invalid limit ({field}_{suffix}={value})! Must be a finite number '
+                                 f'between {-MAXIMUM_LIMIT / scale} and {MAXIMUM_LIMIT / scale}.')
+            limits.append(int(round(limit * scale)))
+        if limits != [None, None]:
+            criteria.append((field, *limits))
+    return tuple(criteria)
+
+
+def _format_row(row):
+    result = {'stock_symbol': row.stock_symbol, 'company_name': row.company_name,
+              'current_share_price': row.current_share_price / 100 if row.current_share_price is not None else None}
+    for field, (_, scale) in SCREENER_FIELDS.items():
+        value = getattr(row, field)
+        result[field] = value / scale if value is not None else None
+    return result
+
+
+def screen_stocks(criteria=(), sort='stock_symbol', descending=False, page=1, per_page=25):
+    """Return a page of the tracked stocks matching all of the criteria (suitable for JSON).
+
+    `criteria` is a tuple of (field, minimum, maximum) tuples, as returned by
+    `parse_criteria()`. Stocks without a value for a field used in the criteria
+    are excluded.
+    """
+    if sort != 'stock_symbol' and sort not in SCREENER_FIELDS:
+        raise ValueError(f'Invalid sort field ({sort})!')
+    if not 1 <= page <= MAXIMUM_PAGE:
+        raise ValueError(f'Invalid page ({page})! Must be between 1 and {MAXIMUM_PAGE}.')
+
+    key = (criteria, sort, descending, page, per_page)
+    results = screener_cache.get(key)
+    if results is not None:
+        return results
+
+    tracked_symbols = union(database.session.query(Stock.stock_symbol).statement,
+                            database.session.query(WatchStock.stock_symbol).statement)
+    query = database.session.query(*[getattr(StockFundamentals, column) for column in SCREENER_RESULT_COLUMNS]) \
+        .filter(StockFundamentals.stock_symbol.in_(tracked_symbols))
+    for field, minimum, maximum in criteria:
+        column = SCREENER_FIELDS[field][0]
+        query = query.filter(column.isnot(None))
+        if minimum is not None:
+            query = query.filter(column >= minimum)
+        if maximum is not None:
+            query = query.filter(column <= maximum)
+
+    sort_column = getattr(StockFundamentals, sort)
+    query = query.order_by(sort_column.desc() if descending else sort_column, StockFundamentals.stock_symbol)
+    total = query.order_by(None).count()
+    rows = query.limit(per_page).offset((page - 1) * per_page).all()
+
+    results = {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'stocks': [_format_row(row) for row in rows],
+    }
+    screener_cache.set(key, results)
+    return results
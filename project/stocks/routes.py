@@ -1,11 +1,40 @@
 from . import stocks_blueprint
-from flask import current_app, render_template, request, flash, redirect, url_for, abort
+from flask import current_app, render_template, request, flash, redirect, url_for, abort, Response, stream_with_context, jsonify
 from pydantic import BaseModel, validator, ValidationError
-from project.models import Stock
+from project.models import Stock, User, Transaction, PriceAlert, get_start_of_today, get_tracked_symbols
 from project import database
-# import click
+from project.exports import generate_csv, cents_to_dollars
+from project.prices import retrieve_daily_prices, price_history_cache, day_number_to_date, date_to_day_number
+from project.analytics import get_portfolio_analytics, get_portfolio_value_history
+from project.lots import ACCOUNTING_METHODS, get_positions, get_lot_currency, sell_lots, split_lots
+from project.charts import CHART_RANGES, CHART_RESOLUTIONS, get_chart_data, get_range_start_date
+from project.indicators import INDICATORS, get_indicator, get_indicator_params, get_indicator_overlay
+from project.projections import PROJECTION_METHODS, PROJECTION_HORIZONS, PROJECTION_PATHS, \
+    PROJECTION_PERCENTILES, get_projection, start_projection
+from project.ledger import TRANSACTION_TYPES, get_ledger_summary, record_transaction, record_lot_adjustment, \
+    record_lot_sale, backfill_transactions
+from project.alerts import ALERT_TYPES, check_price_alerts, check_current_price, create_price_alert, delete_price_alert
+from project.dividends import get_dividend_projection
+from project.allocation import get_allocation
+from project.leaderboard import update_leaderboard_scores
+from project.returns import calculate_return_metrics
+from project.risk import RISK_WINDOWS, DEFAULT_CONFIDENCE_LEVELS, MAXIMUM_SCENARIOS, parse_confidence_levels, \
+    parse_scenario, get_portfolio_risk
+from project.fx import SUPPORTED_CURRENCIES, retrieve_fx_rates, get_fx_rates, convert_values, get_portfolio_totals
+import click
 from flask_login import login_required, current_user
 from datetime import datetime
+from typing import List
+from sqlalchemy import or_
+import numpy as np
+
+
+# Indicators that can be overlaid on the price chart of a stock (with the same scale as the prices)
+CHART_OVERLAYS = {
+    'SMA': 'SMA (20)',
+    'EMA': 'EMA (20)',
+    'BBANDS': 'Bollinger Bands',
+}
 
 
 # --------------
@@ -17,6 +46,62 @@ class StockModel(BaseModel):
     stock_symbol: str
     number_of_shares: int
     purchase_price: float
+    currency: str = 'USD'
+
+    @validator('stock_symbol')
+    def stock_symbol_check(cls, value):
+        if not value.isalpha() or len(value) > 5:
+            raise ValueError('Stock symbol must be 1-5 characters')
+        return value.upper()
+
+    @validator('currency')
+    def currency_check(cls, value):
+        if value.upper() not in SUPPORTED_CURRENCIES:
+            raise ValueError(f'Currency must be one of: {", ".join(SUPPORTED_CURRENCIES)}')
+        return value.upper()
+
+
+class TransactionModel(BaseModel):
+    """Class for parsing a new transaction for the ledger from a form."""
+    stock_symbol: str
+    transaction_type: str
+    number_of_shares: int = 0
+    price: float = 0.0
+    split_ratio: float = None
+    accounting_method: str = 'FIFO'
+    lot_ids: List[int] = []
+
+    @validator('stock_symbol')
+    def stock_symbol_check(cls, value):
+        if not value.isalpha() or len(value) > 5:
+            raise ValueError('Stock symbol must be 1-5 characters')
+        return value.upper()
+
+    @validator('transaction_type')
+    def transaction_type_check(cls, value):
+        if value.upper() not in TRANSACTION_TYPES:
+            raise ValueError(f'Transaction type must be one of: {", ".join(TRANSACTION_TYPES)}')
+        return value.upper()
+
+    @validator('accounting_method')
+    def accounting_method_check(cls, value):
+        if value.upper() not in ACCOUNTING_METHODS:
+            raise ValueError(f'Accounting method must be one of: {", ".join(ACCOUNTING_METHODS)}')
+        return value.upper()
+
+    @validator('lot_ids', pre=True)
+    def lot_ids_split(cls, value):
+        # The specific lots are entered as a comma-separated list of lot IDs (e.g. '12, 15')
+        if isinstance(value, str):
+            return [lot_id.strip() for lot_id in value.split(',') if lot_id.strip()]
+        return value
+
+
+class PriceAlertModel(BaseModel):
+    """Class for parsing a new price alert from a form."""
+    stock_symbol: str
+    alert_type: str
+    value: float
 
     @validator('stock_symbol')
     def stock_symbol_check(cls, value):
@@ -24,6 +109,21 @@ class StockModel(BaseModel):
             raise ValueError('Stock symbol must be 1-5 characters')
         return value.upper()
 
+    @validator('alert_type')
+    def alert_type_check(cls, value):
+        if value.upper() not in ALERT_TYPES:
+            raise ValueError(f'Alert type must be one of: {", ".join(ALERT_TYPES)}')
+        return value.upper()
+
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def format_validation_errors(error: ValidationError) -> str:
+    """Return the errors of the form data as a message for the user (e.g. 'stock_symbol: Stock symbol must be 1-5 characters')."""
+    return '; '.join(f'{".".join(str(field) for field in item["loc"])}: {item["msg"]}' for item in error.errors())
+
 
 # -----------------
 # Request Callbacks
@@ -78,6 +178,86 @@ class StockModel(BaseModel):
 #     database.session.commit()
 
 
+@stocks_blueprint.cli.command('update_prices')
+@click.argument('symbols', nargs=-1)
+def update_prices(symbols):
+    """Retrieve the daily prices of the stocks and update the price history cache.
+
+    If no symbols are specified, the prices of every stock in a portfolio or
+    watchlist are updated. The leaderboard scores of the users holding the symbols
+    with new prices are then re-computed.
+    """
+    updated_symbols = []
+    for symbol in (symbols or get_tracked_symbols()):
+        symbol = symbol.upper()
+        _, previous_closes = price_history_cache.get_series(symbol)
+        number_of_days_added = retrieve_daily_prices(symbol)
+        number_of_days_cached = price_history_cache.refresh(symbol)
+
+        # Evaluate the price alerts with the move from the previous latest close to the new latest close
+        _, closes = price_history_cache.get_series(symbol)
+        if len(previous_closes) > 0 and number_of_days_cached > 0:
+            check_price_alerts(symbol, int(round(previous_closes[-1] * 100)), int(round(closes[-1] * 100)))
+            database.session.commit()
+        if number_of_days_cached > 0:
+            updated_symbols.append(symbol)
+        click.echo(f'Updated the daily prices for {symbol} ({number_of_days_added} days added, '
+                   f'{number_of_days_cached} days cached)!')
+
+    if updated_symbols:
+        number_of_scores = update_leaderboard_scores(stock_symbols=updated_symbols)
+        click.echo(f'Updated the leaderboard ({number_of_scores} users ranked)!')
+
+
+@stocks_blueprint.cli.command('update_fx_rates')
+@click.argument('currencies', nargs=-1)
+def update_fx_rates(currencies):
+    """Retrieve the daily exchange rates into USD of the currencies.
+
+    If no currencies are specified, the rates of every currency of a stock in a
+    portfolio (or the base currency of a user) are updated.
+    """
+    if not currencies:
+        query = database.session.query(Stock.currency).union(database.session.query(User.base_currency))
+        currencies = sorted(row[0] for row in query if row[0] != 'USD')
+
+    for currency in currencies:
+        currency = currency.upper()
+        try:
+            number_of_days_added = retrieve_fx_rates(currency)
+            click.echo(f'Updated the exchange rates for {currency} ({number_of_days_added} days added)!')
+        except ValueError as e:
+            click.echo(f'Error! {e}')
+
+
+@stocks_blueprint.cli.command('backfill_ledger')
+def backfill_ledger():
+    """Record a purchase in the transaction ledger for each lot added to a portfolio before the ledger."""
+    number_of_lots = backfill_transactions()
+    database.session.commit()
+    click.echo(f'Recorded {number_of_lots} lots in the transaction ledger!')
+
+
+@stocks_blueprint.cli.command('update_leaderboard')
+@click.argument('symbols', nargs=-1)
+def update_leaderboard(symbols):
+    """Re-compute the leaderboard scores of every user that opted in to the leaderboard.
+
+    If symbols are specified, only the scores of the users holding those symbols are
+    re-computed (e.g. after their prices are updated).
+    """
+    number_of_scores = update_leaderboard_scores(stock_symbols=[symbol.upper() for symbol in symbols] or None)
+    click.echo(f'Updated the leaderboard ({number_of_scores} users ranked)!')
+
+
+@stocks_blueprint.cli.command('update_return_metrics')
+def update_return_metrics():
+    """Calculate the time-weighted and money-weighted returns of every portfolio (run nightly)."""
+    number_of_users = calculate_return_metrics(max_workers=current_app.config['RETURN_METRICS_WORKERS'],
+                                               batch_size=current_app.config['RETURN_METRICS_BATCH_SIZE'])
+    click.echo(f'Updated the returns of {number_of_users} portfolios!')
+
+
 # ------
 # Routes
 # ------
@@ -96,41 +276,355 @@ def add_stock():
             stock_data = StockModel(
                 stock_symbol=request.form['stock_symbol'],
                 number_of_shares=request.form['number_of_shares'],
-                purchase_price=request.form['purchase_price']
+                purchase_price=request.form['purchase_price'],
+                currency=request.form.get('currency') or 'USD'
             )
             print(stock_data)
 
+            # Record the lots added before the ledger existed, so the new lot is added to the full position
+            backfill_transactions(current_user.id)
+
             # Save the form data to the database
             new_stock = Stock(stock_data.stock_symbol,
                               stock_data.number_of_shares,
                               stock_data.purchase_price,
                               current_user.id,
-                              datetime.fromisoformat(request.form['purchase_date']))
+                              datetime.fromisoformat(request.form['purchase_date']),
+                              stock_data.currency)
             database.session.add(new_stock)
+
+            # Record the purchase in the transaction ledger
+            record_transaction(Transaction(current_user.id,
+                                           stock_data.stock_symbol,
+                                           'BUY',
+                                           new_stock.purchase_date,
+                                           stock_data.number_of_shares,
+                                           stock_data.purchase_price))
             database.session.commit()
+            update_leaderboard_scores(user_ids=[current_user.id])
 
             flash(f"Added new stock ({stock_data.stock_symbol})!", 'success')
             current_app.logger.info(f"Added new stock ({request.form['stock_symbol']})!")
             return redirect(url_for('stocks.list_stocks'))
         except ValidationError as e:
             print(e)
+        except ValueError as e:
+            database.session.rollback()
+            flash(f'Error! {e}', 'error')
 
-    return render_template('stocks/add_stock.html')
+    return render_template('stocks/add_stock.html', currencies=SUPPORTED_CURRENCIES)
 
 
 @stocks_blueprint.route('/stocks')
 @login_required
 def list_stocks():
-    stocks = Stock.query.order_by(Stock.id).filter_by(user_id=current_user.id).all()
-
-    current_account_value = 0.0
-    for stock in stocks:
+    # Only the stocks with a stale current price are loaded as full entities, as they need to be updated
+    stale_stocks = Stock.query.filter_by(user_id=current_user.id).filter(
+        or_(Stock.current_price_date.is_(None), Stock.current_price_date < get_start_of_today())).all()
+    price_updates = []
+    for stock in stale_stocks:
+        previous_price, previous_price_date = stock.current_price, stock.current_price_date
         stock.get_stock_data()
         database.session.add(stock)
-        current_account_value += stock.get_stock_position_value()
+        # Only the prices that were actually retrieved are checked (a failed retrieval leaves the stale price)
+        if stock.current_price_date != previous_price_date:
+            price_updates.append((stock.stock_symbol, previous_price, stock.current_price))
+    for symbol, _, current_price in price_updates:
+        check_current_price(symbol, current_price)
+    database.session.commit()
+
+    # Only the score of the current user is updated with the new prices, as the scores of the other
+    # users holding the same symbols are updated by the 'update_prices' command
+    if any(current_price != previous_price for _, previous_price, current_price in price_updates):
+        update_leaderboard_scores(user_ids=[current_user.id])
+
+    # The portfolio table only needs a subset of the columns, so the rows are read as lightweight tuples
+    stocks = database.session.query(Stock.id,
+                                    Stock.stock_symbol,
+                                    Stock.number_of_shares,
+                                    Stock.purchase_price,
+                                    Stock.purchase_date,
+                                    Stock.current_price,
+                                    Stock.position_value,
+                                    Stock.currency).filter_by(user_id=current_user.id).order_by(Stock.id).all()
+
+    # Convert the value of each holding into the base currency of the user (NaN if a rate is not available)
+    base_currency = current_user.base_currency
+    converted_values = convert_values([stock.position_value for stock in stocks], [stock.currency for stock in stocks],
+                                      base_currency, get_fx_rates()) / 100
+    # The holdings without a rate are excluded from the total value, and their currencies are listed on the page
+    missing_rates = sorted({stock.currency for stock, value in zip(stocks, converted_values) if np.isnan(value)})
+    current_account_value = float(np.sum(converted_values[~np.isnan(converted_values)]))
+
+    # The positions are derived from the transaction ledger (including the lots added before the ledger existed),
+    # with the number of lots of each stock in the portfolio
+    if backfill_transactions(current_user.id):
+        database.session.commit()
+    positions = [position for position in get_ledger_summary(current_user.id) if position.number_of_shares > 0]
+    number_of_lots = {position.stock_symbol: position.number_of_lots for position in get_positions(current_user.id)}
+    analytics = get_portfolio_analytics(current_user.id, base_currency=base_currency)
+    risk = get_portfolio_risk(current_user.id, base_currency)
+
+    labels = []
+    values = []
+    value_history = get_portfolio_value_history(current_user.id, base_currency)
+    if value_history is not None:
+        labels = [day_number_to_date(day) for day in value_history[0]]
+        values = [round(float(value), 2) for value in value_history[1]]
+
+    return render_template('stocks/stocks.html', stocks=stocks, value=round(current_account_value, 2),
+                           base_currency=base_currency, missing_rates=missing_rates,
+                           converted_values=[None if np.isnan(value) else value for value in converted_values],
+                           positions=positions, number_of_lots=number_of_lots, analytics=analytics, risk=risk,
+                           labels=labels, values=values)
+
+
+@stocks_blueprint.route('/stocks/totals')
+@login_required
+def portfolio_totals():
+    return jsonify(get_portfolio_totals(current_user.id, current_user.base_currency))
+
+
+@stocks_blueprint.route('/stocks/allocation')
+@login_required
+def portfolio_allocation():
+    return jsonify(get_allocation(current_user.id, current_user.base_currency))
+
+
+@stocks_blueprint.route('/stocks/analytics')
+@login_required
+def portfolio_analytics():
+    analytics = get_portfolio_analytics(current_user.id, base_currency=current_user.base_currency)
+    if analytics is None:
+        return jsonify({'error': 'Not enough price history to compute the portfolio analytics.'}), 404
+    return jsonify(analytics)
+
+
+def get_risk_parameters():
+    """Return the (confidence levels, window, scenarios) of the risk of a portfolio from the request arguments.
+
+    Each non-empty line of the `scenarios` argument is a scenario (e.g. 'Technology -20%, market -5%').
+    """
+    confidence_levels = request.args.get('confidence_levels', '')
+    window = request.args.get('window', 252, type=int)
+    lines = [line.strip() for line in request.args.get('scenarios', '').splitlines() if line.strip()]
+    if window not in RISK_WINDOWS or len(lines) > MAXIMUM_SCENARIOS:
+        raise ValueError(f'Invalid window ({window}) or too many scenarios (maximum of {MAXIMUM_SCENARIOS})!')
+    confidence_levels = parse_confidence_levels(confidence_levels) if confidence_levels else DEFAULT_CONFIDENCE_LEVELS
+    return confidence_levels, window, tuple((line, parse_scenario(line)) for line in lines)
+
+
+@stocks_blueprint.route('/stocks/risk')
+@login_required
+def portfolio_risk():
+    risk = None
+    try:
+        confidence_levels, window, scenarios = get_risk_parameters()
+        risk = get_portfolio_risk(current_user.id, current_user.base_currency, confidence_levels, window, scenarios)
+    except ValueError as e:
+        flash(f'Error! {e}', 'error')
+        confidence_levels, window = DEFAULT_CONFIDENCE_LEVELS, 252
+    return render_template('stocks/risk.html', risk=risk, windows=RISK_WINDOWS, window=window,
+                           confidence_levels=', '.join(f'{level * 100:g}' for level in confidence_levels),
+                           scenarios=request.args.get('scenarios', ''))
+
+
+@stocks_blueprint.route('/stocks/risk.json')
+@login_required
+def portfolio_risk_json():
+    try:
+        risk = get_portfolio_risk(current_user.id, current_user.base_currency, *get_risk_parameters())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if risk is None:
+        return jsonify({'error': 'The portfolio is empty.'}), 404
+    return jsonify(risk)
+
+
+@stocks_blueprint.route('/stocks/dividends')
+@login_required
+def dividend_income():
+    projection = get_dividend_projection(current_user.id, current_user.base_currency)
+    return render_template('stocks/dividends.html', projection=projection)
 
+
+@stocks_blueprint.route('/stocks/dividends.json')
+@login_required
+def dividend_income_json():
+    return jsonify(get_dividend_projection(current_user.id, current_user.base_currency))
+
+
+@stocks_blueprint.route('/stocks/transactions')
+@login_required
+def list_transactions():
+    if backfill_transactions(current_user.id):
+        database.session.commit()
+    positions = get_ledger_summary(current_user.id)
+    transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.id.desc()).limit(50).all()
+    return render_template('stocks/transactions.html', positions=positions, transactions=transactions)
+
+
+@stocks_blueprint.route('/stocks/transactions/add', methods=['GET', 'POST'])
+@login_required
+def add_transaction():
+    if request.method == 'POST':
+        try:
+            transaction_data = TransactionModel(
+                stock_symbol=request.form['stock_symbol'],
+                transaction_type=request.form['transaction_type'],
+                number_of_shares=request.form.get('number_of_shares') or 0,
+                price=request.form.get('price') or 0.0,
+                split_ratio=request.form.get('split_ratio') or None,
+                accounting_method=request.form.get('accounting_method') or 'FIFO',
+                lot_ids=request.form.get('lot_ids', '')
+            )
+
+            backfill_transactions(current_user.id)
+            transaction = Transaction(current_user.id,
+                                      transaction_data.stock_symbol,
+                                      transaction_data.transaction_type,
+                                      datetime.fromisoformat(request.form['transaction_date']),
+                                      transaction_data.number_of_shares,
+                                      transaction_data.price,
+                                      transaction_data.split_ratio)
+            record_transaction(transaction)
+
+            # Apply the purchase, sale, or split to the lots in the portfolio, so they stay consistent with the ledger
+            if transaction.transaction_type == 'BUY':
+                database.session.add(Stock(transaction.stock_symbol,
+                                           transaction.number_of_shares,
+                                           transaction_data.price,
+                                           current_user.id,
+                                           transaction.transaction_date,
+                                           get_lot_currency(current_user.id, transaction.stock_symbol)))
+            elif transaction.transaction_type == 'SELL':
+                sell_lots(current_user.id, transaction.stock_symbol, transaction.number_of_shares,
+                          transaction_data.accounting_method, transaction_data.lot_ids)
+            elif transaction.transaction_type == 'SPLIT':
+                split_lots(current_user.id, transaction.stock_symbol, transaction.split_ratio)
+            database.session.commit()
+            update_leaderboard_scores(user_ids=[current_user.id])
+
+            flash(f'Recorded {transaction_data.transaction_type} transaction ({transaction_data.stock_symbol})!', 'success')
+            current_app.logger.info(f'Recorded {transaction_data.transaction_type} transaction '
+                                    f'({transaction_data.stock_symbol}) for user: {current_user.id}')
+            return redirect(url_for('stocks.list_transactions'))
+        except ValidationError as e:
+            flash(f'Error! Invalid transaction ({format_validation_errors(e)})!', 'error')
+            current_app.logger.warning(f'Invalid transaction for user {current_user.id}: {format_validation_errors(e)}')
+        except ValueError as e:
+            database.session.rollback()
+            flash(f'Error! {e}', 'error')
+
+    return render_template('stocks/add_transaction.html', transaction_types=TRANSACTION_TYPES,
+                           accounting_methods=ACCOUNTING_METHODS)
+
+
+@stocks_blueprint.route('/stocks/alerts', methods=['GET', 'POST'])
+@login_required
+def list_price_alerts():
+    if request.method == 'POST':
+        try:
+            alert_data = PriceAlertModel(
+                stock_symbol=request.form['stock_symbol'],
+                alert_type=request.form['alert_type'],
+                value=request.form['value']
+            )
+
+            create_price_alert(current_user.id, alert_data.stock_symbol, alert_data.alert_type, alert_data.value)
+            database.session.commit()
+
+            flash(f'Added price alert ({alert_data.stock_symbol})!', 'success')
+            current_app.logger.info(f'Added price alert ({alert_data.stock_symbol}) for user: {current_user.id}')
+            return redirect(url_for('stocks.list_price_alerts'))
+        except ValidationError as e:
+            flash(f'Error! Invalid price alert ({format_validation_errors(e)})!', 'error')
+            current_app.logger.warning(f'Invalid price alert for user {current_user.id}: {format_validation_errors(e)}')
+        except ValueError as e:
+            database.session.rollback()
+            flash(f'Error! {e}', 'error')
+
+    alerts = PriceAlert.query.filter_by(user_id=current_user.id) \
+        .order_by(PriceAlert.triggered_on.isnot(None), PriceAlert.stock_symbol, PriceAlert.threshold).all()
+    return render_template('stocks/alerts.html', alerts=alerts, alert_types=ALERT_TYPES)
+
+
+@stocks_blueprint.route('/stocks/alerts/<id>/delete')
+@login_required
+def delete_alert(id):
+    alert = PriceAlert.query.filter_by(id=id).first_or_404()
+
+    if alert.user_id != current_user.id:
+        abort(403)
+
+    delete_price_alert(alert)
     database.session.commit()
-    return render_template('stocks/stocks.html', stocks=stocks, value=round(current_account_value, 2))
+    flash(f'Price alert ({alert.stock_symbol}) was deleted!', 'success')
+    current_app.logger.info(f'Price alert ({alert.stock_symbol}) was deleted for user: {current_user.id}!')
+    return redirect(url_for('stocks.list_price_alerts'))
+
+
+def get_projection_parameters():
+    method = request.values.get('method', 'bootstrap')
+    horizon = request.values.get('horizon', 252, type=int)
+    number_of_paths = request.values.get('paths', 10_000, type=int)
+    if method not in PROJECTION_METHODS or horizon not in PROJECTION_HORIZONS or number_of_paths not in PROJECTION_PATHS:
+        abort(400)
+    return method, horizon, number_of_paths
+
+
+@stocks_blueprint.route('/stocks/projection', methods=['GET', 'POST'])
+@login_required
+def portfolio_projection():
+    method, horizon, number_of_paths = get_projection_parameters()
+
+    if request.method == 'POST':
+        # The simulation runs as a background job, so the page is reloaded until the results are available
+        if start_projection(current_user.id, method, horizon, number_of_paths, current_user.base_currency) is None:
+            flash('Error! Not enough price history to project the portfolio value.', 'error')
+        else:
+            current_app.logger.info(f'Started the projection ({number_of_paths} paths) for user: {current_user.id}')
+        return redirect(url_for('stocks.portfolio_projection', method=method, horizon=horizon, paths=number_of_paths))
+
+    projection = get_projection(current_user.id, method, horizon, number_of_paths, current_user.base_currency)
+    return render_template('stocks/projection.html', projection=projection, method=method, horizon=horizon,
+                           base_currency=current_user.base_currency,
+                           number_of_paths=number_of_paths, methods=PROJECTION_METHODS, horizons=PROJECTION_HORIZONS,
+                           paths=PROJECTION_PATHS, percentiles=PROJECTION_PERCENTILES)
+
+
+@stocks_blueprint.route('/stocks/projection.json')
+@login_required
+def portfolio_projection_json():
+    projection = get_projection(current_user.id, *get_projection_parameters(), current_user.base_currency)
+    if projection is None:
+        return jsonify({'status': 'not_started', 'result': None}), 404
+    return jsonify(projection)
+
+
+@stocks_blueprint.route('/stocks/export.csv')
+@login_required
+def export_stocks():
+    query = database.session.query(Stock.stock_symbol,
+                                   Stock.number_of_shares,
+                                   Stock.purchase_price,
+                                   Stock.purchase_date,
+                                   Stock.current_price,
+                                   Stock.position_value).filter_by(user_id=current_user.id).order_by(Stock.id)
+    header = ['stock_symbol', 'number_of_shares', 'purchase_price', 'purchase_date', 'current_price', 'position_value']
+
+    def convert_row(row):
+        return (row.stock_symbol,
+                row.number_of_shares,
+                cents_to_dollars(row.purchase_price),
+                row.purchase_date,
+                cents_to_dollars(row.current_price),
+                cents_to_dollars(row.position_value))
+
+    current_app.logger.info(f'Exporting the portfolio for user: {current_user.id}')
+    return Response(stream_with_context(generate_csv(query, header, convert_row)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=portfolio.csv'})
 
 
 @stocks_blueprint.route("/chartjs_demo1")
@@ -169,8 +663,62 @@ def stock_details(id):
     if stock.user_id != current_user.id:
         abort(403)
 
-    title, labels, values = stock.get_weekly_stock_data()
-    return render_template('stocks/stock_details.html', stock=stock, title=title, labels=labels, values=values)
+    chart_range = request.args.get('range', '6M')
+    resolution = request.args.get('resolution', 'daily')
+    overlay = request.args.get('overlay', '')
+    if chart_range not in CHART_RANGES or resolution not in CHART_RESOLUTIONS or \
+            (overlay and overlay not in CHART_OVERLAYS):
+        abort(400)
+
+    # Chart the stored prices over the selected range, otherwise retrieve the weekly prices from Alpha Vantage
+    overlay_values = {}
+    days, labels, values = get_chart_data(stock.stock_symbol, chart_range, resolution)
+    if labels:
+        title = f'{resolution.capitalize()} Prices ({stock.stock_symbol})'
+        if overlay:
+            overlay_values = get_indicator_overlay(stock.stock_symbol, overlay, days)
+    else:
+        title, labels, values = stock.get_weekly_stock_data()
+        labels = [label.strftime('%m/%d/%Y') for label in labels]
+        values = [float(value) for value in values]
+    return render_template('stocks/stock_details.html', stock=stock, title=title, labels=labels, values=values,
+                           chart_range=chart_range, resolution=resolution, overlay=overlay,
+                           overlay_values=overlay_values, chart_ranges=CHART_RANGES,
+                           chart_resolutions=CHART_RESOLUTIONS, chart_overlays=CHART_OVERLAYS)
+
+
+@stocks_blueprint.route('/stocks/<id>/indicators')
+@login_required
+def stock_indicators(id):
+    stock = Stock.query.filter_by(id=id).first_or_404()
+
+    if stock.user_id != current_user.id:
+        abort(403)
+
+    name = request.args.get('name', 'SMA').upper()
+    chart_range = request.args.get('range', '6M')
+    if name not in INDICATORS or chart_range not in CHART_RANGES:
+        abort(400)
+
+    try:
+        params = get_indicator_params(name, **{key: request.args.get(key) for key in INDICATORS[name]})
+    except ValueError:
+        abort(400)
+
+    days, outputs = get_indicator(stock.stock_symbol, name, **params)
+    if len(days) == 0:
+        return jsonify({'error': f'No price history is available for {stock.stock_symbol}.'}), 404
+
+    start_date = get_range_start_date(day_number_to_date(days[-1]), chart_range)
+    first_row = 0 if start_date is None else int(np.searchsorted(days, date_to_day_number(start_date)))
+    return jsonify({
+        'symbol': stock.stock_symbol,
+        'indicator': name,
+        'params': params,
+        'dates': [day_number_to_date(day).isoformat() for day in days[first_row:]],
+        **{output: [None if np.isnan(value) else round(float(value), 4) for value in values[first_row:]]
+           for output, values in outputs.items()},
+    })
 
 
 @stocks_blueprint.route('/stocks/<id>/delete')
@@ -181,8 +729,18 @@ def delete_stock(id):
     if stock.user_id != current_user.id:
         abort(403)
 
+    # Deleting a lot records the sale of its shares in the transaction ledger
+    try:
+        backfill_transactions(current_user.id)
+        record_lot_sale(stock, datetime.now())
+    except ValueError as e:
+        database.session.rollback()
+        flash(f'Error! {e}', 'error')
+        return redirect(url_for('stocks.list_stocks'))
+
     database.session.delete(stock)
     database.session.commit()
+    update_leaderboard_scores(user_ids=[current_user.id])
     flash(f'Stock ({stock.stock_symbol}) was deleted!', 'success')
     current_app.logger.info(f'Stock ({stock.stock_symbol}) was deleted for user: {current_user.id}!')
     return redirect(url_for('stocks.list_stocks'))
@@ -197,15 +755,26 @@ def edit_stock(id):
         abort(403)
 
     if request.method == 'POST':
-        # Edit the stock data in the database
-        stock.update(request.form['number_of_shares'],
-                     request.form['purchase_price'],
-                     datetime.fromisoformat(request.form['purchase_date']))
-        database.session.add(stock)
-        database.session.commit()
+        # Edit the stock data in the database, and record the change of the lot in the transaction ledger
+        try:
+            backfill_transactions(current_user.id)
+            original_number_of_shares, original_purchase_price = stock.number_of_shares, stock.purchase_price
+            stock.update(request.form['number_of_shares'],
+                         request.form['purchase_price'],
+                         datetime.fromisoformat(request.form['purchase_date']))
+            if stock.number_of_shares <= 0:
+                raise ValueError(f'Invalid number of shares ({stock.number_of_shares})!')
+            record_lot_adjustment(stock, original_number_of_shares, original_purchase_price)
+            database.session.add(stock)
+            database.session.commit()
+            update_leaderboard_scores(user_ids=[current_user.id])
 
-        flash(f'Stock ({ stock.stock_symbol }) was updated!', 'success')
-        current_app.logger.info(f'Stock ({ stock.stock_symbol }) was updated by user: { current_user.id}')
-        return redirect(url_for('stocks.list_stocks'))
+            flash(f'Stock ({ stock.stock_symbol }) was updated!', 'success')
+            current_app.logger.info(f'Stock ({ stock.stock_symbol }) was updated by user: { current_user.id}')
+            return redirect(url_for('stocks.list_stocks'))
+        except ValueError as e:
+            database.session.rollback()
+            flash(f'Error! {e}', 'error')
+            stock = Stock.query.filter_by(id=id).first_or_404()
 
     return render_template('stocks/edit_stock.html', stock=stock)
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField
 from wtforms.validators import DataRequired, Length, Email
+from project.fx import SUPPORTED_CURRENCIES
 
 
 class RegistrationForm(FlaskForm):
@@ -30,3 +31,13 @@ class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Current Password', validators=[DataRequired()])
     new_password = PasswordField('New Password', validators=[DataRequired()])
     submit = SubmitField('Submit')
+
+
+class BaseCurrencyForm(FlaskForm):
+    base_currency = SelectField('Base Currency', choices=SUPPORTED_CURRENCIES, validators=[DataRequired()])
+    submit = SubmitField('Update')
+
+
+class LeaderboardForm(FlaskForm):
+    leaderboard_opt_in = BooleanField('Rank my portfolio return on the leaderboard')
+    submit = SubmitField('Update')
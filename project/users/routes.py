@@ -1,7 +1,9 @@
 from . import users_blueprint
-from flask import render_template, flash, abort, request, current_app, redirect, url_for, escape, copy_current_request_context
-from .forms import RegistrationForm, LoginForm, EmailForm, PasswordForm, ChangePasswordForm
-from project.models import User
+from flask import render_template, flash, abort, request, current_app, redirect, url_for, escape, copy_current_request_context, jsonify
+from .forms import RegistrationForm, LoginForm, EmailForm, PasswordForm, ChangePasswordForm, BaseCurrencyForm, LeaderboardForm
+from project.models import User, ReturnMetrics
+from project.allocation import get_allocation
+from project.leaderboard import get_leaderboard, update_leaderboard_scores
 from project import database, mail
 from sqlalchemy.exc import IntegrityError
 from flask_login import login_user, current_user, login_required, logout_user
@@ -143,7 +145,66 @@ def logout():
 @users_blueprint.route('/profile')
 @login_required
 def user_profile():
-    return render_template('users/profile.html')
+    form = BaseCurrencyForm(base_currency=current_user.base_currency)
+    allocation = get_allocation(current_user.id, current_user.base_currency)
+    leaderboard_form = LeaderboardForm(leaderboard_opt_in=current_user.leaderboard_opt_in)
+    return_metrics = ReturnMetrics.query.get(current_user.id)
+    return render_template('users/profile.html', form=form, allocation=allocation, leaderboard_form=leaderboard_form,
+                           return_metrics=return_metrics)
+
+
+@users_blueprint.route('/base_currency', methods=['POST'])
+@login_required
+def change_base_currency():
+    form = BaseCurrencyForm()
+
+    if form.validate_on_submit():
+        # Load the full User object, as `current_user` may only be the cached identity of the user
+        user = User.query.get(current_user.id)
+        user.base_currency = form.base_currency.data
+        database.session.add(user)
+        database.session.commit()
+        flash(f'Base currency has been updated to {form.base_currency.data}!', 'success')
+        current_app.logger.info(f'Base currency updated to {form.base_currency.data} for user: {current_user.email}')
+    else:
+        flash('ERROR! Invalid base currency!', 'error')
+    return redirect(url_for('users.user_profile'))
+
+
+@users_blueprint.route('/leaderboard_opt_in', methods=['POST'])
+@login_required
+def change_leaderboard_opt_in():
+    form = LeaderboardForm()
+
+    if form.validate_on_submit():
+        # Load the full User object, as `current_user` may only be the cached identity of the user
+        user = User.query.get(current_user.id)
+        user.leaderboard_opt_in = form.leaderboard_opt_in.data
+        database.session.add(user)
+        database.session.commit()
+        update_leaderboard_scores(user_ids=[user.id])
+        if user.leaderboard_opt_in:
+            flash('Your portfolio return is now ranked on the leaderboard!', 'success')
+        else:
+            flash('Your portfolio return has been removed from the leaderboard!', 'success')
+        current_app.logger.info(f'Leaderboard opt-in updated to {user.leaderboard_opt_in} for user: {current_user.email}')
+    else:
+        flash('ERROR! Invalid leaderboard setting!', 'error')
+    return redirect(url_for('users.user_profile'))
+
+
+@users_blueprint.route('/leaderboard')
+@login_required
+def leaderboard():
+    return render_template('users/leaderboard.html',
+                           leaderboard=get_leaderboard(current_app.config['LEADERBOARD_SIZE'], current_user.id))
+
+
+@users_blueprint.route('/leaderboard.json')
+@login_required
+def leaderboard_json():
+    number_of_users = request.args.get('n', current_app.config['LEADERBOARD_SIZE'], type=int)
+    return jsonify(get_leaderboard(max(1, min(number_of_users, 100)), current_user.id))
 
 
 @users_blueprint.route('/confirm/<token>')
@@ -235,9 +296,11 @@ def change_password():
     form = ChangePasswordForm()
 
     if form.validate_on_submit():
-        if current_user.is_password_correct(form.current_password.data):
-            current_user.set_password(form.new_password.data)
-            database.session.add(current_user)
+        # Load the full User object, as `current_user` may only be the cached identity of the user
+        user = User.query.get(current_user.id)
+        if user.is_password_correct(form.current_password.data):
+            user.set_password(form.new_password.data)
+            database.session.add(user)
             database.session.commit()
             flash('Password has been updated!', 'success')
             current_app.logger.info(f'Password updated for user: {current_user.email}')
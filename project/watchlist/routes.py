@@ -1,21 +1,72 @@
 from . import watchlist_blueprint
-from flask import render_template, request, flash, current_app, redirect, url_for, abort
+from flask import render_template, request, flash, current_app, redirect, url_for, abort, Response, stream_with_context, jsonify
 from flask_login import login_required, current_user
 from .forms import WatchStockForm
 from project import database
-from project.models import WatchStock
+from project.models import WatchStock, WatchStockRow, get_start_of_today, save_stock_fundamentals, \
+    get_tracked_symbols
+from sqlalchemy import or_
+from project.exports import generate_ndjson, cents_to_dollars
+from project.analytics import CORRELATION_WINDOWS, TRADING_DAYS_PER_YEAR, get_correlation_matrix
+from project.screener import SCREENER_FIELDS, MAXIMUM_PAGE, parse_criteria, screen_stocks, screener_cache
+from project.alerts import check_current_price
+from project.frontier import FRONTIER_WINDOWS, get_frontier, start_frontier
+import click
 
 
+# ------------
+# CLI Commands
+# ------------
+
+@watchlist_blueprint.cli.command('update_fundamentals')
+def update_fundamentals():
+    """Retrieve the fundamentals of every tracked stock without up-to-date fundamentals."""
+    for symbol in get_tracked_symbols():
+        watchstock = WatchStock.query.filter_by(stock_symbol=symbol).order_by(WatchStock.stock_data_date.desc()).first()
+        if watchstock is None or watchstock.stock_data_date is None:
+            # Stocks that are only in a portfolio are retrieved without being added to any watchlist
+            watchstock = WatchStock(symbol, None)
+            watchstock.retrieve_current_share_price()
+            watchstock.retrieve_stock_analysis_data()
+
+        save_stock_fundamentals(watchstock)
+        database.session.commit()
+        click.echo(f'Updated the fundamentals for {symbol}!')
+
+
+# ------
+# Routes
+# ------
+
 @watchlist_blueprint.route('/watchlist')
 @login_required
 def watchlist():
-    watchstocks = WatchStock.query.order_by(WatchStock.id).filter_by(user_id=current_user.id).all()
-    for watchstock in watchstocks:
+    # Only the watchstocks with stale data are loaded as full entities, as they need to be updated
+    start_of_today = get_start_of_today()
+    stale_watchstocks = WatchStock.query.filter_by(user_id=current_user.id).filter(
+        or_(WatchStock.current_share_price_date.is_(None),
+            WatchStock.current_share_price_date < start_of_today,
+            WatchStock.stock_data_date.is_(None),
+            WatchStock.stock_data_date < start_of_today)).all()
+    price_updates = []
+    for watchstock in stale_watchstocks:
+        previous_price_date = watchstock.current_share_price_date
         watchstock.retrieve_current_share_price()
         watchstock.retrieve_stock_analysis_data()
         database.session.add(watchstock)
+        save_stock_fundamentals(watchstock)
+        # Only the prices that were actually retrieved are checked (a failed retrieval leaves the stale price)
+        if watchstock.current_share_price_date != previous_price_date:
+            price_updates.append((watchstock.stock_symbol, watchstock.current_share_price))
+    for symbol, current_price in price_updates:
+        check_current_price(symbol, current_price)
     database.session.commit()
+    if stale_watchstocks:
+        screener_cache.clear()
 
+    # The watchlist table only needs a subset of the columns, so the rows are read as lightweight objects
+    rows = database.session.query(*WatchStockRow.query_columns()).filter_by(user_id=current_user.id).order_by(WatchStock.id)
+    watchstocks = [WatchStockRow(row) for row in rows]
     return render_template('watchlist/watchlist.html', watchstocks=watchstocks)
 
 
@@ -52,6 +103,145 @@ def delete_watch_stock(id):
     return redirect(url_for('watchlist.watchlist'))
 
 
+@watchlist_blueprint.route('/watchlist/export.ndjson')
+@login_required
+def export_watchlist():
+    query = database.session.query(WatchStock.stock_symbol,
+                                   WatchStock.company_name,
+                                   WatchStock.current_share_price,
+                                   WatchStock.fiftytwo_week_low,
+                                   WatchStock.fiftytwo_week_high,
+                                   WatchStock.market_cap,
+                                   WatchStock.dividend_per_share,
+                                   WatchStock.pe_ratio,
+                                   WatchStock.peg_ratio,
+                                   WatchStock.profit_margin,
+                                   WatchStock.beta,
+                                   WatchStock.price_to_book_ratio,
+                                   WatchStock.stock_data_date).filter_by(user_id=current_user.id).order_by(WatchStock.id)
+    keys = ['stock_symbol', 'company_name', 'current_share_price', 'fiftytwo_week_low', 'fiftytwo_week_high',
+            'market_cap', 'dividend_per_share', 'pe_ratio', 'peg_ratio', 'profit_margin', 'beta',
+            'price_to_book_ratio', 'stock_data_date']
+
+    def convert_row(row):
+        return (row.stock_symbol,
+                row.company_name,
+                cents_to_dollars(row.current_share_price),
+                cents_to_dollars(row.fiftytwo_week_low),
+                cents_to_dollars(row.fiftytwo_week_high),
+                row.market_cap,
+                cents_to_dollars(row.dividend_per_share),
+                cents_to_dollars(row.pe_ratio),
+                cents_to_dollars(row.peg_ratio),
+                cents_to_dollars(row.profit_margin),
+                cents_to_dollars(row.beta),
+                cents_to_dollars(row.price_to_book_ratio),
+                row.stock_data_date)
+
+    current_app.logger.info(f'Exporting the watchlist for user: {current_user.id}')
+    return Response(stream_with_context(generate_ndjson(query, keys, convert_row)),
+                    mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=watchlist.ndjson'})
+
+
+def get_correlation_window() -> int:
+    window = request.args.get('window', TRADING_DAYS_PER_YEAR, type=int)
+    if window not in CORRELATION_WINDOWS:
+        abort(400)
+    return window
+
+
+@watchlist_blueprint.route('/watchlist/correlation')
+@login_required
+def correlation():
+    window = get_correlation_window()
+    matrices = get_correlation_matrix(current_user.id, window)
+    return render_template('watchlist/correlation.html', matrices=matrices, window=window, windows=CORRELATION_WINDOWS)
+
+
+@watchlist_blueprint.route('/watchlist/correlation.json')
+@login_required
+def correlation_json():
+    matrices = get_correlation_matrix(current_user.id, get_correlation_window())
+    if matrices is None:
+        return jsonify({'error': 'Not enough price history to compute the correlation matrix.'}), 404
+    return jsonify(matrices)
+
+
+def get_frontier_parameters():
+    """Return the (symbols, window) of an efficient frontier, where the symbols must be in the user's watchlist."""
+    symbols = sorted({symbol.upper() for symbol in request.values.getlist('symbols')})
+    window = request.values.get('window', TRADING_DAYS_PER_YEAR, type=int)
+    watchlist_symbols = get_watchlist_symbols(current_user.id)
+    if window not in FRONTIER_WINDOWS or not set(symbols) <= set(watchlist_symbols):
+        abort(400)
+    return symbols, window
+
+
+def get_watchlist_symbols(user_id: int):
+    rows = database.session.query(WatchStock.stock_symbol).filter_by(user_id=user_id).distinct()
+    return sorted(row[0] for row in rows)
+
+
+@watchlist_blueprint.route('/watchlist/frontier', methods=['GET', 'POST'])
+@login_required
+def efficient_frontier():
+    symbols, window = get_frontier_parameters()
+
+    if request.method == 'POST':
+        # The optimization runs as a background job, so the page is reloaded until the results are available
+        try:
+            start_frontier(symbols, window)
+            current_app.logger.info(f'Started the efficient frontier of {", ".join(symbols)} for user: {current_user.id}')
+        except ValueError as e:
+            flash(f'Error! {e}', 'error')
+        return redirect(url_for('watchlist.efficient_frontier', symbols=symbols, window=window))
+
+    frontier = get_frontier(symbols, window) if len(symbols) >= 2 else None
+    return render_template('watchlist/frontier.html', frontier=frontier, symbols=symbols, window=window,
+                           watchlist_symbols=get_watchlist_symbols(current_user.id), windows=FRONTIER_WINDOWS)
+
+
+@watchlist_blueprint.route('/watchlist/frontier.json')
+@login_required
+def efficient_frontier_json():
+    frontier = get_frontier(*get_frontier_parameters())
+    if frontier is None:
+        return jsonify({'status': 'not_started', 'result': None, 'error': None}), 404
+    return jsonify(frontier)
+
+
+def get_screen_parameters():
+    try:
+        criteria = parse_criteria(request.args)
+    except ValueError:
+        abort(400)
+
+    sort = request.args.get('sort', 'stock_symbol')
+    if sort != 'stock_symbol' and sort not in SCREENER_FIELDS:
+        abort(400)
+    descending = request.args.get('order', 'asc') == 'desc'
+    page = max(request.args.get('page', 1, type=int), 1)
+    if page > MAXIMUM_PAGE:
+        abort(400)
+    return criteria, sort, descending, page
+
+
+@watchlist_blueprint.route('/screener')
+@login_required
+def screener():
+    criteria, sort, descending, page = get_screen_parameters()
+    results = screen_stocks(criteria, sort, descending, page)
+    return render_template('watchlist/screener.html', results=results, fields=SCREENER_FIELDS, sort=sort,
+                           descending=descending)
+
+
+@watchlist_blueprint.route('/screener.json')
+@login_required
+def screener_json():
+    return jsonify(screen_stocks(*get_screen_parameters()))
+
+
 @watchlist_blueprint.route('/stock_analysis_guide')
 def stock_analysis_guide():
     return render_template('watchlist/stock_analysis_guide.html')
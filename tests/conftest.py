@@ -1,8 +1,9 @@
 import pytest
 from project import create_app, database
 from flask import current_app
-from project.models import Stock, User, WatchStock
-from datetime import datetime
+from project.models import Stock, User, WatchStock, DailyPrice
+from project.prices import price_history_cache
+from datetime import datetime, date
 import requests
 
 
@@ -71,6 +72,8 @@ class MockSuccessResponseOverview(object):
             'AssetType': 'Common Stock',
             'Name': 'Costco Wholesale Corporation',
             'Currency': 'USD',
+            'Sector': 'TRADE & SERVICES',
+            'Industry': 'RETAIL-VARIETY STORES',
             'MarketCapitalization': '160300990464',
             'PERatio': '37.155',
             'PEGRatio': '3.9329',
@@ -147,9 +150,10 @@ def new_user():
 
 
 @pytest.fixture(scope='module')
-def test_client():
+def test_client(tmp_path_factory):
     flask_app = create_app()
     flask_app.config.from_object('config.TestingConfig')
+    flask_app.config['PRICE_CACHE_FOLDER'] = str(tmp_path_factory.mktemp('price_cache'))
     flask_app.extensions['mail'].suppress = True
 
     # Create a test client using the Flask application configured for testing
@@ -420,3 +424,26 @@ def add_watch_stocks_for_default_user(test_client, log_in_default_user):
     test_client.post('/watchlist/add_watch_stock',
                      data={'stock_symbol': 'QCOM'})
     return
+
+
+@pytest.fixture(scope='function')
+def price_history(tmp_path):
+    flask_app = create_app()
+    flask_app.config.from_object('config.TestingConfig')
+    flask_app.config['PRICE_CACHE_FOLDER'] = str(tmp_path)
+
+    # Establish an application context before accessing the database and the price history cache
+    with flask_app.app_context():
+        database.create_all()
+
+        # Add the daily prices for two stocks on every weekday in July 2020
+        for day in range(1, 32):
+            price_date = date(2020, 7, day)
+            if price_date.weekday() < 5:
+                database.session.add(DailyPrice('AAPL', price_date, str(360.0 + day)))
+                database.session.add(DailyPrice('MSFT', price_date, str(200.0 - day / 2)))
+        database.session.commit()
+
+        yield price_history_cache  # this is where the testing happens!
+
+        database.drop_all()
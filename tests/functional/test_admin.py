@@ -2,6 +2,9 @@
 This file (test_admin.py) contains the functional tests for the `admin` blueprint.
 """
 import re
+from datetime import datetime
+from project import database
+from project.models import User, Stock, WatchStock
 
 
 def test_cli_create_admin_user(cli_test_runner):
@@ -61,7 +64,8 @@ def test_admin_views_non_admin_user(test_client_admin, log_in_user1):
                   '/admin/users/5/confirm_email',
                   '/admin/users/5/unconfirm_email',
                   '/admin/users/1/change_password',
-                  '/admin/users/1/change_email']
+                  '/admin/users/1/change_email',
+                  '/admin/stocks/export.csv']
 
     routes_post = [{'url': '/admin/users/4/change_password', 'data': {'password': 'FlaskIsGreat101'}},
                    {'url': '/admin/users/5/change_email', 'data': {'email': 'user104@gmail.com'}}]
@@ -90,7 +94,8 @@ def test_admin_view_users_not_logged_in(test_client_admin):
                   '/admin/users/5/confirm_email',
                   '/admin/users/5/unconfirm_email',
                   '/admin/users/1/change_password',
-                  '/admin/users/1/change_email']
+                  '/admin/users/1/change_email',
+                  '/admin/stocks/export.csv']
 
     routes_post = [{'url': '/admin/users/4/change_password', 'data': {'password': 'FlaskIsGreat101'}},
                    {'url': '/admin/users/5/change_email', 'data': {'email': 'user104@gmail.com'}}]
@@ -170,6 +175,32 @@ def test_admin_delete_user_valid(test_client_admin, log_in_admin_user):
     assert b'List of Users' in response.data
 
 
+def test_admin_delete_user_with_stocks(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+          and a user with stocks in their portfolio and watchlist
+    WHEN the '/admin/users/<id>/delete' page is requested (GET)
+    THEN check that the user and all of their stocks and watchstocks are deleted
+    """
+    user = User('user5@gmail.com', 'FlaskIsGreat5')
+    database.session.add(user)
+    database.session.commit()
+    user_id = user.id
+
+    for index in range(25):
+        database.session.add(Stock('SBUX', '10', '85.32', user_id, datetime(2020, 7, 1)))
+    database.session.add(WatchStock('COST', user_id))
+    database.session.add(WatchStock('QCOM', user_id))
+    database.session.commit()
+
+    response = test_client_admin.get(f'/admin/users/{user_id}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    assert f'User ({user_id}: user5@gmail.com) was deleted!'.encode() in response.data
+    assert User.query.get(user_id) is None
+    assert Stock.query.filter_by(user_id=user_id).count() == 0
+    assert WatchStock.query.filter_by(user_id=user_id).count() == 0
+
+
 def test_admin_delete_admin_user(test_client_admin, log_in_admin_user):
     """
     GIVEN a Flask application configured for testing with the admin user logged in
@@ -265,3 +296,16 @@ def test_admin_post_change_email_valid(test_client_admin, log_in_admin_user):
     assert response.status_code == 200
     assert re.search(r"User.* email \(.*\) was updated!", str(response.data))
     assert b'List of Users' in response.data
+
+
+def test_admin_export_stocks(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+    WHEN the '/admin/stocks/export.csv' page is requested (GET)
+    THEN check that the portfolios of all users are returned as CSV data
+    """
+    response = test_client_admin.get('/admin/stocks/export.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.data.decode().splitlines()[0] == ('user_id,email,stock_symbol,number_of_shares,'
+                                                      'purchase_price,purchase_date,current_price,position_value')
@@ -0,0 +1,139 @@
+"""
+This file (test_api.py) contains the functional tests for the `api` blueprint.
+"""
+from datetime import date
+from project import database
+from project.models import Stock, WatchStock, User, DailyPrice
+from project.prices import price_history_cache
+
+
+def get_default_user():
+    return User.query.filter_by(email='patrick@gmail.com').first()
+
+
+def test_get_api_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing without a user logged in
+    WHEN the '/api/v1/stocks', '/api/v1/watchlist', and '/api/v1/quotes' endpoints are requested (GET)
+    THEN check that a 401 (Unauthorized) JSON error is returned instead of a redirect to the login page
+    """
+    for url in ('/api/v1/stocks', '/api/v1/watchlist', '/api/v1/quotes'):
+        response = test_client.get(url)
+        assert response.status_code == 401
+        assert 'error' in response.get_json()
+
+
+def test_get_api_stocks(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/api/v1/stocks' endpoint is requested (GET) with and without the validators of a previous response
+    THEN check the compact rows, and that a 304 (Not Modified) is only returned until a stock changes
+    """
+    user = get_default_user()
+    stock = Stock('AMZN', '4', '3100.50', user.id)
+    database.session.add(stock)
+    database.session.commit()
+    stock_id = stock.id
+
+    response = test_client.get('/api/v1/stocks')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+    assert 'no-cache' in response.headers['Cache-Control']
+    data = response.get_json()
+    assert data['columns'][:4] == ['id', 'symbol', 'number_of_shares', 'purchase_price']
+    assert [stock_id, 'AMZN', 4, 3100.5] in [row[:4] for row in data['rows']]
+    assert b': ' not in response.data
+
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    response = test_client.get('/api/v1/stocks', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = test_client.get('/api/v1/stocks', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    # Updating the price of a stock changes the version of the user's data
+    stock = Stock.query.get(stock_id)
+    stock.current_price = 320000
+    database.session.commit()
+    response = test_client.get('/api/v1/stocks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['version'] == data['version'] + 1
+
+    database.session.delete(Stock.query.get(stock_id))
+    database.session.commit()
+    assert get_default_user().data_version == data['version'] + 2
+
+
+def test_get_api_watchlist(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/api/v1/watchlist' endpoint is requested (GET) before and after a stock is added to the watchlist
+    THEN check that the previous ETag no longer matches and the new stock is returned
+    """
+    user = get_default_user()
+    response = test_client.get('/api/v1/watchlist')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert test_client.get('/api/v1/watchlist', headers={'If-None-Match': etag}).status_code == 304
+
+    watchstock = WatchStock('NVDA', user.id)
+    watchstock.current_share_price = 52347
+    database.session.add(watchstock)
+    database.session.commit()
+    watchstock_id = watchstock.id
+
+    response = test_client.get('/api/v1/watchlist', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    data = response.get_json()
+    symbol_column = data['columns'].index('symbol')
+    price_column = data['columns'].index('current_share_price')
+    assert [watchstock_id, 'NVDA', 523.47] in [[row[0], row[symbol_column], row[price_column]] for row in data['rows']]
+
+    database.session.delete(WatchStock.query.get(watchstock_id))
+    database.session.commit()
+
+
+def test_get_api_quotes(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and the daily prices of a stock
+    WHEN the '/api/v1/quotes' endpoint is requested (GET) before and after a new daily price is stored
+    THEN check the latest quote, and that a 304 (Not Modified) is only returned until the price changes
+    """
+    for day in (1, 2):
+        database.session.add(DailyPrice('INTC', date(2020, 7, day), str(50.0 + day)))
+    database.session.commit()
+    price_history_cache.refresh('INTC')
+
+    response = test_client.get('/api/v1/quotes?symbols=intc,XYZ,INTC')
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == 'Thu, 02 Jul 2020 00:00:00 GMT'
+    data = response.get_json()
+    assert data['columns'] == ['symbol', 'date', 'close', 'previous_close', 'change_percent']
+    assert data['rows'] == [['INTC', '2020-07-02', 52.0, 51.0, 1.96], ['XYZ', None, None, None, None]]
+
+    etag = response.headers['ETag']
+    assert test_client.get('/api/v1/quotes?symbols=INTC,XYZ', headers={'If-None-Match': etag}).status_code == 304
+
+    database.session.add(DailyPrice('INTC', date(2020, 7, 3), '50.00'))
+    database.session.commit()
+    price_history_cache.refresh('INTC')
+    response = test_client.get('/api/v1/quotes?symbols=INTC,XYZ', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['rows'][0] == ['INTC', '2020-07-03', 50.0, 52.0, -3.85]
+
+
+def test_get_api_quotes_invalid_symbols(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/api/v1/quotes' endpoint is requested (GET) with an invalid symbol or too many symbols
+    THEN check that a 400 (Bad Request) JSON error is returned
+    """
+    for symbols in ('../ETC', ','.join(f'S{index}' for index in range(101))):
+        response = test_client.get(f'/api/v1/quotes?symbols={symbols}')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
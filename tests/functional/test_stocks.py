@@ -3,6 +3,12 @@ This file (test_stocks.py) contains the functional tests for the 'stocks' bluepr
 """
 import requests
 import re
+from datetime import date, datetime, timedelta
+from project import database
+from project.models import Stock, User, DailyPrice, Transaction, PriceAlert, WatchStock, LeaderboardScore
+from project.alerts import load_price_alerts
+from project.ledger import get_ledger_positions
+from project.prices import price_history_cache
 
 
 # --------------
@@ -161,6 +167,37 @@ def test_get_stock_list_logged_in(test_client, add_stocks_for_default_user, mock
         assert header in response.data
     for element in data:
         assert element in response.data
+    assert b'Positions' in response.data
+    assert b'Average Cost' in response.data
+
+
+def test_get_stock_list_missing_exchange_rate(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a stock in a currency without an exchange rate
+    WHEN the '/stocks' page and the '/stocks/totals' data are requested (GET)
+    THEN check that the stock is listed as excluded from the total value
+    """
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    stock = Stock('SONY', '10', '9000', user.id, datetime(2020, 7, 1), currency='JPY')
+    stock.current_price = 950000
+    stock.current_price_date = datetime.now()
+    stock.position_value = 9500000
+    database.session.add(stock)
+    database.session.commit()
+    stock_id = stock.id
+
+    response = test_client.get('/stocks', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'The holdings in JPY are excluded from the total value' in response.data
+
+    response = test_client.get('/stocks/totals')
+    assert response.status_code == 200
+    assert response.get_json()['missing_rates'] == ['JPY']
+    assert not response.get_json()['is_complete']
+
+    database.session.delete(Stock.query.get(stock_id))
+    database.session.commit()
 
 
 def test_get_stock_list_not_logged_in(test_client):
@@ -237,6 +274,51 @@ def test_get_stock_detail_page_failed_response(test_client, add_stocks_for_defau
     assert b'canvas id="stockChart"' not in response.data
 
 
+def test_get_stock_detail_page_daily_prices(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the daily prices of a stock stored
+    WHEN the page for the stock is retrieved (GET) and the response from Alpha Vantage failed
+    THEN check that the chart is displayed using the stored daily prices
+    """
+    test_client.post('/add_stock', data={'stock_symbol': 'ORCL',
+                                         'number_of_shares': '12',
+                                         'purchase_price': '80.00',
+                                         'purchase_date': '2020-07-01'})
+    for day in range(1, 31):
+        database.session.add(DailyPrice('ORCL', date.today() - timedelta(days=day), str(80.0 + day)))
+    database.session.commit()
+
+    stock = Stock.query.filter_by(stock_symbol='ORCL').first()
+    response = test_client.get(f'/stocks/{stock.id}', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'canvas id="stockChart"' in response.data
+    assert b'Daily Prices (ORCL)' in response.data
+
+    response = test_client.get(f'/stocks/{stock.id}?range=1Y&resolution=weekly', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Weekly Prices (ORCL)' in response.data
+
+    response = test_client.get(f'/stocks/{stock.id}?range=2W', follow_redirects=True)
+    assert response.status_code == 400
+
+    response = test_client.get(f'/stocks/{stock.id}?range=1M&overlay=BBANDS', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'BBANDS upper' in response.data
+
+    response = test_client.get(f'/stocks/{stock.id}/indicators?name=RSI&period=5&range=MAX')
+    assert response.status_code == 200
+    indicator = response.get_json()
+    assert indicator['params'] == {'period': 5}
+    assert len(indicator['dates']) == len(indicator['rsi']) == 30
+
+    response = test_client.get(f'/stocks/{stock.id}/indicators?name=RSI&period=abc')
+    assert response.status_code == 400
+
+    # Remove the stock, so it does not change the portfolio of the default user in the other tests
+    test_client.get(f'/stocks/{stock.id}/delete')
+
+
 def test_get_stock_detail_page_incorrect_user(test_client, log_in_second_user):
     """
     GIVEN a Flask application configured for testing with the second user logged in
@@ -436,3 +518,719 @@ def test_get_edit_stock_page_invalid_stock(test_client, log_in_default_user):
                                 follow_redirects=True)
     assert response.status_code == 404
     assert not re.search(r"Stock \(.*[A-Z]{4}.*was updated!", str(response.data))
+
+
+def test_get_export_stocks_logged_in(test_client, log_in_default_user, add_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/export.csv' page is requested (GET)
+    THEN check that the portfolio is returned as CSV data
+    """
+    response = test_client.get('/stocks/export.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'portfolio.csv' in response.headers['Content-Disposition']
+    lines = response.data.decode().splitlines()
+    assert lines[0] == 'stock_symbol,number_of_shares,purchase_price,purchase_date,current_price,position_value'
+    assert 'SAM,27,301.23,2020-07-01T00:00:00,0.0,0.0' in lines
+    assert 'TWTR,146,34.56,2020-02-03T00:00:00,0.0,0.0' in lines
+
+
+def test_get_export_stocks_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/stocks/export.csv' page is requested (GET) when the user is not logged in
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/export.csv', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'stock_symbol,number_of_shares' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_portfolio_analytics(test_client, log_in_default_user, add_stocks_for_default_user,
+                                 mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/analytics' page is requested (GET) before and after the daily prices are stored
+    THEN check that the analytics are only returned when the price history is available
+    """
+    response = test_client.get('/stocks/analytics')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
+
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    symbols = {stock.stock_symbol for stock in Stock.query.filter_by(user_id=user.id)} | {'SPY'}
+    for day in range(1, 11):
+        for index, symbol in enumerate(sorted(symbols)):
+            database.session.add(DailyPrice(symbol, date(2020, 8, day), str(100.0 + index + day * (-1) ** day)))
+    database.session.commit()
+
+    response = test_client.get('/stocks/analytics')
+    assert response.status_code == 200
+    analytics = response.get_json()
+    assert analytics['start_date'] == '2020-08-01'
+    assert analytics['end_date'] == '2020-08-10'
+    assert analytics['benchmark'] == 'SPY'
+    assert {holding['symbol'] for holding in analytics['holdings']} == symbols - {'SPY'}
+    assert analytics['portfolio']['volatility'] > 0.0
+
+    response = test_client.get('/stocks', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Portfolio Analytics' in response.data
+    assert b'Sharpe Ratio' in response.data
+    assert b'canvas id="portfolioValueChart"' in response.data
+
+
+def test_post_add_transaction(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a purchase and a partial sale are posted to the '/stocks/transactions/add' page (POST)
+    THEN check that the transactions are recorded and the position includes the realized gain
+    """
+    response = test_client.post('/add_stock',
+                                data={'stock_symbol': 'NFLX',
+                                      'number_of_shares': '20',
+                                      'purchase_price': '300.00',
+                                      'purchase_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'NFLX',
+                                      'transaction_type': 'SELL',
+                                      'number_of_shares': '5',
+                                      'price': '350.00',
+                                      'transaction_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Recorded SELL transaction (NFLX)!' in response.data
+    assert b'Recent Transactions' in response.data
+    assert b'Realized Gain' in response.data
+    assert b'$250.00' in response.data  # 5 * ($350.00 - $300.00)
+
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    transactions = Transaction.query.filter_by(user_id=user.id, stock_symbol='NFLX').order_by(Transaction.id).all()
+    assert [transaction.transaction_type for transaction in transactions] == ['BUY', 'SELL']
+
+    # The sale is also removed from the lot in the portfolio
+    assert Stock.query.filter_by(user_id=user.id, stock_symbol='NFLX').one().number_of_shares == 15
+
+
+def test_post_add_transaction_specific_lots(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and two lots of a stock
+    WHEN sales of specific lots are posted to the '/stocks/transactions/add' page (POST), with a lot specified twice and once
+    THEN check that the sale with the duplicate lot is rejected, and that the other sale is removed from the specified lot
+    """
+    for purchase_date in ('2020-07-01', '2020-07-02'):
+        test_client.post('/add_stock', data={'stock_symbol': 'PEP',
+                                             'number_of_shares': '10',
+                                             'purchase_price': '130.00',
+                                             'purchase_date': purchase_date})
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    lot_ids = [stock.id for stock in Stock.query.filter_by(user_id=user.id, stock_symbol='PEP').order_by(Stock.id)]
+
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'PEP',
+                                      'transaction_type': 'SELL',
+                                      'number_of_shares': '15',
+                                      'price': '140.00',
+                                      'accounting_method': 'SPECIFIC',
+                                      'lot_ids': f'{lot_ids[1]}, {lot_ids[1]}',
+                                      'transaction_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'is specified more than once for the sale!' in response.data
+    assert Transaction.query.filter_by(user_id=user.id, stock_symbol='PEP', transaction_type='SELL').count() == 0
+
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'PEP',
+                                      'transaction_type': 'SELL',
+                                      'number_of_shares': '4',
+                                      'price': '140.00',
+                                      'accounting_method': 'SPECIFIC',
+                                      'lot_ids': str(lot_ids[1]),
+                                      'transaction_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert b'Recorded SELL transaction (PEP)!' in response.data
+    lots = Stock.query.filter_by(user_id=user.id, stock_symbol='PEP').order_by(Stock.id).all()
+    assert [lot.number_of_shares for lot in lots] == [10, 6]
+
+    # Remove the stocks, so they do not change the portfolio of the default user in the other tests
+    for lot_id in lot_ids:
+        test_client.get(f'/stocks/{lot_id}/delete')
+
+
+def test_post_add_transaction_invalid_sale(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a sale of more shares than are held is posted to the '/stocks/transactions/add' page (POST)
+    THEN check that an error message is displayed and the sale is not recorded
+    """
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'ZZZ',
+                                      'transaction_type': 'SELL',
+                                      'number_of_shares': '5',
+                                      'price': '10.00',
+                                      'transaction_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Cannot sell 5 shares of ZZZ' in response.data
+    assert b'Record a Transaction' in response.data
+    assert Transaction.query.filter_by(stock_symbol='ZZZ').count() == 0
+
+
+def test_post_add_transaction_invalid_data(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a transaction with an invalid symbol and transaction type is posted to the '/stocks/transactions/add' page (POST)
+    THEN check that the reasons are displayed and the transaction is not recorded
+    """
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'ZZ9',
+                                      'transaction_type': 'GIFT',
+                                      'number_of_shares': '5',
+                                      'price': '10.00',
+                                      'transaction_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid transaction (stock_symbol: Stock symbol must be 1-5 characters; ' \
+           b'transaction_type: Transaction type must be one of: BUY, SELL, SPLIT, DIVIDEND)!' in response.data
+    assert b'Record a Transaction' in response.data
+    assert Transaction.query.filter_by(stock_symbol='ZZ9').count() == 0
+
+
+def test_post_add_stock_invalid_number_of_shares(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/add_stock' page is posted to (POST) with zero shares
+    THEN check that an error message is displayed and the stock is not added to the portfolio or the ledger
+    """
+    response = test_client.post('/add_stock',
+                                data={'stock_symbol': 'ZZZZ',
+                                      'number_of_shares': '0',
+                                      'purchase_price': '10.00',
+                                      'purchase_date': '2020-08-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid number of shares (0)!' in response.data
+    assert b'Add a Stock' in response.data
+    assert Stock.query.filter_by(stock_symbol='ZZZZ').count() == 0
+    assert Transaction.query.filter_by(stock_symbol='ZZZZ').count() == 0
+
+
+def test_edit_and_delete_stock_ledger(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a stock is added, edited (with valid and invalid data), and deleted
+    THEN check that the edit is recorded as an adjustment and the deletion as a sale in the ledger
+    """
+    test_client.post('/add_stock', data={'stock_symbol': 'XOM',
+                                         'number_of_shares': '10',
+                                         'purchase_price': '50.00',
+                                         'purchase_date': '2020-07-01'})
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    stock_id = Stock.query.filter_by(user_id=user.id, stock_symbol='XOM').one().id
+
+    response = test_client.post(f'/stocks/{stock_id}/edit',
+                                data={'number_of_shares': '12',
+                                      'purchase_price': '55.00',
+                                      'purchase_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock (XOM) was updated!' in response.data
+    position = get_ledger_positions(user.id, 'XOM')['XOM']
+    assert (position.number_of_shares, position.cost_basis, position.realized_gain) == (12, 12 * 5500, 0)
+
+    response = test_client.post(f'/stocks/{stock_id}/edit',
+                                data={'number_of_shares': '0',
+                                      'purchase_price': '',
+                                      'purchase_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid number of shares (0)!' in response.data
+    assert Stock.query.get(stock_id).number_of_shares == 12
+
+    response = test_client.get(f'/stocks/{stock_id}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock (XOM) was deleted!' in response.data
+
+    transactions = Transaction.query.filter_by(user_id=user.id, stock_symbol='XOM').order_by(Transaction.id).all()
+    assert [(transaction.transaction_type, transaction.number_of_shares) for transaction in transactions] == \
+        [('BUY', 10), ('ADJUSTMENT', -10), ('ADJUSTMENT', 12), ('SELL', 12)]
+    assert transactions[-1].price == 5500  # No current price, so the lot is sold at its purchase price
+
+
+def test_edit_and_delete_stock_added_before_ledger(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and two lots of a stock that were added before the transaction ledger existed
+    WHEN the lots are edited and deleted
+    THEN check that the lots are first recorded as purchases in the ledger, so the edit and deletion are recorded
+    """
+    user_id = User.query.filter_by(email='patrick@gmail.com').first().id
+    stocks = [Stock('HPQ', '10', '20.00', user_id, datetime(2020, 7, 1)),
+              Stock('HPQ', '5', '22.00', user_id, datetime(2020, 7, 2))]
+    database.session.add_all(stocks)
+    database.session.commit()
+    stock_ids = [stock.id for stock in stocks]
+
+    response = test_client.post(f'/stocks/{stock_ids[0]}/edit',
+                                data={'number_of_shares': '8',
+                                      'purchase_price': '20.00',
+                                      'purchase_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock (HPQ) was updated!' in response.data
+    assert get_ledger_positions(user_id, 'HPQ')['HPQ'].number_of_shares == 13
+
+    response = test_client.get(f'/stocks/{stock_ids[1]}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock (HPQ) was deleted!' in response.data
+    position = get_ledger_positions(user_id, 'HPQ')['HPQ']
+    assert (position.number_of_shares, position.cost_basis) == (8, 27000 - round(27000 * 5 / 13))  # Average cost
+
+    transactions = Transaction.query.filter_by(user_id=user_id, stock_symbol='HPQ').order_by(Transaction.id).all()
+    assert [(transaction.transaction_type, transaction.number_of_shares) for transaction in transactions] == \
+        [('BUY', 10), ('BUY', 5), ('ADJUSTMENT', -10), ('ADJUSTMENT', 8), ('SELL', 5)]
+
+    response = test_client.get(f'/stocks/{stock_ids[0]}/delete', follow_redirects=True)
+    assert b'Stock (HPQ) was deleted!' in response.data
+
+
+def test_get_stock_list_added_before_ledger(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a lot of a stock that was added before the transaction ledger existed
+    WHEN the '/stocks' page is requested (GET)
+    THEN check that the lot is recorded in the ledger, so it is included in the positions
+    """
+    user_id = User.query.filter_by(email='patrick@gmail.com').first().id
+    stock = Stock('DELL', '6', '40.00', user_id, datetime(2020, 7, 1))
+    stock.current_price_date = datetime.now()
+    database.session.add(stock)
+    database.session.commit()
+    stock_id = stock.id
+
+    response = test_client.get('/stocks', follow_redirects=True)
+    assert response.status_code == 200
+    assert get_ledger_positions(user_id, 'DELL')['DELL'].number_of_shares == 6
+
+    test_client.get(f'/stocks/{stock_id}/delete', follow_redirects=True)
+    assert Transaction.query.filter_by(user_id=user_id, stock_symbol='DELL').count() == 2
+
+
+def test_post_add_transaction_purchase_and_split(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a purchase and a split are posted to the '/stocks/transactions/add' page (POST)
+    THEN check that the purchase adds a lot to the portfolio and the split is applied to the lot
+    """
+    response = test_client.post('/stocks/transactions/add',
+                                data={'stock_symbol': 'CVX',
+                                      'transaction_type': 'BUY',
+                                      'number_of_shares': '8',
+                                      'price': '90.00',
+                                      'transaction_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Recorded BUY transaction (CVX)!' in response.data
+
+    test_client.post('/stocks/transactions/add',
+                     data={'stock_symbol': 'CVX',
+                           'transaction_type': 'SPLIT',
+                           'split_ratio': '2.0',
+                           'transaction_date': '2020-07-02'})
+    user = User.query.filter_by(email='patrick@gmail.com').first()
+    stock = Stock.query.filter_by(user_id=user.id, stock_symbol='CVX').one()
+    assert (stock.number_of_shares, stock.purchase_price, stock.currency) == (16, 4500, 'USD')
+
+    # Remove the stock, so it does not change the portfolio of the default user in the other tests
+    test_client.get(f'/stocks/{stock.id}/delete')
+
+
+def test_get_transactions_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/stocks/transactions' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/transactions', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Recent Transactions' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_projection_page(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/projection' page is requested (GET) with and without valid parameters
+    THEN check that the form is displayed or a 400 (Bad Request) error is returned
+    """
+    response = test_client.get('/stocks/projection')
+    assert response.status_code == 200
+    assert b'Projected Value' in response.data
+    assert b'Run Projection' in response.data
+
+    response = test_client.get('/stocks/projection?paths=7')
+    assert response.status_code == 400
+
+    response = test_client.get('/stocks/projection.json')
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'not_started'
+
+
+def test_post_projection_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/stocks/projection' page is posted to (POST)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.post('/stocks/projection', data={'method': 'gbm'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Run Projection' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_post_price_alert_invalid_value(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a price alert with an infinite threshold is posted to the '/stocks/alerts' page (POST)
+    THEN check that an error message is displayed
+    """
+    for value in ('inf', '1e400'):
+        response = test_client.post('/stocks/alerts',
+                                    data={'stock_symbol': 'NVDA', 'alert_type': 'ABOVE', 'value': value},
+                                    follow_redirects=True)
+        assert response.status_code == 200
+        assert b'Must be a finite number.' in response.data
+
+def test_post_price_alert_invalid_data(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a price alert with an invalid alert type and value is posted to the '/stocks/alerts' page (POST)
+    THEN check that the reasons are displayed and the alert is not added
+    """
+    response = test_client.post('/stocks/alerts',
+                                data={'stock_symbol': 'NVDA', 'alert_type': 'NEAR', 'value': 'high'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid price alert (alert_type: Alert type must be one of: ' in response.data
+    assert b'value: value is not a valid float)!' in response.data
+    assert PriceAlert.query.filter_by(stock_symbol='NVDA', alert_type='NEAR').count() == 0
+
+
+def test_post_price_alert_triggered(test_client, log_in_default_user, mock_requests_get_success_daily):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a stock in their portfolio with yesterday's price (and daily close)
+    WHEN price alerts are added on the '/stocks/alerts' page (POST) and the portfolio is refreshed (GET)
+    THEN check that only the alert crossed by the new price is triggered and deleting an alert works
+    """
+    load_price_alerts()
+    response = test_client.post('/add_stock',
+                                data={'stock_symbol': 'NVDA',
+                                      'number_of_shares': '10',
+                                      'purchase_price': '100.00',
+                                      'purchase_date': '2020-07-01'})
+    assert response.status_code == 302
+    stock = Stock.query.filter_by(stock_symbol='NVDA').first()
+    stock.current_price = 11000
+    stock.current_price_date = datetime.now() - timedelta(days=1)
+    database.session.add(stock)
+    database.session.add(DailyPrice('NVDA', date.today() - timedelta(days=1), '110.00'))
+    database.session.commit()
+    price_history_cache.refresh('NVDA')
+
+    response = test_client.post('/stocks/alerts',
+                                data={'stock_symbol': 'NVDA', 'alert_type': 'ABOVE', 'value': '120.00'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Added price alert (NVDA)!' in response.data
+    response = test_client.post('/stocks/alerts',
+                                data={'stock_symbol': 'NVDA', 'alert_type': 'PERCENT', 'value': '60'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'$160.00' in response.data
+
+    # The move from the daily close of $110.00 to the price of $148.34 crosses the $120.00 threshold, but not the $160.00 threshold
+    response = test_client.get('/stocks')
+    assert response.status_code == 200
+    response = test_client.get('/stocks/alerts')
+    assert b'at $148.34' in response.data
+    alerts = PriceAlert.query.filter_by(stock_symbol='NVDA').order_by(PriceAlert.id).all()
+    assert [alert.triggered_price for alert in alerts] == [14834, None]
+
+    for alert_id in [alert.id for alert in alerts]:
+        response = test_client.get(f'/stocks/alerts/{alert_id}/delete', follow_redirects=True)
+        assert response.status_code == 200
+        assert b'Price alert (NVDA) was deleted!' in response.data
+    assert PriceAlert.query.filter_by(stock_symbol='NVDA').count() == 0
+
+    Stock.query.filter_by(stock_symbol='NVDA').delete()
+    Transaction.query.filter_by(stock_symbol='NVDA').delete()
+    DailyPrice.query.filter_by(stock_symbol='NVDA').delete()
+    database.session.commit()
+    price_history_cache.invalidate('NVDA')
+
+
+def test_price_alert_not_triggered_by_stale_price(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in, a stock in their portfolio
+          and watchlist with a days-old price below the latest daily close, and a price alert below the close
+    WHEN the portfolio and the watchlist are refreshed (GET) and the price API returns an error
+    THEN check that the stale price is not checked against the alert
+    """
+    load_price_alerts()
+    user_id = User.query.filter_by(email='patrick@gmail.com').first().id
+    stock = Stock('AMD', '10', '80.00', user_id, datetime(2020, 7, 1))
+    stock.current_price = 9000
+    stock.current_price_date = datetime.now() - timedelta(days=3)
+    watchstock = WatchStock('AMD', user_id)
+    watchstock.current_share_price = 9000
+    watchstock.current_share_price_date = datetime.now() - timedelta(days=3)
+    database.session.add_all([stock, watchstock])
+    database.session.add(DailyPrice('AMD', date.today() - timedelta(days=1), '110.00'))
+    database.session.commit()
+    price_history_cache.refresh('AMD')
+    stock_id, watchstock_id = stock.id, watchstock.id
+
+    response = test_client.post('/stocks/alerts',
+                                data={'stock_symbol': 'AMD', 'alert_type': 'BELOW', 'value': '100.00'},
+                                follow_redirects=True)
+    assert b'Added price alert (AMD)!' in response.data
+
+    assert test_client.get('/stocks').status_code == 200
+    assert test_client.get('/watchlist').status_code == 200
+    alert = PriceAlert.query.filter_by(stock_symbol='AMD').one()
+    assert alert.triggered_price is None
+
+    test_client.get(f'/stocks/alerts/{alert.id}/delete')
+    test_client.get(f'/stocks/{stock_id}/delete')
+    database.session.delete(WatchStock.query.get(watchstock_id))
+    database.session.commit()
+
+
+def test_post_price_alert_invalid_symbol(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a price alert on a stock that is not in the portfolio or watchlist is posted to the '/stocks/alerts' page (POST)
+    THEN check that an error message is displayed and the alert is not added
+    """
+    response = test_client.post('/stocks/alerts',
+                                data={'stock_symbol': 'ZZZ', 'alert_type': 'BELOW', 'value': '10.00'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock (ZZZ) is not in the portfolio or the watchlist!' in response.data
+    assert PriceAlert.query.filter_by(stock_symbol='ZZZ').count() == 0
+
+
+def test_get_price_alerts_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/stocks/alerts' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/alerts', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Add a Price Alert' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_dividends_page(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/dividends' page and the '/stocks/dividends.json' data are requested (GET)
+    THEN check that the projected dividend income is returned
+    """
+    response = test_client.get('/stocks/dividends')
+    assert response.status_code == 200
+    assert b'Projected Dividend Income' in response.data
+    assert b'Monthly Income' in response.data
+    assert b'Annual Income (USD)' in response.data
+
+    response = test_client.get('/stocks/dividends.json')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['monthly_income'] == round(data['annual_income'] / 12, 2)
+    assert data['base_currency'] == 'USD'
+    assert data['missing_rates'] == []
+
+
+def test_get_dividends_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/stocks/dividends' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/dividends', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Projected Dividend Income' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_portfolio_allocation(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/allocation' data and the user profile are requested (GET)
+    THEN check that the allocation by sector, industry, and asset type is returned
+    """
+    response = test_client.get('/stocks/allocation')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['base_currency'] == 'USD'
+    assert set(data) >= {'sector', 'industry', 'asset_type', 'total_value', 'missing_rates'}
+
+    response = test_client.get('/users/profile')
+    assert response.status_code == 200
+    assert data['total_value'] > 0
+    assert b'Portfolio Allocation' in response.data
+    assert b'By Sector:' in response.data
+
+
+def test_get_portfolio_risk(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/risk' page and data are requested (GET) with a stress scenario
+    THEN check that the risk and the scenario are returned, and that invalid parameters are reported
+    """
+    response = test_client.get('/stocks/risk?confidence_levels=95,99&window=252&scenarios=market+-10%25')
+    assert response.status_code == 200
+    assert b'Portfolio Risk' in response.data
+    assert b'Stress Scenarios' in response.data
+    assert b'market -10%' in response.data
+
+    response = test_client.get('/stocks/risk.json?scenarios=market+-10%25')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [level['confidence_level'] for level in data['value_at_risk']] == [0.95, 0.99]
+    assert data['scenarios'][0]['name'] == 'market -10%'
+    assert data['scenarios'][0]['profit'] == round(-0.1 * data['total_value'], 2)
+
+    response = test_client.get('/stocks/risk?scenarios=market', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid shock (market)!' in response.data
+    response = test_client.get('/stocks/risk.json?scenarios=rates+%2B1%25')
+    assert response.status_code == 400
+    assert 'Invalid shock target (rates)' in response.get_json()['error']
+    response = test_client.get('/stocks/risk.json?window=100')
+    assert response.status_code == 400
+    response = test_client.get('/stocks/risk.json?confidence_levels=nan')
+    assert response.status_code == 400
+
+
+def test_get_portfolio_risk_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing, without a user logged in
+    WHEN the '/stocks/risk' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/risk', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_cli_update_prices(cli_test_runner, mock_requests_get_success_daily, tmp_path):
+    """
+    GIVEN a Flask CLI test runner and a monkeypatched version of requests.get()
+    WHEN the 'flask stocks update_prices' command is processed
+    THEN check that the daily prices are stored and cached
+    """
+    cli_test_runner.app.config['PRICE_CACHE_FOLDER'] = str(tmp_path)
+    result = cli_test_runner.invoke(args=['stocks', 'update_prices', 'qcom'])
+    assert 'Updated the daily prices for QCOM (2 days added, 2 days cached)!' in result.output
+    assert (tmp_path / 'QCOM.prices').exists()
+
+
+def test_cli_update_prices_leaderboard(cli_test_runner, mock_requests_get_success_daily, tmp_path):
+    """
+    GIVEN a Flask CLI test runner, a monkeypatched version of requests.get(), and a user on the leaderboard
+          holding a stock with an older current price
+    WHEN the 'flask stocks update_prices' command is processed for the stock
+    THEN check that the score of the user is re-computed with the new daily close
+    """
+    cli_test_runner.app.config['PRICE_CACHE_FOLDER'] = str(tmp_path)
+    with cli_test_runner.app.app_context():
+        user = User('prices@email.com', 'FlaskIsAwesome123')
+        user.leaderboard_opt_in = True
+        database.session.add(user)
+        database.session.flush()
+        user_id = user.id
+        stock = Stock('AMAT', '10', '100.00', user_id, datetime(2020, 1, 2))
+        stock.current_price = 10000
+        stock.current_price_date = datetime(2020, 3, 1)
+        database.session.add(stock)
+        database.session.commit()
+
+    result = cli_test_runner.invoke(args=['stocks', 'update_prices', 'amat'])
+    assert 'Updated the daily prices for AMAT (2 days added, 2 days cached)!' in result.output
+    assert 'Updated the leaderboard (1 users ranked)!' in result.output
+    with cli_test_runner.app.app_context():
+        assert LeaderboardScore.query.get(user_id).score == round(148.34 / 100.0 - 1.0, 6)
+
+
+def test_cli_update_fx_rates(cli_test_runner, tmp_path):
+    """
+    GIVEN a Flask CLI test runner and a replay file of recorded exchange rates
+    WHEN the 'flask stocks update_fx_rates' command is processed
+    THEN check that the exchange rates are stored
+    """
+    replay_file = tmp_path / 'fx_rates.json'
+    replay_file.write_text('{"EUR": {"Time Series FX (Daily)": {"2020-07-01": {"4. close": "1.1250"}}}}')
+    cli_test_runner.app.config['FX_RATES_REPLAY_FILE'] = str(replay_file)
+    result = cli_test_runner.invoke(args=['stocks', 'update_fx_rates', 'eur', 'usd'])
+    assert 'Updated the exchange rates for EUR (1 days added)!' in result.output
+    assert 'Error! Invalid currency (USD)!' in result.output
+
+
+def test_cli_backfill_ledger(cli_test_runner):
+    """
+    GIVEN a Flask CLI test runner and a portfolio with lots that are not in the transaction ledger
+    WHEN the 'flask stocks backfill_ledger' command is processed (twice)
+    THEN check that a purchase is recorded for each lot only once
+    """
+    with cli_test_runner.app.app_context():
+        database.session.add(Stock('IBM', '10', '120.00', 1, datetime(2020, 7, 1)))
+        database.session.add(Stock('IBM', '5', '125.00', 1, datetime(2020, 7, 2)))
+        database.session.commit()
+
+    result = cli_test_runner.invoke(args=['stocks', 'backfill_ledger'])
+    assert 'Recorded 2 lots in the transaction ledger!' in result.output
+    result = cli_test_runner.invoke(args=['stocks', 'backfill_ledger'])
+    assert 'Recorded 0 lots in the transaction ledger!' in result.output
+
+    with cli_test_runner.app.app_context():
+        assert Transaction.query.filter_by(user_id=1, stock_symbol='IBM', transaction_type='BUY').count() == 2
+
+
+def test_cli_update_leaderboard(cli_test_runner):
+    """
+    GIVEN a Flask CLI test runner and a user that opted in to the leaderboard holding AAPL
+    WHEN the 'flask stocks update_leaderboard' command is processed for AAPL and for MSFT
+    THEN check that only the holders of the specified symbols are ranked
+    """
+    with cli_test_runner.app.app_context():
+        user = User('leader@email.com', 'FlaskIsAwesome123')
+        user.leaderboard_opt_in = True
+        database.session.add(user)
+        database.session.flush()
+        database.session.add(Stock('AAPL', '10', '100.00', user.id, datetime(2020, 7, 1)))
+        database.session.commit()
+
+    result = cli_test_runner.invoke(args=['stocks', 'update_leaderboard', 'msft'])
+    assert 'Updated the leaderboard (0 users ranked)!' in result.output
+    result = cli_test_runner.invoke(args=['stocks', 'update_leaderboard', 'aapl'])
+    assert 'Updated the leaderboard (1 users ranked)!' in result.output
+
+
+def test_cli_update_return_metrics(cli_test_runner):
+    """
+    GIVEN a Flask CLI test runner
+    WHEN the 'flask stocks update_return_metrics' command is processed without any portfolios
+    THEN check that no returns are calculated
+    """
+    result = cli_test_runner.invoke(args=['stocks', 'update_return_metrics'])
+    assert 'Updated the returns of 0 portfolios!' in result.output
@@ -1,10 +1,12 @@
 """
 This file (test_users.py) contains the functional tests for the 'users' blueprint.
 """
-from project import mail
-from project.models import User
+from project import mail, database, user_cache
+from project.models import User, Stock, ReturnMetrics
+from project.leaderboard import load_leaderboard
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
+from datetime import date
 
 
 def test_get_registration_page(test_client):
@@ -583,3 +585,135 @@ def test_get_resend_email_confirmation_not_logged_in(test_client):
         assert b'Email sent to confirm your email address.  Please check your email!' not in response.data
         assert len(outbox) == 0
         assert b'Please log in to access this page.' in response.data
+
+
+def test_cached_user_identity_invalidated(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the user's email address is confirmed after their identity has been cached
+    THEN check that the cached identity is invalidated and the updated identity is used
+    """
+    user_id = User.query.filter_by(email='patrick@gmail.com').first().id
+    response = test_client.get('/users/profile')
+    assert response.status_code == 200
+    assert user_cache.get(user_id) == (user_id, 'patrick@gmail.com', 'User', False, 'USD')
+
+    user = User.query.get(user_id)
+    user.confirm_email_address()
+    database.session.add(user)
+    database.session.commit()
+    assert user_cache.get(user_id) is None
+
+    response = test_client.get('/users/profile')
+    assert response.status_code == 200
+    assert b'Email address confirmed on' in response.data
+    assert user_cache.get(user_id) == (user_id, 'patrick@gmail.com', 'User', True, 'USD')
+
+    # Clean up by un-confirming the email address
+    user = User.query.get(user_id)
+    user.unconfirm_email_address()
+    database.session.add(user)
+    database.session.commit()
+
+
+def test_post_change_base_currency(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the base currency is changed on the '/users/base_currency' page (POST)
+    THEN check that the base currency is updated and displayed on the user profile
+    """
+    response = test_client.post('/users/base_currency', data={'base_currency': 'EUR'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Base currency has been updated to EUR!' in response.data
+    assert b'The total value of the portfolio is converted into: EUR' in response.data
+
+    response = test_client.get('/stocks/totals')
+    assert response.status_code == 200
+    assert response.get_json()['base_currency'] == 'EUR'
+
+    response = test_client.post('/users/base_currency', data={'base_currency': 'XYZ'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'ERROR! Invalid base currency!' in response.data
+
+    # Clean up by resetting the base currency
+    response = test_client.post('/users/base_currency', data={'base_currency': 'USD'}, follow_redirects=True)
+    assert b'The total value of the portfolio is converted into: USD' in response.data
+
+
+def test_post_leaderboard_opt_in(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the user opts in to the leaderboard on the '/users/leaderboard_opt_in' page (POST) and adds a stock
+    THEN check that the user is ranked on the leaderboard (with the stock valued at its cost) until they opt out
+    """
+    load_leaderboard()
+    response = test_client.get('/users/leaderboard')
+    assert response.status_code == 200
+    assert b'Your portfolio return is not ranked on the leaderboard.' in response.data
+
+    response = test_client.post('/users/leaderboard_opt_in', data={'leaderboard_opt_in': 'y'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Your portfolio return is now ranked on the leaderboard!' in response.data
+    assert b'Your portfolio return is ranked on the leaderboard.' in response.data
+
+    response = test_client.post('/add_stock',
+                                data={'stock_symbol': 'SAM',
+                                      'number_of_shares': '10',
+                                      'purchase_price': '100.00',
+                                      'purchase_date': '2020-07-01'})
+    assert response.status_code == 302
+    response = test_client.get('/users/leaderboard')
+    assert response.status_code == 200
+    assert b'Your rank: <b>1</b> of 1 (0.00%)' in response.data
+    assert b'pat***@gmail.com' in response.data
+
+    response = test_client.get('/users/leaderboard.json?n=10')
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'number_of_users': 1,
+        'leaders': [dict(rank=1, name='pat***@gmail.com', score=0.0, is_current_user=True)],
+        'user': dict(rank=1, score=0.0),
+    }
+
+    # Clean up by deleting the stock and opting out
+    stock = Stock.query.filter_by(stock_symbol='SAM').first()
+    test_client.get(f'/stocks/{stock.id}/delete')
+    response = test_client.post('/users/leaderboard_opt_in', data={}, follow_redirects=True)
+    assert b'Your portfolio return has been removed from the leaderboard!' in response.data
+    assert test_client.get('/users/leaderboard.json').get_json()['number_of_users'] == 0
+
+
+def test_get_leaderboard_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/users/leaderboard' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/users/leaderboard', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_user_profile_return_metrics(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the '/users/profile' page is requested (GET) before and after the returns are calculated
+    THEN check that the stored returns of the portfolio are displayed
+    """
+    response = test_client.get('/users/profile')
+    assert response.status_code == 200
+    assert b'Portfolio Returns' in response.data
+    assert b'The returns of the portfolio are calculated nightly.' in response.data
+
+    user_id = User.query.filter_by(email='patrick@gmail.com').first().id
+    database.session.add(ReturnMetrics(user_id, date(2020, 7, 1), date(2021, 7, 1), 0.1234, 0.1234, 0.1567))
+    database.session.commit()
+    response = test_client.get('/users/profile')
+    assert response.status_code == 200
+    assert b'Time-Weighted Return: 12.34%' in response.data
+    assert b'Money-Weighted Return (IRR): 15.67% per year' in response.data
+    assert b'Since July 01, 2020, as of July 01, 2021' in response.data
+
+    # Clean up by deleting the returns
+    ReturnMetrics.query.filter_by(user_id=user_id).delete()
+    database.session.commit()
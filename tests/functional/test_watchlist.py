@@ -1,7 +1,12 @@
 """
 This file (test_watchlist.py) contains the functional tests for the `watchlist` blueprint.
 """
+import json
 import re
+import time
+from project import database
+from project.models import WatchStock
+from project.screener import screener_cache
 
 
 def test_get_add_watch_stock_page(test_client, log_in_default_user):
@@ -171,3 +176,165 @@ def test_get_stock_analysis_guide_page(test_client, log_in_default_user):
     response = test_client.get('/stock_analysis_guide', follow_redirects=True)
     assert response.status_code == 200
     assert b'Stock Analysis Guide' in response.data
+
+
+def test_get_export_watchlist_logged_in(test_client, log_in_default_user, add_watch_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of watchstocks in the database
+    WHEN the '/watchlist/export.ndjson' page is requested (GET)
+    THEN check that each watchstock is returned as a separate JSON object
+    """
+    response = test_client.get('/watchlist/export.ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    watchstocks = [json.loads(line) for line in response.data.decode().splitlines()]
+    symbols = [watchstock['stock_symbol'] for watchstock in watchstocks]
+    assert 'COST' in symbols
+    assert 'MSFT' in symbols
+    assert 'QCOM' in symbols
+    assert 'pe_ratio' in watchstocks[0]
+
+
+def test_get_export_watchlist_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing without a user logged in
+    WHEN the '/watchlist/export.ndjson' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/watchlist/export.ndjson', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'stock_symbol' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_correlation_page_without_history(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/watchlist/correlation' page is requested (GET) without any daily prices stored
+    THEN check that a message about the missing price history is displayed
+    """
+    response = test_client.get('/watchlist/correlation')
+    assert response.status_code == 200
+    assert b'Correlation' in response.data
+    assert b'need a daily price history' in response.data
+
+    response = test_client.get('/watchlist/correlation.json')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
+
+
+def test_get_correlation_page_invalid_window(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/watchlist/correlation' page is requested (GET) with an unsupported window
+    THEN check that a 400 (Bad Request) error is returned
+    """
+    response = test_client.get('/watchlist/correlation?window=17')
+    assert response.status_code == 400
+
+
+def test_get_correlation_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/watchlist/correlation' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/watchlist/correlation', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_screener_page(test_client, log_in_default_user, add_watch_stocks_for_default_user,
+                           mock_requests_get_success_overview):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the fundamentals of the watch stocks retrieved
+    WHEN the '/screener' page is requested (GET) with criteria
+    THEN check that only the stocks matching the criteria are returned
+    """
+    screener_cache.clear()
+    WatchStock.query.update({WatchStock.stock_data_date: None})
+    database.session.commit()
+    response = test_client.get('/watchlist')
+    assert response.status_code == 200
+
+    response = test_client.get('/screener?pe_ratio_min=30&profit_margin_min=20&sort=pe_ratio')
+    assert response.status_code == 200
+    assert b'Stock Screener' in response.data
+    assert b'Costco Wholesale Corporation' in response.data
+
+    response = test_client.get('/screener.json?pe_ratio_max=30')
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 0
+
+    response = test_client.get('/screener.json?beta_min=high')
+    assert response.status_code == 400
+
+    response = test_client.get('/screener.json?pe_ratio_min=1e400')
+    assert response.status_code == 400
+
+    response = test_client.get('/screener.json?pe_ratio_max=1e300')
+    assert response.status_code == 400
+
+    response = test_client.get(f'/screener.json?page={10 ** 20}')
+    assert response.status_code == 400
+    response = test_client.get('/screener.json?page=10000')
+    assert response.status_code == 200
+    assert response.get_json()['stocks'] == []
+
+
+def test_get_screener_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/screener' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/screener', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock Screener' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_post_efficient_frontier(test_client, log_in_default_user, add_watch_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and stocks in their watchlist
+    WHEN the efficient frontier of two watch stocks is started on the '/watchlist/frontier' page (POST)
+    THEN check that the request returns immediately and the status of the job is reported
+    """
+    response = test_client.get('/watchlist/frontier')
+    assert response.status_code == 200
+    assert b'Select at least two stocks from your watchlist' in response.data
+    assert b'value="COST"' in response.data
+
+    response = test_client.post('/watchlist/frontier', data={'symbols': ['COST', 'QCOM'], 'window': '126'})
+    assert response.status_code == 302
+    assert 'symbols=COST&symbols=QCOM&window=126' in response.location
+
+    # There is no price history for the stocks in the test database, so the job fails
+    for _ in range(100):
+        response = test_client.get('/watchlist/frontier.json?symbols=COST&symbols=QCOM&window=126')
+        if response.get_json()['status'] != 'running':
+            break
+        time.sleep(0.05)
+    assert response.get_json()['status'] == 'error'
+    response = test_client.get('/watchlist/frontier?symbols=COST&symbols=QCOM&window=126')
+    assert b'The optimization could not be completed: Not enough price history' in response.data
+
+    response = test_client.post('/watchlist/frontier', data={'symbols': ['COST'], 'window': '126'}, follow_redirects=True)
+    assert b'Error! Select between 2 and 50 stocks!' in response.data
+    response = test_client.post('/watchlist/frontier', data={'symbols': ['COST', 'TSLA'], 'window': '126'})
+    assert response.status_code == 400
+    response = test_client.get('/watchlist/frontier.json?symbols=COST&symbols=MSFT&window=63')
+    assert response.status_code == 404
+
+
+def test_get_efficient_frontier_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing, without a user logged in
+    WHEN the '/watchlist/frontier' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/watchlist/frontier', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
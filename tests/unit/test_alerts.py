@@ -0,0 +1,187 @@
+"""
+This file (test_alerts.py) contains the unit tests for the alerts.py file.
+"""
+import random
+import pytest
+from flask import current_app
+from project import database, mail
+from project.models import Stock, User, PriceAlert
+from project.alerts import SymbolAlertIndex, PriceAlertEngine, price_alert_engine, alert_notification_queue, \
+    load_price_alerts, create_price_alert, delete_price_alert, check_price_alerts, check_current_price
+
+
+def test_symbol_alert_index_pop_crossed():
+    """
+    GIVEN a SymbolAlertIndex with alerts above and below the current price
+    WHEN the price moves up and then down
+    THEN check that only the alerts with a threshold crossed by each move are returned (once)
+    """
+    alerts = SymbolAlertIndex()
+    alerts.add(1, 'above', 11000)
+    alerts.add(2, 'above', 12000)
+    alerts.add(3, 'above', 10500)
+    alerts.add(4, 'below', 9000)
+    alerts.add(5, 'below', 9500)
+    assert len(alerts) == 5
+
+    assert alerts.pop_crossed(10000, 10000) == []
+    assert alerts.pop_crossed(10000, 9999) == []
+    assert alerts.pop_crossed(10000, 11000) == [3, 1]
+    assert alerts.pop_crossed(10000, 11000) == []
+    assert alerts.pop_crossed(11000, 9500) == [5]
+    assert alerts.pop_crossed(12500, 8000) == [4]
+    assert alerts.above_thresholds == [12000]
+    assert alerts.below_thresholds == []
+
+    assert alerts.remove(2, 'above', 12000)
+    assert not alerts.remove(2, 'above', 12000)
+    assert len(alerts) == 0
+
+    # Adding an alert that is already in the index does not add it again
+    alerts.add(6, 'below', 9000)
+    alerts.add(6, 'below', 9000)
+    assert alerts.below_ids == [6]
+
+
+def test_price_alert_engine_many_alerts():
+    """
+    GIVEN a PriceAlertEngine loaded with 100k alerts on 10 symbols
+    WHEN the price of a symbol moves
+    THEN check that exactly the alerts with a threshold between the old and new prices are triggered
+    """
+    generator = random.Random(42)
+    alerts = [(alert_id, f'S{alert_id % 10}', generator.choice(('above', 'below')), generator.randint(5000, 15000))
+              for alert_id in range(100_000)]
+    engine = PriceAlertEngine()
+    engine.load(alerts)
+    assert len(engine) == 100_000
+    assert not engine.is_stale(60)
+
+    expected = sorted(alert_id for alert_id, symbol, direction, threshold in alerts
+                      if symbol == 'S3' and direction == 'above' and 10000 < threshold <= 10100)
+    assert len(expected) > 0
+    assert sorted(engine.evaluate('S3', 10000, 10100)) == expected
+    number_of_alerts = 100_000 - len(expected)
+    assert engine.evaluate('S3', 10000, 10100) == []
+    assert engine.evaluate('XYZ', 10000, 20000) == []
+
+    expected = sorted(alert_id for alert_id, symbol, direction, threshold in alerts
+                      if symbol == 'S7' and direction == 'below' and 9000 <= threshold < 9500)
+    assert sorted(engine.evaluate('S7', 9500, 9000)) == expected
+    assert len(engine) == number_of_alerts - len(expected)
+
+
+def test_price_alerts_triggered(price_history):
+    """
+    GIVEN a user with a stock in their portfolio and three price alerts on it
+    WHEN the price of the stock moves up past one threshold
+    THEN check that only that alert is marked as triggered and its notification is delivered by email
+    """
+    current_app.extensions['mail'].suppress = True
+    user = User('alerts@email.com', 'FlaskIsAwesome123')
+    database.session.add(user)
+    database.session.add(Stock('AAPL', '10', '100.00', 1))
+    database.session.commit()
+    load_price_alerts()
+
+    above = create_price_alert(user.id, 'AAPL', 'ABOVE', 120.0)
+    percent = create_price_alert(user.id, 'AAPL', 'PERCENT', -10)
+    deleted = create_price_alert(user.id, 'AAPL', 'PERCENT', 15)
+    database.session.commit()
+    assert percent.threshold == 9000
+    assert percent.direction == 'below'
+    assert deleted.threshold == 11500
+    delete_price_alert(deleted)
+    database.session.commit()
+
+    with mail.record_messages() as outbox:
+        assert check_price_alerts('AAPL', 0, 13000) == []
+        triggered = check_price_alerts('AAPL', 11000, 13000)
+        database.session.commit()
+        alert_notification_queue.join()
+
+        assert [alert.id for alert in triggered] == [above.id]
+        assert len(outbox) == 1
+        assert outbox[0].subject == 'Flask Stock Portfolio App - Price Alert (AAPL)'
+        assert outbox[0].recipients[0] == 'alerts@email.com'
+        assert '$130.00' in outbox[0].html
+
+    alert = PriceAlert.query.filter_by(id=above.id).first()
+    assert alert.triggered_on is not None
+    assert alert.triggered_price == 13000
+    assert PriceAlert.query.filter_by(id=percent.id).first().triggered_on is None
+
+    # Re-loading the index only includes the alerts that have not been triggered
+    load_price_alerts()
+    assert len(price_alert_engine) == 1
+
+
+def test_create_price_alert_invalid(price_history):
+    """
+    GIVEN a user with a stock in their portfolio
+    WHEN invalid price alerts are created
+    THEN check that a ValueError is raised
+    """
+    database.session.add(Stock('AAPL', '10', '100.00', 7))
+    database.session.commit()
+
+    with pytest.raises(ValueError):
+        create_price_alert(7, 'MSFT', 'ABOVE', 120.0)
+    with pytest.raises(ValueError):
+        create_price_alert(7, 'AAPL', 'ABOVE', -1.0)
+    with pytest.raises(ValueError):
+        create_price_alert(7, 'AAPL', 'PERCENT', -100.0)
+    with pytest.raises(ValueError):
+        create_price_alert(7, 'AAPL', 'SIDEWAYS', 5.0)
+    for value in (float('inf'), float('nan'), 1e400, 1e12):
+        with pytest.raises(ValueError):
+            create_price_alert(7, 'AAPL', 'ABOVE', value)
+    with pytest.raises(ValueError):
+        create_price_alert(7, 'AAPL', 'PERCENT', 1e12)
+
+
+def test_create_price_alert_reloads_index_once(price_history):
+    """
+    GIVEN a user with a stock in their portfolio and a stale index of the price alerts
+    WHEN a price alert is created and then deleted
+    THEN check that the alert is only added to the index once, and that deleting it removes it from the index
+    """
+    database.session.add(Stock('AAPL', '10', '100.00', 8))
+    database.session.commit()
+    price_alert_engine.loaded_at = None
+
+    alert = create_price_alert(8, 'AAPL', 'ABOVE', 120.0)
+    database.session.commit()
+    assert len(price_alert_engine) == 1
+    delete_price_alert(alert)
+    database.session.commit()
+    assert len(price_alert_engine) == 0
+
+
+def test_check_current_price(price_history):
+    """
+    GIVEN alerts on AAPL (with a latest daily close of $391.00), one created when the price was already above it
+    WHEN new current prices of AAPL are evaluated (as retrieved from a user's stale row)
+    THEN check that the moves are evaluated from the daily close and then from the last price evaluated
+    """
+    current_app.extensions['mail'].suppress = True
+    price_history.refresh('AAPL')
+    price_alert_engine.load([])
+    price_alert_engine._last_prices.clear()
+    user = User('current_price@email.com', 'FlaskIsAwesome123')
+    database.session.add(user)
+    database.session.commit()
+    database.session.add(Stock('AAPL', '10', '300.00', user.id))
+    database.session.commit()
+    already_above = create_price_alert(user.id, 'AAPL', 'ABOVE', 380.0)
+    above = create_price_alert(user.id, 'AAPL', 'ABOVE', 393.0)
+    below = create_price_alert(user.id, 'AAPL', 'BELOW', 392.0)
+    database.session.commit()
+
+    # The move from $391.00 (not from the $140.00 of a stale row) to $395.00 only crosses $393.00
+    assert [alert.id for alert in check_current_price('AAPL', 39500)] == [above.id]
+    assert [alert.id for alert in check_current_price('AAPL', 39100)] == [below.id]
+    assert check_current_price('AAPL', 0) == []
+    database.session.commit()
+    alert_notification_queue.join()
+    assert PriceAlert.query.filter_by(id=already_above.id).first().triggered_on is None
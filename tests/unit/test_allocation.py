@@ -0,0 +1,123 @@
+"""
+This file (test_allocation.py) contains the unit tests for the allocation.py file.
+"""
+from datetime import date
+from project import database
+from project.models import Stock, StockFundamentals, FxRate, User
+from project.allocation import get_allocation, allocation_cache
+from project.fx import fx_rate_cache
+
+
+def add_stock(symbol, number_of_shares, current_price, user_id, currency='USD'):
+    stock = Stock(symbol, number_of_shares, '1.00', user_id, currency=currency)
+    stock.current_price = current_price
+    stock.position_value = current_price * stock.number_of_shares
+    database.session.add(stock)
+
+
+def add_fundamentals(symbol, asset_type, sector, industry):
+    fundamentals = StockFundamentals(symbol)
+    fundamentals.asset_type = asset_type
+    fundamentals.sector = sector
+    fundamentals.industry = industry
+    database.session.add(fundamentals)
+
+
+def test_get_allocation(price_history):
+    """
+    GIVEN a portfolio with lots of stocks in two sectors, a stock in EUR, and a stock without fundamentals
+    WHEN the allocation of the portfolio is calculated
+    THEN check the allocation by sector, industry, and asset type in the base currency
+    """
+    allocation_cache.clear()
+    fx_rate_cache.clear()
+    database.session.add(FxRate('EUR', date(2020, 7, 1), '1.50'))
+    add_stock('AAPL', '10', 1000, 51)
+    add_stock('AAPL', '10', 1000, 51)
+    add_stock('MSFT', '10', 1000, 51)
+    add_stock('SAP', '10', 1000, 51, currency='EUR')
+    add_stock('XYZ', '10', 500, 51)
+    add_fundamentals('AAPL', 'Common Stock', 'Technology', 'Electronic Computers')
+    add_fundamentals('MSFT', 'Common Stock', 'Technology', 'Prepackaged Software')
+    add_fundamentals('SAP', 'Common Stock', 'Technology', 'Prepackaged Software')
+    database.session.commit()
+
+    allocation = get_allocation(51)
+    assert allocation['total_value'] == 200.0 + 100.0 + 150.0 + 50.0
+    assert allocation['sector'] == [dict(name='Technology', value=450.0, weight=0.9),
+                                    dict(name='Unknown', value=50.0, weight=0.1)]
+    assert allocation['industry'] == [dict(name='Prepackaged Software', value=250.0, weight=0.5),
+                                      dict(name='Electronic Computers', value=200.0, weight=0.4),
+                                      dict(name='Unknown', value=50.0, weight=0.1)]
+    assert [item['name'] for item in allocation['asset_type']] == ['Common Stock', 'Unknown']
+    assert get_allocation(51) is allocation
+
+    assert allocation['missing_rates'] == []
+
+    allocation = get_allocation(51, 'EUR')
+    assert allocation['base_currency'] == 'EUR'
+    assert allocation['total_value'] == round(500.0 / 1.5, 2)
+
+
+def test_get_allocation_missing_rate(price_history):
+    """
+    GIVEN a portfolio with a stock in USD and a stock in GBP (without an exchange rate)
+    WHEN the allocation of the portfolio is calculated in USD
+    THEN check that the stock in GBP is excluded from the allocation and its currency is listed
+    """
+    allocation_cache.clear()
+    fx_rate_cache.clear()
+    add_stock('AAPL', '10', 1000, 53)
+    add_stock('BP', '10', 1000, 53, currency='GBP')
+    add_fundamentals('AAPL', 'Common Stock', 'Technology', 'Electronic Computers')
+    add_fundamentals('BP', 'Common Stock', 'Energy', 'Oil & Gas')
+    database.session.commit()
+
+    allocation = get_allocation(53)
+    assert allocation['total_value'] == 100.0
+    assert allocation['sector'] == [dict(name='Technology', value=100.0, weight=1.0)]
+    assert allocation['missing_rates'] == ['GBP']
+
+
+def test_get_allocation_changed_in_another_process(price_history):
+    """
+    GIVEN the cached allocation of a user
+    WHEN the user's stocks are changed without the ORM events of this process (as in another process)
+    THEN check that the allocation is re-calculated, as the version of the user's data changed
+    """
+    allocation_cache.clear()
+    user = User('allocation@email.com', 'FlaskIsAwesome123')
+    database.session.add(user)
+    database.session.commit()
+    add_stock('AAPL', '10', 1000, user.id)
+    database.session.commit()
+    assert get_allocation(user.id)['total_value'] == 100.0
+
+    database.session.execute(Stock.__table__.update().where(Stock.__table__.c.user_id == user.id)
+                             .values(position_value=20000))
+    database.session.execute(User.__table__.update().where(User.__table__.c.id == user.id)
+                             .values(data_version=User.__table__.c.data_version + 1))
+    database.session.commit()
+    assert get_allocation(user.id)['total_value'] == 200.0
+
+
+def test_get_allocation_invalidated(price_history):
+    """
+    GIVEN the cached allocation of a portfolio
+    WHEN a stock is added to the portfolio, and then the sector of a stock is refreshed
+    THEN check that the cached allocation is replaced each time
+    """
+    allocation_cache.clear()
+    add_stock('AAPL', '10', 1000, 52)
+    add_fundamentals('AAPL', 'Common Stock', 'Technology', 'Electronic Computers')
+    database.session.commit()
+    assert get_allocation(52)['sector'][0]['value'] == 100.0
+
+    add_stock('AAPL', '10', 1000, 52)
+    database.session.commit()
+    assert get_allocation(52)['sector'][0]['value'] == 200.0
+
+    fundamentals = StockFundamentals.query.filter_by(stock_symbol='AAPL').first()
+    fundamentals.sector = 'Manufacturing'
+    database.session.commit()
+    assert get_allocation(52)['sector'][0]['name'] == 'Manufacturing'
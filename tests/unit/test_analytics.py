@@ -0,0 +1,251 @@
+"""
+This file (test_analytics.py) contains the unit tests for the analytics.py file.
+"""
+from datetime import date, datetime
+import time
+import numpy as np
+import pytest
+from project import database
+from project.models import Stock, WatchStock, DailyPrice, FxRate
+from project.analytics import forward_fill, load_price_matrix, compute_returns, compute_max_drawdown, compute_analytics, \
+    compute_portfolio_values, get_portfolio_value_history, portfolio_value_cache, compute_covariance_correlation, \
+    get_correlation_matrix, correlation_cache, get_portfolio_analytics
+from project.fx import fx_rate_cache
+
+
+def test_forward_fill():
+    """
+    GIVEN a price matrix with missing prices
+    WHEN the missing prices are forward filled
+    THEN check that each missing price is replaced by the previous price in the same column
+    """
+    prices = np.array([[np.nan, 10.0],
+                       [5.0, np.nan],
+                       [np.nan, np.nan],
+                       [6.0, 12.0]])
+    filled = forward_fill(prices)
+    assert np.isnan(filled[0, 0])
+    assert filled[:, 1].tolist() == [10.0, 10.0, 10.0, 12.0]
+    assert filled[1:, 0].tolist() == [5.0, 5.0, 6.0]
+
+
+def test_compute_returns_and_max_drawdown():
+    """
+    GIVEN a matrix of values
+    WHEN the daily returns and maximum drawdowns are computed
+    THEN check the results for each column
+    """
+    values = np.array([[100.0, 10.0],
+                       [110.0, 9.0],
+                       [55.0, 12.0],
+                       [120.0, 6.0]])
+    assert np.allclose(compute_returns(values)[:, 0], [0.1, -0.5, 120.0 / 55.0 - 1.0])
+    assert np.allclose(compute_max_drawdown(values), [-0.5, -0.5])
+
+
+def test_compute_analytics():
+    """
+    GIVEN a matrix of closing prices for two holdings and a benchmark
+    WHEN the analytics are computed
+    THEN check the volatility, Sharpe ratio, and beta of each holding and the portfolio
+    """
+    benchmark = np.array([100.0, 101.0, 99.0, 102.0, 103.0, 101.0])
+    prices = np.column_stack([benchmark * 2.0, np.full(6, 50.0) + np.arange(6)])
+    analytics = compute_analytics(prices, [10, 5], benchmark, risk_free_rate=0.0)
+
+    benchmark_returns = compute_returns(benchmark)
+    expected_volatility = benchmark_returns.std(ddof=1) * np.sqrt(252)
+    assert analytics['volatility'][0] == pytest.approx(expected_volatility)
+    assert analytics['sharpe_ratio'][0] == pytest.approx(benchmark_returns.mean() * 252 / expected_volatility)
+    assert analytics['beta'][0] == pytest.approx(1.0)
+    assert analytics['max_drawdown'][0] == pytest.approx(99.0 / 101.0 - 1.0)
+    assert len(analytics['volatility']) == 3  # Two holdings and the portfolio
+
+
+def test_load_price_matrix(price_history):
+    """
+    GIVEN the daily prices of two stocks stored in the database
+    WHEN the aligned price matrix is loaded for a range of dates
+    THEN check that the matrix has one column per stock and one row per trading day
+    """
+    days, prices = load_price_matrix(['AAPL', 'MSFT'], date(2020, 7, 6), date(2020, 7, 10))
+    assert len(days) == 5
+    assert prices.shape == (5, 2)
+    assert prices[0].tolist() == [366.0, 197.0]
+
+    days, prices = load_price_matrix(['AAPL', 'SBUX'])
+    assert len(days) == 0
+
+
+def test_compute_analytics_performance():
+    """
+    GIVEN the daily closing prices for 200 holdings over 10 years
+    WHEN the analytics are computed
+    THEN check that the analytics are computed in less than 50ms
+    """
+    random_generator = np.random.default_rng(17)
+    prices = 100.0 * np.exp(np.cumsum(random_generator.normal(0.0, 0.01, (2520, 200)), axis=0))
+    benchmark = 100.0 * np.exp(np.cumsum(random_generator.normal(0.0, 0.01, 2520)))
+    shares = random_generator.integers(1, 100, 200)
+
+    durations = []
+    for _ in range(5):
+        start_time = time.perf_counter()
+        compute_analytics(prices, shares, benchmark)
+        durations.append(time.perf_counter() - start_time)
+    assert min(durations) < 0.050
+
+
+def test_compute_portfolio_values():
+    """
+    GIVEN a price matrix for two stocks and three lots purchased on different days
+    WHEN the daily portfolio values are computed
+    THEN check that each lot is only included from its purchase date
+    """
+    days = np.array([10, 11, 12, 13])
+    prices = np.array([[10.0, np.nan],
+                       [11.0, 100.0],
+                       [12.0, 101.0],
+                       [13.0, 102.0]])
+    values = compute_portfolio_values(days, prices,
+                                      lot_columns=np.array([0, 1, 0]),
+                                      lot_shares=np.array([5.0, 2.0, 1.0]),
+                                      lot_purchase_days=np.array([5, 11, 13]))
+    assert values.tolist() == [50.0, 255.0, 262.0, 282.0]
+
+
+def test_get_portfolio_value_history(price_history):
+    """
+    GIVEN the daily prices of two stocks and a portfolio with a lot of each stock
+    WHEN the portfolio value history is retrieved before and after new daily prices are stored
+    THEN check that the cached series is extended with the new days
+    """
+    database.session.add(Stock('AAPL', '10', '370.00', 17, datetime(2020, 7, 1)))
+    database.session.add(Stock('MSFT', '4', '190.00', 17, datetime(2020, 7, 15)))
+    database.session.commit()
+
+    days, values = get_portfolio_value_history(17)
+    assert len(days) == 23
+    assert values[0] == 3610.0  # 10 shares of AAPL at $361.00
+    assert values[-1] == 10 * 391.0 + 4 * 184.5
+
+    database.session.add(DailyPrice('AAPL', date(2020, 8, 3), '400.00'))
+    database.session.add(DailyPrice('MSFT', date(2020, 8, 3), '200.00'))
+    database.session.commit()
+    price_history.refresh('AAPL')
+    price_history.refresh('MSFT')
+
+    cached_days = portfolio_value_cache.get(17)[1]
+    days, values = get_portfolio_value_history(17)
+    assert len(days) == 24
+    assert np.array_equal(days[:-1], cached_days)
+    assert values[-1] == 10 * 400.0 + 4 * 200.0
+
+    assert get_portfolio_value_history(18) is None
+
+
+def test_get_portfolio_value_history_base_currency(price_history):
+    """
+    GIVEN the daily prices of two stocks, the exchange rate of EUR into USD, and a portfolio with lots in USD, EUR, and GBP
+    WHEN the portfolio value history is retrieved in USD and in EUR
+    THEN check that the lots are converted into the base currency, and that the lot in GBP (without a rate) is excluded
+    """
+    fx_rate_cache.clear()
+    database.session.add(FxRate('EUR', date(2020, 7, 1), '1.25'))
+    database.session.add(Stock('AAPL', '10', '370.00', 19, datetime(2020, 7, 1)))
+    database.session.add(Stock('MSFT', '4', '190.00', 19, datetime(2020, 7, 1), currency='EUR'))
+    database.session.add(Stock('MSFT', '100', '190.00', 19, datetime(2020, 7, 1), currency='GBP'))
+    database.session.commit()
+
+    days, values = get_portfolio_value_history(19, 'USD')
+    assert values[-1] == pytest.approx(10 * 391.0 + 4 * 184.5 * 1.25)
+
+    days, values = get_portfolio_value_history(19, 'EUR')
+    assert values[-1] == pytest.approx(10 * 391.0 / 1.25 + 4 * 184.5)
+
+    database.session.add(Stock('AAPL', '10', '370.00', 20, datetime(2020, 7, 1), currency='GBP'))
+    database.session.commit()
+    assert get_portfolio_value_history(20, 'USD') is None
+
+
+def test_get_portfolio_analytics_base_currency(price_history):
+    """
+    GIVEN the daily prices of two stocks and a portfolio with a holding in USD and a holding in GBP (without a rate)
+    WHEN the portfolio analytics are calculated in USD
+    THEN check that the holding in GBP is listed as excluded, and that the portfolio analytics match the holding in USD
+    """
+    fx_rate_cache.clear()
+    database.session.add(Stock('AAPL', '10', '370.00', 21, datetime(2020, 7, 1)))
+    database.session.add(Stock('MSFT', '4', '190.00', 21, datetime(2020, 7, 1), currency='GBP'))
+    database.session.commit()
+
+    analytics = get_portfolio_analytics(21, base_currency='USD')
+    assert analytics['base_currency'] == 'USD'
+    assert analytics['excluded_symbols'] == ['MSFT']
+    assert [holding['shares'] for holding in analytics['holdings']] == [10, 4]
+    assert analytics['portfolio']['annualized_return'] == analytics['holdings'][0]['annualized_return']
+    assert analytics['portfolio']['volatility'] == analytics['holdings'][0]['volatility']
+
+    assert get_portfolio_analytics(21, base_currency='GBP') is None
+
+
+def test_compute_covariance_correlation():
+    """
+    GIVEN a matrix of daily prices, including a stock with a constant price
+    WHEN the covariance and correlation matrices are computed
+    THEN check that they match the NumPy reference calculations
+    """
+    rng = np.random.default_rng(5)
+    prices = np.empty((100, 4))
+    prices[:, :3] = 100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.01, (100, 3)), axis=0)
+    prices[:, 3] = 50.0
+
+    covariance, correlation = compute_covariance_correlation(prices)
+    returns = compute_returns(prices[:, :3])
+    assert np.allclose(covariance[:3, :3], np.cov(returns, rowvar=False) * 252)
+    assert np.allclose(correlation[:3, :3], np.corrcoef(returns, rowvar=False))
+    assert np.isnan(correlation[3]).all()
+    assert np.isnan(correlation[:, 3]).all()
+
+
+def test_compute_covariance_correlation_performance():
+    """
+    GIVEN a matrix of one year of daily prices for 100 stocks
+    WHEN the covariance and correlation matrices are computed
+    THEN check that the calculation is fast enough for an interactive page
+    """
+    rng = np.random.default_rng(7)
+    prices = 100.0 * np.cumprod(1.0 + rng.normal(0.0005, 0.02, (253, 100)), axis=0)
+
+    start = time.perf_counter()
+    covariance, correlation = compute_covariance_correlation(prices)
+    elapsed = time.perf_counter() - start
+
+    assert correlation.shape == (100, 100)
+    assert np.allclose(np.diag(correlation), 1.0)
+    assert elapsed < 0.05
+
+
+def test_get_correlation_matrix(price_history):
+    """
+    GIVEN the daily prices of two stocks in a user's portfolio and watchlist, and a stock without a history
+    WHEN the correlation matrix is retrieved twice
+    THEN check that the matrices only include the stocks with a history and the second result is cached
+    """
+    correlation_cache.clear()
+    database.session.add(Stock('AAPL', '10', '370.00', 19, datetime(2020, 7, 1)))
+    database.session.add(WatchStock('MSFT', 19))
+    database.session.add(WatchStock('NFLX', 19))
+    database.session.commit()
+
+    matrices = get_correlation_matrix(19, window=10)
+    assert matrices['symbols'] == ['AAPL', 'MSFT']
+    assert matrices['excluded_symbols'] == ['NFLX']
+    assert matrices['end_date'] == '2020-07-31'
+    assert matrices['correlation'][0][0] == 1.0
+    assert matrices['correlation'][0][1] == matrices['correlation'][1][0]
+    assert matrices['correlation'][0][1] < 0.0  # AAPL rises while MSFT falls
+    assert get_correlation_matrix(19, window=10) is matrices
+    assert len(correlation_cache) == 1
+
+    assert get_correlation_matrix(20) is None
@@ -0,0 +1,119 @@
+"""
+This file (test_assets.py) contains the unit tests for the assets.py file.
+"""
+import brotli
+import gzip
+import os
+import re
+from flask import url_for
+from project.assets import StaticAssets, fingerprint_filename
+
+
+def test_fingerprint_filename():
+    """
+    GIVEN the filename and content of a static file
+    WHEN the fingerprinted filename is generated
+    THEN check that the hash of the content is inserted before the extension
+    """
+    fingerprinted_filename = fingerprint_filename('js/Chart.min.js', b'content')
+    assert re.fullmatch(r'js/Chart\.min\.[0-9a-f]{10}\.js', fingerprinted_filename)
+    assert fingerprint_filename('js/Chart.min.js', b'content') == fingerprinted_filename
+    assert fingerprint_filename('js/Chart.min.js', b'new content') != fingerprinted_filename
+
+
+def test_build_static_assets(tmp_path):
+    """
+    GIVEN a static folder with a large stylesheet, a small stylesheet, and an image
+    WHEN the static files are built (twice)
+    THEN check that every file is fingerprinted, that only the large stylesheet is compressed (with gzip and Brotli), and that it is only compressed once
+    """
+    static_folder = tmp_path / 'static'
+    build_folder = tmp_path / 'build'
+    (static_folder / 'css').mkdir(parents=True)
+    (static_folder / 'img').mkdir()
+    large_css = b'.table { border: 1px solid #000; }\n' * 100
+    (static_folder / 'css' / 'large.css').write_bytes(large_css)
+    (static_folder / 'css' / 'small.css').write_bytes(b'body { margin: 0; }')
+    (static_folder / 'img' / 'logo.png').write_bytes(os.urandom(2048))
+
+    assets = StaticAssets()
+    assets.build(str(static_folder), str(build_folder))
+    assert set(assets.fingerprints) == {'css/large.css', 'css/small.css', 'img/logo.png'}
+    fingerprinted_filename = assets.fingerprints['css/large.css']
+    assert assets.sources[fingerprinted_filename] == 'css/large.css'
+    assert assets.encodings[assets.fingerprints['css/small.css']] == []
+    assert assets.encodings[assets.fingerprints['img/logo.png']] == []
+
+    encodings = dict(assets.encodings[fingerprinted_filename])
+    assert gzip.decompress(open(encodings['gzip'], 'rb').read()) == large_css
+    assert brotli.decompress(open(encodings['br'], 'rb').read()) == large_css
+    modified_time = os.stat(encodings['gzip']).st_mtime_ns
+
+    assets.build(str(static_folder), str(build_folder))
+    assert dict(assets.encodings[fingerprinted_filename]) == encodings
+    assert os.stat(encodings['gzip']).st_mtime_ns == modified_time
+
+
+def test_get_fingerprinted_static_file(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the fingerprinted URL of the vendored Chart.js file is requested (GET) with and without gzip
+    THEN check that the file is served (compressed if accepted) with an immutable, year-long Cache-Control header
+    """
+    with test_client.application.test_request_context():
+        url = url_for('static', filename='js/Chart.min.js')
+    assert re.fullmatch(r'/static/js/Chart\.min\.[0-9a-f]{10}\.js', url)
+    with open(os.path.join(test_client.application.static_folder, 'js', 'Chart.min.js'), 'rb') as file:
+        content = file.read()
+
+    response = test_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Type'].startswith(('application/javascript', 'text/javascript'))
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 31536000
+    assert len(response.data) < len(content)
+    assert gzip.decompress(response.data) == content
+
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == content
+    assert response.cache_control.immutable
+
+
+def test_get_fingerprinted_static_file_brotli(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the fingerprinted URL of the vendored Chart.js file is requested (GET) by a browser that accepts Brotli and gzip
+    THEN check that the Brotli-compressed file is served, as it is the preferred encoding
+    """
+    with test_client.application.test_request_context():
+        url = url_for('static', filename='js/Chart.min.js')
+    with open(os.path.join(test_client.application.static_folder, 'js', 'Chart.min.js'), 'rb') as file:
+        content = file.read()
+
+    response = test_client.get(url, headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['Content-Type'].startswith(('application/javascript', 'text/javascript'))
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.cache_control.immutable
+    assert brotli.decompress(response.data) == content
+
+
+def test_get_pages_with_fingerprinted_static_files(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the home page is requested (GET), and a static file is requested without a fingerprint
+    THEN check that the page links to the fingerprinted stylesheet, and that the static file is not cached as immutable
+    """
+    response = test_client.get('/')
+    assert response.status_code == 200
+    assert re.search(rb'/static/css/base_style\.[0-9a-f]{10}\.css', response.data)
+    assert b'/static/css/base_style.css' not in response.data
+
+    response = test_client.get('/static/css/base_style.css')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
@@ -0,0 +1,68 @@
+"""
+This file (test_cache.py) contains the unit tests for the cache.py file.
+"""
+from project.cache import TTLCache
+from freezegun import freeze_time
+
+
+def test_cache_set_and_get():
+    """
+    GIVEN an empty TTLCache
+    WHEN values are stored in the cache
+    THEN check that the values are returned and missing keys return the default
+    """
+    cache = TTLCache(maxsize=4)
+    cache.set('AAPL', 14834)
+    assert cache.get('AAPL') == 14834
+    assert 'AAPL' in cache
+    assert cache.get('MSFT') is None
+    assert cache.get('MSFT', 0) == 0
+
+
+def test_cache_lru_eviction():
+    """
+    GIVEN a full TTLCache
+    WHEN a new value is stored in the cache
+    THEN check that the least-recently used value is evicted
+    """
+    cache = TTLCache(maxsize=2)
+    cache.set(1, 'one')
+    cache.set(2, 'two')
+    cache.get(1)
+    cache.set(3, 'three')
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+    assert len(cache) == 2
+
+
+def test_cache_ttl_expiration():
+    """
+    GIVEN a TTLCache with a TTL of 60 seconds
+    WHEN the value is read before and after the TTL expires
+    THEN check that the value is only returned before the TTL expires
+    """
+    with freeze_time('2020-07-24 09:00:00', tick=False) as frozen_time:
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('COST', 'Costco')
+        frozen_time.tick(59)
+        assert cache.get('COST') == 'Costco'
+        frozen_time.tick(2)
+        assert cache.get('COST') is None
+
+
+def test_cache_invalidate_and_clear():
+    """
+    GIVEN a TTLCache with values stored
+    WHEN a value is invalidated and then the cache is cleared
+    THEN check that the values are removed
+    """
+    cache = TTLCache(maxsize=4)
+    cache.set(1, 'one')
+    cache.set(2, 'two')
+    cache.invalidate(1)
+    cache.invalidate(17)
+    assert 1 not in cache
+    assert 2 in cache
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,107 @@
+"""
+This file (test_charts.py) contains the unit tests for the charts.py file.
+"""
+from datetime import date
+import time
+import numpy as np
+from flask import current_app
+from project.charts import lttb, aggregate_closes, get_chart_data, chart_cache
+from project.prices import date_to_day_number
+
+
+def test_lttb_short_series():
+    """
+    GIVEN a series with fewer points than the threshold
+    WHEN the series is downsampled
+    THEN check that every point is selected
+    """
+    assert lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+
+
+def test_lttb_preserves_shape():
+    """
+    GIVEN a long series with a single spike and a single dip
+    WHEN the series is downsampled
+    THEN check that the first, last, spike, and dip points are selected in order
+    """
+    x = np.arange(10_000)
+    y = np.sin(x / 1000.0)
+    y[2500] = 10.0
+    y[7300] = -10.0
+
+    selected = lttb(x, y, 100)
+    assert len(selected) == 100
+    assert selected[0] == 0
+    assert selected[-1] == 9_999
+    assert np.all(np.diff(selected) > 0)
+    assert 2500 in selected
+    assert 7300 in selected
+
+
+def test_lttb_performance():
+    """
+    GIVEN a series of 20 years of daily prices
+    WHEN the series is downsampled to 250 points
+    THEN check that the downsampling is fast enough for every page request
+    """
+    x = np.arange(5040)
+    y = 100.0 * np.cumprod(1.0 + np.random.default_rng(3).normal(0.0, 0.01, 5040))
+
+    start = time.perf_counter()
+    selected = lttb(x, y, 250)
+    elapsed = time.perf_counter() - start
+
+    assert len(selected) == 250
+    assert elapsed < 0.05
+
+
+def test_aggregate_closes():
+    """
+    GIVEN the daily closing prices of a stock over several weeks and months
+    WHEN the prices are aggregated to a weekly and a monthly resolution
+    THEN check that the last closing price of each week and month is returned
+    """
+    price_dates = [date(2020, 7, 29), date(2020, 7, 30), date(2020, 7, 31),  # Wednesday - Friday
+                   date(2020, 8, 3), date(2020, 8, 7),                       # Monday, Friday
+                   date(2020, 8, 10), date(2020, 9, 1)]
+    days = np.array([date_to_day_number(price_date) for price_date in price_dates], dtype=np.int32)
+    closes = np.arange(1.0, 8.0)
+
+    weekly_days, weekly_closes = aggregate_closes(days, closes, 'weekly')
+    assert weekly_closes.tolist() == [3.0, 5.0, 6.0, 7.0]
+    assert weekly_days[0] == date_to_day_number(date(2020, 7, 31))
+
+    monthly_days, monthly_closes = aggregate_closes(days, closes, 'monthly')
+    assert monthly_closes.tolist() == [3.0, 6.0, 7.0]
+    assert monthly_days[1] == date_to_day_number(date(2020, 8, 10))
+
+    assert aggregate_closes(days, closes, 'daily')[1] is closes
+
+
+def test_get_chart_data(price_history):
+    """
+    GIVEN the daily prices of a stock for July 2020
+    WHEN the chart data is retrieved for the last month with a maximum of 10 points
+    THEN check that the series is downsampled, includes the first and last day, and is cached
+    """
+    chart_cache.clear()
+    current_app.config['CHART_MAX_POINTS'] = 10
+
+    days, labels, values = get_chart_data('AAPL', '1M', 'daily')
+    assert len(days) == 10
+    assert len(labels) == 10
+    assert len(values) == 10
+    assert labels[0] == '07/01/2020'
+    assert labels[-1] == '07/31/2020'
+    assert values[0] == 361.0
+    assert values[-1] == 391.0
+    assert get_chart_data('AAPL', '1M', 'daily') is chart_cache.get(('AAPL', '1M', 'daily', 10, date(2020, 7, 31)))
+
+    _, labels, values = get_chart_data('AAPL', 'MAX', 'weekly')
+    assert labels == ['07/03/2020', '07/10/2020', '07/17/2020', '07/24/2020', '07/31/2020']
+    assert values == [363.0, 370.0, 377.0, 384.0, 391.0]
+
+    days, labels, values = get_chart_data('NFLX', '1Y', 'monthly')
+    assert len(days) == 0
+    assert labels == []
+    assert values == []
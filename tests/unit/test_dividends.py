@@ -0,0 +1,120 @@
+"""
+This file (test_dividends.py) contains the unit tests for the dividends.py file.
+"""
+from datetime import date
+from project import database
+from project.models import Stock, StockFundamentals, FxRate, User
+from project.dividends import get_dividend_projection, dividend_cache
+from project.fx import fx_rate_cache
+
+
+def add_fundamentals(symbol, dividend_per_share):
+    fundamentals = StockFundamentals(symbol)
+    fundamentals.dividend_per_share = dividend_per_share
+    database.session.add(fundamentals)
+
+
+def test_get_dividend_projection(price_history):
+    """
+    GIVEN a portfolio with several lots of a stock, and the dividends of two of its three stocks
+    WHEN the projected dividend income is calculated
+    THEN check the income of each stock (with its lots combined) and the totals
+    """
+    dividend_cache.clear()
+    database.session.add(Stock('AAPL', '10', '100.00', 31))
+    database.session.add(Stock('AAPL', '30', '200.00', 31))
+    database.session.add(Stock('MSFT', '20', '50.00', 31))
+    database.session.add(Stock('TSLA', '5', '700.00', 31))
+    database.session.add(Stock('AAPL', '1000', '10.00', 32))
+    add_fundamentals('AAPL', 300)
+    add_fundamentals('MSFT', 120)
+    database.session.commit()
+
+    projection = get_dividend_projection(31)
+    assert [holding['symbol'] for holding in projection['holdings']] == ['AAPL', 'MSFT', 'TSLA']
+    assert projection['holdings'][0]['shares'] == 40
+    assert projection['holdings'][0]['annual_income'] == 120.0
+    assert projection['holdings'][0]['monthly_income'] == 10.0
+    assert projection['holdings'][0]['yield_on_cost'] == round(120.0 / 7000.0, 4)
+    assert projection['holdings'][2]['dividend_per_share'] is None
+    assert projection['holdings'][2]['annual_income'] is None
+    assert projection['annual_income'] == 144.0
+    assert projection['monthly_income'] == 12.0
+    assert projection['yield_on_cost'] == round(144.0 / 8000.0, 4)
+    assert get_dividend_projection(31) is projection
+    assert projection['missing_rates'] == []
+
+
+def test_get_dividend_projection_invalidated(price_history):
+    """
+    GIVEN the cached dividend projection of a portfolio
+    WHEN a stock is added to the portfolio, and then the dividend of a stock is refreshed
+    THEN check that the cached projection is replaced each time
+    """
+    dividend_cache.clear()
+    database.session.add(Stock('AAPL', '10', '100.00', 33))
+    add_fundamentals('AAPL', 300)
+    database.session.commit()
+    assert get_dividend_projection(33)['annual_income'] == 30.0
+
+    database.session.add(Stock('AAPL', '10', '150.00', 33))
+    database.session.commit()
+    assert get_dividend_projection(33)['annual_income'] == 60.0
+
+    fundamentals = StockFundamentals.query.filter_by(stock_symbol='AAPL').first()
+    fundamentals.dividend_per_share = 400
+    database.session.commit()
+    assert get_dividend_projection(33)['annual_income'] == 80.0
+
+
+def test_get_dividend_projection_base_currency(price_history):
+    """
+    GIVEN a portfolio with stocks in USD, EUR, and GBP, and the exchange rate of EUR into USD
+    WHEN the projected dividend income is calculated in EUR
+    THEN check that the totals are converted into EUR and the stock in GBP (without a rate) is listed as excluded
+    """
+    fx_rate_cache.clear()
+    dividend_cache.clear()
+    database.session.add(FxRate('EUR', date(2020, 7, 1), '1.25'))
+    database.session.add(Stock('AAPL', '10', '100.00', 34))
+    database.session.add(Stock('SAP', '10', '100.00', 34, currency='EUR'))
+    database.session.add(Stock('BP', '10', '10.00', 34, currency='GBP'))
+    add_fundamentals('AAPL', 500)
+    add_fundamentals('SAP', 200)
+    add_fundamentals('BP', 100)
+    database.session.commit()
+
+    projection = get_dividend_projection(34, 'EUR')
+    assert projection['base_currency'] == 'EUR'
+    assert [holding['currency'] for holding in projection['holdings']] == ['USD', 'GBP', 'EUR']
+    assert projection['holdings'][0]['annual_income'] == 50.0
+    assert projection['holdings'][0]['converted_annual_income'] == 40.0
+    assert projection['holdings'][1]['annual_income'] == 10.0
+    assert projection['holdings'][1]['converted_annual_income'] is None
+    assert projection['annual_income'] == 40.0 + 20.0
+    assert projection['yield_on_cost'] == round(60.0 / (1000.0 / 1.25 + 1000.0), 4)
+    assert projection['missing_rates'] == ['GBP']
+    assert get_dividend_projection(34, 'USD')['annual_income'] == 50.0 + 25.0
+
+
+def test_get_dividend_projection_changed_in_another_process(price_history):
+    """
+    GIVEN the cached dividend projection of a user
+    WHEN the user's stocks are changed without the ORM events of this process (as in another process)
+    THEN check that the projection is re-calculated, as the version of the user's data changed
+    """
+    dividend_cache.clear()
+    user = User('dividends@email.com', 'FlaskIsAwesome123')
+    database.session.add(user)
+    database.session.commit()
+    database.session.add(Stock('AAPL', '10', '100.00', user.id))
+    add_fundamentals('AAPL', 300)
+    database.session.commit()
+    assert get_dividend_projection(user.id)['annual_income'] == 30.0
+
+    database.session.execute(Stock.__table__.update().where(Stock.__table__.c.user_id == user.id)
+                             .values(number_of_shares=20))
+    database.session.execute(User.__table__.update().where(User.__table__.c.id == user.id)
+                             .values(data_version=User.__table__.c.data_version + 1))
+    database.session.commit()
+    assert get_dividend_projection(user.id)['annual_income'] == 60.0
@@ -0,0 +1,82 @@
+"""
+This file (test_frontier.py) contains the unit tests for the frontier.py file.
+"""
+import time
+import numpy as np
+import pytest
+from project.frontier import compute_efficient_frontier, start_frontier, get_frontier, frontier_jobs
+
+
+def wait_for_frontier(symbols, window):
+    for _ in range(100):
+        frontier = get_frontier(symbols, window)
+        if frontier is not None and frontier['status'] != 'running':
+            return frontier
+        time.sleep(0.05)
+    return frontier
+
+
+def test_compute_efficient_frontier():
+    """
+    GIVEN the expected returns and covariance of two uncorrelated stocks
+    WHEN the efficient frontier is computed
+    THEN check the minimum-variance and maximum Sharpe ratio weights, and the sampled frontier
+    """
+    expected_returns = [0.10, 0.20]
+    covariance = np.diag([0.04, 0.09])
+    result = compute_efficient_frontier(expected_returns, covariance, risk_free_rate=0.0, number_of_points=10)
+
+    assert result['minimum_variance']['weights'] == [round(0.09 / 0.13, 4), round(0.04 / 0.13, 4)]
+    assert result['max_sharpe']['weights'] == [round(2.5 / (2.5 + 20 / 9), 4), round((20 / 9) / (2.5 + 20 / 9), 4)]
+
+    frontier = result['frontier']
+    assert len(frontier) == 10
+    assert frontier[0] == result['minimum_variance']
+    assert all(abs(sum(point['weights']) - 1.0) < 1e-3 for point in frontier)
+    assert [point['expected_return'] for point in frontier] == sorted(point['expected_return'] for point in frontier)
+    assert [point['volatility'] for point in frontier] == sorted(point['volatility'] for point in frontier)
+    assert frontier[-1]['expected_return'] == 0.2
+    assert all(point['sharpe_ratio'] <= result['max_sharpe']['sharpe_ratio'] for point in frontier)
+
+
+def test_compute_efficient_frontier_invalid():
+    """
+    GIVEN a singular covariance matrix, and a risk-free rate above the return of the minimum-variance portfolio
+    WHEN the efficient frontier is computed
+    THEN check that a ValueError is raised, and that there is no maximum Sharpe ratio portfolio
+    """
+    with pytest.raises(ValueError):
+        compute_efficient_frontier([0.1, 0.2], np.ones((2, 2)))
+
+    result = compute_efficient_frontier([0.10, 0.20], np.diag([0.04, 0.09]), risk_free_rate=0.5)
+    assert result['max_sharpe'] is None
+    assert result['minimum_variance']['sharpe_ratio'] < 0.0
+
+
+def test_start_frontier(price_history):
+    """
+    GIVEN the daily prices of AAPL and MSFT for July 2020
+    WHEN the efficient frontier of the two stocks is started as a background job
+    THEN check that the results are stored, and that invalid parameters raise a ValueError
+    """
+    frontier_jobs.clear()
+    assert start_frontier(['MSFT', 'AAPL'], 63)['status'] in ('running', 'complete')
+    frontier = wait_for_frontier(['AAPL', 'MSFT'], 63)
+    assert frontier['status'] == 'complete'
+    result = frontier['result']
+    assert result['symbols'] == ['AAPL', 'MSFT']
+    assert result['start_date'] == '2020-07-01'
+    assert len(result['frontier']) == 25
+    assert abs(sum(result['minimum_variance']['weights']) - 1.0) < 1e-3
+    assert start_frontier(['AAPL', 'MSFT'], 63) == frontier
+
+    frontier_jobs.clear()
+    start_frontier(['AAPL', 'XYZ'], 63)
+    frontier = wait_for_frontier(['AAPL', 'XYZ'], 63)
+    assert frontier['status'] == 'error'
+    assert frontier['error'] == 'Not enough price history to compute the efficient frontier!'
+
+    with pytest.raises(ValueError):
+        start_frontier(['AAPL'], 63)
+    with pytest.raises(ValueError):
+        start_frontier(['AAPL', 'MSFT'], 100)
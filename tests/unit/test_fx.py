@@ -0,0 +1,86 @@
+"""
+This file (test_fx.py) contains the unit tests for the fx.py file.
+"""
+from datetime import date
+import json
+import numpy as np
+import pytest
+from flask import current_app
+from project import database
+from project.models import Stock, FxRate
+from project.fx import convert_values, retrieve_fx_rates, get_fx_rates, get_portfolio_totals, fx_rate_cache
+
+
+def write_replay_file(tmp_path, rates):
+    # Record the exchange rates in the same format as the FX_DAILY responses from Alpha Vantage
+    responses = {currency: {'Time Series FX (Daily)': {day: {'4. close': str(rate)} for day, rate in days.items()}}
+                 for currency, days in rates.items()}
+    replay_file = tmp_path / 'fx_rates.json'
+    replay_file.write_text(json.dumps(responses))
+    current_app.config['FX_RATES_PROVIDER'] = 'replay'
+    current_app.config['FX_RATES_REPLAY_FILE'] = str(replay_file)
+
+
+def test_convert_values():
+    """
+    GIVEN values in three currencies and the exchange rates of two of them
+    WHEN the values are converted into a base currency
+    THEN check the converted values, with NaN for the value without an exchange rate
+    """
+    rates = {'USD': 1.0, 'EUR': 1.2, 'GBP': 1.5}
+    converted = convert_values([100, 200, 300, 400], ['USD', 'EUR', 'GBP', 'JPY'], 'EUR', rates)
+    assert np.allclose(converted[:3], [100 / 1.2, 200, 300 * 1.5 / 1.2])
+    assert np.isnan(converted[3])
+
+    assert np.allclose(convert_values([100, 200], ['EUR', 'EUR'], 'USD', rates), [120, 240])
+    assert np.all(np.isnan(convert_values([100], ['USD'], 'CHF', rates)))
+    assert len(convert_values([], [], 'USD', rates)) == 0
+
+
+def test_retrieve_fx_rates(price_history, tmp_path):
+    """
+    GIVEN recorded exchange rates of EUR into USD
+    WHEN the exchange rates are retrieved twice with the replay provider
+    THEN check that only the new days are stored and the latest rate on each date is returned
+    """
+    fx_rate_cache.clear()
+    write_replay_file(tmp_path, {'EUR': {'2020-07-01': 1.12, '2020-07-02': 1.13}})
+    assert retrieve_fx_rates('EUR') == 2
+    assert retrieve_fx_rates('EUR') == 0
+
+    write_replay_file(tmp_path, {'EUR': {'2020-07-06': 1.14, '2020-07-02': 1.13}})
+    assert retrieve_fx_rates('EUR') == 1
+    assert FxRate.query.filter_by(currency='EUR').count() == 3
+
+    assert get_fx_rates(date(2020, 7, 3)) == {'USD': 1.0, 'EUR': 1.13}
+    assert get_fx_rates(date(2020, 7, 10)) == {'USD': 1.0, 'EUR': 1.14}
+    assert get_fx_rates(date(2020, 6, 30)) == {'USD': 1.0}
+
+    with pytest.raises(ValueError):
+        retrieve_fx_rates('USD')
+
+
+def test_get_portfolio_totals(price_history):
+    """
+    GIVEN a portfolio with stocks in USD, EUR, and GBP, and the exchange rate of EUR into USD
+    WHEN the totals of the portfolio are calculated in EUR
+    THEN check that the holdings are converted and the currency without a rate is listed
+    """
+    fx_rate_cache.clear()
+    database.session.add(FxRate('EUR', date(2020, 7, 1), '1.25'))
+    stocks = [Stock('AAPL', '10', '100.00', 41), Stock('SAP', '10', '100.00', 41, currency='EUR'),
+              Stock('BP', '10', '10.00', 41, currency='GBP')]
+    for stock in stocks:
+        stock.current_price = stock.purchase_price * 2
+        stock.position_value = stock.current_price * stock.number_of_shares
+        database.session.add(stock)
+    database.session.commit()
+
+    totals = get_portfolio_totals(41, 'EUR', date(2020, 7, 31))
+    assert totals['base_currency'] == 'EUR'
+    assert totals['total_value'] == 2000.0 / 1.25 + 2000.0
+    assert totals['total_cost'] == 1000.0 / 1.25 + 1000.0
+    assert [currency['currency'] for currency in totals['currencies']] == ['EUR', 'GBP', 'USD']
+    assert totals['currencies'][1]['converted_value'] is None
+    assert totals['missing_rates'] == ['GBP']
+    assert not totals['is_complete']
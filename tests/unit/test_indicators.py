@@ -0,0 +1,84 @@
+"""
+This file (test_indicators.py) contains the unit tests for the indicators.py file.
+"""
+from datetime import date
+import numpy as np
+import pytest
+from project import database
+from project.models import DailyPrice
+from project.indicators import sma, ema, get_indicator, get_indicator_params, get_indicator_overlay, indicator_cache, \
+    _INDICATOR_FUNCTIONS
+
+
+def test_sma_and_ema():
+    """
+    GIVEN a series of closing prices
+    WHEN the simple and exponential moving averages are computed
+    THEN check the results against a direct calculation
+    """
+    closes = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert np.isnan(sma(closes, 3)[:2]).all()
+    assert sma(closes, 3)[2:].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+    closes = 100.0 * np.cumprod(1.0 + np.random.default_rng(2).normal(0.0, 0.01, 300))
+    expected = np.empty(300)
+    expected[0] = closes[0]
+    for index in range(1, 300):
+        expected[index] = 0.1 * closes[index] + 0.9 * expected[index - 1]
+    assert np.allclose(ema(closes, 0.1), expected)
+
+
+def test_get_indicator_params():
+    """
+    GIVEN the name of an indicator and some of its parameters
+    WHEN the parameters are parsed
+    THEN check that the defaults are used for missing parameters and invalid values are rejected
+    """
+    assert get_indicator_params('MACD', fast='5') == {'fast': 5, 'slow': 26, 'signal': 9}
+    with pytest.raises(ValueError):
+        get_indicator_params('ADX')
+    with pytest.raises(ValueError):
+        get_indicator_params('SMA', window='-3')
+
+
+@pytest.mark.parametrize('name', ['SMA', 'EMA', 'RSI', 'BBANDS', 'MACD'])
+def test_incremental_indicators(name):
+    """
+    GIVEN a series of closing prices
+    WHEN an indicator is computed for the first 700 days and then extended with the last 300 days
+    THEN check that the result matches computing the indicator over the full series
+    """
+    closes = 100.0 * np.cumprod(1.0 + np.random.default_rng(4).normal(0.0, 0.01, 1000))
+    params = get_indicator_params(name)
+
+    full_outputs, _ = _INDICATOR_FUNCTIONS[name](closes, 1000, {}, **params)
+    first_outputs, state = _INDICATOR_FUNCTIONS[name](closes[:700], 700, {}, **params)
+    new_outputs, _ = _INDICATOR_FUNCTIONS[name](closes, 300, state, **params)
+    for output, values in full_outputs.items():
+        assert np.allclose(np.concatenate([first_outputs[output], new_outputs[output]]), values, equal_nan=True)
+
+
+def test_get_indicator(price_history):
+    """
+    GIVEN the daily prices of a stock for July 2020
+    WHEN the RSI is retrieved before and after a new daily price is added
+    THEN check that the cached indicator is extended with the new day
+    """
+    indicator_cache.clear()
+    days, outputs = get_indicator('AAPL', 'RSI', period=5)
+    assert len(days) == 23
+    assert np.isnan(outputs['rsi'][:5]).all()
+    assert outputs['rsi'][-1] == 100.0  # the price of AAPL only increases
+
+    database.session.add(DailyPrice('AAPL', date(2020, 8, 3), '380.00'))
+    database.session.commit()
+    price_history.refresh('AAPL')
+
+    days, outputs = get_indicator('AAPL', 'RSI', period=5)
+    assert len(days) == 24
+    assert len(outputs['rsi']) == 24
+    assert outputs['rsi'][-1] < 100.0
+
+    overlay = get_indicator_overlay('AAPL', 'SMA', days[-3:], window=2)
+    assert overlay == {'sma': [389.5, 390.5, 385.5]}
+    assert get_indicator('NFLX', 'SMA')[1] == {}
@@ -0,0 +1,89 @@
+"""
+This file (test_jobs.py) contains the unit tests for the jobs.py file.
+"""
+from datetime import date
+import os
+import threading
+import time
+from flask import current_app
+from project.jobs import JobStore, get_job_executor, submit_job
+
+
+def wait_for_job(store, key):
+    for _ in range(100):
+        job = store.get(key)
+        if job is not None and job['status'] != 'running':
+            return job
+        time.sleep(0.05)
+    return job
+
+
+def test_job_store(price_history, tmp_path):
+    """
+    GIVEN two job stores with the same name (as in two web server processes)
+    WHEN the status of a job is stored by one of the stores
+    THEN check that the job is read by the other store until it expires
+    """
+    current_app.config['JOB_FOLDER'] = str(tmp_path)
+    key = (1, ('AAPL', 'MSFT'), date(2020, 7, 31))
+    first_store, second_store = JobStore('tests'), JobStore('tests')
+    assert second_store.get(key) is None
+
+    first_store.set(key, {'status': 'complete', 'result': [1.5, None]})
+    assert second_store.get(key) == {'status': 'complete', 'result': [1.5, None]}
+    assert second_store.get(key + ('gbm',)) is None
+    assert [name for name in os.listdir(tmp_path / 'tests') if name.endswith('.tmp')] == []
+
+    current_app.config['JOB_TTL'] = 0
+    assert second_store.get(key) is None
+    current_app.config['JOB_TTL'] = 3600
+
+    second_store.clear()
+    assert first_store.get(key) is None
+
+
+def test_job_store_timeout(price_history, tmp_path):
+    """
+    GIVEN a job store with a job that is still running after the timeout (e.g. its process was restarted)
+    WHEN the job is read and started again
+    THEN check that the job is reported as an error, and that it is run again
+    """
+    current_app.config['JOB_FOLDER'] = str(tmp_path)
+    store = JobStore('tests')
+    store.set('key', {'status': 'running', 'result': None})
+    current_app.config['JOB_TIMEOUT'] = 0
+    assert store.get('key')['status'] == 'error'
+
+    def run_job():
+        store.set('key', {'status': 'complete', 'result': 42})
+
+    assert store.start('key', {'status': 'running', 'result': None}, run_job)['status'] == 'running'
+    current_app.config['JOB_TIMEOUT'] = 600
+    assert wait_for_job(store, 'key') == {'status': 'complete', 'result': 42}
+    assert store.start('key', {'status': 'running', 'result': None}, run_job) == {'status': 'complete', 'result': 42}
+
+
+def test_submit_job_bounded_threads(price_history):
+    """
+    GIVEN the pool of background threads of this process
+    WHEN more jobs are submitted than the number of threads
+    THEN check that at most `JOB_WORKERS` jobs run at the same time, with an application context
+    """
+    running = []
+    maximum_running = []
+    lock = threading.Lock()
+
+    def run_job():
+        assert current_app.config['TESTING']
+        with lock:
+            running.append(1)
+            maximum_running.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    futures = [submit_job(run_job) for _ in range(8)]
+    for future in futures:
+        future.result(timeout=5)
+    assert max(maximum_running) <= current_app.config['JOB_WORKERS']
+    assert get_job_executor(current_app.config['JOB_WORKERS']) is get_job_executor(current_app.config['JOB_WORKERS'])
@@ -0,0 +1,188 @@
+"""
+This file (test_leaderboard.py) contains the unit tests for the leaderboard.py file.
+"""
+from datetime import date, datetime
+import random
+import time
+from project import database
+from project.models import Stock, User, LeaderboardScore, FxRate, DailyPrice
+from project.leaderboard import Leaderboard, leaderboard, load_leaderboard, get_latest_prices, compute_scores, \
+    update_leaderboard_scores, mask_email, get_leaderboard
+from project.fx import fx_rate_cache
+
+
+def add_user(email, leaderboard_opt_in=True):
+    user = User(email, 'FlaskIsAwesome123')
+    user.leaderboard_opt_in = leaderboard_opt_in
+    database.session.add(user)
+    database.session.flush()
+    return user.id
+
+
+def add_stock(symbol, number_of_shares, purchase_price, current_price, user_id, currency='USD', price_date=None):
+    stock = Stock(symbol, number_of_shares, purchase_price, user_id, currency=currency)
+    stock.current_price = current_price
+    stock.current_price_date = price_date or datetime(2020, 7, 31)
+    stock.position_value = current_price * stock.number_of_shares
+    database.session.add(stock)
+    return stock
+
+
+def test_leaderboard_ranking():
+    """
+    GIVEN a leaderboard with the scores of four users
+    WHEN scores are updated and removed
+    THEN check the top users and the rank of each user
+    """
+    board = Leaderboard()
+    board.load([(1, 0.10), (2, 0.50), (3, -0.20), (4, 0.25)])
+    assert len(board) == 4
+    assert board.top(2) == [(2, 0.50), (4, 0.25)]
+    assert [board.rank(user_id) for user_id in (1, 2, 3, 4)] == [3, 1, 4, 2]
+    assert board.rank(5) is None
+
+    board.update(3, 0.75)
+    board.update(5, 0.0)
+    assert board.top(10) == [(3, 0.75), (2, 0.50), (4, 0.25), (1, 0.10), (5, 0.0)]
+    assert board.rank(1) == 4
+    assert board.get_score(3) == 0.75
+
+    assert board.remove(2)
+    assert not board.remove(2)
+    assert 2 not in board
+    assert board.top(2) == [(3, 0.75), (4, 0.25)]
+    assert board.rank(5) == 4
+
+
+def test_leaderboard_many_users():
+    """
+    GIVEN a leaderboard with 100k users
+    WHEN scores are updated and the rank of users is queried
+    THEN check that the ranking matches a full sort and each operation is fast
+    """
+    random.seed(45)
+    scores = {user_id: round(random.uniform(-0.9, 3.0), 6) for user_id in range(1, 100_001)}
+    board = Leaderboard()
+    board.load(scores.items())
+    assert len(board) == 100_000
+
+    start = time.perf_counter()
+    for user_id in range(1, 1001):
+        scores[user_id] = round(random.uniform(-0.9, 3.0), 6)
+        board.update(user_id, scores[user_id])
+    ranks = [board.rank(user_id) for user_id in range(1, 1001)]
+    top = board.top(25)
+    elapsed = time.perf_counter() - start
+
+    expected = sorted(scores, key=lambda user_id: (-scores[user_id], user_id))
+    assert top == [(user_id, scores[user_id]) for user_id in expected[:25]]
+    assert ranks == [expected.index(user_id) + 1 for user_id in range(1, 1001)]
+    assert elapsed < 1.0
+
+
+def test_mask_email():
+    """
+    GIVEN email addresses
+    WHEN the names shown on the leaderboard are generated
+    THEN check that only the start of the email address is shown
+    """
+    assert mask_email('patrick@email.com') == 'pat***@email.com'
+    assert mask_email('ab@email.com') == 'ab***@email.com'
+
+
+def test_compute_scores(price_history):
+    """
+    GIVEN users that opted in (and out) of the leaderboard, with holdings in USD and EUR
+    WHEN the scores of the users are computed
+    THEN check that each holding is valued at the latest price of its symbol and converted into USD
+    """
+    fx_rate_cache.clear()
+    database.session.add(FxRate('EUR', date(2020, 7, 1), '1.50'))
+    user1 = add_user('user1@email.com')
+    user2 = add_user('user2@email.com')
+    user3 = add_user('user3@email.com', leaderboard_opt_in=False)
+    add_stock('AAPL', '10', '100.00', 12000, user1, price_date=datetime(2020, 7, 30))
+    add_stock('AAPL', '10', '100.00', 15000, user2)
+    add_stock('SAP', '10', '100.00', 9000, user2, currency='EUR')
+    add_stock('XYZ', '10', '50.00', 0, user2)
+    add_stock('AAPL', '10', '100.00', 15000, user3)
+    database.session.commit()
+
+    assert get_latest_prices() == {'AAPL': 15000, 'SAP': 9000, 'XYZ': 0}
+    scores = compute_scores()
+    assert set(scores) == {user1, user2}
+    # AAPL is valued at the latest price of $150.00 (not the price of $120.00 retrieved for the first user)
+    assert scores[user1] == (0.5, 150000, 100000)
+    # AAPL: $1500 / $1000, SAP: $1350 / $1500 (in USD), XYZ: no price (valued at its cost of $500)
+    assert scores[user2] == (round(3350.0 / 3000.0 - 1.0, 6), 335000, 300000)
+    assert compute_scores(Stock.user_id.in_([user1])) == {user1: scores[user1]}
+
+    # A daily close stored after the latest current price (e.g. by the 'update_prices' command) is used instead
+    database.session.add(DailyPrice('AAPL', date(2020, 8, 3), '160.00'))
+    database.session.add(DailyPrice('SAP', date(2020, 7, 1), '80.00'))
+    database.session.commit()
+    assert get_latest_prices() == {'AAPL': 16000, 'SAP': 9000, 'XYZ': 0}
+    assert get_latest_prices(['AAPL']) == {'AAPL': 16000}
+    assert compute_scores(Stock.user_id.in_([user1]))[user1] == (0.6, 160000, 100000)
+
+
+def test_update_leaderboard_scores(price_history):
+    """
+    GIVEN users that opted in to the leaderboard
+    WHEN the holdings of a user and the price of a symbol change
+    THEN check that only the scores of the affected users are updated
+    """
+    load_leaderboard()
+    user1 = add_user('user1@email.com')
+    user2 = add_user('user2@email.com')
+    user3 = add_user('user3@email.com')
+    add_stock('AAPL', '10', '100.00', 11000, user1)
+    add_stock('MSFT', '10', '100.00', 12000, user2)
+    add_stock('AAPL', '10', '100.00', 11000, user3)
+    database.session.commit()
+    assert update_leaderboard_scores() == 3
+    assert leaderboard.top(3) == [(user2, 0.2), (user1, 0.1), (user3, 0.1)]
+    assert LeaderboardScore.query.get(user2).portfolio_value == 120000
+
+    # A new lot for the first user only updates their score
+    add_stock('MSFT', '10', '100.00', 15000, user1, price_date=datetime(2020, 7, 30))
+    database.session.commit()
+    assert update_leaderboard_scores(user_ids=[user1]) == 1
+    assert leaderboard.rank(user1) == 2
+    assert LeaderboardScore.query.get(user2).score == 0.2
+
+    # A new price of AAPL updates the first and third users
+    stock = Stock.query.filter_by(user_id=user3).first()
+    stock.current_price = 20000
+    stock.current_price_date = datetime(2020, 8, 3)
+    database.session.commit()
+    assert update_leaderboard_scores(stock_symbols=['AAPL']) == 2
+    assert leaderboard.top(3) == [(user3, 1.0), (user1, round((2000.0 + 1200.0) / 2000.0 - 1.0, 6)), (user2, 0.2)]
+    assert LeaderboardScore.query.count() == 3
+
+    # A holder of the symbol without a score is removed from the ranking
+    user = User.query.get(user1)
+    user.leaderboard_opt_in = False
+    database.session.commit()
+    assert update_leaderboard_scores(stock_symbols=['AAPL']) == 1
+    assert leaderboard.rank(user1) is None
+    assert leaderboard.top(3) == [(user3, 1.0), (user2, 0.2)]
+    user = User.query.get(user1)
+    user.leaderboard_opt_in = True
+    database.session.commit()
+    update_leaderboard_scores(user_ids=[user1])
+
+    # Opting out removes the user from the leaderboard
+    user = User.query.get(user3)
+    user.leaderboard_opt_in = False
+    database.session.commit()
+    assert update_leaderboard_scores(user_ids=[user3]) == 0
+    assert leaderboard.rank(user3) is None
+    assert LeaderboardScore.query.get(user3) is None
+
+    board = get_leaderboard(2, user2)
+    assert board['number_of_users'] == 2
+    assert [leader['name'] for leader in board['leaders']] == ['use***@email.com', 'use***@email.com']
+    assert board['leaders'][0]['rank'] == 1
+    assert board['user'] == dict(rank=2, score=0.2)
+    assert get_leaderboard(2, user3)['user'] is None
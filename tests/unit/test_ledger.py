@@ -0,0 +1,180 @@
+"""
+This file (test_ledger.py) contains the unit tests for the ledger.py file.
+"""
+from datetime import datetime
+import pytest
+from flask import current_app
+from project import database
+from project.models import Stock, Transaction, PositionSnapshot
+from project.ledger import LedgerPosition, get_ledger_positions, record_transaction, record_lot_adjustment, \
+    record_lot_sale, backfill_transactions
+
+
+def test_ledger_position_apply():
+    """
+    GIVEN a LedgerPosition object
+    WHEN buy, split, sell, and dividend transactions are applied
+    THEN check the shares, cost basis, realized gain, and dividend income
+    """
+    position = LedgerPosition('AAPL')
+    transactions = [
+        Transaction(1, 'AAPL', 'BUY', datetime(2020, 7, 1), '10', '100.00'),
+        Transaction(1, 'AAPL', 'BUY', datetime(2020, 7, 2), '10', '200.00'),
+        Transaction(1, 'AAPL', 'SPLIT', datetime(2020, 7, 3), split_ratio='2.0'),
+        Transaction(1, 'AAPL', 'SELL', datetime(2020, 7, 4), '10', '100.00'),
+        Transaction(1, 'AAPL', 'DIVIDEND', datetime(2020, 7, 5), price='0.50'),
+    ]
+    for transaction_id, transaction in enumerate(transactions, start=1):
+        transaction.id = transaction_id
+        position.apply(transaction)
+
+    # The split halves the average cost ($150 -> $75), so the sale of 10 shares realizes 10 * ($100 - $75)
+    assert position.number_of_shares == 30
+    assert position.cost_basis == 30 * 7500
+    assert position.realized_gain == 10 * 2500
+    assert position.dividend_income == 30 * 50
+    assert position.transaction_id == 5
+    assert position.transactions_since_snapshot == 5
+
+    position.current_price = 8000
+    assert position.position_value == 30 * 8000
+    assert position.unrealized_gain == 30 * 500
+
+
+def test_record_transaction_invalid_sale(price_history):
+    """
+    GIVEN a ledger with a purchase of 10 shares
+    WHEN a sale of 15 shares is recorded
+    THEN check that a ValueError is raised and the sale is not added to the ledger
+    """
+    record_transaction(Transaction(21, 'AAPL', 'BUY', datetime(2020, 7, 1), '10', '100.00'))
+    database.session.commit()
+
+    with pytest.raises(ValueError):
+        record_transaction(Transaction(21, 'AAPL', 'SELL', datetime(2020, 7, 2), '15', '110.00'))
+    with pytest.raises(ValueError):
+        record_transaction(Transaction(21, 'AAPL', 'SPLIT', datetime(2020, 7, 2), split_ratio='0'))
+
+    assert Transaction.query.filter_by(user_id=21).count() == 1
+    assert get_ledger_positions(21)['AAPL'].number_of_shares == 10
+
+
+def test_record_transaction_snapshots(price_history):
+    """
+    GIVEN a ledger for a user
+    WHEN more transactions are recorded than the snapshot interval
+    THEN check that snapshots are added and the positions match replaying the full ledger
+    """
+    current_app.config['LEDGER_SNAPSHOT_INTERVAL'] = 4
+    for day in range(1, 11):
+        record_transaction(Transaction(22, 'AAPL', 'BUY', datetime(2020, 7, day), '10', str(100 + day)))
+        if day % 3 == 0:
+            record_transaction(Transaction(22, 'AAPL', 'SELL', datetime(2020, 7, day), '5', '120.00'))
+        record_transaction(Transaction(22, 'MSFT', 'BUY', datetime(2020, 7, day), '1', '200.00'))
+        database.session.commit()
+
+    # Snapshots of each stock are added every 4 transactions (13 for AAPL and 10 for MSFT)
+    assert PositionSnapshot.query.filter_by(user_id=22, stock_symbol='AAPL').count() == 3
+    assert PositionSnapshot.query.filter_by(user_id=22, stock_symbol='MSFT').count() == 2
+
+    expected = {}
+    for transaction in Transaction.query.filter_by(user_id=22).order_by(Transaction.id):
+        expected.setdefault(transaction.stock_symbol, LedgerPosition(transaction.stock_symbol)).apply(transaction)
+
+    positions = get_ledger_positions(22)
+    assert sorted(positions) == ['AAPL', 'MSFT']
+    for symbol in ('AAPL', 'MSFT'):
+        assert positions[symbol].number_of_shares == expected[symbol].number_of_shares
+        assert positions[symbol].cost_basis == expected[symbol].cost_basis
+        assert positions[symbol].realized_gain == expected[symbol].realized_gain
+
+    # Only the transactions after the latest snapshot are applied when reading the positions
+    assert positions['AAPL'].transactions_since_snapshot == 1
+    assert positions['MSFT'].transactions_since_snapshot == 2
+    assert positions['AAPL'].number_of_shares == 85
+
+
+def test_record_lot_adjustment(price_history):
+    """
+    GIVEN a ledger with the purchases of two lots of a stock
+    WHEN one of the lots is edited (and then edited without any change)
+    THEN check that the shares and cost of the original lot are replaced without changing the realized gain
+    """
+    stock = Stock('AAPL', '10', '100.00', 23, datetime(2020, 7, 1))
+    database.session.add(stock)
+    record_transaction(Transaction(23, 'AAPL', 'BUY', datetime(2020, 7, 1), '10', '100.00'))
+    record_transaction(Transaction(23, 'AAPL', 'BUY', datetime(2020, 7, 2), '20', '200.00'))
+    database.session.commit()
+
+    stock.update('15', '110.00')
+    record_lot_adjustment(stock, 10, 10000)
+    database.session.commit()
+    position = get_ledger_positions(23)['AAPL']
+    assert position.number_of_shares == 35
+    assert position.cost_basis == 15 * 11000 + 20 * 20000
+    assert position.realized_gain == 0
+
+    record_lot_adjustment(stock, 15, 11000)
+    transaction_types = [transaction.transaction_type
+                         for transaction in Transaction.query.filter_by(user_id=23).order_by(Transaction.id)]
+    assert transaction_types == ['BUY', 'BUY', 'ADJUSTMENT', 'ADJUSTMENT']
+
+    # The original lot cannot be removed when the ledger does not hold its shares
+    with pytest.raises(ValueError):
+        record_lot_adjustment(stock, 50, 11000)
+    database.session.rollback()
+
+
+def test_record_lot_sale(price_history):
+    """
+    GIVEN a ledger with the purchase of a lot of a stock
+    WHEN the lot is sold (with and without a current price)
+    THEN check that the sale is recorded at the current price, or the purchase price if there is no current price
+    """
+    stock = Stock('MSFT', '10', '150.00', 24, datetime(2020, 7, 1))
+    record_transaction(Transaction(24, 'MSFT', 'BUY', datetime(2020, 7, 1), '20', '150.00'))
+    stock.current_price = 18000
+    position = record_lot_sale(stock, datetime(2020, 7, 2))
+    assert position.number_of_shares == 10
+    assert position.realized_gain == 10 * 3000
+
+    stock.current_price = 0
+    position = record_lot_sale(stock, datetime(2020, 7, 3))
+    assert position.number_of_shares == 0
+    assert position.realized_gain == 10 * 3000
+
+    with pytest.raises(ValueError):
+        record_lot_sale(stock, datetime(2020, 7, 4))
+    database.session.rollback()
+
+
+def test_backfill_transactions(price_history):
+    """
+    GIVEN portfolios with lots that were added before the ledger (and a stock that is already in the ledger)
+    WHEN the transactions are backfilled (twice)
+    THEN check that a purchase is only recorded for each lot of the stocks without any transactions
+    """
+    database.session.add(Stock('AAPL', '10', '100.00', 25, datetime(2020, 7, 2)))
+    database.session.add(Stock('AAPL', '5', '90.00', 25, datetime(2020, 7, 1)))
+    database.session.add(Stock('MSFT', '7', '200.00', 25, datetime(2020, 7, 1)))
+    database.session.add(Stock('MSFT', '3', '210.00', 26, datetime(2020, 7, 1)))
+    record_transaction(Transaction(25, 'MSFT', 'BUY', datetime(2020, 7, 1), '7', '200.00'))
+    database.session.commit()
+
+    assert backfill_transactions() == 3
+    database.session.commit()
+    positions = get_ledger_positions(25)
+    assert positions['AAPL'].number_of_shares == 15
+    assert positions['AAPL'].cost_basis == 5 * 9000 + 10 * 10000
+    assert positions['MSFT'].number_of_shares == 7
+    assert get_ledger_positions(26)['MSFT'].number_of_shares == 3
+
+    assert backfill_transactions() == 0
+
+    database.session.add(Stock('AAPL', '2', '100.00', 27, datetime(2020, 7, 1)))
+    database.session.add(Stock('AAPL', '4', '100.00', 28, datetime(2020, 7, 1)))
+    database.session.commit()
+    assert backfill_transactions(user_id=27) == 1
+    database.session.commit()
+    assert get_ledger_positions(27)['AAPL'].number_of_shares == 2
+    assert get_ledger_positions(28) == {}
@@ -0,0 +1,167 @@
+"""
+This file (test_lots.py) contains the unit tests for the lots.py file.
+"""
+from datetime import datetime
+import pytest
+from project import database
+from project.models import Stock
+from project.lots import Position, get_positions, allocate_sale, get_lot_currency, sell_lots, split_lots
+
+
+# Lots of a stock: (lot ID, number of shares, purchase date as a day number)
+LOT_IDS = [11, 12, 13, 14]
+LOT_SHARES = [10, 20, 5, 15]
+LOT_PURCHASE_DAYS = [18000, 18100, 17900, 18100]
+
+
+def test_position():
+    """
+    GIVEN a Position object for three lots of a stock
+    WHEN the average cost and unrealized gain are calculated
+    THEN check that they are based on the total shares and cost basis
+    """
+    position = Position('AAPL', 3, 40, 40 * 15000, 16000, 40 * 16000)
+    assert position.average_cost == 15000
+    assert position.unrealized_gain == 40 * 1000
+
+
+def test_get_positions(price_history):
+    """
+    GIVEN a portfolio with multiple lots of the same stocks
+    WHEN the positions of the portfolio are retrieved
+    THEN check that the lots are consolidated into one position per stock
+    """
+    database.session.add(Stock('AAPL', '10', '100.00', 17, datetime(2020, 7, 1)))
+    database.session.add(Stock('AAPL', '30', '200.00', 17, datetime(2020, 7, 2)))
+    database.session.add(Stock('MSFT', '5', '150.00', 17, datetime(2020, 7, 3)))
+    database.session.add(Stock('MSFT', '5', '150.00', 18, datetime(2020, 7, 3)))
+    database.session.commit()
+
+    positions = get_positions(17)
+    assert [position.stock_symbol for position in positions] == ['AAPL', 'MSFT']
+    assert positions[0].number_of_lots == 2
+    assert positions[0].number_of_shares == 40
+    assert positions[0].average_cost == 17500
+    assert positions[1].number_of_shares == 5
+
+
+def test_allocate_sale_fifo():
+    """
+    GIVEN a set of lots of a stock
+    WHEN a sale is allocated using FIFO
+    THEN check that the oldest lots are sold first
+    """
+    assert allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 12) == [(13, 5), (11, 7)]
+    assert allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 15, 'FIFO') == [(13, 5), (11, 10)]
+
+
+def test_allocate_sale_lifo():
+    """
+    GIVEN a set of lots of a stock
+    WHEN a sale is allocated using LIFO
+    THEN check that the newest lots are sold first
+    """
+    assert allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 25, 'LIFO') == [(14, 15), (12, 10)]
+
+
+def test_allocate_sale_specific_lots():
+    """
+    GIVEN a set of lots of a stock
+    WHEN a sale is allocated using specific lots
+    THEN check that only the specified lots are sold in the order specified
+    """
+    assert allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 12, 'SPECIFIC', [14, 11]) == [(14, 12)]
+    assert allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 20, 'SPECIFIC', [14, 11]) == [(14, 15), (11, 5)]
+
+
+def test_allocate_sale_invalid():
+    """
+    GIVEN a set of lots of a stock
+    WHEN an invalid sale is allocated
+    THEN check that a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 51)
+    with pytest.raises(ValueError):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 0)
+    with pytest.raises(ValueError):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 5, 'SPECIFIC', [99])
+    with pytest.raises(ValueError):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 5, 'HIFO')
+
+
+def test_allocate_sale_duplicate_specific_lots():
+    """
+    GIVEN a set of lots of a stock
+    WHEN a sale is allocated using specific lots with a lot specified twice
+    THEN check that a ValueError is raised instead of selling the shares of the lot twice
+    """
+    with pytest.raises(ValueError, match='more than once'):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 15, 'SPECIFIC', [11, 11])
+    with pytest.raises(ValueError, match='more than once'):
+        allocate_sale(LOT_IDS, LOT_SHARES, LOT_PURCHASE_DAYS, 5, 'SPECIFIC', [14, 11, 14])
+
+
+def test_sell_lots(price_history):
+    """
+    GIVEN a portfolio with three lots of a stock
+    WHEN shares are sold using FIFO and then using specific lots
+    THEN check that the shares are removed from the selected lots, and that the lots that are sold out are deleted
+    """
+    for shares, purchase_day in (('10', 2), ('20', 1), ('5', 3)):
+        stock = Stock('AAPL', shares, '150.00', 22, datetime(2020, 7, purchase_day))
+        stock.current_price = 16000
+        stock.position_value = stock.number_of_shares * 16000
+        database.session.add(stock)
+    database.session.commit()
+    lot_ids = [stock.id for stock in Stock.query.filter_by(user_id=22).order_by(Stock.id)]
+
+    assert sell_lots(22, 'AAPL', 25) == [(lot_ids[1], 20), (lot_ids[0], 5)]
+    database.session.commit()
+    lots = Stock.query.filter_by(user_id=22).order_by(Stock.id).all()
+    assert [(lot.id, lot.number_of_shares, lot.position_value) for lot in lots] == \
+        [(lot_ids[0], 5, 5 * 16000), (lot_ids[2], 5, 5 * 16000)]
+
+    assert sell_lots(22, 'AAPL', 5, 'SPECIFIC', [lot_ids[2]]) == [(lot_ids[2], 5)]
+    database.session.commit()
+    assert [lot.id for lot in Stock.query.filter_by(user_id=22)] == [lot_ids[0]]
+
+    with pytest.raises(ValueError):
+        sell_lots(22, 'AAPL', 6)
+
+
+def test_split_lots(price_history):
+    """
+    GIVEN a portfolio with three lots of a stock
+    WHEN a 3-for-2 split is applied to the lots
+    THEN check that the shares and prices of each lot are split, and that the cost basis of the lots is unchanged
+    """
+    for shares, purchase_day in (('3', 1), ('5', 2), ('1', 3)):
+        stock = Stock('AAPL', shares, '150.00', 19, datetime(2020, 7, purchase_day))
+        stock.current_price = 18000
+        database.session.add(stock)
+    database.session.add(Stock('AAPL', '10', '150.00', 20, datetime(2020, 7, 1)))
+    database.session.commit()
+
+    split_lots(19, 'AAPL', 1.5)
+    database.session.commit()
+    lots = Stock.query.filter_by(user_id=19).order_by(Stock.purchase_date).all()
+
+    # The total of 13.5 shares is rounded to 14 (as in the ledger), so the newest lot has the rounding difference
+    assert [lot.number_of_shares for lot in lots] == [4, 8, 2]
+    assert sum(lot.number_of_shares * lot.purchase_price for lot in lots) == pytest.approx(9 * 15000, rel=0.01)
+    assert [lot.current_price for lot in lots] == [12000] * 3
+    assert [lot.position_value for lot in lots] == [4 * 12000, 8 * 12000, 2 * 12000]
+    assert Stock.query.filter_by(user_id=20).one().number_of_shares == 10
+
+
+def test_get_lot_currency(price_history):
+    """
+    GIVEN a portfolio with a lot of a stock in euros
+    WHEN the currency of the lots of a stock is retrieved
+    THEN check that the currency of the existing lot is returned, or USD for a new stock
+    """
+    database.session.add(Stock('SAP', '10', '100.00', 21, datetime(2020, 7, 1), 'EUR'))
+    database.session.commit()
+    assert get_lot_currency(21, 'SAP') == 'EUR'
+    assert get_lot_currency(21, 'AAPL') == 'USD'
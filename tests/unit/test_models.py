@@ -3,6 +3,7 @@ This file (test_models.py) contains the unit tests for the models.py file.
 """
 from datetime import datetime
 from freezegun import freeze_time
+from project.models import WatchStockRow
 
 
 def test_new_stock(new_stock):
@@ -274,6 +275,9 @@ def test_get_watchstock_data_success(new_watch_stock, mock_requests_get_success_
     assert new_watch_stock.get_beta() == 0.67
     assert new_watch_stock.price_to_book_ratio == 523
     assert new_watch_stock.get_price_to_book_ratio() == 5.23
+    assert new_watch_stock.asset_type == 'Common Stock'
+    assert new_watch_stock.sector == 'Trade & Services'
+    assert new_watch_stock.industry == 'Retail-Variety Stores'
     assert new_watch_stock.stock_data_date.date() == datetime.now().date()
 
 
@@ -405,3 +409,25 @@ def test_update_stock_only_purchase_date_changed(new_stock_updated):
     assert new_stock_updated.current_price == 14834  # $148.34 -> integer
     assert new_stock_updated.current_price_date.date() == datetime.now().date()
     assert new_stock_updated.position_value == (14834*16)
+
+
+def test_watchstock_row(new_watch_stock):
+    """
+    GIVEN an initialized WatchStock object with the stock analysis data defined
+    WHEN a lightweight WatchStockRow object is created from its columns
+    THEN check that the formatted values match the WatchStock object
+    """
+    new_watch_stock.fiftytwo_week_low = 26268
+    new_watch_stock.market_cap = '160300990464'
+    new_watch_stock.pe_ratio = 3715
+    new_watch_stock.peg_ratio = 393
+    new_watch_stock.profit_margin = 2503
+    new_watch_stock.price_to_book_ratio = 523
+    row = WatchStockRow(new_watch_stock)
+    assert row.stock_symbol == 'COST'
+    assert row.get_fiftytwo_week_low() == new_watch_stock.get_fiftytwo_week_low()
+    assert row.get_market_cap() == '160.3B'
+    assert row.get_pe_ratio() == 37.15
+    assert row.get_peg_ratio() == 3.93
+    assert row.get_profit_margin() == 25.03
+    assert row.get_price_to_book_ratio() == 5.23
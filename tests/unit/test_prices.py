@@ -0,0 +1,110 @@
+"""
+This file (test_prices.py) contains the unit tests for the prices.py file.
+"""
+from datetime import date
+import os
+import numpy as np
+from project import database
+from project.models import DailyPrice
+from project.prices import date_to_day_number, day_number_to_date, retrieve_daily_prices
+
+
+def test_day_numbers():
+    """
+    GIVEN the helper functions for converting dates to day numbers
+    WHEN a date is converted to a day number and back
+    THEN check that the original date is returned
+    """
+    assert date_to_day_number(date(1970, 1, 1)) == 0
+    assert date_to_day_number(date(2020, 7, 24)) == 18467
+    assert day_number_to_date(18467) == date(2020, 7, 24)
+
+
+def test_price_history_cache_empty(price_history):
+    """
+    GIVEN a price history cache
+    WHEN the series for a stock that has not been cached is requested
+    THEN check that empty arrays are returned
+    """
+    days, closes = price_history.get_series('SBUX')
+    assert len(days) == 0
+    assert len(closes) == 0
+    assert price_history.get_latest_date('SBUX') is None
+
+
+def test_price_history_cache_refresh(price_history):
+    """
+    GIVEN a price history cache and daily prices stored in the database
+    WHEN the cache for a stock is refreshed
+    THEN check that all the daily prices are stored in the memory-mapped file
+    """
+    assert price_history.refresh('AAPL') == 23
+    days, closes = price_history.get_series('AAPL')
+    assert isinstance(days, np.memmap)
+    assert days.dtype == np.int32
+    assert closes.dtype == np.float64
+    assert len(days) == 23
+    assert day_number_to_date(days[0]) == date(2020, 7, 1)
+    assert closes[0] == 361.0
+    assert price_history.get_latest_date('AAPL') == date(2020, 7, 31)
+    assert os.path.exists(price_history.get_path('AAPL'))
+
+    # A second refresh without new daily prices does not change the cache
+    assert price_history.refresh('AAPL') == 0
+
+
+def test_price_history_cache_slice_by_date(price_history):
+    """
+    GIVEN a price history cache with the daily prices of a stock
+    WHEN a range of dates is requested
+    THEN check that only the days in the range are returned
+    """
+    price_history.refresh('MSFT')
+    days, closes = price_history.get_series('MSFT', date(2020, 7, 11), date(2020, 7, 17))
+    assert [day_number_to_date(day) for day in days] == [date(2020, 7, 13), date(2020, 7, 14), date(2020, 7, 15),
+                                                         date(2020, 7, 16), date(2020, 7, 17)]
+    assert closes[0] == 193.5
+    assert np.shares_memory(closes, price_history.get_series('MSFT')[1])
+
+
+def test_price_history_cache_incremental_refresh(price_history):
+    """
+    GIVEN a price history cache with the daily prices of a stock
+    WHEN new daily prices are stored and the cache is refreshed
+    THEN check that only the new days are added to the cache
+    """
+    price_history.refresh('AAPL')
+    database.session.add(DailyPrice('AAPL', date(2020, 8, 3), '435.75'))
+    database.session.add(DailyPrice('AAPL', date(2020, 8, 4), '438.66'))
+    database.session.commit()
+
+    assert price_history.refresh('AAPL') == 2
+    days, closes = price_history.get_series('AAPL')
+    assert len(days) == 25
+    assert price_history.get_latest_date('AAPL') == date(2020, 8, 4)
+    assert closes[-1] == 438.66
+
+    assert price_history.rebuild('AAPL') == 25
+
+
+def test_retrieve_daily_prices(price_history, mock_requests_get_success_daily):
+    """
+    GIVEN a monkeypatched (successful response) version of requests.get()
+    WHEN the daily prices for a stock are retrieved twice
+    THEN check that the new daily prices are only stored once
+    """
+    assert retrieve_daily_prices('SBUX') == 2
+    assert retrieve_daily_prices('SBUX') == 0
+    assert DailyPrice.query.filter_by(stock_symbol='SBUX').count() == 2
+    assert price_history.refresh('SBUX') == 2
+    assert price_history.get_latest_date('SBUX') == date(2020, 3, 24)
+
+
+def test_retrieve_daily_prices_failure(price_history, mock_requests_get_failure):
+    """
+    GIVEN a monkeypatched (failed response) version of requests.get()
+    WHEN the daily prices for a stock are retrieved
+    THEN check that no daily prices are stored
+    """
+    assert retrieve_daily_prices('SBUX') == 0
+    assert DailyPrice.query.filter_by(stock_symbol='SBUX').count() == 0
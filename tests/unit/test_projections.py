@@ -0,0 +1,95 @@
+"""
+This file (test_projections.py) contains the unit tests for the projections.py file.
+"""
+from datetime import datetime
+import time
+import numpy as np
+import pytest
+from project import database
+from project.models import Stock
+from project.projections import get_checkpoints, simulate_batch, run_projection, start_projection, get_projection, \
+    get_process_pool, projection_jobs
+
+
+RETURNS = np.random.default_rng(11).normal(0.0005, 0.01, 500)
+
+
+def test_get_checkpoints():
+    """
+    GIVEN a horizon in trading days
+    WHEN the checkpoints are calculated
+    THEN check that they are increasing and end on the last day
+    """
+    assert get_checkpoints(5).tolist() == [1, 2, 3, 4, 5]
+    checkpoints = get_checkpoints(252)
+    assert len(checkpoints) == 12
+    assert checkpoints[0] == 1
+    assert checkpoints[-1] == 252
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'gbm'])
+def test_simulate_batch(method):
+    """
+    GIVEN a series of daily returns
+    WHEN a batch of paths is simulated
+    THEN check the shape of the results and that the mean growth matches the historical returns
+    """
+    growth = simulate_batch(RETURNS, method, 252, 5000, seed=1)
+    assert growth.shape == (5000, 12)
+    assert np.all(growth > 0.0)
+    expected_log_growth = np.log1p(RETURNS).mean() * 252
+    assert abs(np.log(growth[:, -1]).mean() - expected_log_growth) < 0.02
+
+    with pytest.raises(ValueError):
+        simulate_batch(RETURNS, 'garch', 252, 10, seed=1)
+
+
+def test_run_projection_process_pool():
+    """
+    GIVEN a series of daily returns
+    WHEN 100,000 paths are simulated across a process pool
+    THEN check that the percentiles are ordered, the simulation finishes in seconds, and the process pool is reused
+    """
+    start = time.perf_counter()
+    result = run_projection(RETURNS, 1000.0, 'bootstrap', 252, 100_000, batch_size=10_000, max_workers=2, seed=3)
+    elapsed = time.perf_counter() - start
+
+    assert result['number_of_paths'] == 100_000
+    assert result['start_value'] == 1000.0
+    last_values = [result['percentiles'][str(percentile)][-1] for percentile in (5, 25, 50, 75, 95)]
+    assert last_values == sorted(last_values)
+    assert 0.0 < result['probability_of_loss'] < 1.0
+    assert elapsed < 20.0
+
+    # The results only depend on the seed, not on the number of processes
+    assert run_projection(RETURNS, 1000.0, 'bootstrap', 252, 100_000, batch_size=10_000, seed=3) == result
+
+    # The process pool is reused by the next projection, instead of spawning new worker processes
+    process_pool = get_process_pool(2)
+    assert run_projection(RETURNS, 1000.0, 'gbm', 21, 1000, max_workers=2, seed=4)['number_of_paths'] == 1000
+    assert get_process_pool(2) is process_pool
+
+
+def test_start_projection(price_history):
+    """
+    GIVEN a portfolio with the daily prices of its stocks stored
+    WHEN a projection is started as a background job
+    THEN check that the stored results are available when the job completes
+    """
+    projection_jobs.clear()
+    database.session.add(Stock('AAPL', '10', '370.00', 23, datetime(2020, 7, 1)))
+    database.session.commit()
+
+    assert get_projection(23, 'gbm', 21, 1000) is None
+    assert start_projection(23, 'gbm', 21, 1000)['status'] in ('running', 'complete')
+
+    for _ in range(100):
+        projection = get_projection(23, 'gbm', 21, 1000)
+        if projection['status'] != 'running':
+            break
+        time.sleep(0.05)
+
+    assert projection['status'] == 'complete'
+    assert projection['result']['start_value'] == 3910.0
+    assert start_projection(23, 'gbm', 21, 1000) == projection
+    assert start_projection(24, 'gbm', 21, 1000) is None
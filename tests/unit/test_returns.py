@@ -0,0 +1,162 @@
+"""
+This file (test_returns.py) contains the unit tests for the returns.py file.
+"""
+from datetime import date, datetime
+import time
+import numpy as np
+from project import database
+from project.models import Stock, ReturnMetrics
+from project.fx import fx_rate_cache
+from project.returns import solve_xirr, compute_time_weighted_returns, compute_return_metrics, calculate_return_metrics
+
+
+def add_stock(symbol, number_of_shares, purchase_price, user_id, purchase_date):
+    database.session.add(Stock(symbol, number_of_shares, purchase_price, user_id, purchase_date))
+
+
+def test_solve_xirr():
+    """
+    GIVEN rows of cash flows with known internal rates of return (padded with zeros)
+    WHEN the XIRR of every row is solved at once
+    THEN check the rate of each row, and that a row without a solution is NaN
+    """
+    flow_dates = [date(2008, 1, 1), date(2008, 3, 1), date(2008, 10, 30), date(2009, 2, 15), date(2009, 4, 1)]
+    amounts = np.array([
+        [-10000.0, 2750.0, 4250.0, 3250.0, 2750.0],
+        [-1000.0, 1100.0, 0.0, 0.0, 0.0],
+        [-1000.0, -1000.0, 0.0, 0.0, 0.0],
+        [-1000.0, 500.0, 0.0, 0.0, 0.0],
+    ])
+    times = np.zeros(amounts.shape)
+    times[0] = [(flow_date - flow_dates[0]).days / 365.0 for flow_date in flow_dates]
+    times[1:, 1] = 1.0
+
+    rates = solve_xirr(amounts, times)
+    assert round(rates[0], 6) == 0.373363
+    assert round(rates[1], 6) == 0.1
+    assert np.isnan(rates[2])
+    assert round(rates[3], 6) == -0.5
+
+
+def test_solve_xirr_many_portfolios():
+    """
+    GIVEN 100k rows of cash flows with random rates of return (including losses and very large gains)
+    WHEN the XIRR of every row is solved at once
+    THEN check that every rate is found quickly
+    """
+    rng = np.random.default_rng(46)
+    expected = rng.uniform(-0.9, 20.0, size=100_000)
+    times = np.zeros((len(expected), 3))
+    times[:, 1] = rng.uniform(0.0, 0.5, size=len(expected))
+    times[:, 2] = times[:, 1] + rng.uniform(0.1, 3.0, size=len(expected))
+    amounts = np.zeros(times.shape)
+    amounts[:, :2] = -1000.0
+    amounts[:, 2] = 1000.0 * ((1.0 + expected) ** times[:, 2] + (1.0 + expected) ** (times[:, 2] - times[:, 1]))
+
+    start = time.perf_counter()
+    rates = solve_xirr(amounts, times)
+    elapsed = time.perf_counter() - start
+    assert np.allclose(rates, expected, rtol=1e-6)
+    assert elapsed < 5.0
+
+
+def test_compute_time_weighted_returns():
+    """
+    GIVEN the daily values of two portfolios, one with a purchase on the third day
+    WHEN the time-weighted returns are computed
+    THEN check that the purchase is excluded from the return
+    """
+    values = np.array([[100.0, 0.0], [110.0, 0.0], [220.0, 50.0], [242.0, 40.0]])
+    flows = np.array([[100.0, 0.0], [0.0, 0.0], [110.0, 50.0], [0.0, 0.0]])
+    assert np.allclose(compute_time_weighted_returns(values, flows), [1.1 * 1.0 * 1.1 - 1.0, -0.2])
+
+
+def test_compute_return_metrics():
+    """
+    GIVEN a price matrix of two symbols and the lots of two users (including a lot purchased before the price history)
+    WHEN the returns of the users are computed
+    THEN check the time-weighted and money-weighted returns of each user
+    """
+    days = np.array([100, 101, 102, 103])
+    prices = np.array([[10.0, np.nan], [11.0, 20.0], [12.0, 20.0], [12.0, 30.0]])
+    returns = compute_return_metrics(days, prices,
+                                     lot_users=np.array([1, 1, 2]),
+                                     lot_columns=np.array([0, 1, 1]),
+                                     lot_shares=np.array([10.0, 5.0, 1.0]),
+                                     lot_costs=np.array([100.0, 100.0, 15.0]),
+                                     lot_days=np.array([100, 102, 103 - 365]))
+    user_ids, start_days, time_weighted_returns, annualized, money_weighted_returns = returns
+    assert user_ids.tolist() == [1, 2]
+    assert start_days.tolist() == [100, 103 - 365]
+
+    # User 1: 110/100, (120 + 100 - 100)/110, (120 + 150)/220
+    assert np.allclose(time_weighted_returns, [1.1 * 120 / 110 * 270 / 220 - 1.0, 0.5])
+    assert np.isnan(annualized[0])
+    assert np.isclose(annualized[1], 0.5)
+
+    # User 2: bought for $15 a year before the last day, and worth $30 on the last day
+    assert np.isclose(money_weighted_returns[1], 1.0)
+
+    # User 1: a gain of 35% in 3 days is outside the range of the annual rates that are solved
+    assert np.isnan(money_weighted_returns[0])
+
+
+def test_calculate_return_metrics(price_history):
+    """
+    GIVEN the portfolios of three users, with the daily prices of AAPL and MSFT for July 2020
+    WHEN the returns of every portfolio are calculated in batches (in this process and in a process pool)
+    THEN check that the returns of each user are stored
+    """
+    add_stock('AAPL', '10', '361.00', 61, datetime(2020, 7, 1))
+    add_stock('AAPL', '10', '361.00', 62, datetime(2020, 7, 1))
+    add_stock('MSFT', '10', '150.00', 62, datetime(2020, 7, 15))
+    add_stock('MSFT', '5', '150.00', 63, datetime(2020, 6, 1))
+    database.session.commit()
+
+    assert calculate_return_metrics(batch_size=2) == 3
+    metrics = ReturnMetrics.query.get(61)
+    assert metrics.start_date == date(2020, 7, 1)
+    assert metrics.as_of_date == date(2020, 7, 31)
+    assert round(metrics.time_weighted_return, 6) == round(391.0 / 361.0 - 1.0, 6)
+    assert metrics.annualized_time_weighted_return is None
+    assert round(metrics.money_weighted_return, 4) == round((391.0 / 361.0) ** (365 / 30) - 1.0, 4)
+
+    # MSFT was purchased before its price history, so the time-weighted return starts on July 1st
+    metrics = ReturnMetrics.query.get(63)
+    assert round(metrics.time_weighted_return, 6) == round(184.5 / 199.5 - 1.0, 6)
+    assert round(metrics.money_weighted_return, 4) == round((184.5 / 150.0) ** (365 / 60) - 1.0, 4)
+
+    results = [(row.user_id, row.time_weighted_return, row.money_weighted_return)
+               for row in ReturnMetrics.query.order_by(ReturnMetrics.user_id)]
+    assert calculate_return_metrics(max_workers=2, batch_size=1) == 3
+    assert [(row.user_id, row.time_weighted_return, row.money_weighted_return)
+            for row in ReturnMetrics.query.order_by(ReturnMetrics.user_id)] == results
+    assert ReturnMetrics.query.get(62).start_date == date(2020, 7, 1)
+
+
+def test_compute_return_metrics_no_lots():
+    """
+    GIVEN a price matrix and no lots
+    WHEN the returns are computed
+    THEN check that empty arrays are returned
+    """
+    returns = compute_return_metrics(np.array([100, 101]), np.array([[10.0], [11.0]]),
+                                     lot_users=np.array([], dtype=np.int64),
+                                     lot_columns=np.array([], dtype=np.intp),
+                                     lot_shares=np.array([]), lot_costs=np.array([]),
+                                     lot_days=np.array([], dtype=np.int64))
+    assert all(len(array) == 0 for array in returns)
+
+
+def test_calculate_return_metrics_without_exchange_rates(price_history):
+    """
+    GIVEN a portfolio that only has lots in a currency without an exchange rate
+    WHEN the returns of every portfolio are calculated
+    THEN check that no returns are calculated (instead of an error)
+    """
+    fx_rate_cache.clear()
+    database.session.add(Stock('AAPL', '10', '361.00', 64, datetime(2020, 7, 1), currency='EUR'))
+    database.session.commit()
+
+    assert calculate_return_metrics() == 0
+    assert ReturnMetrics.query.count() == 0
@@ -0,0 +1,177 @@
+"""
+This file (test_risk.py) contains the unit tests for the risk.py file.
+"""
+import time
+import numpy as np
+import pytest
+from project import database
+from project.models import Stock, StockFundamentals
+from project.fx import fx_rate_cache
+from project.risk import parse_confidence_levels, parse_scenario, compute_var_cvar, build_shock_matrix, compute_risk, \
+    get_portfolio_risk, risk_cache
+
+
+def add_stock(symbol, number_of_shares, current_price, user_id, currency='USD'):
+    stock = Stock(symbol, number_of_shares, '100.00', user_id, currency=currency)
+    stock.current_price = current_price
+    stock.position_value = current_price * stock.number_of_shares
+    database.session.add(stock)
+
+
+def test_parse_risk_parameters():
+    """
+    GIVEN confidence levels and stress scenarios as entered in the risk form
+    WHEN they are parsed
+    THEN check the confidence levels and shocks, and that invalid input raises a ValueError
+    """
+    assert parse_confidence_levels('99, 95,97.5') == (0.95, 0.975, 0.99)
+    assert parse_scenario('Technology -20%, market -5.5 %, AAPL +10%') == \
+        (('technology', -0.2), ('market', -0.055), ('aapl', 0.1))
+
+    for text in ('', '95, abc', '50', '100', 'nan', '95, inf'):
+        with pytest.raises(ValueError):
+            parse_confidence_levels(text)
+    for text in ('Technology', 'Technology -20', '-20%', 'Technology -20%,'):
+        with pytest.raises(ValueError):
+            parse_scenario(text)
+
+
+def test_compute_var_cvar():
+    """
+    GIVEN the historical profits of a portfolio on 100 days
+    WHEN the VaR and CVaR are computed at the 95% and 99% confidence levels
+    THEN check the losses of the worst 5 days and the worst day
+    """
+    profits = np.random.default_rng(47).permutation(np.arange(-10.0, 90.0))
+    var, cvar = compute_var_cvar(profits, (0.95, 0.99))
+    assert var.tolist() == [6.0, 10.0]
+    assert cvar.tolist() == [8.0, 10.0]
+
+
+def test_build_shock_matrix():
+    """
+    GIVEN holdings with a sector, industry, asset type, and beta (or without any fundamentals)
+    WHEN the shocks of the stress scenarios are combined into a matrix
+    THEN check the change in the value of each holding in each scenario
+    """
+    symbols = ['AAPL', 'XOM', 'XYZ']
+    classifications = [('Technology', 'Electronic Computers', 'Common Stock'),
+                       ('Energy', 'Petroleum Refining', 'Common Stock'),
+                       (None, None, None)]
+    betas = np.array([1.2, 0.8, np.nan])
+    scenarios = [parse_scenario('Technology -20%, market -10%'),
+                 parse_scenario('Common Stock +5%, XYZ -50%')]
+
+    shocks = build_shock_matrix(scenarios, symbols, classifications, betas)
+    assert np.allclose(shocks, [[-0.2 - 0.12, -0.08, -0.1], [0.05, 0.05, -0.5]])
+
+
+def test_build_shock_matrix_targets():
+    """
+    GIVEN holdings with a sector and industry
+    WHEN the shocks target a prefix of a sector, an alias of a sector, and a target that matches no holding
+    THEN check that the prefix and alias match the sectors, and that the unmatched target raises a ValueError
+    """
+    symbols = ['AAPL', 'JPM', 'XOM']
+    classifications = [('TECHNOLOGY', 'ELECTRONIC COMPUTERS', 'Common Stock'),
+                       ('FINANCE', 'NATIONAL COMMERCIAL BANKS', 'Common Stock'),
+                       ('ENERGY & TRANSPORTATION', 'PETROLEUM REFINING', 'Common Stock')]
+    betas = np.array([1.2, 1.1, 0.8])
+    scenarios = [parse_scenario('tech -20%, financials -10%'), parse_scenario('energy +5%')]
+
+    shocks = build_shock_matrix(scenarios, symbols, classifications, betas)
+    assert np.allclose(shocks, [[-0.2, -0.1, 0.0], [0.0, 0.0, 0.05]])
+
+    for text in ('rates +1%', 'MSFT -10%', 'tech -20%, utilities -5%'):
+        with pytest.raises(ValueError, match='Invalid shock target'):
+            build_shock_matrix([parse_scenario(text)], symbols, classifications, betas)
+
+
+def test_compute_risk_many_holdings():
+    """
+    GIVEN a portfolio of 500 holdings with two years of daily prices (and a holding without a full history)
+    WHEN the VaR, CVaR, and 10 stress scenarios are computed
+    THEN check the results against a direct calculation and that the calculation is fast
+    """
+    rng = np.random.default_rng(47)
+    prices = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, size=(505, 500)), axis=0))
+    prices[:10, 0] = np.nan
+    values = rng.uniform(100.0, 10000.0, size=500)
+    symbols = [f'S{column}' for column in range(500)]
+    classifications = [(f'Sector {column % 11}', f'Industry {column % 50}', 'Common Stock') for column in range(500)]
+    scenarios = [parse_scenario(f'Sector {index} -20%, market -{index}%') for index in range(10)]
+
+    start = time.perf_counter()
+    shocks = build_shock_matrix(scenarios, symbols, classifications, rng.uniform(0.5, 1.5, size=500))
+    result = compute_risk(prices, values, (0.95, 0.99), shocks)
+    elapsed = time.perf_counter() - start
+
+    profits = sorted((prices[1:, 1:] / prices[:-1, 1:] - 1.0) @ values[1:])
+    assert result['complete'].tolist() == [False] + [True] * 499
+    assert np.isclose(result['var'][0], -profits[int(np.ceil(0.05 * 504)) - 1])
+    assert np.isclose(result['cvar'][1], -np.mean(profits[:int(np.ceil(0.01 * 504))]))
+    assert np.allclose(result['scenario_profits'], shocks @ values)
+    assert elapsed < 0.5
+
+
+def test_get_portfolio_risk(price_history):
+    """
+    GIVEN a portfolio of AAPL and MSFT with the daily prices for July 2020, and the fundamentals of AAPL
+    WHEN the risk of the portfolio is calculated (twice)
+    THEN check the VaR, the stress scenarios, and that the second result is cached
+    """
+    risk_cache.clear()
+    add_stock('AAPL', '10', 39100, 47)
+    add_stock('MSFT', '20', 18450, 47)
+    fundamentals = StockFundamentals('AAPL')
+    fundamentals.sector = 'Technology'
+    fundamentals.beta = 120
+    database.session.add(fundamentals)
+    database.session.commit()
+
+    scenarios = (('Tech crash', parse_scenario('Technology -20%')), ('Market', parse_scenario('market -10%')))
+    risk = get_portfolio_risk(47, confidence_levels=(0.95,), window=63, scenarios=scenarios)
+    assert risk['total_value'] == 3910.0 + 3690.0
+    assert risk['start_date'] == '2020-07-01'
+    assert risk['end_date'] == '2020-07-31'
+    assert risk['number_of_days'] == 22
+    assert risk['excluded_symbols'] == []
+    assert risk['missing_rates'] == []
+
+    # AAPL rises and MSFT falls every day, so the worst day is the largest fall of MSFT net of the rise of AAPL
+    days = [day for day in range(1, 32) if day not in (4, 5, 11, 12, 18, 19, 25, 26)]
+    aapl = np.array([360.0 + day for day in days])
+    msft = np.array([200.0 - day / 2 for day in days])
+    profits = np.sort((aapl[1:] / aapl[:-1] - 1.0) * 3910.0 + (msft[1:] / msft[:-1] - 1.0) * 3690.0)
+    assert risk['value_at_risk'][0]['var'] == round(-profits[1], 2)
+    assert risk['value_at_risk'][0]['cvar'] == round(-profits[:2].mean(), 2)
+    assert risk['scenarios'] == [
+        dict(name='Tech crash', profit=-782.0, percent=round(-782.0 / 7600.0, 4)),
+        dict(name='Market', profit=round(-0.12 * 3910.0 - 0.1 * 3690.0, 2), percent=round((-0.12 * 3910.0 - 0.1 * 3690.0) / 7600.0, 4)),
+    ]
+    assert get_portfolio_risk(47, confidence_levels=(0.95,), window=63, scenarios=scenarios) is risk
+
+    with pytest.raises(ValueError):
+        get_portfolio_risk(47, window=100)
+    assert get_portfolio_risk(48) is None
+
+
+def test_get_portfolio_risk_missing_rate(price_history):
+    """
+    GIVEN a portfolio of AAPL (in USD) and MSFT (in GBP, without an exchange rate)
+    WHEN the risk of the portfolio is calculated in USD with a scenario targeting MSFT
+    THEN check that MSFT is excluded and its currency is listed, and that the scenario is rejected
+    """
+    risk_cache.clear()
+    fx_rate_cache.clear()
+    add_stock('AAPL', '10', 39100, 49)
+    add_stock('MSFT', '20', 18450, 49, currency='GBP')
+    database.session.commit()
+
+    risk = get_portfolio_risk(49, scenarios=(('Market', parse_scenario('market -10%')),))
+    assert risk['total_value'] == 3910.0
+    assert risk['missing_rates'] == ['GBP']
+    assert risk['scenarios'][0]['profit'] == -391.0
+
+    with pytest.raises(ValueError):
+        get_portfolio_risk(49, scenarios=(('MSFT', parse_scenario('MSFT -10%')),))
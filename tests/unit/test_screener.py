@@ -0,0 +1,91 @@
+"""
+This file (test_screener.py) contains the unit tests for the screener.py file.
+"""
+from datetime import datetime
+import pytest
+from werkzeug.datastructures import MultiDict
+from project import database
+from project.models import Stock, WatchStock, StockFundamentals, save_stock_fundamentals
+from project.screener import parse_criteria, screen_stocks, screener_cache
+
+
+def add_fundamentals(symbol, pe_ratio, profit_margin, price, low, high):
+    watchstock = WatchStock(symbol, 31)
+    watchstock.company_name = f'{symbol} Corporation'
+    watchstock.current_share_price = price
+    watchstock.fiftytwo_week_low = low
+    watchstock.fiftytwo_week_high = high
+    watchstock.pe_ratio = pe_ratio
+    watchstock.profit_margin = profit_margin
+    watchstock.stock_data_date = datetime.now()
+    database.session.add(watchstock)
+    save_stock_fundamentals(watchstock)
+
+
+def test_stock_fundamentals_update():
+    """
+    GIVEN a WatchStock with the current price between the 52-week low and high
+    WHEN a StockFundamentals object is updated from the WatchStock
+    THEN check that the fundamentals are copied and the 52-week position is calculated
+    """
+    watchstock = WatchStock('COST', 1)
+    watchstock.current_share_price = 30000
+    watchstock.fiftytwo_week_low = 25000
+    watchstock.fiftytwo_week_high = 35000
+    watchstock.pe_ratio = 3715
+
+    fundamentals = StockFundamentals('COST')
+    fundamentals.update(watchstock)
+    assert fundamentals.pe_ratio == 3715
+    assert fundamentals.fiftytwo_week_position == 5000
+    assert fundamentals.updated_on is not None
+
+
+def test_parse_criteria():
+    """
+    GIVEN the arguments of a screener request
+    WHEN the criteria are parsed
+    THEN check that only the specified limits are returned, converted to the stored units
+    """
+    args = MultiDict({'pe_ratio_min': '5', 'pe_ratio_max': '20.5', 'profit_margin_min': '10', 'beta_max': ''})
+    assert parse_criteria(args) == (('pe_ratio', 500, 2050), ('profit_margin', 1000, None))
+
+    assert parse_criteria(MultiDict({'pe_ratio_max': '21474836.47'})) == (('pe_ratio', None, 2 ** 31 - 1),)
+    for value in ('high', 'inf', '-inf', 'nan', '1e400', '1e300', '-21474836.48'):
+        with pytest.raises(ValueError):
+            parse_criteria(MultiDict({'beta_min': value}))
+
+
+def test_screen_stocks(price_history):
+    """
+    GIVEN the fundamentals of stocks in a watchlist, plus the fundamentals of a stock that is no longer tracked
+    WHEN the stocks are screened with multiple criteria, sorted, and paged
+    THEN check that only the matching tracked stocks are returned
+    """
+    screener_cache.clear()
+    add_fundamentals('AAA', 1500, 2000, 100, 50, 150)
+    add_fundamentals('BBB', 2500, 1200, 140, 50, 150)
+    add_fundamentals('CCC', 1800, 500, 60, 50, 150)
+    add_fundamentals('DDD', 1000, 3000, 100, 50, 150)
+    database.session.add(Stock('EEE', '10', '10.00', 31))
+    database.session.commit()
+    WatchStock.query.filter_by(stock_symbol='DDD').delete()
+    database.session.commit()
+
+    results = screen_stocks((('pe_ratio', None, 2000), ('profit_margin', 1000, None)))
+    assert results['total'] == 1
+    assert [stock['stock_symbol'] for stock in results['stocks']] == ['AAA']
+    assert results['stocks'][0]['pe_ratio'] == 15.0
+    assert results['stocks'][0]['fiftytwo_week_position'] == 50.0
+
+    results = screen_stocks(sort='fiftytwo_week_position', descending=True, per_page=2)
+    assert results['total'] == 3
+    assert [stock['stock_symbol'] for stock in results['stocks']] == ['BBB', 'AAA']
+    results = screen_stocks(sort='fiftytwo_week_position', descending=True, page=2, per_page=2)
+    assert [stock['stock_symbol'] for stock in results['stocks']] == ['CCC']
+
+    assert screen_stocks(sort='fiftytwo_week_position', descending=True, page=2, per_page=2) is results
+    with pytest.raises(ValueError):
+        screen_stocks(sort='company_name')
+    with pytest.raises(ValueError):
+        screen_stocks(page=10 ** 20)